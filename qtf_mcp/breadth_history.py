@@ -0,0 +1,262 @@
+"""Intraday market-breadth samples in a fixed-size ring buffer.
+
+``market_breadth`` keeps only its latest result, so the evolution of a session
+could only be seen by polling it from the client. While the market is live the
+sampler records one breadth sample every ``MARKET_BREADTH_HISTORY_INTERVAL_SECONDS``:
+the sample time, the up/down/flat and limit-up/down counts and the ten bucket
+counts. Samples go into NumPy arrays allocated once at
+``MARKET_BREADTH_HISTORY_CAPACITY`` rows; when full, the oldest row is
+overwritten. The ring holds one trading day and starts over on the next.
+
+After the close the day is written to ``MARKET_BREADTH_HISTORY_DIR`` as one
+``.npz`` file, so ``market_breadth_history`` serves today from memory and
+earlier days from disk, downsampled, without any upstream call.
+
+Inert when ``MARKET_BREADTH_HISTORY_INTERVAL_SECONDS`` is 0.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+from .cache import BOUNDARY_BUFFER, MARKET_CLOSE, _add, _as_shanghai, in_trading_session
+from .config import (
+    MARKET_BREADTH_HISTORY_CAPACITY,
+    MARKET_BREADTH_HISTORY_DIR,
+    MARKET_BREADTH_HISTORY_INTERVAL_SECONDS,
+)
+from .datasource.market_breadth import MARKET_BREADTH_RANGES, MarketBreadthData, get_market_breadth
+from .observability import detached_context
+
+logger = logging.getLogger("qtf_mcp")
+
+# 每个样本的计数列；缺失的涨跌停家数记为 -1
+COUNT_FIELDS = (
+    "up_count",
+    "down_count",
+    "flat_count",
+    "limit_up_count",
+    "limit_down_count",
+)
+MISSING_COUNT = -1
+# in_trading_session 在收盘和午间休市后再多几分钟，拿到定格的数值；此后落盘
+SAMPLING_END = _add(MARKET_CLOSE, BOUNDARY_BUFFER)
+
+_SAMPLER_TASK_ATTR = "_cn_stock_breadth_sampler_task"
+
+
+@dataclass(frozen=True)
+class BreadthSeries:
+    """One trading day's samples in time order: ``counts`` columns are COUNT_FIELDS then the ten buckets."""
+
+    trade_date: str
+    times: ndarray
+    counts: ndarray
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def downsample(self, points: int) -> "BreadthSeries":
+        """Keep at most ``points`` evenly spaced samples, always including the first and last."""
+        if points <= 0 or len(self) <= points:
+            return self
+        index = np.unique(np.linspace(0, len(self) - 1, points).round().astype(np.int64))
+        return BreadthSeries(self.trade_date, self.times[index], self.counts[index])
+
+
+class BreadthRing:
+    """Fixed-size ring of breadth samples for one trading day."""
+
+    def __init__(self, capacity: int = MARKET_BREADTH_HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.trade_date: Optional[str] = None
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._counts = np.zeros((capacity, len(COUNT_FIELDS) + len(MARKET_BREADTH_RANGES)), dtype=np.int32)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self, trade_date: Optional[str] = None) -> None:
+        self.trade_date = trade_date
+        self._next = 0
+        self._size = 0
+
+    def append(self, trade_date: str, timestamp: float, data: MarketBreadthData) -> None:
+        if trade_date != self.trade_date:
+            self.clear(trade_date)
+        row = self._counts[self._next]
+        row[: len(COUNT_FIELDS)] = [
+            MISSING_COUNT if value is None else value
+            for value in (getattr(data, field) for field in COUNT_FIELDS)
+        ]
+        row[len(COUNT_FIELDS) :] = [bucket.count for bucket in data.distribution]
+        self._times[self._next] = timestamp
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    @property
+    def last_time(self) -> Optional[float]:
+        return float(self._times[self._next - 1]) if self._size else None
+
+    def series(self) -> Optional[BreadthSeries]:
+        if self.trade_date is None or not self._size:
+            return None
+        start = (self._next - self._size) % self.capacity
+        order = (start + np.arange(self._size)) % self.capacity
+        return BreadthSeries(self.trade_date, self._times[order].copy(), self._counts[order].copy())
+
+
+def _history_path(directory: str, trade_date: str) -> str:
+    return os.path.join(directory, f"{trade_date}.npz")
+
+
+def save_series(series: BreadthSeries, directory: str = MARKET_BREADTH_HISTORY_DIR) -> str:
+    """Write one day's samples atomically; returns the file path."""
+    os.makedirs(directory, exist_ok=True)
+    path = _history_path(directory, series.trade_date)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            np.savez(handle, times=series.times, counts=series.counts)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def load_series(trade_date: str, directory: str = MARKET_BREADTH_HISTORY_DIR) -> Optional[BreadthSeries]:
+    path = _history_path(directory, trade_date)
+    try:
+        with np.load(path) as archive:
+            return BreadthSeries(trade_date, archive["times"], archive["counts"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError):
+        logger.warning("Unreadable market breadth history path=%s", path, exc_info=True)
+        return None
+
+
+class BreadthSampler:
+    """Sample market breadth while the market is live; persist the day after the close."""
+
+    def __init__(
+        self,
+        *,
+        interval: float = MARKET_BREADTH_HISTORY_INTERVAL_SECONDS,
+        capacity: int = MARKET_BREADTH_HISTORY_CAPACITY,
+        directory: str = MARKET_BREADTH_HISTORY_DIR,
+    ):
+        self.interval = interval
+        self.directory = directory
+        self.ring = BreadthRing(capacity)
+        self._persisted: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    async def sample(self, now: Optional[datetime.datetime] = None) -> bool:
+        """Record the current breadth once. False when it was stale or too close to the last sample."""
+        current = _as_shanghai(now)
+        trade_date = current.date().isoformat()
+        timestamp = current.timestamp()
+        if self.ring.trade_date == trade_date and self.ring.last_time is not None:
+            if timestamp - self.ring.last_time < self.interval / 2:
+                return False
+        data = await get_market_breadth()
+        # 开盘前几分钟上游可能还是上一交易日的数据
+        if data.trade_date is not None and data.trade_date != trade_date:
+            return False
+        self.ring.append(trade_date, timestamp, data)
+        return True
+
+    def persist(self) -> Optional[str]:
+        """Write the ring's day to disk once. Returns the path when written."""
+        series = self.ring.series()
+        if series is None or self._persisted == series.trade_date:
+            return None
+        path = save_series(series, self.directory)
+        self._persisted = series.trade_date
+        logger.info(
+            "Market breadth history saved trade_date=%s samples=%s path=%s",
+            series.trade_date,
+            len(series),
+            path,
+        )
+        return path
+
+    def history(self, trade_date: Optional[str] = None) -> Optional[BreadthSeries]:
+        """One day's samples: today's from memory, earlier days from disk."""
+        series = self.ring.series()
+        if series is not None and trade_date in (None, series.trade_date):
+            return series
+        if trade_date is None:
+            trade_date = _as_shanghai().date().isoformat()
+        return load_series(trade_date, self.directory)
+
+    async def tick(self, now: Optional[datetime.datetime] = None) -> None:
+        current = _as_shanghai(now)
+        if in_trading_session(current):
+            await self.sample(current)
+        elif current.replace(tzinfo=None).time() >= SAMPLING_END:
+            self.persist()
+
+    async def run(self) -> None:
+        """Tick on interval boundaries for the loop's lifetime."""
+        while True:
+            await asyncio.sleep(self.interval - time.time() % self.interval)
+            try:
+                await self.tick()
+            except Exception:
+                logger.warning("Market breadth sample failed", exc_info=True)
+
+    def ensure_running(self) -> None:
+        """Start the sampler on the running event loop, once."""
+        if not self.enabled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = getattr(loop, _SAMPLER_TASK_ATTR, None)
+        if task is not None and not task.done():
+            return
+        # 在应用启动时启动，不继承任何请求的截止时间
+        setattr(
+            loop,
+            _SAMPLER_TASK_ATTR,
+            loop.create_task(self.run(), context=detached_context()),
+        )
+        logger.info("Market breadth sampler started interval=%ss", self.interval)
+
+
+_sampler: Optional[BreadthSampler] = None
+
+
+def get_breadth_sampler() -> BreadthSampler:
+    global _sampler
+    if _sampler is None:
+        _sampler = BreadthSampler()
+    return _sampler
+
+
+def set_breadth_sampler(sampler: Optional[BreadthSampler]) -> None:
+    """Replace the process-wide sampler. Tests use this; production does not."""
+    global _sampler
+    _sampler = sampler
@@ -39,26 +39,35 @@ Wall-clock dependencies in the render path, and how each is covered:
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import datetime
+import fcntl
 import hashlib
 import json
 import logging
 import os
 import shutil
+import sqlite3
 import tempfile
 import threading
 import time
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 from zoneinfo import ZoneInfo
 
 from .config import (
+    RAW_DATA_CACHE_ENABLED,
+    RAW_DATA_CACHE_MAX_ENTRIES,
+    REPORT_CACHE_BACKEND,
     REPORT_CACHE_DIR,
     REPORT_CACHE_DISK_ENABLED,
     REPORT_CACHE_ENABLED,
+    REPORT_CACHE_LEASE_TIMEOUT_SECONDS,
     REPORT_CACHE_LIVE_TTL_SECONDS,
     REPORT_CACHE_MAX_ENTRIES,
     REPORT_CACHE_SETTLE_TIME,
+    REPORT_CACHE_SWR_SECONDS,
 )
 from .version import __version__
 
@@ -105,6 +114,10 @@ EPOCH_DIR_PREFIX = "epoch-"
 # open is 64h) so a sweep never removes data another phase may still read.
 DISK_RETENTION_SECONDS = 5 * 24 * 3600
 DISK_SWEEP_INTERVAL_SECONDS = 3600
+# The sqlite backend keeps every epoch in one database next to the epoch
+# directories (which then hold only fill-lease lock files).
+SQLITE_FILENAME = "report-cache.sqlite3"
+LEASE_POLL_SECONDS = 0.05
 
 
 def _add(clock: datetime.time, delta: datetime.timedelta) -> datetime.time:
@@ -124,6 +137,28 @@ def _as_shanghai(now: Optional[datetime.datetime] = None) -> datetime.datetime:
     return current.astimezone(SHANGHAI_TZ)
 
 
+def in_trading_session(
+    now: Optional[datetime.datetime] = None,
+    settle: datetime.timedelta = BOUNDARY_BUFFER,
+) -> bool:
+    """Whether ``now`` is in a weekday session, or within ``settle`` after one ends.
+
+    The sessions are PRE_OPEN to LUNCH_START and LUNCH_END to MARKET_CLOSE; the
+    settle minutes catch the values the upstream feeds freeze at each boundary.
+    Background samplers use this. The report rendering branch is
+    ``research.is_realtime_fund_flow_window`` instead, which stays on until
+    BRANCH_FLIP.
+    """
+    current = _as_shanghai(now)
+    if current.weekday() >= 5:
+        return False
+    clock = current.replace(tzinfo=None).time()
+    return (
+        PRE_OPEN <= clock < _add(LUNCH_START, settle)
+        or LUNCH_END <= clock < _add(MARKET_CLOSE, settle)
+    )
+
+
 def _clamp_settle(value: datetime.time) -> datetime.time:
     """Keep the settle boundary inside the range where an epoch stays coherent.
 
@@ -175,7 +210,15 @@ def _render_fingerprint() -> str:
     # must hash to a stable marker, or the fingerprint would change every boot.
     sources = [
         (os.path.join(here, name), True)
-        for name in ("research.py", "mcp_app.py", "cache.py", "config.py")
+        for name in (
+            "research.py",
+            "indicators.py",
+            "mcp_app.py",
+            "cache.py",
+            "config.py",
+            "window_stats.py",
+            "report_doc.py",
+        )
     ]
     sources.append((os.path.join(here, os.pardir, "confs", "indices.json"), False))
     for path, required in sources:
@@ -300,6 +343,22 @@ def build_key(
     )
 
 
+def _fresh_in_epoch(
+    phase: str,
+    epoch: str,
+    created_at: float,
+    created_epoch: str,
+    live_ttl_seconds: float,
+) -> bool:
+    if created_epoch != epoch:
+        return False
+    if phase != PHASE_LIVE:
+        return True
+    if live_ttl_seconds <= 0:
+        return False
+    return (time.time() - created_at) <= live_ttl_seconds
+
+
 def is_cacheable_report(text: str) -> bool:
     """Reject renderings that captured a transient upstream failure."""
     if not text or not text.strip():
@@ -308,7 +367,14 @@ def is_cacheable_report(text: str) -> bool:
 
 
 class ReportCache:
-    """Two-tier epoch-bound cache: bounded memory over an optional disk tier."""
+    """Two-tier epoch-bound cache: bounded memory over an optional disk tier.
+
+    The disk tier is either one JSON file per entry (``backend="file"``) or a
+    WAL-mode SQLite database shared by every worker process pointing at the same
+    directory (``backend="sqlite"``). Both store entries under ``key.digest()``
+    and re-check the epoch on read, so the render fingerprint and epoch
+    invariants hold across processes exactly as they do within one.
+    """
 
     def __init__(
         self,
@@ -318,15 +384,25 @@ class ReportCache:
         max_entries: int = REPORT_CACHE_MAX_ENTRIES,
         disk_enabled: bool = REPORT_CACHE_DISK_ENABLED,
         directory: str = REPORT_CACHE_DIR,
+        backend: str = REPORT_CACHE_BACKEND,
+        lease_timeout_seconds: float = REPORT_CACHE_LEASE_TIMEOUT_SECONDS,
+        stale_seconds: float = REPORT_CACHE_SWR_SECONDS,
     ):
         self.enabled = enabled
         self.live_ttl_seconds = live_ttl_seconds
+        self.stale_seconds = stale_seconds
         self.max_entries = max_entries
         self.disk_enabled = disk_enabled
         self.directory = directory
+        self.backend = backend
+        self.lease_timeout_seconds = lease_timeout_seconds
         self._entries: dict[str, tuple[float, str, Any]] = {}
         self._lock = threading.Lock()
         self._last_sweep_at = 0.0
+        self._sqlite_local = threading.local()
+        self.lease_waits = 0
+        self.lease_timeouts = 0
+        self.stale_hits = 0
         self.hits = 0
         self.misses = 0
         self.stores = 0
@@ -334,13 +410,29 @@ class ReportCache:
     # -- policy ----------------------------------------------------------
 
     def _fresh(self, key: CacheKey, created_at: float, created_epoch: str) -> bool:
-        if created_epoch != key.epoch:
-            return False
-        if key.phase != PHASE_LIVE:
-            return True
-        if self.live_ttl_seconds <= 0:
-            return False
-        return (time.time() - created_at) <= self.live_ttl_seconds
+        return _fresh_in_epoch(
+            key.phase, key.epoch, created_at, created_epoch, self.live_ttl_seconds
+        )
+
+    def _stale_age(
+        self, key: CacheKey, created_at: float, created_epoch: str
+    ) -> Optional[float]:
+        """Age of a LIVE entry past its TTL but inside the SWR window, else None.
+
+        Only LIVE entries qualify: every other phase is either fully reusable or
+        a different epoch, and serving across an epoch would break invariant 1.
+        """
+        if (
+            self.stale_seconds <= 0
+            or key.phase != PHASE_LIVE
+            or created_epoch != key.epoch
+            or self.live_ttl_seconds <= 0
+        ):
+            return None
+        age = time.time() - created_at
+        if age <= self.live_ttl_seconds + self.stale_seconds:
+            return age
+        return None
 
     # -- memory tier -----------------------------------------------------
 
@@ -398,7 +490,85 @@ class ReportCache:
             shutil.rmtree(path, ignore_errors=True)
             logger.debug("Report cache retired epoch directory %s", name)
 
+        if self.backend == "sqlite":
+            try:
+                self._sqlite().execute(
+                    "DELETE FROM entries WHERE created_at < ?",
+                    (now - DISK_RETENTION_SECONDS,),
+                )
+            except sqlite3.Error:
+                logger.debug("Report cache sqlite sweep failed", exc_info=True)
+
+    def _sqlite(self) -> sqlite3.Connection:
+        """Per-thread, per-process connection to the shared database.
+
+        Connections are never shared across a fork: the pid check reopens in a
+        child that inherited the parent's thread-local.
+        """
+        local = self._sqlite_local
+        conn = getattr(local, "conn", None)
+        if conn is not None and getattr(local, "pid", None) == os.getpid():
+            return conn
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(
+            os.path.join(self.directory, SQLITE_FILENAME),
+            timeout=5.0,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " digest TEXT PRIMARY KEY,"
+            " epoch TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " tool TEXT,"
+            " symbol TEXT,"
+            " value TEXT NOT NULL)"
+        )
+        local.conn = conn
+        local.pid = os.getpid()
+        return conn
+
+    def _sqlite_read(self, key: CacheKey) -> Optional[tuple[float, str, Any]]:
+        try:
+            row = self._sqlite().execute(
+                "SELECT created_at, value FROM entries WHERE digest = ? AND epoch = ?",
+                (key.digest(), key.epoch),
+            ).fetchone()
+        except sqlite3.Error:
+            logger.debug("Report cache sqlite read failed", exc_info=True)
+            return None
+        if row is None:
+            return None
+        try:
+            return float(row[0]), key.epoch, json.loads(row[1])
+        except (TypeError, ValueError):
+            return None
+
+    def _sqlite_write(self, key: CacheKey, created_at: float, value: Any) -> None:
+        try:
+            self._sqlite().execute(
+                "INSERT OR REPLACE INTO entries"
+                " (digest, epoch, created_at, tool, symbol, value)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key.digest(),
+                    key.epoch,
+                    created_at,
+                    key.tool,
+                    key.symbol,
+                    json.dumps(value, ensure_ascii=False),
+                ),
+            )
+        except Exception:
+            # A cache write must never surface as a tool error.
+            logger.debug("Report cache sqlite write failed", exc_info=True)
+
     def _disk_read(self, key: CacheKey) -> Optional[tuple[float, str, Any]]:
+        if self.backend == "sqlite":
+            return self._sqlite_read(key)
         path = os.path.join(self._epoch_dir(key.epoch), f"{key.digest()}.json")
         try:
             with open(path, "r", encoding="utf-8") as handle:
@@ -413,6 +583,9 @@ class ReportCache:
         return float(payload.get("created_at", 0.0)), key.epoch, payload.get("value")
 
     def _disk_write(self, key: CacheKey, created_at: float, value: Any) -> None:
+        if self.backend == "sqlite":
+            self._sqlite_write(key, created_at, value)
+            return
         directory = self._epoch_dir(key.epoch)
         temp_path = None
         try:
@@ -467,7 +640,7 @@ class ReportCache:
             if entry is not None and self._fresh(key, entry[0], entry[1]):
                 self.hits += 1
                 return entry[2]
-            if entry is not None:
+            if entry is not None and self._stale_age(key, entry[0], entry[1]) is None:
                 self._entries.pop(digest, None)
 
         if not self.disk_enabled:
@@ -488,6 +661,34 @@ class ReportCache:
             self.hits += 1
         return loaded[2]
 
+    def get_stale(self, key: CacheKey) -> Optional[tuple[Any, float]]:
+        """Return ``(value, age_seconds)`` for an expired LIVE entry still inside
+        the SWR window, or None. Never raises.
+
+        Call this only after ``get`` missed. The caller owns the refresh: this
+        method never renders and never extends the entry's life.
+        """
+        if not self.enabled or self.stale_seconds <= 0 or key.phase != PHASE_LIVE:
+            return None
+        try:
+            digest = key.digest()
+            with self._lock:
+                entry = self._entries.get(digest)
+            if entry is None and self.disk_enabled:
+                entry = self._disk_read(key)
+            if entry is None:
+                return None
+            age = self._stale_age(key, entry[0], entry[1])
+            if age is None:
+                return None
+            with self._lock:
+                self.stale_hits += 1
+            return entry[2], age
+        except Exception:
+            logger.warning("Report cache stale read failed tool=%s symbol=%s",
+                           key.tool, key.symbol, exc_info=True)
+            return None
+
     def put(self, key: CacheKey, value: Any) -> None:
         """Store a value. Never raises.
 
@@ -517,10 +718,109 @@ class ReportCache:
             self._sweep_disk()
             self._disk_write(key, created_at, value)
 
+    @property
+    def shared(self) -> bool:
+        """True when other worker processes read and fill the same entries."""
+        return self.enabled and self.disk_enabled and self.backend == "sqlite"
+
+    @contextlib.asynccontextmanager
+    async def fill_lease(self, key: Optional[CacheKey]) -> AsyncIterator[bool]:
+        """Hold the cross-process right to render ``key``; yield whether it was taken.
+
+        Only the shared backend takes a lease. The lease is an ``flock`` on a
+        per-digest file inside the epoch directory, so it dies with the process
+        that held it and retires with the epoch. The holder renders and stores;
+        everyone else waits here, and on True must re-probe before rendering,
+        because the previous holder has usually filled the entry by then.
+
+        Waiting is bounded by ``lease_timeout_seconds``: a worker stuck while
+        holding the lease degrades the others to rendering themselves, which is
+        the behaviour without a lease. Lock faults degrade the same way.
+        """
+        if key is None or not self.shared:
+            yield False
+            return
+
+        handle = None
+        acquired = False
+        started_at = time.perf_counter()
+        try:
+            directory = self._epoch_dir(key.epoch)
+            os.makedirs(directory, exist_ok=True)
+            handle = open(os.path.join(directory, f"{key.digest()}.lock"), "a+")
+            while not acquired:
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                except BlockingIOError:
+                    if time.perf_counter() - started_at >= self.lease_timeout_seconds:
+                        break
+                    await asyncio.sleep(LEASE_POLL_SECONDS)
+            if not acquired:
+                with self._lock:
+                    self.lease_timeouts += 1
+                logger.warning(
+                    "Report cache lease timed out tool=%s symbol=%s epoch=%s "
+                    "waited=%.3fs",
+                    key.tool,
+                    key.symbol,
+                    key.epoch,
+                    time.perf_counter() - started_at,
+                )
+        except OSError:
+            logger.debug("Report cache lease unavailable", exc_info=True)
+        except BaseException:
+            # Cancelled while waiting: do not leak the descriptor.
+            if handle is not None:
+                handle.close()
+            raise
+
+        if not acquired:
+            if handle is not None:
+                handle.close()
+            yield False
+            return
+
+        waited = time.perf_counter() - started_at
+        if waited >= LEASE_POLL_SECONDS:
+            with self._lock:
+                self.lease_waits += 1
+            logger.info(
+                "Report cache lease acquired after wait tool=%s symbol=%s epoch=%s "
+                "waited=%.3fs",
+                key.tool,
+                key.symbol,
+                key.epoch,
+                waited,
+            )
+        try:
+            yield True
+        finally:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            except OSError:
+                pass
+            handle.close()
+
+    @contextlib.asynccontextmanager
+    async def get_or_lease(self, key: CacheKey) -> AsyncIterator[Optional[Any]]:
+        """Yield the cached value, or None while holding the fill lease for ``key``.
+
+        On None the caller renders and stores before leaving the block, so other
+        workers waiting on the lease find the entry instead of rendering again.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            yield cached
+            return
+        async with self.fill_lease(key) as leased:
+            yield self.get(key) if leased else None
+
     def clear(self) -> None:
         with self._lock:
             self._entries.clear()
-            self.hits = self.misses = self.stores = 0
+            self.hits = self.misses = self.stores = self.stale_hits = 0
+            self.lease_waits = self.lease_timeouts = 0
             self._last_sweep_at = 0.0
 
 
@@ -536,12 +836,13 @@ def get_report_cache() -> ReportCache:
                 _cache = ReportCache()
                 logger.info(
                     "Report cache initialised enabled=%s live_ttl=%.0fs settle=%s "
-                    "max_entries=%s disk=%s dir=%s render=%s",
+                    "max_entries=%s disk=%s backend=%s dir=%s render=%s",
                     _cache.enabled,
                     _cache.live_ttl_seconds,
                     SETTLE.strftime("%H:%M"),
                     _cache.max_entries,
                     _cache.disk_enabled,
+                    _cache.backend,
                     _cache.directory,
                     RENDER_FINGERPRINT,
                 )
@@ -553,3 +854,130 @@ def set_report_cache(cache: Optional[ReportCache]) -> None:
     global _cache
     with _cache_lock:
         _cache = cache
+
+
+class RawDataCache:
+    """Epoch-bound cache of fetched raw data, one level below ``ReportCache``.
+
+    ``ReportCache`` keys on the tool, so ``brief``, ``full`` and ``tech`` for the
+    same symbol each refetch the same two-year window. This tier keys on
+    ``(symbol, window)`` only and remembers which ``FetchRequirements`` produced
+    each entry: a full fetch satisfies any later narrower request (``tech``
+    after ``brief``), so a tool switch inside one epoch only re-renders.
+
+    Reuse follows the report cache rules exactly — same epoch, LIVE bounded by
+    the same TTL — so a report rendered from a reused fetch is one a live fetch
+    in that epoch could have produced. Callers must not store fetches that
+    recorded a failure. Entries are shallow-copied on read; the arrays are
+    shared and must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = RAW_DATA_CACHE_ENABLED,
+        live_ttl_seconds: float = REPORT_CACHE_LIVE_TTL_SECONDS,
+        max_entries: int = RAW_DATA_CACHE_MAX_ENTRIES,
+    ):
+        self.enabled = enabled
+        self.live_ttl_seconds = live_ttl_seconds
+        self.max_entries = max_entries
+        # (symbol, window) -> (created_at, epoch, requirements, data)
+        self._entries: dict[tuple[str, str], tuple[float, str, Any, dict]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(
+        self,
+        symbol: str,
+        window: str,
+        requirements: Any,
+        *,
+        now: Optional[datetime.datetime] = None,
+    ) -> Optional[dict]:
+        """Return a copy of a fetch that covers ``requirements``, or None. Never raises."""
+        if not self.enabled:
+            return None
+        try:
+            phase, epoch = market_phase(now)
+            with self._lock:
+                entry = self._entries.get((symbol, window))
+                if entry is not None and not _fresh_in_epoch(
+                    phase, epoch, entry[0], entry[1], self.live_ttl_seconds
+                ):
+                    self._entries.pop((symbol, window), None)
+                    entry = None
+                if entry is None or not entry[2].covers(requirements):
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                return dict(entry[3])
+        except Exception:
+            logger.warning("Raw data cache read failed symbol=%s", symbol, exc_info=True)
+            return None
+
+    def put(
+        self,
+        symbol: str,
+        window: str,
+        requirements: Any,
+        data: dict,
+        *,
+        now: Optional[datetime.datetime] = None,
+    ) -> None:
+        """Store a fetch. Never raises.
+
+        A fresh entry that already covers ``requirements`` is kept: replacing a
+        full fetch with a narrower one would make the next report tool refetch.
+        """
+        if not self.enabled or not data:
+            return
+        try:
+            phase, epoch = market_phase(now)
+            if phase == PHASE_LIVE and self.live_ttl_seconds <= 0:
+                return
+            slot = (symbol, window)
+            with self._lock:
+                current = self._entries.get(slot)
+                if (
+                    current is not None
+                    and _fresh_in_epoch(
+                        phase, epoch, current[0], current[1], self.live_ttl_seconds
+                    )
+                    and current[2].covers(requirements)
+                    and not requirements.covers(current[2])
+                ):
+                    return
+                while len(self._entries) >= self.max_entries and slot not in self._entries:
+                    oldest = min(self._entries, key=lambda s: self._entries[s][0])
+                    self._entries.pop(oldest, None)
+                self._entries[slot] = (time.time(), epoch, requirements, dict(data))
+                self.stores += 1
+        except Exception:
+            logger.warning("Raw data cache write failed symbol=%s", symbol, exc_info=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.stores = 0
+
+
+_raw_cache: Optional[RawDataCache] = None
+
+
+def get_raw_data_cache() -> RawDataCache:
+    global _raw_cache
+    if _raw_cache is None:
+        with _cache_lock:
+            if _raw_cache is None:
+                _raw_cache = RawDataCache()
+    return _raw_cache
+
+
+def set_raw_data_cache(cache: Optional[RawDataCache]) -> None:
+    """Replace the process-wide raw data cache. Tests use this; production does not."""
+    global _raw_cache
+    with _cache_lock:
+        _raw_cache = cache
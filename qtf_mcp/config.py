@@ -32,6 +32,61 @@ BATCH_QUERY_CONCURRENCY = max(
     1,
     int(os.getenv("CN_STOCK_BATCH_QUERY_CONCURRENCY", "2")),
 )
+# Single-symbol cache misses (tech per symbol, kline_daily, kline_range) have
+# their own slots, so a one-bar lookup never waits behind report batches that
+# hold the batch slots for their whole run. Same per-client fairness.
+SYMBOL_QUERY_CONCURRENCY = max(
+    1,
+    int(os.getenv("CN_STOCK_SYMBOL_QUERY_CONCURRENCY", "2")),
+)
+
+
+def _parse_client_map(raw) -> dict[str, int]:
+    """Parse ``"10.0.0.5=3,10.0.0.6=1"`` into ``{host: int}``, skipping bad pairs."""
+    result: dict[str, int] = {}
+    for pair in str(raw or "").split(","):
+        host, _, value = pair.partition("=")
+        try:
+            result[host.strip()] = max(0, int(value))
+        except ValueError:
+            continue
+    return result
+
+
+# Admission slots are shared fairly between clients (the caller's host):
+# waiting clients take turns, each keeping the turn for up to its weight in
+# consecutive grants, so one client queueing many batches cannot starve the
+# others. Unlisted hosts weigh 1.
+BATCH_CLIENT_WEIGHTS = _parse_client_map(os.getenv("CN_STOCK_BATCH_CLIENT_WEIGHTS"))
+# Slots one client may hold at once, even when others are idle. 0 means up to
+# BATCH_QUERY_CONCURRENCY; CN_STOCK_BATCH_CLIENT_LIMITS overrides it per host.
+BATCH_CLIENT_MAX_ACTIVE = max(
+    0,
+    int(os.getenv("CN_STOCK_BATCH_CLIENT_MAX_ACTIVE", "0")),
+)
+BATCH_CLIENT_LIMITS = _parse_client_map(os.getenv("CN_STOCK_BATCH_CLIENT_LIMITS"))
+
+# End-to-end deadline for a tool call when neither the X-Request-Timeout header
+# nor the tool's deadline argument sets one. Work still queued at an admission
+# point past it is dropped instead of spending upstream capacity on a response
+# nobody waits for. 0 disables the default. watchlist reports progress and
+# only follows an explicit deadline.
+REQUEST_DEADLINE_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_REQUEST_DEADLINE_SECONDS", "300")),
+)
+
+# watchlist takes long symbol lists and runs them as ordinary 4-symbol batches,
+# at most BATCH_QUERY_CONCURRENCY at a time, so other clients still interleave.
+WATCHLIST_MAX_SYMBOLS = max(
+    1,
+    int(os.getenv("CN_STOCK_WATCHLIST_MAX_SYMBOLS", "300")),
+)
+# Per-symbol deadline, counted from batch admission. 0 disables it.
+WATCHLIST_SYMBOL_TIMEOUT_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_WATCHLIST_SYMBOL_TIMEOUT_SECONDS", "60")),
+)
 
 # Financial abstracts normally change only after periodic reports are published.
 # Cache successful results to keep recurring batch scans off the upstream API.
@@ -44,6 +99,96 @@ FINANCE_CACHE_MAX_ENTRIES = max(
     int(os.getenv("CN_STOCK_FINANCE_CACHE_MAX_ENTRIES", "512")),
 )
 
+# One Playwright driver serves every browser (qtf_mcp/datasource/browser.py). A
+# browser is recycled once its in-flight work drains after it has opened this many
+# pages, or when the driver and browsers together exceed this resident memory
+# (MB, read from /proc). 0 disables either check.
+BROWSER_MAX_PAGES = max(
+    0,
+    int(os.getenv("CN_STOCK_BROWSER_MAX_PAGES", "500")),
+)
+BROWSER_MAX_RSS_MB = max(
+    0.0,
+    float(os.getenv("CN_STOCK_BROWSER_MAX_RSS_MB", "1536")),
+)
+# Realtime fund-flow pages (qtf_mcp/datasource/realtime_ff.py) come from a pool
+# of route-configured Chromium pages that stay on the Eastmoney domain. The pool
+# size is also the scrape concurrency; 2C4G hosts should keep it at 2.
+REALTIME_FF_PAGE_POOL_SIZE = max(
+    1,
+    int(os.getenv("CN_STOCK_REALTIME_FF_PAGE_POOL_SIZE", "2")),
+)
+# A page is closed and replaced after this many scrapes, or once its JS heap
+# exceeds the threshold (MB, 0 disables the check).
+REALTIME_FF_PAGE_MAX_USES = max(
+    1,
+    int(os.getenv("CN_STOCK_REALTIME_FF_PAGE_MAX_USES", "50")),
+)
+REALTIME_FF_PAGE_MAX_HEAP_MB = max(
+    0.0,
+    float(os.getenv("CN_STOCK_REALTIME_FF_PAGE_MAX_HEAP_MB", "256")),
+)
+# Stock fund flow is looked up through push2's list API before any page is
+# opened: lookups arriving within the window are merged into list calls of up to
+# BATCH_SIZE codes. Indices and codes missing from the list fall back to the
+# pages above. BATCH_SIZE=0 turns the list API off.
+REALTIME_FF_BATCH_SIZE = max(
+    0,
+    int(os.getenv("CN_STOCK_REALTIME_FF_BATCH_SIZE", "50")),
+)
+REALTIME_FF_BATCH_WINDOW_MS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_REALTIME_FF_BATCH_WINDOW_MS", "20")),
+)
+# A successful realtime fund-flow result is reused per target for this long, so
+# brief/medium/full hitting the same stock or index within one push2 refresh
+# (Eastmoney pushes every few seconds) share one fetch. 0 disables reuse.
+REALTIME_FF_RESULT_TTL_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_REALTIME_FF_RESULT_TTL_SECONDS", "3")),
+)
+# Background refresh of recently requested realtime fund-flow targets during
+# the weekday sessions (cache.in_trading_session). Reports then read the latest sample from memory instead of
+# fetching on the request path. Opt-in: 0 disables the poller. A target not
+# requested for IDLE_SECONDS is dropped; at most MAX_TARGETS are kept.
+REALTIME_FF_POLL_INTERVAL_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_REALTIME_FF_POLL_INTERVAL_SECONDS", "0")),
+)
+REALTIME_FF_POLL_IDLE_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_REALTIME_FF_POLL_IDLE_SECONDS", "600")),
+)
+REALTIME_FF_POLL_CONCURRENCY = max(
+    1,
+    int(os.getenv("CN_STOCK_REALTIME_FF_POLL_CONCURRENCY", "2")),
+)
+REALTIME_FF_POLL_MAX_TARGETS = max(
+    1,
+    int(os.getenv("CN_STOCK_REALTIME_FF_POLL_MAX_TARGETS", "50")),
+)
+
+# screen reads one full-market quote table (qtf_mcp/datasource/market_snapshot.py).
+# Outside live trading it is reused for the whole epoch; while live, for this long.
+MARKET_SNAPSHOT_LIVE_TTL_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_MARKET_SNAPSHOT_LIVE_TTL_SECONDS", "30")),
+)
+# K-line and finance features kept for screen, one row per stock whose latest
+# K-lines the server has loaded today. A row is ten floats.
+SCREEN_FEATURE_MAX_ENTRIES = max(
+    1,
+    int(os.getenv("CN_STOCK_SCREEN_FEATURE_MAX_ENTRIES", "6000")),
+)
+# The first screen of each market epoch loads the features of every snapshot stock
+# in the background, this many stocks at a time; each load still waits for the
+# shared data-fetch slots, so client requests keep the rest. 0 disables: screen
+# then only sees the stocks clients happened to load.
+SCREEN_FEATURE_BUILD_CONCURRENCY = max(
+    0,
+    int(os.getenv("CN_STOCK_SCREEN_FEATURE_BUILD_CONCURRENCY", "2")),
+)
+
 # --- Report cache (qtf_mcp/cache.py) ---
 # A rendered report is reusable only inside the market epoch that produced it,
 # so the cache never changes what a tool would return. Disabling the master
@@ -75,6 +220,13 @@ REPORT_CACHE_MAX_ENTRIES = max(
     1,
     int(os.getenv("CN_STOCK_REPORT_CACHE_MAX_ENTRIES", "512")),
 )
+# Opt-in stale-while-revalidate for LIVE entries: for this many seconds past the
+# TTL, brief/medium/full return the expired report at once (with its age in the
+# response warnings) and refresh it in the background. 0 keeps the strict TTL.
+REPORT_CACHE_SWR_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_REPORT_CACHE_SWR_SECONDS", "0")),
+)
 # Second tier surviving restarts. Closed epochs span 16h (64h over a weekend),
 # so an in-memory-only cache loses most of its value on any redeploy.
 REPORT_CACHE_DISK_ENABLED = _parse_bool(
@@ -88,6 +240,90 @@ REPORT_CACHE_DIR = os.path.normpath(
     os.path.join(_PROJECT_ROOT, os.getenv("CN_STOCK_REPORT_CACHE_DIR") or ".runtime/report-cache")
 )
 
+# Where the second tier lives. "file" is one JSON file per entry and suits a
+# single server process. "sqlite" keeps entries in one WAL-mode database under
+# REPORT_CACHE_DIR and adds a cross-process fill lease, so several workers behind
+# a load balancer share hits and render each key once per epoch.
+REPORT_CACHE_BACKEND = (os.getenv("CN_STOCK_REPORT_CACHE_BACKEND") or "file").strip().lower()
+if REPORT_CACHE_BACKEND not in {"file", "sqlite"}:
+    REPORT_CACHE_BACKEND = "file"
+# Upper bound on waiting for another worker's render. A worker that hangs while
+# holding the lease must not stall the others; after this they render themselves.
+REPORT_CACHE_LEASE_TIMEOUT_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_REPORT_CACHE_LEASE_TIMEOUT_SECONDS", "60")),
+)
+
+# Pre-render tier: the fetched raw arrays, shared by every tool that renders the
+# same symbol and window inside one epoch. Memory only — numpy arrays are cheap
+# to keep and expensive to serialise, and a restart refetches at most one window
+# per symbol. Subordinate to the report cache master switch.
+RAW_DATA_CACHE_ENABLED = REPORT_CACHE_ENABLED and _parse_bool(
+    os.getenv("CN_STOCK_RAW_DATA_CACHE_ENABLED"), True
+)
+RAW_DATA_CACHE_MAX_ENTRIES = max(
+    1,
+    int(os.getenv("CN_STOCK_RAW_DATA_CACHE_MAX_ENTRIES", "128")),
+)
+
+# Re-render the N most requested (tool, symbol, params) keys right after each
+# full-reuse epoch boundary (qtf_mcp/prewarm.py). 0 disables: warming spends
+# upstream credits on keys nobody may ask for again.
+PREWARM_TOP_N = max(0, int(os.getenv("CN_STOCK_PREWARM_TOP_N", "0")))
+PREWARM_MAX_TRACKED_KEYS = max(
+    1,
+    int(os.getenv("CN_STOCK_PREWARM_MAX_TRACKED_KEYS", "2048")),
+)
+
+# Start the browser, fill the fund-flow page pool, check a canary page and refresh
+# the Tonghuashun auth this many minutes before 09:15 on weekdays; close the
+# browser after the 17:00 flip (qtf_mcp/session_warmup.py). 0 disables both.
+SESSION_WARMUP_MINUTES = max(
+    0.0,
+    float(os.getenv("CN_STOCK_SESSION_WARMUP_MINUTES", "5")),
+)
+
+# market_breadth tries Tonghuashun first and falls back to counts computed from
+# the full-market snapshot, limit-up/down included. Off skips Tonghuashun and
+# with it the headful Chrome its auth bootstrap needs.
+MARKET_BREADTH_TONGHUASHUN_ENABLED = _parse_bool(
+    os.getenv("CN_STOCK_MARKET_BREADTH_TONGHUASHUN_ENABLED"), True
+)
+# Record one market_breadth sample this often while the market is live and keep
+# the day's samples in a fixed-size ring (qtf_mcp/breadth_history.py); the day is
+# written to MARKET_BREADTH_HISTORY_DIR after the close. 0 disables the sampler.
+# A 60-second interval is ~240 samples a day, well inside the default capacity.
+MARKET_BREADTH_HISTORY_INTERVAL_SECONDS = max(
+    0.0,
+    float(os.getenv("CN_STOCK_MARKET_BREADTH_HISTORY_INTERVAL_SECONDS", "60")),
+)
+MARKET_BREADTH_HISTORY_CAPACITY = max(
+    1,
+    int(os.getenv("CN_STOCK_MARKET_BREADTH_HISTORY_CAPACITY", "512")),
+)
+MARKET_BREADTH_HISTORY_DIR = os.path.normpath(
+    os.path.join(
+        _PROJECT_ROOT,
+        os.getenv("CN_STOCK_MARKET_BREADTH_HISTORY_DIR") or ".runtime/market-breadth",
+    )
+)
+
+# Technical indicators (qtf_mcp/indicators.py). Incremental mode keeps per-symbol
+# recursive state so a repeat tech/full render only steps the last bar, replaying
+# the TA-Lib/pandas arithmetic. A new state is seeded from one full vectorised
+# computation (~0.3 ms at 480 bars, against ~0.15 ms for the full computation
+# alone) and a warm step costs ~0.07 ms, so a symbol breaks even within a few calls
+# of the day (tests_research/bench_indicators.py). VERIFY computes both and logs
+# any difference — for rollout checks, it costs the full computation again.
+INDICATOR_INCREMENTAL_ENABLED = _parse_bool(
+    os.getenv("CN_STOCK_INDICATOR_INCREMENTAL_ENABLED"), True
+)
+INDICATOR_VERIFY = _parse_bool(os.getenv("CN_STOCK_INDICATOR_VERIFY"), False)
+INDICATOR_STATE_MAX_ENTRIES = max(
+    1,
+    int(os.getenv("CN_STOCK_INDICATOR_STATE_MAX_ENTRIES", "256")),
+)
+
 
 def _parse_hhmm(raw, default: datetime.time) -> datetime.time:
     """Parse a four-digit HHMM clock, falling back to ``default``."""
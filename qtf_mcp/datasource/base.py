@@ -27,6 +27,19 @@ class FetchRequirements:
     def technical(cls) -> "FetchRequirements":
         return cls(finance=False, fund_flow=False, realtime=True, unadjusted_kline=False)
 
+    @classmethod
+    def screen(cls) -> "FetchRequirements":
+        return cls(finance=True, fund_flow=False, realtime=True, unadjusted_kline=False)
+
+    def covers(self, other: "FetchRequirements") -> bool:
+        """True when data fetched with ``self`` contains everything ``other`` needs."""
+        return (
+            (self.finance or not other.finance)
+            and (self.fund_flow or not other.fund_flow)
+            and (self.realtime or not other.realtime)
+            and (self.unadjusted_kline or not other.unadjusted_kline)
+        )
+
 
 @dataclass
 class StockData:
@@ -0,0 +1,312 @@
+"""One Playwright driver and its browsers, shared by every scraping purpose.
+
+Realtime fund flow and the Tonghuashun market-breadth bootstrap used to start
+their own Playwright driver and Chromium. ``BrowserManager`` owns a single
+driver for the process and one browser per launch profile. A purpose
+(``BrowserPurpose``) names its profile and gets its own long-lived context in
+that browser; purposes with the same profile share the browser process.
+
+Fund flow runs headless. Tonghuashun's anti-bot check needs a headful Chrome
+(under Xvfb on servers), which a headless browser cannot stand in for, so it
+keeps its own profile; that browser is closed as soon as its last lease ends,
+as before, while the driver and the fund-flow browser stay up.
+
+Callers hold a context through ``lease``. Before handing out a context the
+manager checks the browser's health and recycles it, once its in-flight
+leases drain, when it has disconnected, has opened ``BROWSER_MAX_PAGES`` pages,
+or the driver and browsers together exceed ``BROWSER_MAX_RSS_MB`` of resident
+memory. ``stats()`` reports utilisation for logs and admission.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional
+
+from playwright.async_api import Browser, BrowserContext, async_playwright
+
+from ..config import BROWSER_MAX_PAGES, BROWSER_MAX_RSS_MB
+
+logger = logging.getLogger("qtf_mcp")
+
+# 所有用途共用的启动参数
+BASE_BROWSER_ARGS = (
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+)
+# 读 /proc 有成本，常驻内存最多每隔这么久采样一次
+RSS_SAMPLE_SECONDS = 10.0
+
+
+@dataclass(frozen=True)
+class BrowserPurpose:
+    """How one scraping purpose wants its browser and context."""
+
+    name: str
+    headless: bool = True
+    # 优先尝试的浏览器渠道（如 "chrome"），失败时退回 Playwright 自带的 Chromium
+    channel: Optional[str] = None
+    args: tuple[str, ...] = ()
+    context_options: tuple[tuple[str, Any], ...] = ()
+    # False：最后一个租约结束后关闭该浏览器
+    keep_open: bool = True
+
+    @property
+    def launch_key(self) -> tuple:
+        return (self.headless, self.channel, tuple(dict.fromkeys(BASE_BROWSER_ARGS + self.args)))
+
+
+def descendant_rss_mb(root_pid: Optional[int] = None) -> Optional[float]:
+    """Resident memory of this process's descendants (driver and browsers), from /proc.
+
+    None where /proc is unavailable.
+    """
+    root = root_pid or os.getpid()
+    try:
+        names = os.listdir("/proc")
+    except OSError:
+        return None
+    children: dict[int, list[int]] = {}
+    rss_kb: dict[int, int] = {}
+    for name in names:
+        if not name.isdigit():
+            continue
+        pid = int(name)
+        try:
+            with open(f"/proc/{name}/status", encoding="ascii", errors="ignore") as status:
+                for line in status:
+                    if line.startswith("PPid:"):
+                        children.setdefault(int(line.split()[1]), []).append(pid)
+                    elif line.startswith("VmRSS:"):
+                        rss_kb[pid] = int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    total = 0
+    pending = list(children.get(root, ()))
+    while pending:
+        pid = pending.pop()
+        total += rss_kb.get(pid, 0)
+        pending.extend(children.get(pid, ()))
+    return total / 1024.0
+
+
+class _BrowserEntry:
+    def __init__(self, browser: Browser, key: tuple):
+        self.browser = browser
+        self.key = key
+        self.contexts: dict[str, BrowserContext] = {}
+        self.keep_open = False
+        self.in_use = 0
+        self.pages_opened = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def count_page(self, page) -> None:
+        self.pages_opened += 1
+
+
+class BrowserManager:
+    """Process-wide owner of the Playwright driver, browsers and contexts."""
+
+    def __init__(
+        self,
+        *,
+        max_rss_mb: float = BROWSER_MAX_RSS_MB,
+        max_pages: int = BROWSER_MAX_PAGES,
+    ):
+        self.max_rss_mb = max_rss_mb
+        self.max_pages = max_pages
+        self.launches = 0
+        self.recycles = 0
+        self._playwright = None
+        self._driver_lock = asyncio.Lock()
+        self._launch_locks: dict[tuple, asyncio.Lock] = {}
+        self._browsers: dict[tuple, _BrowserEntry] = {}
+        self._launching = 0
+        self._rss_mb: Optional[float] = None
+        self._rss_sampled_at = 0.0
+
+    # ── 驱动与浏览器 ──────────────────────────────────────
+    async def _driver(self):
+        async with self._driver_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            return self._playwright
+
+    async def _stop_driver_if_unused(self) -> None:
+        async with self._driver_lock:
+            if self._browsers or self._launching or self._playwright is None:
+                return
+            playwright, self._playwright = self._playwright, None
+            try:
+                await playwright.stop()
+            except Exception:
+                logger.warning("Stopping Playwright failed", exc_info=True)
+
+    async def _launch(self, purpose: BrowserPurpose) -> _BrowserEntry:
+        browser = None
+        self._launching += 1
+        try:
+            playwright = await self._driver()
+            options = {"headless": purpose.headless, "args": list(purpose.launch_key[2])}
+            if purpose.channel:
+                try:
+                    browser = await playwright.chromium.launch(channel=purpose.channel, **options)
+                except Exception:
+                    browser = await playwright.chromium.launch(**options)
+            else:
+                browser = await playwright.chromium.launch(**options)
+        except BaseException:
+            # 启动被取消或失败：不留下半初始化的浏览器与驱动
+            self._launching -= 1
+            if browser is not None:
+                await self._close_quietly(browser)
+            await self._stop_driver_if_unused()
+            raise
+        self._launching -= 1
+        self.launches += 1
+        entry = _BrowserEntry(browser, purpose.launch_key)
+        self._browsers[purpose.launch_key] = entry
+        logger.info(
+            "Browser launched purpose=%s headless=%s launches=%s",
+            purpose.name,
+            purpose.headless,
+            self.launches,
+        )
+        return entry
+
+    @staticmethod
+    async def _close_quietly(browser: Browser) -> None:
+        try:
+            await browser.close()
+        except Exception:
+            logger.warning("Closing browser failed", exc_info=True)
+
+    async def _close_entry(self, entry: _BrowserEntry, reason: str) -> None:
+        if self._browsers.get(entry.key) is entry:
+            self._browsers.pop(entry.key, None)
+        await self._close_quietly(entry.browser)
+        logger.info(
+            "Browser closed reason=%s pages_opened=%s rss_mb=%s",
+            reason,
+            entry.pages_opened,
+            "-" if self._rss_mb is None else f"{self._rss_mb:.0f}",
+        )
+
+    # ── 健康检查与回收 ────────────────────────────────────
+    def _sample_rss(self) -> Optional[float]:
+        now = time.monotonic()
+        if now - self._rss_sampled_at >= RSS_SAMPLE_SECONDS:
+            self._rss_sampled_at = now
+            self._rss_mb = descendant_rss_mb()
+        return self._rss_mb
+
+    def _recycle_reason(self, entry: _BrowserEntry) -> Optional[str]:
+        if not entry.browser.is_connected():
+            return "disconnected"
+        if self.max_pages > 0 and entry.pages_opened >= self.max_pages:
+            return "pages"
+        if self.max_rss_mb > 0:
+            rss = self._sample_rss()
+            if rss is not None and rss > self.max_rss_mb:
+                return "rss"
+        return None
+
+    # ── 租约 ──────────────────────────────────────────────
+    async def _acquire(self, purpose: BrowserPurpose) -> tuple[_BrowserEntry, BrowserContext]:
+        key = purpose.launch_key
+        lock = self._launch_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._browsers.get(key)
+            if entry is not None:
+                reason = self._recycle_reason(entry)
+                if reason is not None:
+                    # 等在用的租约结束再关，新的租约在锁外排队
+                    await entry.idle.wait()
+                    self.recycles += 1
+                    self._rss_sampled_at = 0.0
+                    await self._close_entry(entry, reason)
+                    entry = None
+            launched = entry is None
+            if entry is None:
+                entry = await self._launch(purpose)
+            context = entry.contexts.get(purpose.name)
+            if context is None:
+                try:
+                    context = await entry.browser.new_context(**dict(purpose.context_options))
+                except BaseException:
+                    if launched:
+                        await self._close_entry(entry, "context_failed")
+                        await self._stop_driver_if_unused()
+                    raise
+                context.on("page", entry.count_page)
+                entry.contexts[purpose.name] = context
+            entry.keep_open = entry.keep_open or purpose.keep_open
+            entry.in_use += 1
+            entry.idle.clear()
+            return entry, context
+
+    async def _release(self, entry: _BrowserEntry) -> None:
+        entry.in_use -= 1
+        if entry.in_use > 0:
+            return
+        entry.idle.set()
+        if not entry.keep_open and self._browsers.get(entry.key) is entry:
+            await self._close_entry(entry, "released")
+
+    @contextlib.asynccontextmanager
+    async def lease(self, purpose: BrowserPurpose) -> AsyncIterator[BrowserContext]:
+        """Hold ``purpose``'s context; the browser is not recycled while any lease is held."""
+        entry, context = await self._acquire(purpose)
+        try:
+            yield context
+        finally:
+            await self._release(entry)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "browsers": len(self._browsers),
+            "contexts": sum(len(entry.contexts) for entry in self._browsers.values()),
+            "in_use": sum(entry.in_use for entry in self._browsers.values()),
+            "pages_opened": sum(entry.pages_opened for entry in self._browsers.values()),
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "rss_mb": self._rss_mb,
+        }
+
+    async def close(self, drain_seconds: float = 0) -> None:
+        """Close every browser and stop the driver.
+
+        With ``drain_seconds`` each browser first gets that long for its
+        in-flight leases to finish.
+        """
+        for entry in list(self._browsers.values()):
+            if drain_seconds > 0:
+                try:
+                    await asyncio.wait_for(entry.idle.wait(), drain_seconds)
+                except asyncio.TimeoutError:
+                    logger.warning("Closing browser with leases in use=%s", entry.in_use)
+            await self._close_entry(entry, "shutdown")
+        await self._stop_driver_if_unused()
+
+
+_manager: Optional[BrowserManager] = None
+
+
+def get_browser_manager() -> BrowserManager:
+    global _manager
+    if _manager is None:
+        _manager = BrowserManager()
+    return _manager
+
+
+def set_browser_manager(manager: Optional[BrowserManager]) -> None:
+    """Replace the process-wide manager. Tests use this; production does not."""
+    global _manager
+    _manager = manager
@@ -28,7 +28,14 @@ from ..config import (
     SZ_INDICES,
 )
 from .base import DataSource, FetchRequirements, StockData
-from ..observability import log_context
+from ..observability import (
+    DeadlineExceeded,
+    check_deadline,
+    deadline_remaining,
+    detached_context,
+    log_context,
+    shed,
+)
 
 logger = logging.getLogger("qtf_mcp")
 
@@ -176,7 +183,17 @@ async def _run_in_executor(func, *args):
     """在有界线程池中运行同步函数。"""
     requested_at = time.perf_counter()
     slots = _get_data_fetch_slots()
-    await slots.acquire()
+    # 已过截止时间的请求不再占用上游名额：排队前后各检查一次
+    check_deadline("data_fetch")
+    try:
+        await asyncio.wait_for(slots.acquire(), deadline_remaining())
+    except asyncio.TimeoutError:
+        raise shed("data_fetch") from None
+    try:
+        check_deadline("data_fetch")
+    except DeadlineExceeded:
+        slots.release()
+        raise
     submitted_at = time.perf_counter()
     request_id, tool, symbol = log_context()
     loop = asyncio.get_running_loop()
@@ -549,8 +566,10 @@ class CNStockDataSource(DataSource):
         task = inflight.get(cache_key)
         role = "follower"
         if task is None or task.done():
+            # 财务结果跨请求共享且长期缓存：不随发起者的截止时间丢弃
             task = asyncio.create_task(
-                self._fetch_and_cache_finance(code, symbol, cache_key)
+                self._fetch_and_cache_finance(code, symbol, cache_key),
+                context=detached_context(),
             )
             inflight[cache_key] = task
             task.add_done_callback(
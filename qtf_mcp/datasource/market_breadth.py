@@ -7,15 +7,22 @@ import re
 import tempfile
 import threading
 import time
-from dataclasses import dataclass, replace
+from collections import deque
+from dataclasses import dataclass, field, replace
 from datetime import date, datetime
 from pathlib import Path
 from typing import Iterable, Optional, Protocol, Sequence
 from zoneinfo import ZoneInfo
 
+import numpy as np
 import pandas as pd
 import requests
-from playwright.async_api import Browser, Playwright, async_playwright
+from numpy import ndarray
+
+from ..config import MARKET_BREADTH_TONGHUASHUN_ENABLED
+from ..observability import DeadlineExceeded, detached_context
+from .browser import BrowserPurpose, get_browser_manager
+from .market_snapshot import MarketSnapshot, get_market_snapshot
 
 
 logger = logging.getLogger("qtf_mcp")
@@ -33,6 +40,22 @@ MARKET_BREADTH_RANGES = (
     "6% ~ 8%",
     "8% ~ 涨停",
 )
+# 十档分布的边界：负区间左闭右开，正区间左开右闭，0 归入 "0% ~ 2%"
+MARKET_BREADTH_EDGES = np.array([-8.0, -6.0, -4.0, -2.0, 0.0, 2.0, 4.0, 6.0, 8.0])
+
+# 涨跌幅限制：主板 10%，创业板与科创板 20%，北交所 30%。风险警示（ST、*ST）股票与所在
+# 板块相同：沪深主板风险警示股自 2025-07-07 起由 5% 调整为 10%
+MAIN_BOARD_LIMIT = 0.10
+GROWTH_BOARD_LIMIT = 0.20
+BSE_LIMIT = 0.30
+GROWTH_BOARD_PREFIXES = ("SH688", "SH689", "SZ300", "SZ301", "SZ302")
+# 上市首日为 N、注册制新股前五日为 C 开头，这些交易日不设涨跌幅限制
+NEW_LISTING_MARKERS = ("N", "C")
+
+
+# 每次刷新都要开有界面的 Chrome：两次成功刷新至少间隔这么久，新凭证也至少
+# 用这么久才进入提前刷新的窗口
+TONGHUASHUN_MIN_REFRESH_INTERVAL_SECONDS = 300.0
 
 
 @dataclass(frozen=True)
@@ -60,6 +83,9 @@ class MarketBreadthData:
 class TonghuashunAuth:
     v_cookie: str
     user_agent: str
+    # 取得与过期时间（Unix 秒，0/None 为未知）；不参与相等比较，同一 Cookie 即同一凭证
+    obtained_at: float = field(default=0.0, compare=False)
+    expires_at: Optional[float] = field(default=None, compare=False)
 
 
 class MarketBreadthProvider(Protocol):
@@ -119,24 +145,76 @@ def _build_buckets(counts: Iterable[int]) -> tuple[MarketBreadthBucket, ...]:
     )
 
 
+def _distribution_counts(values: ndarray) -> ndarray:
+    index = np.where(
+        values <= 0,
+        np.searchsorted(MARKET_BREADTH_EDGES, values, side="right"),
+        np.searchsorted(MARKET_BREADTH_EDGES, values, side="left"),
+    )
+    return np.bincount(index, minlength=len(MARKET_BREADTH_RANGES))
+
+
 def build_market_breadth_distribution(
-    percentages: pd.Series,
+    percentages: pd.Series | ndarray,
 ) -> tuple[MarketBreadthBucket, ...]:
     """Build the same ten percentage-change buckets used by Tonghuashun."""
-    values = pd.to_numeric(percentages, errors="coerce").dropna()
-    counts = (
-        int((values < -8).sum()),
-        int(((values >= -8) & (values < -6)).sum()),
-        int(((values >= -6) & (values < -4)).sum()),
-        int(((values >= -4) & (values < -2)).sum()),
-        int(((values >= -2) & (values < 0)).sum()),
-        int(((values >= 0) & (values <= 2)).sum()),
-        int(((values > 2) & (values <= 4)).sum()),
-        int(((values > 4) & (values <= 6)).sum()),
-        int(((values > 6) & (values <= 8)).sum()),
-        int((values > 8).sum()),
+    values = pd.to_numeric(pd.Series(percentages), errors="coerce").to_numpy(dtype=np.float64)
+    return _build_buckets(_distribution_counts(values[np.isfinite(values)]))
+
+
+def price_limit_rates(symbols: ndarray, names: ndarray) -> ndarray:
+    """Daily price-limit fraction per stock; NaN for new listings that trade without one."""
+    boards = symbols.astype(str).astype("<U5")
+    labels = names.astype(str)
+    rates = np.full(len(symbols), MAIN_BOARD_LIMIT)
+    rates[np.isin(boards, GROWTH_BOARD_PREFIXES)] = GROWTH_BOARD_LIMIT
+    rates[np.char.startswith(boards, "BJ")] = BSE_LIMIT
+    rates[np.isin(labels.astype("<U1"), NEW_LISTING_MARKERS)] = np.nan
+    return rates
+
+
+def _limit_price(prices: ndarray) -> ndarray:
+    # 交易所按四舍五入到分计算涨跌停价；加一个小量抵消浮点误差
+    return np.floor(prices * 100 + 0.5 + 1e-6) / 100
+
+
+def compute_market_breadth(
+    snapshot: MarketSnapshot,
+    *,
+    source: str = "efinance",
+) -> MarketBreadthData:
+    """Compute breadth, limit-up/down counts and the ten buckets from a snapshot's columns."""
+    change_pct = snapshot.columns["change_pct"]
+    close = snapshot.columns["close"]
+    prev_close = snapshot.columns["prev_close"]
+    traded = np.isfinite(change_pct)
+    valid = change_pct[traded]
+
+    rates = price_limit_rates(snapshot.symbols, snapshot.names)
+    limited = traded & np.isfinite(close) & np.isfinite(prev_close) & (prev_close > 0) & np.isfinite(rates)
+    warnings: tuple[str, ...] = ()
+    limit_up_count: Optional[int] = None
+    limit_down_count: Optional[int] = None
+    if limited.any():
+        prev = prev_close[limited]
+        last = close[limited]
+        limit_up_count = int((last >= _limit_price(prev * (1 + rates[limited])) - 0.005).sum())
+        limit_down_count = int((last <= _limit_price(prev * (1 - rates[limited])) + 0.005).sum())
+    else:
+        warnings = ("行情缺少最新价或昨收价，无法计算涨停、跌停家数",)
+
+    return MarketBreadthData(
+        source=source,
+        fetched_at=snapshot.fetched_at,
+        trade_date=snapshot.trade_date,
+        up_count=int((valid > 0).sum()),
+        down_count=int((valid < 0).sum()),
+        flat_count=int((valid == 0).sum()),
+        limit_up_count=limit_up_count,
+        limit_down_count=limit_down_count,
+        distribution=_build_buckets(_distribution_counts(valid)),
+        warnings=warnings,
     )
-    return _build_buckets(counts)
 
 
 def _normalize_trade_date(value: object) -> Optional[str]:
@@ -191,16 +269,25 @@ def parse_tonghuashun_market_breadth(payload: dict) -> MarketBreadthData:
     )
 
 
-def _build_tonghuashun_auth(cookies: list[dict], user_agent: str) -> TonghuashunAuth:
-    v_cookie = next(
-        (str(cookie.get("value", "")) for cookie in cookies if cookie.get("name") == "v"),
-        "",
-    )
+def _build_tonghuashun_auth(
+    cookies: list[dict],
+    user_agent: str,
+    obtained_at: Optional[float] = None,
+) -> TonghuashunAuth:
+    cookie = next((cookie for cookie in cookies if cookie.get("name") == "v"), {})
+    v_cookie = str(cookie.get("value", ""))
     if not v_cookie:
         raise TonghuashunAuthError("同花顺页面未生成 v Cookie")
     if not user_agent:
         raise TonghuashunAuthError("无法获取浏览器 User-Agent")
-    return TonghuashunAuth(v_cookie=v_cookie, user_agent=user_agent)
+    # Playwright 对会话 Cookie 给出 -1
+    expires = float(cookie.get("expires") or 0)
+    return TonghuashunAuth(
+        v_cookie=v_cookie,
+        user_agent=user_agent,
+        obtained_at=time.time() if obtained_at is None else obtained_at,
+        expires_at=expires if expires > 0 else None,
+    )
 
 
 def _tonghuashun_browser_args() -> list[str]:
@@ -216,7 +303,36 @@ def _tonghuashun_browser_args() -> list[str]:
     return args
 
 
+def _tonghuashun_browser_purpose() -> BrowserPurpose:
+    # 同花顺的反爬校验需要有界面的 Chrome；只在取 Cookie 时使用，用完即关
+    return BrowserPurpose(
+        "tonghuashun",
+        headless=False,
+        channel="chrome",
+        args=tuple(_tonghuashun_browser_args()),
+        context_options=(("java_script_enabled", True), ("bypass_csp", True)),
+        keep_open=False,
+    )
+
+
 class TonghuashunPlaywrightProvider:
+    """Tonghuashun breadth over plain HTTP with a browser-issued ``v`` cookie.
+
+    Requests never start a browser. The provider keeps an active credential and
+    the one it replaced as a standby. Each credential's expiry is estimated from
+    the cookie's own expiry, ``CN_STOCK_TONGHUASHUN_AUTH_TTL_SECONDS`` and the
+    ages at which credentials were rejected (HTTP 403, or the HTML challenge page
+    the anti-bot check serves instead of JSON) within the last TTL, but
+    never shorter than the refresh lead plus
+    ``TONGHUASHUN_MIN_REFRESH_INTERVAL_SECONDS``. Once the active one is within
+    ``CN_STOCK_TONGHUASHUN_AUTH_REFRESH_SECONDS`` of that expiry, or is rejected,
+    a detached task bootstraps a new one in the headful Chrome, at most once per
+    ``TONGHUASHUN_MIN_REFRESH_INTERVAL_SECONDS`` after a success and once per
+    cooldown after a failure. Requests keep using whichever credential is still
+    valid meanwhile. With none usable the request fails at once and
+    ``get_market_breadth`` falls back.
+    """
+
     name = "tonghuashun_web"
     page_url = "https://q.10jqka.com.cn/"
     api_url = "https://q.10jqka.com.cn/api.php?t=indexflash&"
@@ -225,10 +341,17 @@ class TonghuashunPlaywrightProvider:
         self,
         cooldown_seconds: Optional[float] = None,
         auth_cache_path: Optional[str | os.PathLike[str]] = None,
+        auth_ttl_seconds: Optional[float] = None,
+        refresh_ahead_seconds: Optional[float] = None,
     ) -> None:
         self._auth: TonghuashunAuth | None = None
+        self._standby: TonghuashunAuth | None = None
         self._rejected_auth: TonghuashunAuth | None = None
+        # 最近几次被拒的 (时刻, 凭证存活秒数)，一个 TTL 内用来收紧对有效期的估计
+        self._rejections: deque[tuple[float, float]] = deque(maxlen=8)
         self._auth_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_retry_at = 0.0
         self._session = requests.Session()
         self._session_lock = threading.Lock()
         self._cooldown_seconds = (
@@ -236,6 +359,16 @@ class TonghuashunPlaywrightProvider:
             if cooldown_seconds is None
             else max(0.0, cooldown_seconds)
         )
+        self._auth_ttl_seconds = (
+            _env_float("CN_STOCK_TONGHUASHUN_AUTH_TTL_SECONDS", 3600.0)
+            if auth_ttl_seconds is None
+            else max(0.0, auth_ttl_seconds)
+        )
+        self._refresh_ahead_seconds = (
+            _env_float("CN_STOCK_TONGHUASHUN_AUTH_REFRESH_SECONDS", 600.0)
+            if refresh_ahead_seconds is None
+            else max(0.0, refresh_ahead_seconds)
+        )
         self._cooldown_until = 0.0
         self._last_failure: Optional[str] = None
         self._auth_cache_path = (
@@ -261,8 +394,15 @@ class TonghuashunPlaywrightProvider:
             if payload.get("version") != 1:
                 return None
             return _build_tonghuashun_auth(
-                [{"name": "v", "value": payload.get("v_cookie", "")}],
+                [
+                    {
+                        "name": "v",
+                        "value": payload.get("v_cookie", ""),
+                        "expires": payload.get("expires_at"),
+                    }
+                ],
                 str(payload.get("user_agent", "")),
+                obtained_at=float(payload.get("obtained_at") or 0),
             )
         except (OSError, TypeError, ValueError, json.JSONDecodeError, TonghuashunAuthError):
             return None
@@ -281,6 +421,8 @@ class TonghuashunPlaywrightProvider:
                         "version": 1,
                         "v_cookie": auth.v_cookie,
                         "user_agent": auth.user_agent,
+                        "obtained_at": auth.obtained_at,
+                        "expires_at": auth.expires_at,
                         "saved_at": _now_shanghai(),
                     },
                     cache_file,
@@ -314,34 +456,16 @@ class TonghuashunPlaywrightProvider:
         finally:
             lock_file.close()
 
-    def _delete_cached_auth_if_stale_sync(self, stale_auth: TonghuashunAuth) -> None:
-        lock_file = self._acquire_auth_file_lock_sync()
+    def _delete_cached_auth_sync(self) -> None:
         try:
-            if self._load_cached_auth_sync() == stale_auth:
-                try:
-                    self._auth_cache_path.unlink()
-                except FileNotFoundError:
-                    pass
-        finally:
-            self._release_auth_file_lock_sync(lock_file)
-
-    @staticmethod
-    async def _launch_browser(playwright: Playwright) -> Browser:
-        launch_args = {
-            "headless": False,
-            "args": _tonghuashun_browser_args(),
-        }
-        try:
-            return await playwright.chromium.launch(channel="chrome", **launch_args)
-        except Exception:
-            return await playwright.chromium.launch(**launch_args)
+            self._auth_cache_path.unlink()
+        except FileNotFoundError:
+            pass
 
     async def _bootstrap_auth(self) -> TonghuashunAuth:
-        async with async_playwright() as playwright:
-            browser = await self._launch_browser(playwright)
+        async with get_browser_manager().lease(_tonghuashun_browser_purpose()) as context:
+            page = await context.new_page()
             try:
-                context = await browser.new_context(java_script_enabled=True, bypass_csp=True)
-                page = await context.new_page()
                 navigation = await page.goto(
                     self.page_url,
                     wait_until="domcontentloaded",
@@ -360,53 +484,136 @@ class TonghuashunPlaywrightProvider:
                 user_agent = await page.evaluate("navigator.userAgent")
                 return _build_tonghuashun_auth(cookies, str(user_agent))
             finally:
-                await browser.close()
-
-    async def _ensure_auth(self) -> TonghuashunAuth:
-        if self._auth is not None:
-            return self._auth
-        async with self._auth_lock:
-            if self._auth is None:
-                cached_auth = await asyncio.to_thread(self._load_cached_auth_sync)
-                if cached_auth is not None and cached_auth != self._rejected_auth:
-                    self._auth = cached_auth
-                    self._rejected_auth = None
-                    return self._auth
-
-                lock_file = None
-                try:
-                    lock_file = await asyncio.to_thread(self._acquire_auth_file_lock_sync)
+                await page.close()
+
+    # ── 凭证状态 ──────────────────────────────────────────
+    def _lifetime(self) -> float:
+        """Estimated credential lifetime: the TTL, shortened by rejections seen within the last TTL."""
+        now = time.time()
+        while self._rejections and now - self._rejections[0][0] >= self._auth_ttl_seconds:
+            self._rejections.popleft()
+        lifetime = min((self._auth_ttl_seconds, *(age for _, age in self._rejections)))
+        # 一次过早的被拒不能让每个新凭证一取得就要刷新
+        return max(lifetime, self._refresh_ahead_seconds + TONGHUASHUN_MIN_REFRESH_INTERVAL_SECONDS)
+
+    def _expires_at(self, auth: TonghuashunAuth) -> float:
+        """Estimated wall-clock expiry: the earlier of the cookie's own and ``_lifetime``."""
+        estimated = auth.obtained_at + self._lifetime()
+        return min(estimated, auth.expires_at) if auth.expires_at else estimated
+
+    def _needs_refresh(self, auth: TonghuashunAuth) -> bool:
+        return time.time() >= self._expires_at(auth) - self._refresh_ahead_seconds
+
+    async def _current_auth(self) -> TonghuashunAuth | None:
+        """The credential to use: the first unexpired of active and standby, else whichever exists."""
+        if self._auth is None and self._standby is None:
+            async with self._auth_lock:
+                if self._auth is None:
+                    # 重启或其他进程刷新过：磁盘上的凭证只读不建
                     cached_auth = await asyncio.to_thread(self._load_cached_auth_sync)
                     if cached_auth is not None and cached_auth != self._rejected_auth:
                         self._auth = cached_auth
-                    else:
-                        self._auth = await self._bootstrap_auth()
-                        try:
-                            await asyncio.to_thread(self._save_cached_auth_sync, self._auth)
-                        except OSError as exc:
-                            logger.warning("Unable to persist Tonghuashun auth cache: %s", exc)
-                    self._rejected_auth = None
+        candidates = [auth for auth in (self._auth, self._standby) if auth is not None]
+        now = time.time()
+        for auth in candidates:
+            if now < self._expires_at(auth):
+                return auth
+        return candidates[0] if candidates else None
+
+    def _promote(self, fresh: TonghuashunAuth) -> None:
+        if self._auth is not None and self._auth != fresh and self._auth != self._rejected_auth:
+            self._standby = self._auth
+        elif self._standby == fresh:
+            self._standby = None
+        self._auth = fresh
+
+    def _reject(self, stale_auth: TonghuashunAuth) -> None:
+        """Drop a credential the API refused; promote the standby and refresh in the background."""
+        now = time.time()
+        if stale_auth.obtained_at > 0:
+            self._rejections.append((now, max(0.0, now - stale_auth.obtained_at)))
+        self._rejected_auth = stale_auth
+        if self._auth == stale_auth:
+            self._auth, self._standby = self._standby, None
+        elif self._standby == stale_auth:
+            self._standby = None
+        logger.warning(
+            "Tonghuashun auth rejected age=%s standby=%s",
+            "-" if stale_auth.obtained_at <= 0 else f"{now - stale_auth.obtained_at:.0f}s",
+            self._auth is not None,
+        )
+        self._schedule_refresh()
+
+    # ── 后台刷新 ──────────────────────────────────────────
+    async def _refresh_auth(self) -> TonghuashunAuth:
+        lock_file = None
+        try:
+            lock_file = await asyncio.to_thread(self._acquire_auth_file_lock_sync)
+        except OSError as exc:
+            logger.warning("Unable to lock Tonghuashun auth cache: %s", exc)
+        try:
+            if lock_file is not None:
+                # 持锁期间其他进程可能已刷新过
+                cached_auth = await asyncio.to_thread(self._load_cached_auth_sync)
+                if cached_auth is not None and cached_auth == self._rejected_auth:
+                    # 删掉被拒的凭证，免得重启后的进程再拿它试
+                    try:
+                        await asyncio.to_thread(self._delete_cached_auth_sync)
+                    except OSError as exc:
+                        logger.warning("Unable to remove stale Tonghuashun auth cache: %s", exc)
+                if (
+                    cached_auth is not None
+                    and cached_auth not in (self._rejected_auth, self._auth)
+                    and not self._needs_refresh(cached_auth)
+                ):
+                    return cached_auth
+            fresh = await self._bootstrap_auth()
+            if lock_file is not None:
+                try:
+                    await asyncio.to_thread(self._save_cached_auth_sync, fresh)
                 except OSError as exc:
-                    logger.warning("Unable to lock Tonghuashun auth cache: %s", exc)
-                    self._auth = await self._bootstrap_auth()
-                    self._rejected_auth = None
-                finally:
-                    if lock_file is not None:
-                        await asyncio.to_thread(self._release_auth_file_lock_sync, lock_file)
-            return self._auth
-
-    async def _invalidate_auth(self, stale_auth: TonghuashunAuth) -> None:
-        invalidated = False
-        async with self._auth_lock:
-            if self._auth == stale_auth:
-                self._auth = None
-                self._rejected_auth = stale_auth
-                invalidated = True
-        if invalidated:
-            try:
-                await asyncio.to_thread(self._delete_cached_auth_if_stale_sync, stale_auth)
-            except OSError as exc:
-                logger.warning("Unable to remove stale Tonghuashun auth cache: %s", exc)
+                    logger.warning("Unable to persist Tonghuashun auth cache: %s", exc)
+            return fresh
+        finally:
+            if lock_file is not None:
+                await asyncio.to_thread(self._release_auth_file_lock_sync, lock_file)
+
+    async def _run_refresh(self) -> bool:
+        started_at = time.perf_counter()
+        try:
+            fresh = await self._refresh_auth()
+        except Exception as exc:
+            self._refresh_retry_at = time.monotonic() + self._cooldown_seconds
+            self._last_failure = str(exc)
+            logger.warning("Tonghuashun auth refresh failed error=%s", exc)
+            return False
+        self._refresh_retry_at = time.monotonic() + TONGHUASHUN_MIN_REFRESH_INTERVAL_SECONDS
+        self._promote(fresh)
+        logger.info(
+            "Tonghuashun auth refreshed expires_in=%.0fs standby=%s cost=%.2fs",
+            self._expires_at(fresh) - time.time(),
+            self._standby is not None,
+            time.perf_counter() - started_at,
+        )
+        return True
+
+    def _schedule_refresh(self) -> Optional[asyncio.Task]:
+        """Start one background refresh unless one is running or the last one ended recently."""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return self._refresh_task
+        if time.monotonic() < self._refresh_retry_at:
+            return None
+        # 刷新要开浏览器，不能继承触发它的那次请求的截止时间
+        self._refresh_task = asyncio.get_running_loop().create_task(
+            self._run_refresh(),
+            context=detached_context(),
+        )
+        return self._refresh_task
+
+    async def refresh(self) -> bool:
+        """Refresh the credential now, joining a refresh already in flight."""
+        task = self._schedule_refresh()
+        return await asyncio.shield(task) if task is not None else False
 
     def _request_payload_sync(self, auth: TonghuashunAuth) -> dict:
         headers = {
@@ -422,6 +629,7 @@ class TonghuashunPlaywrightProvider:
             raise TonghuashunAuthError("同花顺涨跌分布接口返回 HTTP 403")
         if response.status_code != 200:
             raise RuntimeError(f"同花顺涨跌分布接口返回 HTTP {response.status_code}")
+        # 反爬校验对过期的 v Cookie 返回 200 的 HTML 验证页，与 403 一样算凭证被拒
         try:
             payload = response.json()
         except (json.JSONDecodeError, requests.JSONDecodeError, ValueError) as exc:
@@ -437,70 +645,68 @@ class TonghuashunPlaywrightProvider:
             detail = f": {self._last_failure}" if self._last_failure else ""
             raise TonghuashunCooldownError(f"同花顺数据源冷却中，约 {remaining} 秒后重试{detail}")
 
-        try:
-            auth = await self._ensure_auth()
-            for attempt in range(2):
-                try:
-                    payload = await asyncio.to_thread(self._request_payload_sync, auth)
-                    result = parse_tonghuashun_market_breadth(payload)
-                    self._cooldown_until = 0.0
-                    self._last_failure = None
-                    return result
-                except TonghuashunAuthError:
-                    await self._invalidate_auth(auth)
-                    if attempt == 1:
-                        raise
-                    auth = await self._ensure_auth()
-            raise AssertionError("unreachable")
-        except Exception as exc:
-            self._last_failure = str(exc)
-            self._cooldown_until = time.monotonic() + self._cooldown_seconds
-            raise
+        for attempt in range(2):
+            auth = await self._current_auth()
+            if auth is None:
+                self._schedule_refresh()
+                detail = f": {self._last_failure}" if self._last_failure else ""
+                raise TonghuashunAuthError(f"同花顺认证未就绪，已在后台刷新{detail}")
+            if self._needs_refresh(auth):
+                self._schedule_refresh()
+            try:
+                payload = await asyncio.to_thread(self._request_payload_sync, auth)
+                result = parse_tonghuashun_market_breadth(payload)
+            except TonghuashunAuthError:
+                # 凭证被拒不进入冷却：后台刷新自有冷却，备用凭证可以立即重试
+                self._reject(auth)
+                if attempt == 1:
+                    raise
+                continue
+            except Exception as exc:
+                self._last_failure = str(exc)
+                self._cooldown_until = time.monotonic() + self._cooldown_seconds
+                raise
+            self._cooldown_until = 0.0
+            self._last_failure = None
+            return result
+        raise AssertionError("unreachable")
+
+    async def warm(self) -> bool:
+        """Make sure a fresh credential is ready, and confirm it with one API request."""
+        error: Optional[Exception] = None
+        for _ in range(2):
+            auth = await self._current_auth()
+            if auth is None or self._needs_refresh(auth):
+                await self.refresh()
+            try:
+                await self.fetch()
+                return True
+            except TonghuashunCooldownError as exc:
+                error = exc
+                break
+            except Exception as exc:
+                error = exc
+        logger.warning("Tonghuashun auth warm-up failed error=%s", error)
+        return False
 
     def close(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
         with self._session_lock:
             self._session.close()
 
 
 class EfinanceMarketBreadthProvider:
-    name = "efinance"
+    """Breadth computed locally from the shared full-market snapshot (efinance quotes)."""
 
-    @staticmethod
-    def _fetch_sync() -> MarketBreadthData:
-        import efinance as ef
-
-        quotes = ef.stock.get_realtime_quotes()
-        if quotes is None or quotes.empty or "涨跌幅" not in quotes.columns:
-            raise RuntimeError("efinance 未返回有效的全市场行情")
-
-        percentages = pd.to_numeric(quotes["涨跌幅"], errors="coerce")
-        valid = percentages.dropna()
-        distribution = build_market_breadth_distribution(valid)
-        trade_date = None
-        if "最新交易日" in quotes.columns:
-            dates = quotes.loc[percentages.notna(), "最新交易日"].dropna().astype(str)
-            if not dates.empty:
-                trade_date = dates.mode().iloc[0]
-
-        return MarketBreadthData(
-            source="efinance",
-            fetched_at=_now_shanghai(),
-            trade_date=trade_date,
-            up_count=int((valid > 0).sum()),
-            down_count=int((valid < 0).sum()),
-            flat_count=int((valid == 0).sum()),
-            limit_up_count=None,
-            limit_down_count=None,
-            distribution=distribution,
-            warnings=("efinance 备用源不提供可靠的涨停、跌停家数",),
-        )
+    name = "efinance"
 
     async def fetch(self) -> MarketBreadthData:
-        return await asyncio.to_thread(self._fetch_sync)
+        return compute_market_breadth(await get_market_snapshot())
 
 
 DEFAULT_MARKET_BREADTH_PROVIDERS: tuple[MarketBreadthProvider, ...] = (
-    TonghuashunPlaywrightProvider(),
+    *((TonghuashunPlaywrightProvider(),) if MARKET_BREADTH_TONGHUASHUN_ENABLED else ()),
     EfinanceMarketBreadthProvider(),
 )
 
@@ -533,6 +739,8 @@ async def _fetch_from_providers(
             if failures:
                 result = replace(result, warnings=result.warnings + tuple(failures))
             return result
+        except DeadlineExceeded:
+            raise
         except Exception as exc:
             failures.append(f"{provider.name} 不可用: {exc}")
     raise MarketBreadthUnavailable("; ".join(failures) or "没有可用的涨跌分布数据源")
@@ -559,6 +767,16 @@ async def get_market_breadth(
         return result
 
 
+async def warm_market_breadth_auth() -> bool:
+    """Refresh the auth of every provider that keeps one; True when all succeeded."""
+    ok = True
+    for provider in DEFAULT_MARKET_BREADTH_PROVIDERS:
+        warm = getattr(provider, "warm", None)
+        if warm is not None:
+            ok = await warm() and ok
+    return ok
+
+
 def close_market_breadth_resources() -> None:
     for provider in DEFAULT_MARKET_BREADTH_PROVIDERS:
         close = getattr(provider, "close", None)
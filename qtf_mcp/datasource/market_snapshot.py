@@ -0,0 +1,205 @@
+"""Full-market quote snapshot as NumPy columns.
+
+One ``ef.stock.get_realtime_quotes()`` call returns every Shanghai, Shenzhen and
+Beijing A-share in a single table (~5000 rows). ``screen`` and the local breadth
+computation read it column-wise, so the DataFrame is converted once into
+float64 arrays keyed by short English field names, plus aligned symbol and
+name arrays.
+
+A snapshot is reused for the whole of a non-live market epoch (the quotes do
+not move) and for ``MARKET_SNAPSHOT_LIVE_TTL_SECONDS`` while the market is
+live. Concurrent misses share one upstream fetch, which runs through the same
+bounded data-fetch slots as every other upstream call.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from numpy import ndarray
+
+from ..cache import PHASE_LIVE, market_phase
+from ..config import MARKET_SNAPSHOT_LIVE_TTL_SECONDS
+from ..observability import DeadlineExceeded
+from .cn_stock_source import _run_in_executor
+
+logger = logging.getLogger("qtf_mcp")
+
+
+# 字段名 -> efinance 列名；单位与 efinance 一致（涨跌幅、换手率为百分数，成交额、市值为元）
+SNAPSHOT_FIELDS = {
+    "close": "最新价",
+    "change_pct": "涨跌幅",
+    "change": "涨跌额",
+    "open": "今开",
+    "high": "最高",
+    "low": "最低",
+    "prev_close": "昨日收盘",
+    "turnover": "换手率",
+    "volume_ratio": "量比",
+    "pe": "动态市盈率",
+    "volume": "成交量",
+    "amount": "成交额",
+    "mcap": "总市值",
+    "fmcap": "流通市值",
+}
+
+
+class MarketSnapshotUnavailable(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    symbols: ndarray
+    names: ndarray
+    columns: Dict[str, ndarray]
+    fetched_at: str
+    epoch: str
+    trade_date: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+
+def _shanghai_now() -> datetime:
+    return datetime.now(ZoneInfo("Asia/Shanghai"))
+
+
+def _market_prefix(code: str) -> str:
+    if code.startswith("6"):
+        return "SH"
+    if code.startswith(("0", "3")):
+        return "SZ"
+    return "BJ"
+
+
+def _first_column(quotes: pd.DataFrame, *names: str) -> Optional[pd.Series]:
+    for name in names:
+        if name in quotes.columns:
+            return quotes[name]
+    return None
+
+
+def _trade_date(quotes: pd.DataFrame) -> Optional[str]:
+    if "最新交易日" not in quotes.columns:
+        return None
+    dates = quotes["最新交易日"].dropna().astype(str)
+    if dates.empty:
+        return None
+    text = dates.mode().iloc[0].strip()
+    if re.fullmatch(r"\d{8}", text):
+        return f"{text[:4]}-{text[4:6]}-{text[6:]}"
+    return text or None
+
+
+def snapshot_from_quotes(
+    quotes: pd.DataFrame,
+    *,
+    epoch: str,
+    fetched_at: Optional[str] = None,
+) -> MarketSnapshot:
+    """Convert an efinance quote table into a columnar snapshot."""
+    codes = _first_column(quotes, "股票代码", "代码")
+    if codes is None or quotes.empty:
+        raise MarketSnapshotUnavailable("efinance 未返回有效的全市场行情")
+    codes = codes.astype(str).str.strip().str.zfill(6)
+    names = _first_column(quotes, "股票名称", "名称")
+    symbols = np.array([_market_prefix(code) + code for code in codes], dtype=object)
+    columns = {
+        key: (
+            pd.to_numeric(quotes[column], errors="coerce").to_numpy(dtype=np.float64)
+            if column in quotes.columns
+            else np.full(len(symbols), np.nan)
+        )
+        for key, column in SNAPSHOT_FIELDS.items()
+    }
+    return MarketSnapshot(
+        symbols=symbols,
+        names=(
+            names.astype(str).to_numpy(dtype=object)
+            if names is not None
+            else np.full(len(symbols), "", dtype=object)
+        ),
+        columns=columns,
+        fetched_at=fetched_at or _shanghai_now().strftime("%Y-%m-%d %H:%M:%S"),
+        epoch=epoch,
+        trade_date=_trade_date(quotes),
+    )
+
+
+def _fetch_quotes_sync() -> pd.DataFrame:
+    import efinance as ef
+
+    return ef.stock.get_realtime_quotes()
+
+
+_SNAPSHOT_LOCK_ATTR = "_cn_stock_market_snapshot_lock"
+_snapshot: Optional[MarketSnapshot] = None
+
+
+def _get_snapshot_lock() -> asyncio.Lock:
+    """Return the current event loop's snapshot singleflight lock."""
+    loop = asyncio.get_running_loop()
+    lock = getattr(loop, _SNAPSHOT_LOCK_ATTR, None)
+    if lock is None:
+        lock = asyncio.Lock()
+        setattr(loop, _SNAPSHOT_LOCK_ATTR, lock)
+    return lock
+
+
+def _fresh_snapshot() -> Optional[MarketSnapshot]:
+    snapshot = _snapshot
+    if snapshot is None:
+        return None
+    phase, epoch = market_phase()
+    if snapshot.epoch != epoch:
+        return None
+    if phase == PHASE_LIVE and time.time() - snapshot.created_at >= MARKET_SNAPSHOT_LIVE_TTL_SECONDS:
+        return None
+    return snapshot
+
+
+async def get_market_snapshot() -> MarketSnapshot:
+    """Return the current full-market snapshot, fetching it at most once per freshness window."""
+    global _snapshot
+    cached = _fresh_snapshot()
+    if cached is not None:
+        return cached
+
+    async with _get_snapshot_lock():
+        cached = _fresh_snapshot()
+        if cached is not None:
+            return cached
+        _, epoch = market_phase()
+        started_at = time.perf_counter()
+        try:
+            quotes = await _run_in_executor(_fetch_quotes_sync)
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            raise MarketSnapshotUnavailable(f"全市场行情获取失败: {exc}") from exc
+        if quotes is None:
+            raise MarketSnapshotUnavailable("efinance 未返回有效的全市场行情")
+        _snapshot = snapshot_from_quotes(quotes, epoch=epoch)
+        logger.info(
+            "Market snapshot refreshed rows=%s epoch=%s elapsed=%.3fs",
+            len(_snapshot),
+            epoch,
+            time.perf_counter() - started_at,
+        )
+        return _snapshot
+
+
+def clear_market_snapshot() -> None:
+    """Drop the cached snapshot. Tests use this; production does not."""
+    global _snapshot
+    _snapshot = None
@@ -3,24 +3,38 @@ import json
 import logging
 import os
 import time
-from playwright.async_api import async_playwright, Browser, BrowserContext
-
-from ..config import ALL_INDICES
-from ..observability import log_context
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from playwright.async_api import BrowserContext
+
+from ..cache import in_trading_session
+from ..config import (
+    ALL_INDICES,
+    REALTIME_FF_BATCH_SIZE,
+    REALTIME_FF_BATCH_WINDOW_MS,
+    REALTIME_FF_PAGE_MAX_HEAP_MB,
+    REALTIME_FF_PAGE_MAX_USES,
+    REALTIME_FF_PAGE_POOL_SIZE,
+    REALTIME_FF_POLL_CONCURRENCY,
+    REALTIME_FF_POLL_IDLE_SECONDS,
+    REALTIME_FF_POLL_INTERVAL_SECONDS,
+    REALTIME_FF_POLL_MAX_TARGETS,
+    REALTIME_FF_RESULT_TTL_SECONDS,
+)
+from ..observability import detached_context, log_context
+from .browser import BrowserPurpose, get_browser_manager
+from .cn_stock_source import _run_in_executor
 
 logger = logging.getLogger("qtf_mcp")
 
 # ── 全局单例 ──────────────────────────────────────────────
-_playwright = None
-_browser: Browser | None = None
-_context: BrowserContext | None = None
-_lock = asyncio.Lock()
-
-# 2C4G 建议并发数不超过 2
-SEMAPHORE = asyncio.Semaphore(2)
 _inflight: dict[str, asyncio.Task[dict]] = {}
 _inflight_waiters: dict[str, int] = {}
 _inflight_keep_alive: dict[str, bool] = {}
+# 最近一次成功结果：target -> (monotonic 时间, 结果)
+_results: dict[str, tuple[float, dict]] = {}
 
 # 需要拦截的无用资源
 BLOCKED_PATTERNS = [
@@ -69,6 +83,108 @@ PARSE_JS = """
     }
 """
 
+# 页面表格由 push2 行情接口的 JSON 填充，字段与 data-field 一一对应：
+# 金额（元）与净占比（%）
+FUND_FLOW_AMOUNT_FIELDS = ("f62", "f66", "f72", "f78", "f84")
+FUND_FLOW_RATIO_FIELDS = ("f184", "f69", "f75", "f81", "f87")
+FUND_FLOW_API_PATHS = ("/api/qt/stock/get", "/api/qt/ulist.np/get", "/api/qt/ulist/get")
+# 页面框架 10s + 数据填充 12s，与 DOM 路径原有的两段等待一致
+PAGE_DATA_TIMEOUT_MS = 10000
+DOM_DATA_TIMEOUT_MS = 12000
+
+
+def is_fund_flow_api_url(url: str) -> bool:
+    parts = urlsplit(url)
+    return "push2" in parts.netloc and parts.path.endswith(FUND_FLOW_API_PATHS)
+
+
+def _api_number(value) -> Optional[float]:
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None  # "-" 表示停牌或尚无数据
+    return number if number == number else None
+
+
+def _response_data(text: str):
+    """The ``data`` member of a push2 JSON or JSONP body; None if unreadable."""
+    body = text.strip()
+    if not body.startswith("{"):
+        start, end = body.find("("), body.rfind(")")
+        if start < 0 or end <= start:
+            return None
+        body = body[start + 1:end]
+    try:
+        return json.loads(body).get("data")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _diff_entries(data: dict) -> list:
+    diff = data.get("diff")
+    return list(diff.values()) if isinstance(diff, dict) else list(diff or [])
+
+
+def _fund_flow_values(entry: dict, url: str) -> dict:
+    fltt = parse_qs(urlsplit(url).query).get("fltt", [""])[0]
+    ratio_scale = 1.0 if fltt == "2" else 0.01
+    values = {"name": str(entry.get("f58") or entry.get("f14") or "")}
+    for field in FUND_FLOW_AMOUNT_FIELDS:
+        values[field] = _api_number(entry.get(field)) or 0.0
+    for field in FUND_FLOW_RATIO_FIELDS:
+        values[field] = (_api_number(entry.get(field)) or 0.0) * ratio_scale
+    return values
+
+
+def _response_code(data: dict, url: str) -> str:
+    """Code a push2 entry belongs to: its own f57/f12, else the ``secid`` it was requested with."""
+    code = str(data.get("f57") or data.get("f12") or "")
+    if code:
+        return code
+    secid = parse_qs(urlsplit(url).query).get("secid", [""])[0]
+    return secid.split(".", 1)[-1]
+
+
+def parse_fund_flow_response(text: str, url: str, code: str) -> Optional[dict]:
+    """Extract ``code``'s fund-flow fields from a push2 response body; None if it is not one.
+
+    Accepts plain JSON and JSONP. ``fltt=2`` responses carry real numbers;
+    otherwise push2 sends the percentage fields multiplied by 100. Amounts are
+    returned in yuan and ratios in percent, the same units the page shows.
+    A pooled page can still receive a late response for the symbol it showed
+    before, so only an entry identified as ``code`` is accepted.
+    """
+    if not code:
+        return None
+    data = _response_data(text)
+    if isinstance(data, dict) and "diff" in data:
+        matching = [
+            e for e in _diff_entries(data) if isinstance(e, dict) and str(e.get("f12", "")) == code
+        ]
+        data = matching[0] if matching else None
+    if not isinstance(data, dict) or "f62" not in data:
+        return None
+    if _response_code(data, url) != code:
+        return None
+    return _fund_flow_values(data, url)
+
+
+def parse_fund_flow_list(text: str, url: str) -> dict[str, dict]:
+    """Fund-flow fields of every entry in a push2 list response, keyed by code.
+
+    Codes push2 does not know are simply absent; ``data`` is null when none match.
+    """
+    data = _response_data(text)
+    if not isinstance(data, dict):
+        return {}
+    return {
+        str(entry["f12"]): _fund_flow_values(entry, url)
+        for entry in _diff_entries(data)
+        if isinstance(entry, dict) and entry.get("f12") and "f62" in entry
+    }
+
 
 INDEX_FUND_FLOW_URLS = {
     "000001": "https://data.eastmoney.com/zjlx/zs000001.html",
@@ -95,6 +211,16 @@ def get_fund_flow_url(symbol: str) -> str | None:
     return f"https://data.eastmoney.com/zjlx/{symbol}.html"
 
 
+def fund_flow_secid(symbol: str) -> Optional[str]:
+    """push2 ``secid`` of a stock served by the list API; None for indices and the market page."""
+    if len(symbol) != 6 or not symbol.isdigit():
+        return None
+    if symbol in INDEX_FUND_FLOW_URLS or symbol in ALL_INDICES:
+        return None
+    # 沪市 1（含 900 开头的沪 B），深市与北交所（920/8/4 开头）0
+    return f"{1 if symbol.startswith(('6', '90')) else 0}.{symbol}"
+
+
 def get_fund_flow_display_name(symbol: str, parsed_name: str) -> str:
     """Return a stable display name for fund-flow output."""
     pure_code = "".join(filter(str.isdigit, symbol))
@@ -103,151 +229,488 @@ def get_fund_flow_display_name(symbol: str, parsed_name: str) -> str:
     return parsed_name or symbol
 
 
-# ── Browser 单例管理 ──────────────────────────────────────
-async def _close_started_browser(playwright, browser: Browser | None) -> None:
-    """关闭尚未发布为全局单例的浏览器资源。"""
-    if browser is not None:
+# ── 浏览器 ────────────────────────────────────────────────
+# 驱动与浏览器由 browser.BrowserManager 统一管理；资金流使用无头 Chromium 中的独立 context
+FUND_FLOW_BROWSER = BrowserPurpose(
+    "fund_flow",
+    headless=True,
+    args=(
+        "--no-sandbox",
+        "--disable-background-networking",
+        "--disable-default-apps",
+        "--no-first-run",
+        "--mute-audio",
+    ),
+    context_options=(
+        (
+            "user_agent",
+            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+            "AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/120.0.0.0 Safari/537.36",
+        ),
+        ("java_script_enabled", True),
+        ("bypass_csp", True),
+    ),
+)
+
+
+async def close_browser(drain_seconds: float = 0):
+    """服务退出或收盘后调用，清理资源"""
+    await _page_pool.clear()
+    await get_browser_manager().close(drain_seconds)
+
+
+# ── 页面池 ────────────────────────────────────────────────
+HEAP_USAGE_JS = "() => (performance.memory && performance.memory.usedJSHeapSize) || 0"
+
+
+class PooledPage:
+    """One route-configured page; its response listener feeds the current scrape."""
+
+    def __init__(self, page, context: BrowserContext):
+        self.page = page
+        self.context = context
+        self.uses = 0
+        self.capture = None
+
+    async def on_response(self, response) -> None:
+        capture = self.capture
+        if capture is not None:
+            await capture(response)
+
+
+class PagePool:
+    """Reusable fund-flow pages, bounded to ``size`` in use at once.
+
+    Pages are created once with ``BLOCKED_PATTERNS`` routes and a response
+    listener, then switch symbols by navigating in place, which keeps the
+    renderer, routes and the domain's HTTP cache. A page is replaced after
+    ``max_uses`` scrapes, when its JS heap exceeds ``max_heap_mb``, after a
+    failed scrape, or when the browser context it belongs to is gone.
+    """
+
+    def __init__(self, size: int, *, max_uses: int, max_heap_mb: float = 0):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self.created = 0
+        self.recycled = 0
+        self.in_use = 0
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[PooledPage] = []
+
+    async def _new_page(self, context: BrowserContext) -> PooledPage:
+        page = await context.new_page()
+        pooled = PooledPage(page, context)
         try:
-            await browser.close()
-        except Exception:
-            logger.warning("清理未完成初始化的 Chromium 失败", exc_info=True)
-    if playwright is not None:
+            # 拦截无用资源，降低带宽和 CPU 消耗；路由只在建页时装一次
+            async def block_route(route):
+                await route.abort()
+
+            for pattern in BLOCKED_PATTERNS:
+                await page.route(pattern, block_route)
+            page.on("response", pooled.on_response)
+        except BaseException:
+            await self._close(pooled)
+            raise
+        self.created += 1
+        return pooled
+
+    async def _close(self, pooled: PooledPage) -> None:
         try:
-            await playwright.stop()
+            await pooled.page.close()
         except Exception:
-            logger.warning("清理未完成初始化的 Playwright 失败", exc_info=True)
+            logger.debug("Closing pooled page failed", exc_info=True)
 
-
-async def get_context() -> BrowserContext:
-    global _playwright, _browser, _context
-    async with _lock:
-        if _browser is None or not _browser.is_connected():
-            new_playwright = None
-            new_browser = None
+    async def _reusable(self, pooled: PooledPage) -> bool:
+        if pooled.uses >= self.max_uses:
+            return False
+        if self.max_heap_mb > 0:
             try:
-                new_playwright = await async_playwright().start()
-                new_browser = await new_playwright.chromium.launch(
-                    headless=True,
-                    args=[
-                        "--disable-gpu",
-                        "--no-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-extensions",
-                        "--disable-background-networking",
-                        "--disable-default-apps",
-                        "--no-first-run",
-                        "--mute-audio",
-                    ],
-                )
-                new_context = await new_browser.new_context(
-                    user_agent=(
-                        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                        "AppleWebKit/537.36 (KHTML, like Gecko) "
-                        "Chrome/120.0.0.0 Safari/537.36"
-                    ),
-                    java_script_enabled=True,
-                    bypass_csp=True,
-                )
-            except BaseException:
-                await _close_started_browser(new_playwright, new_browser)
-                raise
-
-            # 仅在完整初始化成功后发布，避免其他任务看到半初始化状态。
-            _playwright = new_playwright
-            _browser = new_browser
-            _context = new_context
-        return _context
-
-
-async def close_browser():
-    """服务退出时调用，清理资源"""
-    global _playwright, _browser, _context
-    if _browser:
-        await _browser.close()
-        _browser = None
-        _context = None
-    if _playwright:
-        await _playwright.stop()
-        _playwright = None
+                heap = float(await pooled.page.evaluate(HEAP_USAGE_JS))
+            except Exception:
+                return False
+            if heap / 1e6 > self.max_heap_mb:
+                return False
+        return True
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    async def acquire(self, context: BrowserContext) -> PooledPage:
+        await self._slots.acquire()
+        self.in_use += 1
+        try:
+            while self._idle:
+                pooled = self._idle.pop()
+                if pooled.context is context:
+                    return pooled
+                # 浏览器重建后旧页面已失效
+                await self._close(pooled)
+            return await self._new_page(context)
+        except BaseException:
+            self.in_use -= 1
+            self._slots.release()
+            raise
+
+    async def release(self, pooled: PooledPage, *, healthy: bool = True) -> None:
+        """Return a page after a scrape; unhealthy or worn-out pages are closed."""
+        pooled.capture = None
+        pooled.uses += 1
+        try:
+            if healthy and len(self._idle) < self.size and await self._reusable(pooled):
+                self._idle.append(pooled)
+            else:
+                self.recycled += 1
+                logger.debug("Recycling fund flow page uses=%s healthy=%s", pooled.uses, healthy)
+                await self._close(pooled)
+        finally:
+            self.in_use -= 1
+            self._slots.release()
+
+    async def warm(self, context: BrowserContext, url: Optional[str] = None) -> int:
+        """Pre-create idle pages up to ``size``, optionally parked on ``url``.
+
+        Parking a page on an Eastmoney page loads the site's scripts into the
+        HTTP cache, so the first real scrape only fetches its own data.
+        """
+        added = 0
+        while len(self._idle) + self.in_use < self.size:
+            pooled = await self._new_page(context)
+            if url:
+                try:
+                    await pooled.page.goto(url, wait_until="domcontentloaded", timeout=25000)
+                except Exception:
+                    logger.debug("Parking fund flow page failed url=%s", url, exc_info=True)
+            self._idle.append(pooled)
+            added += 1
+        return added
+
+    async def clear(self) -> None:
+        idle, self._idle = self._idle, []
+        for pooled in idle:
+            await self._close(pooled)
+
+
+_page_pool = PagePool(
+    REALTIME_FF_PAGE_POOL_SIZE,
+    max_uses=REALTIME_FF_PAGE_MAX_USES,
+    max_heap_mb=REALTIME_FF_PAGE_MAX_HEAP_MB,
+)
+
+
+def get_page_pool() -> PagePool:
+    return _page_pool
 
 
 # ── 单个 Symbol 抓取 ──────────────────────────────────────
-async def fetch_single(symbol: str, context: BrowserContext) -> dict:
-    wait_started_at = time.perf_counter()
-    await SEMAPHORE.acquire()
-    semaphore_wait = time.perf_counter() - wait_started_at
-    service_started_at = time.perf_counter()
+def _to_ratio(v) -> float:
     try:
-        url = get_fund_flow_url(symbol)
-        if url is None:
-            return {"error": "暂无实时资金流向", "url": ""}
+        return float(str(v).replace("%", ""))
+    except Exception:
+        return 0.0
+
+
+def _result_from_fields(symbol: str, raw: dict) -> dict:
+    """Build the result dict; amounts pass through (numbers from JSON, text from the DOM)."""
+    return {
+        "标的名称":      get_fund_flow_display_name(symbol, raw["name"]),
+        "主力净流入":    raw["f62"],
+        "主力净比(%)":   _to_ratio(raw["f184"]),
+        "超大单净流入":  raw["f66"],
+        "超大单净比(%)": _to_ratio(raw["f69"]),
+        "大单净流入":    raw["f72"],
+        "大单净比(%)":   _to_ratio(raw["f75"]),
+        "中单净流入":    raw["f78"],
+        "中单净比(%)":   _to_ratio(raw["f81"]),
+        "小单净流入":    raw["f84"],
+        "小单净比(%)":   _to_ratio(raw["f87"]),
+    }
 
-        page = await context.new_page()
 
-        try:
-            # 拦截无用资源，降低带宽和 CPU 消耗
-            async def block_route(route):
-                await route.abort()
+async def _wait_for_dom_data(page) -> None:
+    # 先等页面框架出现
+    await page.wait_for_selector("text=今日主力净流入", timeout=PAGE_DATA_TIMEOUT_MS)
+    # 再等 Ajax 数据真正填入（超时则认为停牌/非交易时段，直接读当前值）
+    try:
+        await page.wait_for_function(WAIT_FOR_DATA_JS, timeout=DOM_DATA_TIMEOUT_MS)
+    except Exception:
+        # 超时：停牌股 / 非交易时段，数据本身就是空，继续解析拿到的值即可
+        pass
 
-            for pattern in BLOCKED_PATTERNS:
-                await page.route(pattern, block_route)
 
-            await page.goto(url, wait_until="domcontentloaded", timeout=25000)
+async def fetch_single(symbol: str, context: BrowserContext) -> dict:
+    """Fetch one page's realtime fund flow on a pooled page.
 
-            # 先等页面框架出现
-            await page.wait_for_selector("text=今日主力净流入", timeout=10000)
+    The page's own push2 response is intercepted and parsed as soon as it
+    arrives; the DOM is scraped only when no response for this symbol shows up
+    before the table is filled, and always for the market page.
+    """
+    url = get_fund_flow_url(symbol)
+    if url is None:
+        return {"error": "暂无实时资金流向", "url": ""}
 
-            # 再等 Ajax 数据真正填入（超时则认为停牌/非交易时段，直接读当前值）
-            try:
-                await page.wait_for_function(WAIT_FOR_DATA_JS, timeout=12000)
-            except Exception:
-                # 超时：停牌股 / 非交易时段，数据本身就是空，继续解析拿到的值即可
-                pass
+    wait_started_at = time.perf_counter()
+    pooled = await _page_pool.acquire(context)
+    semaphore_wait = time.perf_counter() - wait_started_at
+    service_started_at = time.perf_counter()
+    source = "none"
+    healthy = False
+    page = pooled.page
+    code = "".join(filter(str.isdigit, symbol))
+    captured: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    async def capture_response(response):
+        if captured.done() or not is_fund_flow_api_url(response.url):
+            return
+        try:
+            values = parse_fund_flow_response(await response.text(), response.url, code)
+        except Exception:
+            return
+        if values is not None and not captured.done():
+            captured.set_result(values)
 
-            raw = await page.evaluate(PARSE_JS)
+    # 大盘页（dpzjlx）没有单一代码可核对，只读 DOM
+    pooled.capture = capture_response if code else None
+    dom_ready = None
+    try:
+        # 复用的页面直接在原地跳转：渲染进程、路由与同域缓存都保留
+        await page.goto(url, wait_until="domcontentloaded", timeout=25000)
+
+        # 接口 JSON 与 DOM 填充谁先到用谁；JSON 通常在页面渲染之前就已返回
+        dom_ready = asyncio.ensure_future(_wait_for_dom_data(page))
+        await asyncio.wait({captured, dom_ready}, return_when=asyncio.FIRST_COMPLETED)
+        if captured.done():
+            source = "api"
+            result = _result_from_fields(symbol, captured.result())
+        else:
+            dom_ready.result()
+            source = "dom"
+            result = _result_from_fields(symbol, await page.evaluate(PARSE_JS))
+        healthy = True
+        return result
 
-            def to_ratio(v: str) -> float:
-                try:
-                    return float(str(v).replace("%", ""))
-                except Exception:
-                    return 0.0
-
-            return {
-                "标的名称":      get_fund_flow_display_name(symbol, raw["name"]),
-                "主力净流入":    raw["f62"],
-                "主力净比(%)":   to_ratio(raw["f184"]),
-                "超大单净流入":  raw["f66"],
-                "超大单净比(%)": to_ratio(raw["f69"]),
-                "大单净流入":    raw["f72"],
-                "大单净比(%)":   to_ratio(raw["f75"]),
-                "中单净流入":    raw["f78"],
-                "中单净比(%)":   to_ratio(raw["f81"]),
-                "小单净流入":    raw["f84"],
-                "小单净比(%)":   to_ratio(raw["f87"]),
-            }
-
-        except Exception as e:
-            return {"error": str(e), "url": url}
+    except Exception as e:
+        return {"error": str(e), "url": url}
 
-        finally:
-            await page.close()  # page 用完立即释放，context/browser 保留复用
     finally:
-        SEMAPHORE.release()
+        if dom_ready is not None and not dom_ready.done():
+            dom_ready.cancel()
+            await asyncio.gather(dom_ready, return_exceptions=True)
+        # 失败过的页面状态不可知，直接换新
+        await _page_pool.release(pooled, healthy=healthy)
         request_id, tool, _ = log_context()
         logger.info(
             "Realtime fund flow page request_id=%s tool=%s symbol=%s "
-            "semaphore_wait=%.3fs service=%.3fs",
+            "semaphore_wait=%.3fs service=%.3fs source=%s page_uses=%s",
             request_id,
             tool,
             symbol,
             semaphore_wait,
             time.perf_counter() - service_started_at,
+            source,
+            pooled.uses,
         )
 
 
+CANARY_URL = "https://data.eastmoney.com/zjlx/dpzjlx.html"
+
+
+async def warm_pages(url: str = CANARY_URL) -> int:
+    """Start the browser if needed and fill the page pool."""
+    async with get_browser_manager().lease(FUND_FLOW_BROWSER) as context:
+        return await _page_pool.warm(context, url)
+
+
+async def check_browser(url: str = CANARY_URL) -> bool:
+    """Render a canary fund-flow page on a pooled page; False if the browser cannot."""
+    async with get_browser_manager().lease(FUND_FLOW_BROWSER) as context:
+        pooled = await _page_pool.acquire(context)
+        healthy = False
+        try:
+            await pooled.page.goto(url, wait_until="domcontentloaded", timeout=25000)
+            await pooled.page.wait_for_selector("text=今日主力净流入", timeout=PAGE_DATA_TIMEOUT_MS)
+            healthy = True
+        except Exception as exc:
+            logger.warning("Fund flow canary page failed url=%s error=%s", url, exc)
+        finally:
+            await _page_pool.release(pooled, healthy=healthy)
+    return healthy
+
+
+async def warm_browser() -> bool:
+    """Start the browser, fill the page pool and check the canary page.
+
+    A failed canary restarts the browser once before giving up.
+    """
+    for attempt in range(2):
+        try:
+            await warm_pages()
+            if await check_browser():
+                return True
+        except Exception:
+            logger.warning("Fund flow browser warm-up failed attempt=%s", attempt + 1, exc_info=True)
+        if attempt == 0:
+            await close_browser()
+    return False
+
+
+# ── 列表接口批量取数 ──────────────────────────────────────
+FUND_FLOW_LIST_URL = "https://push2.eastmoney.com/api/qt/ulist.np/get"
+FUND_FLOW_LIST_FIELDS = ",".join(("f12", "f14") + FUND_FLOW_AMOUNT_FIELDS + FUND_FLOW_RATIO_FIELDS)
+FUND_FLOW_LIST_HEADERS = {
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Referer": "https://data.eastmoney.com/zjlx/detail.html",
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+}
+_BATCHER_ATTR = "_cn_stock_fund_flow_batcher"
+
+
+def _fetch_fund_flow_list_sync(secids: list[str]) -> dict[str, dict]:
+    """One push2 list call for ``secids``; fund-flow fields keyed by code."""
+    response = requests.get(
+        FUND_FLOW_LIST_URL,
+        params={
+            "fltt": "2",
+            "invt": "2",
+            "pn": "1",
+            "pz": str(len(secids)),
+            "secids": ",".join(secids),
+            "fields": FUND_FLOW_LIST_FIELDS,
+        },
+        headers=FUND_FLOW_LIST_HEADERS,
+        timeout=PAGE_DATA_TIMEOUT_MS / 1000.0,
+    )
+    response.raise_for_status()
+    return parse_fund_flow_list(response.text, response.url)
+
+
+class FundFlowBatcher:
+    """Merge the stock lookups of one event loop into paginated push2 list calls.
+
+    Lookups arriving within ``window_seconds`` of each other form one batch,
+    sent as list calls of up to ``page_size`` codes through the data-fetch
+    slots. A lookup resolves to None when its code is absent from the reply or
+    its list call failed; the caller then scrapes the stock's page instead.
+    """
+
+    def __init__(self, window_seconds: float, page_size: int):
+        self.window_seconds = window_seconds
+        self.page_size = page_size
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self.batches = 0
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def fetch(self, secid: str) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((secid, future))
+        if len(self._pending) == 1:
+            loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        pending, self._pending = self._pending, []
+        if pending:
+            # 批次由多个请求共享，不继承首个请求的截止时间
+            asyncio.get_running_loop().create_task(
+                self._run(pending), context=detached_context()
+            )
+
+    async def _fetch_page(self, secids: list[str]) -> dict[str, dict]:
+        try:
+            return await _run_in_executor(_fetch_fund_flow_list_sync, secids)
+        except Exception as exc:
+            logger.warning(
+                "Realtime fund flow list call failed codes=%s error=%s", len(secids), exc
+            )
+            return {}
+
+    async def _run(self, pending: list[tuple[str, asyncio.Future]]) -> None:
+        started_at = time.perf_counter()
+        secids = list(dict.fromkeys(secid for secid, _ in pending))
+        pages = [
+            secids[start:start + self.page_size]
+            for start in range(0, len(secids), self.page_size)
+        ]
+        self.batches += 1
+        self.calls += len(pages)
+        values: dict[str, dict] = {}
+        for page_values in await asyncio.gather(*(self._fetch_page(page) for page in pages)):
+            values.update(page_values)
+        for secid, future in pending:
+            found = values.get(secid.split(".", 1)[1])
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if not future.done():
+                future.set_result(found)
+        logger.info(
+            "Realtime fund flow list batch codes=%s calls=%s found=%s cost=%.3fs",
+            len(secids),
+            len(pages),
+            len(values),
+            time.perf_counter() - started_at,
+        )
+
+
+def get_fund_flow_batcher() -> FundFlowBatcher:
+    """The batcher of the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    batcher = getattr(loop, _BATCHER_ATTR, None)
+    if batcher is None:
+        batcher = FundFlowBatcher(REALTIME_FF_BATCH_WINDOW_MS / 1000.0, REALTIME_FF_BATCH_SIZE)
+        setattr(loop, _BATCHER_ATTR, batcher)
+    return batcher
+
+
 async def _fetch_single_with_context(symbol: str) -> dict:
-    context = await get_context()
-    return await fetch_single(symbol, context)
+    async with get_browser_manager().lease(FUND_FLOW_BROWSER) as context:
+        return await fetch_single(symbol, context)
+
+
+async def _fetch_realtime(symbol: str) -> dict:
+    """List API first for stocks; indices, the market page and misses scrape their page."""
+    secid = fund_flow_secid(symbol)
+    if secid is not None and REALTIME_FF_BATCH_SIZE > 0:
+        values = await get_fund_flow_batcher().fetch(secid)
+        if values is not None:
+            return _result_from_fields(symbol, values)
+    return await _fetch_single_with_context(symbol)
+
+
+def _cached_result(symbol: str) -> Optional[dict]:
+    """A successful result for ``symbol`` younger than the result TTL."""
+    entry = _results.get(symbol)
+    if entry is None:
+        return None
+    stored_at, result = entry
+    if time.monotonic() - stored_at >= REALTIME_FF_RESULT_TTL_SECONDS:
+        _results.pop(symbol, None)
+        return None
+    return result
+
+
+def _store_result(symbol: str, result: dict) -> None:
+    if REALTIME_FF_RESULT_TTL_SECONDS <= 0 or "error" in result:
+        return
+    now = time.monotonic()
+    for key, (stored_at, _) in list(_results.items()):
+        if now - stored_at >= REALTIME_FF_RESULT_TTL_SECONDS:
+            _results.pop(key, None)
+    _results[symbol] = (now, result)
+
+
+def clear_result_cache() -> None:
+    _results.clear()
 
 
 def _complete_inflight(symbol: str, task: asyncio.Task[dict]) -> None:
@@ -256,8 +719,8 @@ def _complete_inflight(symbol: str, task: asyncio.Task[dict]) -> None:
         _inflight.pop(symbol, None)
         _inflight_waiters.pop(symbol, None)
         _inflight_keep_alive.pop(symbol, None)
-    if not task.cancelled():
-        task.exception()
+    if not task.cancelled() and task.exception() is None:
+        _store_result(symbol, task.result())
 
 
 async def fetch_single_shared(
@@ -265,12 +728,22 @@ async def fetch_single_shared(
     *,
     keep_alive_on_cancel: bool = True,
 ) -> dict:
-    """Deduplicate only simultaneous live fetches for the same symbol."""
+    """Share one live fetch per symbol: while it runs, and for the result TTL after."""
     request_id, tool, _ = log_context()
+    cached = _cached_result(symbol)
+    if cached is not None:
+        logger.info(
+            "Realtime fund flow result request_id=%s tool=%s symbol=%s "
+            "singleflight_role=cache wait=0.000s outcome=success",
+            request_id,
+            tool,
+            symbol,
+        )
+        return cached
     task = _inflight.get(symbol)
     role = "follower"
     if task is None or task.done():
-        task = asyncio.create_task(_fetch_single_with_context(symbol))
+        task = asyncio.create_task(_fetch_realtime(symbol))
         _inflight[symbol] = task
         _inflight_waiters[symbol] = 0
         _inflight_keep_alive[symbol] = keep_alive_on_cancel
@@ -317,6 +790,173 @@ async def fetch_single_shared(
                     task.cancel()
 
 
+# ── 热门标的订阅轮询 ──────────────────────────────────────
+_POLLER_TASK_ATTR = "_cn_stock_fund_flow_poller_task"
+
+
+class FundFlowSubscriptions:
+    """Keep recently requested targets refreshed in the background during the session.
+
+    ``get_fund_flow`` records every target it is asked for (stocks, the core
+    indices, ``dpzjlx``). Every ``interval`` seconds inside the session the
+    poller refreshes them all through ``fetch_single_shared``, at most
+    ``concurrency`` at a time, so stocks still share list calls and indices
+    still share pages. A sample is served for two intervals, which tolerates
+    one failed refresh; older samples are ignored and the request fetches
+    itself. Targets not requested for ``idle_seconds`` are dropped.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = REALTIME_FF_POLL_INTERVAL_SECONDS,
+        idle_seconds: float = REALTIME_FF_POLL_IDLE_SECONDS,
+        concurrency: int = REALTIME_FF_POLL_CONCURRENCY,
+        max_targets: int = REALTIME_FF_POLL_MAX_TARGETS,
+    ):
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.concurrency = concurrency
+        self.max_targets = max_targets
+        self._requested: dict[str, float] = {}
+        self._samples: dict[str, tuple[float, dict]] = {}
+        self.refreshed = 0
+        self.failed = 0
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def targets(self) -> list[str]:
+        return list(self._requested)
+
+    def record(self, target: str) -> None:
+        """Subscribe ``target``, or extend its subscription. Cheap and never raises."""
+        if not self.enabled:
+            return
+        if target not in self._requested and len(self._requested) >= self.max_targets:
+            oldest = min(self._requested, key=self._requested.__getitem__)
+            self._drop(oldest)
+        self._requested[target] = time.monotonic()
+        self.ensure_running()
+
+    def latest(self, target: str) -> Optional[tuple[dict, float]]:
+        """The freshest sample of ``target`` and its age in seconds, if still servable."""
+        entry = self._samples.get(target)
+        if entry is None:
+            return None
+        fetched_at, result = entry
+        age = time.monotonic() - fetched_at
+        if age >= self.interval * 2:
+            return None
+        return result, age
+
+    def _drop(self, target: str) -> None:
+        self._requested.pop(target, None)
+        self._samples.pop(target, None)
+        self.evicted += 1
+
+    async def refresh(self) -> dict:
+        """Drop idle targets and refresh the rest once. Returns the stats it logs."""
+        now = time.monotonic()
+        for target, requested_at in list(self._requested.items()):
+            if now - requested_at >= self.idle_seconds:
+                self._drop(target)
+        targets = self.targets()
+        slots = asyncio.Semaphore(self.concurrency)
+        started_at = time.perf_counter()
+
+        async def refresh_one(target: str) -> bool:
+            async with slots:
+                try:
+                    result = await fetch_single_shared(target)
+                except Exception:
+                    logger.debug("Realtime fund flow poll failed symbol=%s", target, exc_info=True)
+                    return False
+            if "error" in result:
+                return False
+            if target in self._requested:
+                self._samples[target] = (time.monotonic(), result)
+            return True
+
+        outcomes = await asyncio.gather(*(refresh_one(target) for target in targets))
+        stats = {
+            "targets": len(targets),
+            "refreshed": sum(outcomes),
+            "failed": len(outcomes) - sum(outcomes),
+            "cost": time.perf_counter() - started_at,
+        }
+        self.refreshed += stats["refreshed"]
+        self.failed += stats["failed"]
+        logger.info(
+            "Realtime fund flow poll targets=%s refreshed=%s failed=%s cost=%.3fs",
+            stats["targets"],
+            stats["refreshed"],
+            stats["failed"],
+            stats["cost"],
+        )
+        return stats
+
+    async def run(self) -> None:
+        """Refresh every ``interval`` inside the session. Runs for the loop's lifetime."""
+        while True:
+            # 首次记录时请求本身正在抓取，因此先等一个周期
+            await asyncio.sleep(self.interval)
+            if not self._requested or not in_trading_session():
+                continue
+            try:
+                await self.refresh()
+            except Exception:
+                logger.warning("Realtime fund flow poll failed", exc_info=True)
+
+    def ensure_running(self) -> None:
+        """Start the poll loop on the running event loop, once."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = getattr(loop, _POLLER_TASK_ATTR, None)
+        if task is not None and not task.done():
+            return
+        # 由某次请求触发启动，但不能继承那次请求的截止时间与日志上下文
+        setattr(
+            loop,
+            _POLLER_TASK_ATTR,
+            loop.create_task(self.run(), context=detached_context()),
+        )
+        logger.info(
+            "Realtime fund flow poller started interval=%.1fs idle=%.0fs",
+            self.interval,
+            self.idle_seconds,
+        )
+
+
+_subscriptions = FundFlowSubscriptions()
+
+
+def get_fund_flow_subscriptions() -> FundFlowSubscriptions:
+    return _subscriptions
+
+
+async def _subscribed_or_fetch(symbol: str, keep_alive_on_cancel: bool) -> dict:
+    _subscriptions.record(symbol)
+    sample = _subscriptions.latest(symbol)
+    if sample is None:
+        return await fetch_single_shared(symbol, keep_alive_on_cancel=keep_alive_on_cancel)
+    result, age = sample
+    request_id, tool, _ = log_context()
+    logger.info(
+        "Realtime fund flow result request_id=%s tool=%s symbol=%s "
+        "singleflight_role=subscription wait=0.000s age=%.1fs outcome=success",
+        request_id,
+        tool,
+        symbol,
+        age,
+    )
+    return result
+
+
 # ── 主入口 ────────────────────────────────────────────────
 async def get_fund_flow(
     symbols: list,
@@ -331,7 +971,7 @@ async def get_fund_flow(
         return json.dumps({}, ensure_ascii=False)
 
     tasks = [
-        fetch_single_shared(sym, keep_alive_on_cancel=keep_alive_on_cancel)
+        _subscribed_or_fetch(sym, keep_alive_on_cancel)
         for sym in symbols
     ]
     raw_results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,667 @@
+"""Incremental technical indicators for ``research.get_technical_indicators``.
+
+``tech`` and ``full`` used to recompute KDJ, MACD, three RSIs and BBANDS over
+the whole two-year window on every call, although between two calls in the same
+window only the last bar moves. ``IndicatorEngine`` keeps the recursive state of
+every indicator per ``(symbol, first bar)`` and advances it bar by bar:
+
+- MACD: the two TA-Lib EMAs (with TA-Lib's SMA seeding, the fast EMA seeded
+  late so both start on the same bar) and the signal EMA.
+- RSI: Wilder's average gain / loss.
+- BBANDS: the six cascaded EMAs of T3 and the running sums behind the
+  20-bar standard deviation.
+- KDJ: the 9-bar high / low windows and the K / D smoothing state.
+
+A new state is seeded from one reference pass rather than replayed: the rebuild
+returns the reference outputs as they are, and the state after the second-to-last
+bar comes from them (K / D, the signal EMA) or from a few vectorised calls over
+the same closes (``talib.EMA`` for the MACD and T3 EMAs, Wilder's averages in
+closed form, the rolling windows and sums). Series shorter than ``SEED_MIN_BARS``
+are still inside some warm-up and are replayed bar by bar, which is cheap there.
+
+Each step replays the reference arithmetic operation for operation. On a
+replayed state RSI comes out bit-identical to ``talib``; a seeded state starts
+from values computed in a different order, so every series agrees to the last
+few bits only. KDJ runs the plain recursion, which the
+reference evaluates in 64-bar blocks as a matrix product, so the two differ in
+the last few bits (about 1e-13 on a 0-100 scale). MACD and BBANDS follow TA-Lib's
+portable arithmetic; the TA-Lib wheel dispatches those two to FMA builds at
+runtime on CPUs that have FMA, so there they agree to about 1e-13 relative —
+the same spread TA-Lib itself shows between two machines. State is committed up
+to the second-to-last bar; the last bar is always recomputed from a copy, which
+is what an intraday revision needs.
+
+The reference implementation stays the source of truth:
+
+- the stored inputs must be an exact prefix of the new series, otherwise the
+  state is rebuilt from the first bar (a qfq adjustment rewrites history);
+- any non-finite input goes straight to the reference, whose NaN semantics are
+  not worth replaying;
+- ``INDICATOR_VERIFY`` computes both and logs any difference beyond
+  ``VERIFY_TOLERANCE``, returning the reference result.
+
+The fetch window slides by one bar per trading day and TA-Lib seeds from the
+first bar, so a new day is a new key and costs one rebuild per symbol.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+import numpy as np
+import talib
+from numpy import ndarray
+
+from .config import (
+    INDICATOR_INCREMENTAL_ENABLED,
+    INDICATOR_STATE_MAX_ENTRIES,
+    INDICATOR_VERIFY,
+)
+
+logger = logging.getLogger("qtf_mcp")
+
+SERIES_NAMES = (
+    "kdj_k",
+    "kdj_d",
+    "kdj_j",
+    "macd_dif",
+    "macd_dea",
+    "rsi6",
+    "rsi12",
+    "rsi24",
+    "bb_upper",
+    "bb_middle",
+    "bb_lower",
+)
+
+Series = tuple[ndarray, ...]
+Reference = Callable[[ndarray, ndarray, ndarray], Series]
+
+_NAN = float("nan")
+# 远大于 FMA 造成的末位差异，又足以暴露任何递推顺序错误
+VERIFY_TOLERANCE = 1e-10
+# 短于此长度的新状态逐根回放；更长的从一次全量计算播种。T3 的第六级 EMA 在第
+# 6*(20-1)+1 根 K 线才完成播种，此后各指标都只剩稳态递推。
+SEED_MIN_BARS = 6 * (20 - 1) + 1
+
+
+def _per_to_k(period: int) -> float:
+    # TA-Lib PER_TO_K
+    return 2.0 / float(period + 1)
+
+
+def _divide(numerator: float, denominator: float) -> float:
+    """IEEE division as numpy/pandas do it: x/0 is ±inf, 0/0 is NaN."""
+    if denominator != 0.0:
+        return numerator / denominator
+    if numerator != numerator or numerator == 0.0:
+        return _NAN
+    return math.copysign(math.inf, numerator) * math.copysign(1.0, denominator)
+
+
+class _Ewm:
+    """``y[0] = x[0]``, ``y[t] = (1-alpha)*y[t-1] + alpha*x[t]`` one value at a time."""
+
+    __slots__ = ("decay", "alpha", "value", "started")
+
+    def __init__(self, alpha: float):
+        self.decay = 1.0 - alpha
+        self.alpha = alpha
+        self.value = _NAN
+        self.started = False
+
+    def clone(self) -> "_Ewm":
+        other = _Ewm.__new__(_Ewm)
+        for name in _Ewm.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+
+    def seed(self, value: float) -> None:
+        self.started = True
+        self.value = value
+
+    def step(self, cur: float) -> float:
+        if not self.started:
+            self.started = True
+            self.value = cur
+        else:
+            self.value = self.decay * self.value + self.alpha * cur
+        return self.value
+
+
+class _Kdj:
+    """``research.compute_kdj``: rolling RSV, then two chained recursive smoothings."""
+
+    __slots__ = ("n", "highs", "lows", "k", "d")
+
+    def __init__(self, n: int = 9, m1: int = 3, m2: int = 3):
+        self.n = n
+        self.highs: deque = deque(maxlen=n)
+        self.lows: deque = deque(maxlen=n)
+        self.k = _Ewm(1.0 / m1)
+        self.d = _Ewm(1.0 / m2)
+
+    def clone(self) -> "_Kdj":
+        other = _Kdj.__new__(_Kdj)
+        other.n = self.n
+        other.highs = self.highs.copy()
+        other.lows = self.lows.copy()
+        other.k = self.k.clone()
+        other.d = self.d.clone()
+        return other
+
+    def seed(self, high: ndarray, low: ndarray, k: float, d: float) -> None:
+        """State after the last of the committed bars; ``k``/``d`` are its outputs."""
+        self.highs.extend(float(value) for value in high[-self.n:])
+        self.lows.extend(float(value) for value in low[-self.n:])
+        self.k.seed(k)
+        self.d.seed(d)
+
+    def step(self, close: float, high: float, low: float) -> tuple[float, float, float]:
+        self.highs.append(high)
+        self.lows.append(low)
+        if len(self.highs) < self.n:
+            rsv = 50.0
+        else:
+            low_min = min(self.lows)
+            rsv = _divide(close - low_min, max(self.highs) - low_min) * 100
+            if rsv != rsv:
+                rsv = 50.0
+        k = self.k.step(rsv)
+        d = self.d.step(k)
+        return k, d, 3 * k - 2 * d
+
+
+class _Macd:
+    """``talib.MACD``: SMA-seeded EMAs aligned on bar ``slow-1``, then the signal EMA."""
+
+    __slots__ = (
+        "fast", "slow", "signal", "k_fast", "k_slow", "k_signal",
+        "index", "fast_total", "slow_total", "fast_ema", "slow_ema",
+        "signal_total", "signal_ema",
+    )
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        if slow < fast:
+            fast, slow = slow, fast
+        self.fast, self.slow, self.signal = fast, slow, signal
+        self.k_fast = _per_to_k(fast)
+        self.k_slow = _per_to_k(slow)
+        self.k_signal = _per_to_k(signal)
+        self.index = 0
+        self.fast_total = 0.0
+        self.slow_total = 0.0
+        self.fast_ema = _NAN
+        self.slow_ema = _NAN
+        self.signal_total = 0.0
+        self.signal_ema = _NAN
+
+    def clone(self) -> "_Macd":
+        other = _Macd.__new__(_Macd)
+        for name in _Macd.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+
+    def seed(self, close: ndarray, dea: float) -> None:
+        """State after ``close[-1]``, past the signal warm-up; ``dea`` is its signal value.
+
+        ``talib.EMA`` seeds with the SMA of its first ``period`` inputs, so the
+        fast EMA started ``fast`` bars before bar ``slow-1`` is the one MACD uses.
+        """
+        self.index = len(close)
+        self.slow_ema = float(talib.EMA(close, self.slow)[-1])
+        self.fast_ema = float(talib.EMA(close[self.slow - self.fast:], self.fast)[-1])
+        self.signal_ema = dea
+
+    def step(self, close: float) -> tuple[float, float]:
+        i = self.index
+        self.index += 1
+        seed_at = self.slow - 1
+        if i < seed_at:
+            self.slow_total += close
+            if i >= self.slow - self.fast:
+                self.fast_total += close
+            return _NAN, _NAN
+        if i == seed_at:
+            self.slow_total += close
+            self.fast_total += close
+            self.slow_ema = self.slow_total / self.slow
+            self.fast_ema = self.fast_total / self.fast
+        else:
+            self.slow_ema = ((close - self.slow_ema) * self.k_slow) + self.slow_ema
+            self.fast_ema = ((close - self.fast_ema) * self.k_fast) + self.fast_ema
+        dif = self.fast_ema - self.slow_ema
+
+        signal_at = seed_at + self.signal - 1
+        if i < signal_at:
+            self.signal_total += dif
+            return _NAN, _NAN
+        if i == signal_at:
+            self.signal_total += dif
+            self.signal_ema = self.signal_total / self.signal
+        else:
+            self.signal_ema = ((dif - self.signal_ema) * self.k_signal) + self.signal_ema
+        return dif, self.signal_ema
+
+
+class _Rsi:
+    """``talib.RSI``: Wilder smoothing seeded with the mean of the first ``period`` moves.
+
+    TA-Lib 0.6+ multiplies by a precomputed ``1/period`` instead of dividing.
+    """
+
+    __slots__ = ("period", "inverse", "index", "prev", "gain", "loss")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.inverse = 1.0 / period
+        self.index = 0
+        self.prev = _NAN
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def clone(self) -> "_Rsi":
+        other = _Rsi.__new__(_Rsi)
+        for name in _Rsi.__slots__:
+            setattr(other, name, getattr(self, name))
+        return other
+
+    def _value(self) -> float:
+        total = self.gain + self.loss
+        # TA_IS_ZERO
+        if -0.00000001 < total < 0.00000001:
+            return 0.0
+        return (self.gain / total) * 100.0
+
+    def seed(self, close: ndarray) -> None:
+        """Wilder averages after ``close[-1]`` in closed form, past the ``period`` warm-up.
+
+        ``g[t] = a·g[t-1] + up[t]/period`` with ``a = (period-1)/period`` unrolls to
+        ``a^m·g[period] + Σ a^(m-j)·up[j]/period``; the weights underflow to zero long
+        before the two-year window ends.
+        """
+        period = self.period
+        change = np.diff(close)
+        up = np.where(change > 0, change, 0.0)
+        down = up - change
+        decay = (period - 1) * self.inverse
+        weights = decay ** np.arange(len(change) - period - 1, -1, -1, dtype=np.float64)
+        head = decay ** (len(change) - period)
+        self.gain = head * up[:period].sum() * self.inverse + weights @ up[period:] * self.inverse
+        self.loss = head * down[:period].sum() * self.inverse + weights @ down[period:] * self.inverse
+        self.index = len(close)
+        self.prev = float(close[-1])
+
+    def step(self, close: float) -> float:
+        i = self.index
+        self.index += 1
+        if i == 0:
+            self.prev = close
+            return _NAN
+        change = close - self.prev
+        self.prev = close
+        up = change if change > 0 else 0.0
+        down = up - change
+        period = self.period
+        if i < period:
+            self.gain += up
+            self.loss += down
+            return _NAN
+        if i == period:
+            self.gain = (self.gain + up) * self.inverse
+            self.loss = (self.loss + down) * self.inverse
+            return self._value()
+        self.gain = (self.gain * (period - 1) + up) * self.inverse
+        self.loss = (down + self.loss * (period - 1)) * self.inverse
+        return self._value()
+
+
+class _Bbands:
+    """``talib.BBANDS(matype=T3)`` with the wrapper defaults: period 20, 2 deviations, vFactor 0.7."""
+
+    __slots__ = (
+        "period", "nbdev", "k", "one_minus_k", "c1", "c2", "c3", "c4",
+        "index", "e", "total", "var_total1", "var_total2", "window",
+    )
+
+    def __init__(self, period: int = 20, nbdev: float = 2.0, v_factor: float = 0.7):
+        self.period = period
+        self.nbdev = nbdev
+        self.k = 2.0 / (period + 1.0)
+        self.one_minus_k = 1.0 - self.k
+        temp = v_factor * v_factor
+        self.c1 = -temp * v_factor
+        self.c2 = 3.0 * (temp - self.c1)
+        self.c3 = -6.0 * temp - 3.0 * (v_factor - self.c1)
+        self.c4 = 1.0 + 3.0 * v_factor - self.c1 + 3.0 * temp
+        self.index = 0
+        self.e = [_NAN] * 6
+        self.total = 0.0
+        self.var_total1 = 0.0
+        self.var_total2 = 0.0
+        self.window: deque = deque(maxlen=period)
+
+    def clone(self) -> "_Bbands":
+        other = _Bbands.__new__(_Bbands)
+        for name in _Bbands.__slots__:
+            setattr(other, name, getattr(self, name))
+        other.e = list(self.e)
+        other.window = self.window.copy()
+        return other
+
+    def seed(self, close: ndarray) -> None:
+        """T3 levels and deviation sums after ``close[-1]``, past the six-level warm-up.
+
+        Level ``n`` is seeded with the mean of the first ``period`` values of level
+        ``n-1``, which is how ``talib.EMA`` seeds, so the cascade is six EMA calls.
+        """
+        period = self.period
+        level = close
+        for stage in range(6):
+            level = talib.EMA(level, period)[period - 1:]
+            self.e[stage] = float(level[-1])
+        self.index = len(close)
+        self.window.extend(float(value) for value in close[-period:])
+        trailing = close[-(period - 1):]
+        self.var_total1 = float(trailing.sum())
+        self.var_total2 = float((trailing * trailing).sum())
+
+    def _t3(self, close: float) -> float:
+        """Advance T3; return its value once all six EMAs are seeded, else NaN."""
+        i = self.index
+        period = self.period
+        e = self.e
+        k, omk = self.k, self.one_minus_k
+        # 每一级 EMA 以上一级前 period 个值的均值为种子：第一级用 period 根 K 线，
+        # 之后每级再用 period-1 根，与 TA_T3 的初始化顺序一致。
+        stage = 0 if i < period else min(6, 1 + (i - period) // (period - 1))
+        if stage == 0:
+            self.total = close if i == 0 else self.total + close
+            if i == period - 1:
+                e[0] = self.total / period
+            return _NAN
+        if stage < 6:
+            offset = (i - period) % (period - 1)
+            if offset == 0:
+                # 新一级开始累加：种子和从上一级更新前的种子值开始
+                self.total = e[stage - 1]
+            e[0] = (k * close) + (omk * e[0])
+            for level in range(1, stage):
+                e[level] = (k * e[level - 1]) + (omk * e[level])
+            self.total += e[stage - 1]
+            if offset == period - 2:
+                e[stage] = self.total / period
+                if stage == 5:
+                    return self.c1 * e[5] + self.c2 * e[4] + self.c3 * e[3] + self.c4 * e[2]
+            return _NAN
+        e[0] = (k * close) + (omk * e[0])
+        for level in range(1, 6):
+            e[level] = (k * e[level - 1]) + (omk * e[level])
+        return self.c1 * e[5] + self.c2 * e[4] + self.c3 * e[3] + self.c4 * e[2]
+
+    def step(self, close: float) -> tuple[float, float, float]:
+        middle = self._t3(close)
+        i = self.index
+        self.index += 1
+        period = self.period
+        lookback = 6 * (period - 1)
+        # TA_STDDEV 从 BBANDS 的首个输出往前 period-1 根开始维护滚动和
+        if i < lookback - (period - 1):
+            return _NAN, _NAN, _NAN
+        self.window.append(close)
+        if i < lookback:
+            self.var_total1 += close
+            self.var_total2 += close * close
+            return _NAN, _NAN, _NAN
+        self.var_total1 += close
+        self.var_total2 += close * close
+        mean1 = self.var_total1 / period
+        mean2 = self.var_total2 / period
+        trailing = self.window[0]
+        self.var_total1 -= trailing
+        self.var_total2 -= trailing * trailing
+        variance = mean2 - mean1 * mean1
+        # TA_IS_ZERO_OR_NEG
+        stddev = math.sqrt(variance) if not variance < 0.00000001 else 0.0
+        deviation = stddev * self.nbdev
+        return middle + deviation, middle, middle - deviation
+
+
+class _Kernels:
+    """One bar in, one value per ``SERIES_NAMES`` out."""
+
+    __slots__ = ("kdj", "macd", "rsi", "bbands")
+
+    def __init__(self):
+        self.kdj = _Kdj(9, 3, 3)
+        self.macd = _Macd(12, 26, 9)
+        self.rsi = (_Rsi(6), _Rsi(12), _Rsi(24))
+        self.bbands = _Bbands()
+
+    def clone(self) -> "_Kernels":
+        other = _Kernels.__new__(_Kernels)
+        other.kdj = self.kdj.clone()
+        other.macd = self.macd.clone()
+        other.rsi = tuple(rsi.clone() for rsi in self.rsi)
+        other.bbands = self.bbands.clone()
+        return other
+
+    def seed(self, close: ndarray, high: ndarray, low: ndarray, last: Series) -> None:
+        """State after the last bar of ``close``; ``last`` holds that bar's outputs.
+
+        Needs at least ``SEED_MIN_BARS`` bars so every kernel is past its warm-up.
+        """
+        kdj_k, kdj_d, _, _, macd_dea, *_ = last
+        self.kdj.seed(high, low, float(kdj_k), float(kdj_d))
+        self.macd.seed(close, float(macd_dea))
+        for rsi in self.rsi:
+            rsi.seed(close)
+        self.bbands.seed(close)
+
+    def step(self, close: float, high: float, low: float) -> tuple[float, ...]:
+        return (
+            *self.kdj.step(close, high, low),
+            *self.macd.step(close),
+            *(rsi.step(close) for rsi in self.rsi),
+            *self.bbands.step(close),
+        )
+
+
+class _SymbolState:
+    """Kernels committed through bar ``count - 1``, with the inputs and outputs so far.
+
+    ``last`` keeps the last bar evaluated and the series returned for it: a seeded
+    rebuild returns the reference values, which a step from the seeded state only
+    matches to the last bits, so an unchanged repeat must not re-evaluate it.
+    """
+
+    __slots__ = ("count", "kernels", "inputs", "outputs", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.kernels = _Kernels()
+        self.inputs: tuple[ndarray, ...] = ()
+        self.outputs: list[ndarray] = [np.empty(0) for _ in SERIES_NAMES]
+        self.last: Optional[tuple[tuple, Series]] = None
+
+    @staticmethod
+    def _last_bar(inputs: tuple[ndarray, ...]) -> tuple:
+        return tuple(values[-1] for values in inputs)
+
+    def extends(self, inputs: tuple[ndarray, ...]) -> bool:
+        """True when the committed bars are an exact prefix of ``inputs``."""
+        length = len(inputs[0])
+        if self.count == 0 or length <= self.count:
+            return False
+        return all(
+            np.array_equal(stored, new[: self.count])
+            for stored, new in zip(self.inputs, inputs)
+        )
+
+    def seed(self, inputs: tuple[ndarray, ...], reference: Reference) -> Series:
+        """Take every output from one ``reference`` pass and commit its second-to-last bar."""
+        _, close, high, low = inputs
+        series = tuple(np.asarray(values, dtype=np.float64) for values in reference(close, high, low))
+        self.count = len(close) - 1
+        self.inputs = tuple(np.array(values[: self.count]) for values in inputs)
+        self.kernels.seed(
+            self.inputs[1],
+            self.inputs[2],
+            self.inputs[3],
+            tuple(values[self.count - 1] for values in series),
+        )
+        self.outputs = [values[: self.count].copy() for values in series]
+        self.last = (self._last_bar(inputs), tuple(values.copy() for values in series))
+        return series
+
+    def advance(self, inputs: tuple[ndarray, ...]) -> Series:
+        """Commit every bar but the last, then evaluate the last bar on a copy."""
+        _, close, high, low = inputs
+        length = len(close)
+        bar = self._last_bar(inputs)
+        if length == self.count + 1 and self.last is not None and self.last[0] == bar:
+            return tuple(values.copy() for values in self.last[1])
+        committed = [
+            self.kernels.step(float(close[i]), float(high[i]), float(low[i]))
+            for i in range(self.count, length - 1)
+        ]
+        tail = self.kernels.clone().step(
+            float(close[-1]), float(high[-1]), float(low[-1])
+        )
+        if committed:
+            columns = np.array(committed, dtype=np.float64).T
+            self.outputs = [
+                np.concatenate((previous, column))
+                for previous, column in zip(self.outputs, columns)
+            ]
+        self.count = length - 1
+        self.inputs = tuple(np.array(values[: self.count]) for values in inputs)
+        series = tuple(
+            np.append(previous, value) for previous, value in zip(self.outputs, tail)
+        )
+        self.last = (bar, tuple(values.copy() for values in series))
+        return series
+
+
+class IndicatorEngine:
+    """Per-symbol incremental indicators; a drop-in for the full recomputation."""
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = INDICATOR_INCREMENTAL_ENABLED,
+        verify: bool = INDICATOR_VERIFY,
+        max_entries: int = INDICATOR_STATE_MAX_ENTRIES,
+    ):
+        self.enabled = enabled
+        self.verify = verify
+        self.max_entries = max_entries
+        self._states: OrderedDict[tuple[str, int], _SymbolState] = OrderedDict()
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.rebuilds = 0
+        self.fallbacks = 0
+        self.mismatches = 0
+
+    def compute(
+        self,
+        symbol: str,
+        dates: ndarray,
+        close: ndarray,
+        high: ndarray,
+        low: ndarray,
+        reference: Reference,
+    ) -> Series:
+        """Return the ``SERIES_NAMES`` arrays for the series, as ``reference`` would."""
+        length = len(close)
+        if (
+            not self.enabled
+            or not symbol
+            or length == 0
+            or not len(dates) == len(high) == len(low) == length
+            or not (
+                np.isfinite(close).all()
+                and np.isfinite(high).all()
+                and np.isfinite(low).all()
+            )
+        ):
+            if self.enabled:
+                with self._lock:
+                    self.fallbacks += 1
+            return reference(close, high, low)
+
+        inputs = (np.asarray(dates), close, high, low)
+        key = (symbol, int(dates[0]))
+        # 取出即占有：同一键的并发计算各自持有一份状态，互不踩踏
+        with self._lock:
+            state = self._states.pop(key, None)
+        rebuilt = state is None or not state.extends(inputs)
+        # 播种时返回的就是参考实现的结果，无需再校验
+        seeded = rebuilt and length > SEED_MIN_BARS
+        if rebuilt:
+            state = _SymbolState()
+        series = state.seed(inputs, reference) if seeded else state.advance(inputs)
+        with self._lock:
+            if rebuilt:
+                self.rebuilds += 1
+            else:
+                self.updates += 1
+            self._states[key] = state
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+
+        if self.verify and not seeded:
+            expected = reference(close, high, low)
+            mismatched = [
+                name
+                for name, got, want in zip(SERIES_NAMES, series, expected)
+                if not np.allclose(
+                    got,
+                    np.asarray(want),
+                    rtol=VERIFY_TOLERANCE,
+                    atol=VERIFY_TOLERANCE,
+                    equal_nan=True,
+                )
+            ]
+            if mismatched:
+                with self._lock:
+                    self.mismatches += 1
+                    self._states.pop(key, None)
+                logger.warning(
+                    "Indicator engine mismatch symbol=%s bars=%s rebuilt=%s series=%s",
+                    symbol,
+                    length,
+                    rebuilt,
+                    ",".join(mismatched),
+                )
+                return tuple(expected)
+        return series
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+            self.updates = self.rebuilds = self.fallbacks = self.mismatches = 0
+
+
+_engine: Optional[IndicatorEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_indicator_engine() -> IndicatorEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = IndicatorEngine()
+    return _engine
+
+
+def set_indicator_engine(engine: Optional[IndicatorEngine]) -> None:
+    """Replace the process-wide engine. Tests use this; production does not."""
+    global _engine
+    with _engine_lock:
+        _engine = engine
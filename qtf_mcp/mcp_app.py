@@ -1,10 +1,15 @@
 import asyncio
+import contextlib
+import contextvars
 import datetime
+import functools
+import json
 import logging
 import time
 import uuid
+from collections import Counter, deque
 from io import StringIO
-from typing import Literal, Dict, List, Optional
+from typing import AsyncIterator, Awaitable, Callable, Literal, Dict, List, Optional, TypeVar, Union
 
 from pydantic import BaseModel, Field
 from mcp.server.fastmcp import Context, FastMCP
@@ -13,55 +18,280 @@ from starlette.middleware.cors import CORSMiddleware
 from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from . import research
-from .cache import build_key, get_report_cache, is_cacheable_report
+from .breadth_history import COUNT_FIELDS, get_breadth_sampler
+from .cache import SHANGHAI_TZ, build_key, get_report_cache, is_cacheable_report
 from .datasource import get_datasource
 from .datasource.base import FETCH_FAILURES_KEY, FetchRequirements
-from .datasource.market_breadth import get_market_breadth
-from .config import BATCH_QUERY_CONCURRENCY
-from .observability import bind_log_context, http_trace_id_var
+from .datasource.browser import get_browser_manager
+from .datasource.market_breadth import MARKET_BREADTH_RANGES, get_market_breadth
+from .indicators import get_indicator_engine
+from .report_doc import ReportDocument
+from .screener import get_feature_builder, screen_market
+from .config import (
+    BATCH_CLIENT_LIMITS,
+    BATCH_CLIENT_MAX_ACTIVE,
+    BATCH_CLIENT_WEIGHTS,
+    BATCH_QUERY_CONCURRENCY,
+    REQUEST_DEADLINE_SECONDS,
+    SYMBOL_QUERY_CONCURRENCY,
+    WATCHLIST_MAX_SYMBOLS,
+    WATCHLIST_SYMBOL_TIMEOUT_SECONDS,
+)
+from .observability import (
+    DeadlineExceeded,
+    RequestDeadline,
+    SharedDeadline,
+    bind_deadline,
+    bind_log_context,
+    check_deadline,
+    deadline_remaining,
+    deadline_var,
+    detached_context,
+    http_trace_id_var,
+    shed,
+)
+from .prewarm import PREWARM_HOST, get_prewarm_scheduler
+from .session_warmup import get_session_warmup
 
 logger = logging.getLogger("qtf_mcp")
 _active_report_requests = 0
 _BATCH_QUERY_ADMISSION_ATTR = "_cn_stock_batch_query_admission"
+_SYMBOL_QUERY_ADMISSION_ATTR = "_cn_stock_symbol_query_admission"
+_REPORT_REFRESH_ATTR = "_cn_stock_report_refreshes"
+_RENDER_INFLIGHT_ATTR = "_cn_stock_render_inflight"
+_T = TypeVar("_T")
+# brief/medium/full/tech 单次调用的标的上限；watchlist 按这个大小切批
+MAX_BATCH_SYMBOLS = 4
 
 
-class BatchQueryAdmission:
-    """Event-loop-owned admission control shared by all report modes."""
+class _ClientQueue:
+    __slots__ = ("waiters", "active", "credit")
 
-    def __init__(self, limit: int):
+    def __init__(self) -> None:
+        self.waiters: deque[asyncio.Future] = deque()
+        self.active = 0
+        self.credit = 0
+
+
+class BatchQueryAdmission:
+    """Event-loop-owned admission control shared by all report modes.
+
+    Waiters queue per client (the caller's host, "" when unknown). A freed slot
+    goes to the next waiting client in round-robin order that is under its cap,
+    and a client keeps the turn for up to its weight in consecutive grants. A
+    client alone takes every idle slot; once others queue, each gets its share
+    of the next grants no matter how many batches the first one has queued.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        *,
+        weights: Optional[Dict[str, int]] = None,
+        client_limit: int = 0,
+        client_limits: Optional[Dict[str, int]] = None,
+    ):
         self.limit = limit
         self.active = 0
         self.waiting = 0
-        self._semaphore = asyncio.Semaphore(limit)
+        self.weights = dict(weights or {})
+        self.client_limit = client_limit
+        self.client_limits = dict(client_limits or {})
+        self._clients: Dict[str, _ClientQueue] = {}
+        # 有等待者的客户端，按轮转顺序排列；队首即当前轮次
+        self._turns: deque[str] = deque()
 
-    async def acquire(self) -> float:
+    def _cap(self, client: str) -> int:
+        cap = self.client_limits.get(client, self.client_limit)
+        return min(cap, self.limit) if cap > 0 else self.limit
+
+    def _weight(self, client: str) -> int:
+        return max(1, self.weights.get(client, 1))
+
+    def _grant(self, state: _ClientQueue) -> None:
+        self.active += 1
+        state.active += 1
+
+    def _dispatch(self) -> None:
+        skipped = 0
+        while self.active < self.limit and self._turns and skipped < len(self._turns):
+            client = self._turns[0]
+            state = self._clients[client]
+            if state.active >= self._cap(client):
+                self._turns.rotate(-1)
+                skipped += 1
+                continue
+            future = state.waiters.popleft()
+            self.waiting -= 1
+            # 已被取消的等待者由 acquire 自己收尾，这里只丢弃
+            if not future.done():
+                self._grant(state)
+                future.set_result(None)
+                state.credit -= 1
+                skipped = 0
+            if not state.waiters:
+                self._turns.popleft()
+            elif state.credit <= 0:
+                state.credit = self._weight(client)
+                self._turns.rotate(-1)
+
+    def _forget(self, client: str) -> None:
+        state = self._clients.get(client)
+        if state is not None and not state.waiters and state.active <= 0:
+            del self._clients[client]
+
+    async def acquire(self, client: str = "") -> float:
         started_at = time.perf_counter()
+        state = self._clients.get(client)
+        if state is None:
+            state = self._clients[client] = _ClientQueue()
+        if not self._turns and self.active < self.limit and state.active < self._cap(client):
+            self._grant(state)
+            return time.perf_counter() - started_at
+
+        future = asyncio.get_running_loop().create_future()
+        state.waiters.append(future)
         self.waiting += 1
+        if client not in self._turns:
+            state.credit = self._weight(client)
+            self._turns.append(client)
+        self._dispatch()
         try:
-            await self._semaphore.acquire()
+            await future
         except BaseException:
-            self.waiting -= 1
+            if future.done() and not future.cancelled():
+                # 名额已分到，但调用方在恢复前被取消：归还给下一个客户端
+                self.release(client)
+            else:
+                if future in state.waiters:
+                    state.waiters.remove(future)
+                    self.waiting -= 1
+                if not state.waiters and client in self._turns:
+                    self._turns.remove(client)
+                self._forget(client)
             raise
-        self.waiting -= 1
-        self.active += 1
         return time.perf_counter() - started_at
 
-    def release(self) -> None:
+    def release(self, client: str = "") -> None:
         self.active -= 1
-        self._semaphore.release()
+        state = self._clients.get(client)
+        if state is not None:
+            state.active -= 1
+        self._dispatch()
+        self._forget(client)
+
+    def client_stats(self, client: str = "") -> tuple[int, int]:
+        """``(active, waiting)`` of one client, for the admission logs."""
+        state = self._clients.get(client)
+        return (state.active, len(state.waiters)) if state is not None else (0, 0)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-client slots held and queue depth."""
+        return {
+            client: {"active": state.active, "waiting": len(state.waiters)}
+            for client, state in self._clients.items()
+        }
 
 
-def _get_batch_query_admission() -> BatchQueryAdmission:
+def _loop_admission(attr: str, limit: int) -> BatchQueryAdmission:
     loop = asyncio.get_running_loop()
-    admission = getattr(loop, _BATCH_QUERY_ADMISSION_ATTR, None)
-    if admission is None or admission.limit != BATCH_QUERY_CONCURRENCY:
-        admission = BatchQueryAdmission(BATCH_QUERY_CONCURRENCY)
-        setattr(loop, _BATCH_QUERY_ADMISSION_ATTR, admission)
+    admission = getattr(loop, attr, None)
+    if admission is None or admission.limit != limit:
+        admission = BatchQueryAdmission(
+            limit,
+            weights=BATCH_CLIENT_WEIGHTS,
+            client_limit=BATCH_CLIENT_MAX_ACTIVE,
+            client_limits=BATCH_CLIENT_LIMITS,
+        )
+        setattr(loop, attr, admission)
     return admission
 
 
+def _get_batch_query_admission() -> BatchQueryAdmission:
+    """Slots held by ``brief/medium/full`` batches for their whole run."""
+    return _loop_admission(_BATCH_QUERY_ADMISSION_ATTR, BATCH_QUERY_CONCURRENCY)
+
+
+def _get_symbol_query_admission() -> BatchQueryAdmission:
+    """Slots for single-symbol misses of ``tech`` and the kline tools."""
+    return _loop_admission(_SYMBOL_QUERY_ADMISSION_ATTR, SYMBOL_QUERY_CONCURRENCY)
+
+
+async def _acquire_admission(admission: BatchQueryAdmission, client: str) -> float:
+    """Acquire a slot unless the request's deadline passes first.
+
+    Checked before queueing, bounded while queued, and checked again once
+    granted: work whose client is gone gives the slot straight back.
+    """
+    check_deadline("admission")
+    try:
+        queue_seconds = await asyncio.wait_for(admission.acquire(client), deadline_remaining())
+    except asyncio.TimeoutError:
+        raise shed("admission") from None
+    try:
+        check_deadline("admission")
+    except DeadlineExceeded:
+        admission.release(client)
+        raise
+    return queue_seconds
+
+
+@contextlib.asynccontextmanager
+async def _admitted(client: str, tool: str, symbol: str) -> AsyncIterator[None]:
+    """Hold one symbol-query slot around a single cache-miss render."""
+    admission = _get_symbol_query_admission()
+    queue_seconds = await _acquire_admission(admission, client)
+    if queue_seconds >= 0.001:
+        client_active, client_waiting = admission.client_stats(client)
+        browsers = get_browser_manager().stats()
+        logger.info(
+            "Admission queued tool=%s symbol=%s client=%s queue=%.3fs "
+            "active=%s waiting=%s client_active=%s client_waiting=%s "
+            "browser_leases=%s browser_rss_mb=%s",
+            tool,
+            symbol,
+            client or "-",
+            queue_seconds,
+            admission.active,
+            admission.waiting,
+            client_active,
+            client_waiting,
+            browsers["in_use"],
+            "-" if browsers["rss_mb"] is None else f"{browsers['rss_mb']:.0f}",
+        )
+    try:
+        yield
+    finally:
+        admission.release(client)
+
+
 # --- Output Models for MCP Inspector Schema ---
 
+class ReportItem(BaseModel):
+    """报表中的一条列表项"""
+    text: str = Field(..., description="展示文本（Markdown 中冒号之后的部分）")
+    label: Optional[str] = Field(None, description="条目名称，如 当日、20日均价")
+    values: Optional[Dict[str, Union[float, str, None]]] = Field(
+        None, description="展示文本背后的原始数值（金额为元，比例为小数）"
+    )
+
+
+class ReportTable(BaseModel):
+    """报表中的表格，单元格为原始值"""
+    columns: List[str] = Field(..., description="列名")
+    rows: List[List[Union[float, str, None]]] = Field(..., description="数据行")
+
+
+class ReportSection(BaseModel):
+    """结构化报表的一个章节，与 Markdown 的一个标题对应"""
+    title: str = Field(..., description="章节标题")
+    level: int = Field(..., description="标题级别：1 为 #，2 为 ##")
+    items: Optional[List[ReportItem]] = Field(None, description="列表项")
+    table: Optional[ReportTable] = Field(None, description="表格")
+    sections: Optional[List["ReportSection"]] = Field(None, description="子章节")
+    markdown: Optional[str] = Field(None, description="未结构化的 Markdown 片段")
+
+
 class BatchReportResponse(BaseModel):
     """批量报表响应模型"""
     symbols_count: int = Field(..., description="成功处理并返回报表的证券标的数量")
@@ -69,6 +299,25 @@ class BatchReportResponse(BaseModel):
     reports: Dict[str, str] = Field(..., description="成功生成的报表集合 (键为代码，值为 Markdown 文本)")
     errors: Dict[str, str] = Field(..., description="发生错误的标的信息 (键为代码，值为错误详情)")
     warnings: List[str] = Field(default_factory=list, description="非致命警告信息")
+    documents: Optional[Dict[str, List[ReportSection]]] = Field(
+        None, description="output=json 时的结构化报表 (键为代码)；此时 reports 只含出错标的"
+    )
+
+
+class WatchlistSummary(BaseModel):
+    """自选列表的汇总"""
+    requested: int = Field(..., description="去重并应用上限后的标的数量")
+    succeeded: int = Field(..., description="成功返回报表的标的数量（含缓存命中）")
+    cached: int = Field(..., description="直接命中报告缓存的标的数量")
+    failed: int = Field(..., description="出错的标的数量（不含超时与丢弃）")
+    timed_out: int = Field(..., description="超过单标的时限的标的数量")
+    shed: int = Field(0, description="请求过了截止时间、未执行即丢弃的标的数量")
+    elapsed_seconds: float = Field(..., description="总耗时（秒）")
+
+
+class WatchlistResponse(BatchReportResponse):
+    """自选列表响应：与批量报表相同的外壳，外加汇总"""
+    summary: WatchlistSummary = Field(..., description="按状态统计的汇总")
 
 
 class KDJIndicator(BaseModel):
@@ -118,12 +367,28 @@ class TechnicalIndicatorItem(BaseModel):
     bbands: Optional[BBandsIndicator] = Field(None, description="Bollinger Bands values")
 
 
+ColumnGroup = Dict[str, List[Optional[float]]]
+
+
+class TechnicalColumns(BaseModel):
+    """Technical indicators as parallel arrays aligned with ``dates`` (newest first)."""
+    dates: List[str] = Field(..., description="Trading dates in YYYY-MM-DD format, newest first")
+    ohlc: ColumnGroup = Field(..., description="open/close/high/low/volume arrays")
+    kdj: Optional[ColumnGroup] = Field(None, description="k/d/j arrays")
+    macd: Optional[ColumnGroup] = Field(None, description="dif/dea/histogram arrays")
+    rsi: Optional[ColumnGroup] = Field(None, description="rsi6/rsi12/rsi24 arrays")
+    bbands: Optional[ColumnGroup] = Field(None, description="upper/middle/lower arrays")
+
+
 class TechnicalReport(BaseModel):
     """Machine-readable technical indicator report for one symbol."""
     symbol: str = Field(..., description="Normalized stock symbol")
     name: str = Field("", description="Stock name")
     quote_date: Optional[str] = Field(None, description="Latest trading date in YYYY-MM-DD format")
     indicators: List[TechnicalIndicatorItem] = Field(default_factory=list, description="Recent technical indicators")
+    columns: Optional[TechnicalColumns] = Field(
+        None, description="Column layout of the indicators, set only when layout=columnar"
+    )
 
 
 class BatchTechnicalResponse(BaseModel):
@@ -155,6 +420,44 @@ class MarketBreadthResponse(BaseModel):
     distribution: List[MarketBreadthBucketResponse] = Field(..., description="Ten percentage-change ranges")
     warnings: List[str] = Field(default_factory=list, description="Fallback or partial-data warnings")
 
+
+class MarketBreadthHistoryResponse(BaseModel):
+    """One trading day of market-breadth samples as parallel arrays aligned with ``times``."""
+    trade_date: str = Field(..., description="Trading date in YYYY-MM-DD format")
+    samples: int = Field(..., description="Number of samples recorded for the day before downsampling")
+    times: List[str] = Field(..., description="Sample times (HH:MM:SS, Asia/Shanghai), oldest first")
+    up_count: List[int] = Field(..., description="Rising stocks per sample")
+    down_count: List[int] = Field(..., description="Falling stocks per sample")
+    flat_count: List[int] = Field(..., description="Unchanged stocks per sample")
+    limit_up_count: List[Optional[int]] = Field(..., description="Limit-up stocks per sample; null when unknown")
+    limit_down_count: List[Optional[int]] = Field(..., description="Limit-down stocks per sample; null when unknown")
+    distribution: Dict[str, List[int]] = Field(..., description="Counts per sample for each of the ten percentage-change ranges")
+    warnings: List[str] = Field(default_factory=list, description="Missing-data warnings")
+
+
+class ScreenRowResponse(BaseModel):
+    """One stock in a screen result."""
+    symbol: str = Field(..., description="Normalized symbol, e.g. SH600000")
+    name: str = Field(..., description="Stock name")
+    values: Dict[str, Optional[float]] = Field(..., description="Values of `fields`; null when unavailable")
+
+
+class ScreenResponse(BaseModel):
+    """Ranked, paginated result of a whole-market screen."""
+    expression: str = Field(..., description="Filter expression as evaluated")
+    sort: str = Field(..., description="Ranking field, prefixed with - for descending")
+    fetched_at: str = Field(..., description="Quote snapshot fetch time in Asia/Shanghai")
+    trade_date: Optional[str] = Field(None, description="Latest trading date of the snapshot")
+    total: int = Field(..., description="Number of stocks in the snapshot")
+    matched: int = Field(..., description="Number of stocks matching the expression")
+    offset: int = Field(..., description="Index of the first returned match")
+    limit: int = Field(..., description="Maximum number of returned rows")
+    feature_coverage: int = Field(..., description="Stocks with K-line/finance fields available")
+    features_building: bool = Field(False, description="True while this epoch's background K-line/finance load is still running; feature_coverage is partial until then")
+    fields: List[str] = Field(..., description="Fields included in each row")
+    rows: List[ScreenRowResponse] = Field(..., description="Matching stocks in rank order")
+    warnings: List[str] = Field(default_factory=list, description="Partial-data warnings")
+
 # -----------------------------------------------
 
 
@@ -167,6 +470,142 @@ def _new_trace_id(ctx: Context | None) -> str:
     return f"{mcp_request_id}-{uuid.uuid4().hex[:8]}"
 
 
+def _schedule_report_refresh(
+    cache_key,
+    mode: str,
+    symbol: str,
+    host: str,
+    date: Optional[str],
+    fund_flow_limit: int,
+    output_format: str = "markdown",
+) -> bool:
+    """Start one background re-render for a stale-served key; False if one is running.
+
+    The refresh is an ordinary single-symbol batch with stale serving disabled,
+    so it queues on the same admission as client work and stores through the
+    same cacheability checks.
+    """
+    loop = asyncio.get_running_loop()
+    refreshes = getattr(loop, _REPORT_REFRESH_ATTR, None)
+    if refreshes is None:
+        refreshes = {}
+        setattr(loop, _REPORT_REFRESH_ATTR, refreshes)
+    digest = cache_key.digest()
+    if digest in refreshes:
+        return False
+
+    task = loop.create_task(
+        fetch_batch_reports(
+            symbol,
+            mode,
+            host,
+            date,
+            fund_flow_limit=fund_flow_limit,
+            request_id=f"swr-{uuid.uuid4().hex[:8]}",
+            allow_stale=False,
+            output_format=output_format,
+        ),
+        # 刷新服务的是缓存，不随触发它的那次请求的截止时间丢弃
+        context=detached_context(),
+    )
+    refreshes[digest] = task
+
+    def _finished(done: asyncio.Task) -> None:
+        refreshes.pop(digest, None)
+        if done.cancelled():
+            return
+        error = done.exception()
+        if error is not None:
+            logger.warning(
+                "Report cache refresh failed tool=%s symbol=%s error=%s",
+                mode,
+                symbol,
+                error,
+            )
+
+    task.add_done_callback(_finished)
+    return True
+
+
+async def _coalesce_render(cache_key, fill: Callable[[], Awaitable[_T]]) -> _T:
+    """Run ``fill`` once per ``cache_key.digest()`` among concurrent misses.
+
+    The first caller starts ``fill`` as a task; callers arriving while it runs
+    await the same task and get the same rendered result. Like
+    ``realtime_ff.fetch_single_shared``, every caller awaits through
+    ``asyncio.shield``: a cancelled caller — leader included — only stops
+    waiting, and the render still completes for the others and for the cache.
+
+    The shared render runs under a ``SharedDeadline`` every caller joins: it is
+    dropped at its next admission point only once all of them are past their
+    deadline.
+
+    Only keys that could be cached are coalesced; with the cache disabled the
+    call path stays exactly as it was.
+    """
+    if cache_key is None or not get_report_cache().enabled:
+        return await fill()
+
+    loop = asyncio.get_running_loop()
+    inflight = getattr(loop, _RENDER_INFLIGHT_ATTR, None)
+    if inflight is None:
+        inflight = {}
+        setattr(loop, _RENDER_INFLIGHT_ATTR, inflight)
+    digest = cache_key.digest()
+    task, deadline = inflight.get(digest, (None, None))
+    role = "follower"
+    if task is None or task.done():
+        deadline = SharedDeadline(deadline_var.get())
+        context = contextvars.copy_context()
+        context.run(deadline_var.set, deadline)
+        task = loop.create_task(fill(), context=context)
+        inflight[digest] = (task, deadline)
+
+        def _finished(done: asyncio.Task, key: str = digest) -> None:
+            if inflight.get(key, (None,))[0] is done:
+                inflight.pop(key, None)
+            if not done.cancelled():
+                # 所有等待者都已取消时，避免 "exception was never retrieved"
+                done.exception()
+
+        task.add_done_callback(_finished)
+        role = "leader"
+    else:
+        deadline.join(deadline_var.get())
+
+    started_at = time.perf_counter()
+    result = await asyncio.shield(task)
+    if role == "follower":
+        logger.info(
+            "Report render coalesced tool=%s symbol=%s epoch=%s wait=%.3fs",
+            cache_key.tool,
+            cache_key.symbol,
+            cache_key.epoch,
+            time.perf_counter() - started_at,
+        )
+    return result
+
+
+def _collect(output: dict, symbol: str, report, error: Optional[str] = None) -> None:
+    """Place one symbol's result: structured successes go to ``documents``."""
+    if error is None and output.get("documents") is not None:
+        output["documents"][symbol] = report
+    else:
+        output["reports"][symbol] = report
+    if error is not None:
+        output["errors"][symbol] = error
+
+
+def _rendered_reports(output: dict) -> dict:
+    return {**output["reports"], **(output.get("documents") or {})}
+
+
+def _report_chars(report) -> int:
+    if isinstance(report, str):
+        return len(report)
+    return len(json.dumps(report, ensure_ascii=False))
+
+
 async def fetch_batch_reports(
     symbol_str: str,
     mode: str,
@@ -174,23 +613,51 @@ async def fetch_batch_reports(
     date: Optional[str] = None,
     fund_flow_limit: int = 15,
     request_id: str = "",
+    allow_stale: bool = True,
+    output_format: str = "markdown",
+    symbol_timeout: Optional[float] = None,
+    on_symbol: Optional[Callable[[str, str], Awaitable[None]]] = None,
 ) -> BatchReportResponse:
-    """批量获取并生成报告的核心驱动程序"""
+    """批量获取并生成报告的核心驱动程序
+
+    ``allow_stale`` 只在开启 SWR（``CN_STOCK_REPORT_CACHE_SWR_SECONDS``）时生效；
+    后台刷新自身以 False 调用，保证它一定重新渲染。
+
+    ``output_format="json"`` 时成功的报表以章节结构放进 ``documents``，与 Markdown
+    来自同一次渲染；缓存键带上 output，两种形态各自缓存。
+
+    ``symbol_timeout`` 是单个标的拿到准入之后的处理时限，超时的标的记为错误，
+    其余标的照常返回。``on_symbol(symbol, status)`` 在每个标的完成时调用，
+    status 为 cached/ok/error/timeout/shed，供 watchlist 逐个上报进度。
+
+    请求的截止时间（``deadline_var``）在准入与数据取数名额处检查：排队时已过期
+    的批次直接抛出 DeadlineExceeded，拿到准入后才过期的标的记为 shed。
+    """
     # 1. 预处理：分拆并限流（上限4个）
     raw_symbols = [s.strip().upper() for s in symbol_str.split(',') if s.strip()]
     warnings = []
-    if len(raw_symbols) > 4:
-        skipped_symbols = raw_symbols[4:]
+    if len(raw_symbols) > MAX_BATCH_SYMBOLS:
+        skipped_symbols = raw_symbols[MAX_BATCH_SYMBOLS:]
         warnings.append(
-            f"批量查询最多支持 4 个标的；本次仅处理前 4 个，超出的 {len(skipped_symbols)} 个标的不会返回结果："
+            f"批量查询最多支持 {MAX_BATCH_SYMBOLS} 个标的；本次仅处理前 {MAX_BATCH_SYMBOLS} 个，超出的 {len(skipped_symbols)} 个标的不会返回结果："
             f"{','.join(skipped_symbols)}"
         )
-        raw_symbols = raw_symbols[:4]
+        raw_symbols = raw_symbols[:MAX_BATCH_SYMBOLS]
     symbols_label = ",".join(raw_symbols)
     start_time = time.time()
     date_label = f", date={date}" if date else ""
     requirements = FetchRequirements()
     report_cache = get_report_cache()
+    structured = output_format == "json"
+    params = {"date": date, "fund_flow_limit": fund_flow_limit}
+    if structured:
+        # 只在 json 时加入，Markdown 的缓存键与预热记录保持不变
+        params["output"] = "json"
+    if host != PREWARM_HOST and allow_stale:
+        scheduler = get_prewarm_scheduler()
+        for symbol in raw_symbols:
+            scheduler.record(mode, symbol, params)
+    stale_ages: Dict[str, float] = {}
 
     def _probe_cache(symbol: str):
         """Return (cache_key, cached_report, started_at). Never raises.
@@ -199,14 +666,28 @@ async def fetch_batch_reports(
         """
         started_at = time.perf_counter()
         cache_key = None
+        stale_ages.pop(symbol, None)
         try:
-            cache_key = build_key(
-                mode,
-                symbol,
-                {"date": date, "fund_flow_limit": fund_flow_limit},
-                query_date=date,
-            )
+            cache_key = build_key(mode, symbol, params, query_date=date)
             cached_report = report_cache.get(cache_key)
+            if cached_report is None and allow_stale:
+                stale = report_cache.get_stale(cache_key)
+                if stale is not None:
+                    # SWR：先返回过期不久的盘中快照，只触发一次后台刷新
+                    cached_report, stale_ages[symbol] = stale
+                    scheduled = _schedule_report_refresh(
+                        cache_key, mode, symbol, host, date, fund_flow_limit, output_format
+                    )
+                    logger.info(
+                        "Report cache stale hit request_id=%s tool=%s symbol=%s "
+                        "epoch=%s age=%.1fs refresh=%s",
+                        request_id or "-",
+                        mode,
+                        symbol,
+                        cache_key.epoch,
+                        stale_ages[symbol],
+                        "scheduled" if scheduled else "running",
+                    )
         except Exception:
             logger.warning(
                 "Report cache lookup failed request_id=%s tool=%s symbol=%s",
@@ -218,6 +699,21 @@ async def fetch_batch_reports(
             cached_report = None
         return cache_key, cached_report, started_at
 
+    async def _notify(symbol: str, status: str) -> None:
+        if on_symbol is None:
+            return
+        try:
+            await on_symbol(symbol, status)
+        except Exception:
+            # 进度回调只是通知，失败不能影响报告本身
+            logger.debug("Symbol callback failed symbol=%s", symbol, exc_info=True)
+
+    def _stale_warnings() -> List[str]:
+        return [
+            f"{symbol} 返回的是 {age:.0f} 秒前的盘中缓存快照，后台正在刷新"
+            for symbol, age in stale_ages.items()
+        ]
+
     def _log_cache_hit(symbol: str, cache_key, cached_report, started_at) -> None:
         logger.info(
             "Report cache hit request_id=%s tool=%s symbol=%s "
@@ -228,7 +724,7 @@ async def fetch_batch_reports(
             cache_key.epoch,
             cache_key.phase,
             time.perf_counter() - started_at,
-            len(cached_report),
+            _report_chars(cached_report),
         )
 
     # 整批全命中的批次不做任何上游工作，让它去排 BATCH_QUERY_CONCURRENCY 的队会把
@@ -242,10 +738,14 @@ async def fetch_batch_reports(
         output = {
             "symbols_count": len(raw_symbols),
             "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "reports": {s: probe[1] for s, probe in probes},
+            "reports": {},
             "errors": {},
-            "warnings": warnings,
+            "warnings": warnings + _stale_warnings(),
+            "documents": {} if structured else None,
         }
+        for symbol, (_, cached_report, _) in probes:
+            _collect(output, symbol, cached_report)
+            await _notify(symbol, "cached")
         with bind_log_context(request_id=request_id or "-", tool=mode):
             for symbol, (cache_key, cached_report, started_at) in probes:
                 # 与未命中路径保持同样的关联字段，便于按 symbol 过滤日志
@@ -259,37 +759,45 @@ async def fetch_batch_reports(
                 symbols_label,
                 date_label,
                 time.time() - start_time,
-                len(output["reports"]),
-                sum(len(r) for r in output["reports"].values()),
+                len(_rendered_reports(output)),
+                sum(_report_chars(r) for r in _rendered_reports(output).values()),
             )
         return BatchReportResponse(**output)
 
     admission = _get_batch_query_admission()
     waiting_before = admission.waiting
     active_before = admission.active
+    client_label = host or "-"
     if active_before >= admission.limit:
+        client_active, client_waiting = admission.client_stats(host)
         logger.info(
-            "Batch query queued request_id=%s tool=%s symbols=%s "
-            "active=%s waiting=%s limit=%s",
+            "Batch query queued request_id=%s tool=%s symbols=%s client=%s "
+            "active=%s waiting=%s limit=%s client_active=%s client_waiting=%s",
             request_id or "-",
             mode,
             symbols_label,
+            client_label,
             active_before,
             waiting_before + 1,
             admission.limit,
+            client_active,
+            client_waiting + 1,
         )
-    queue_seconds = await admission.acquire()
+    with bind_log_context(request_id=request_id or "-", tool=mode, symbol=symbols_label):
+        queue_seconds = await _acquire_admission(admission, host)
     service_started_at = time.perf_counter()
     logger.info(
-        "Batch query admitted request_id=%s tool=%s symbols=%s "
-        "queue=%.3fs active=%s waiting=%s limit=%s",
+        "Batch query admitted request_id=%s tool=%s symbols=%s client=%s "
+        "queue=%.3fs active=%s waiting=%s limit=%s client_waiting=%s",
         request_id or "-",
         mode,
         symbols_label,
+        client_label,
         queue_seconds,
         admission.active,
         admission.waiting,
         admission.limit,
+        admission.client_stats(host)[1],
     )
 
     global _active_report_requests
@@ -315,9 +823,113 @@ async def fetch_batch_reports(
         "reports": {},
         "errors": {},
         "warnings": warnings,
+        "documents": {} if structured else None,
     }
     # 响应外壳的 timestamp 始终重新生成，只有 reports 走缓存
 
+    async def render_item(symbol: str, cache_key, symbol_started_at: float):
+        """Render one symbol and return ``(report, error)``; error is None on success."""
+        # 实时资金流抓取与基础行情并行，避免浏览器排队叠加在数据拉取之后
+        prefetch = research.start_realtime_fund_flow_prefetch(symbol, date)
+        try:
+            # 并行拉取基础行情
+            raw_started_at = time.perf_counter()
+            raw_data = await research.load_raw_data(
+                symbol,
+                date,
+                host,
+                requirements=requirements,
+            )
+            raw_elapsed = time.perf_counter() - raw_started_at
+            if not raw_data:
+                err_msg = f"未找到证券代码 {symbol} 的相关行情数据。"
+                return f"Error: {err_msg}", err_msg
+
+            render_started_at = time.perf_counter()
+            buf = ReportDocument()
+            # 根据模式按需构建
+            research.build_basic_data(buf, symbol, raw_data)
+            if mode == "full":
+                await research.build_trading_data(
+                    buf,
+                    symbol,
+                    raw_data,
+                    include_historical_fund_flow=True,
+                    historical_fund_flow_limit=fund_flow_limit,
+                    realtime_fund_flow=prefetch,
+                )
+            else:
+                await research.build_trading_data(
+                    buf,
+                    symbol,
+                    raw_data,
+                    realtime_fund_flow=prefetch,
+                )
+
+            if mode in ["medium", "full"]:
+                research.build_financial_data(buf, symbol, raw_data)
+            if mode == "full":
+                research.build_technical_data(buf, symbol, raw_data)
+
+            markdown = buf.to_markdown()
+            report = buf.to_json() if structured else markdown
+            fetch_failures = tuple(raw_data.get(FETCH_FAILURES_KEY, ()))
+            if (
+                cache_key is not None
+                and not fetch_failures
+                and is_cacheable_report(markdown)
+            ):
+                report_cache.put(cache_key, report)
+            elif fetch_failures:
+                logger.info(
+                    "Report cache skipped request_id=%s tool=%s symbol=%s "
+                    "incomplete_sources=%s",
+                    request_id or "-",
+                    mode,
+                    symbol,
+                    ",".join(fetch_failures),
+                )
+            logger.info(
+                "Finished symbol request_id=%s tool=%s symbol=%s "
+                "raw_data=%.3fs render=%.3fs total=%.3fs chars=%s",
+                request_id or "-",
+                mode,
+                symbol,
+                raw_elapsed,
+                time.perf_counter() - render_started_at,
+                time.perf_counter() - symbol_started_at,
+                len(markdown),
+            )
+            return report, None
+        except DeadlineExceeded:
+            # 丢弃不是错误：已在准入点计数并记录，交给 process_item 单独统计
+            raise
+        except Exception as e:
+            err_msg = str(e)
+            logger.warning(
+                "Failed symbol request_id=%s tool=%s symbol=%s elapsed=%.3fs error=%s",
+                request_id or "-",
+                mode,
+                symbol,
+                time.perf_counter() - symbol_started_at,
+                err_msg,
+            )
+            return f"Error during processing: {err_msg}", err_msg
+        finally:
+            if prefetch is not None:
+                prefetch.discard()
+
+    async def fill_item(symbol: str, cache_key, symbol_started_at: float):
+        # 多进程共享缓存时同一键只由一个 worker 渲染：其余 worker 在租约上等待，
+        # 拿到后重新探测，通常直接命中持有者刚写入的条目。
+        async with report_cache.fill_lease(cache_key) as leased:
+            if leased:
+                cache_key, cached_report, probe_started_at = _probe_cache(symbol)
+                if cached_report is not None:
+                    _log_cache_hit(symbol, cache_key, cached_report, probe_started_at)
+                    return cached_report, None
+            return await render_item(symbol, cache_key, symbol_started_at)
+
     async def process_item(symbol: str):
         with bind_log_context(request_id=request_id or "-", tool=mode, symbol=symbol):
             symbol_started_at = time.perf_counter()
@@ -325,127 +937,77 @@ async def fetch_batch_reports(
             # 否则盘中条目会带着排队时长一起变旧。命中不得再付出一次 Chromium 抓取。
             cache_key, cached_report, probe_started_at = _probe_cache(symbol)
             if cached_report is not None:
-                output["reports"][symbol] = cached_report
+                _collect(output, symbol, cached_report)
                 _log_cache_hit(symbol, cache_key, cached_report, probe_started_at)
+                await _notify(symbol, "cached")
                 return
 
-            # 实时资金流抓取与基础行情并行，避免浏览器排队叠加在数据拉取之后
-            prefetch = research.start_realtime_fund_flow_prefetch(symbol, date)
+            # 同一键的并发未命中只渲染一次，其余请求等待同一份结果。
+            # 超时只放弃等待：开启缓存时渲染在 shield 之后继续，结果照常写入缓存。
+            status = "ok"
             try:
-                # 并行拉取基础行情
-                raw_started_at = time.perf_counter()
-                raw_data = await research.load_raw_data(
-                    symbol,
-                    date,
-                    host,
-                    requirements=requirements,
-                )
-                raw_elapsed = time.perf_counter() - raw_started_at
-                if not raw_data:
-                    err_msg = f"未找到证券代码 {symbol} 的相关行情数据。"
-                    output["errors"][symbol] = err_msg
-                    output["reports"][symbol] = f"Error: {err_msg}"
-                    return
-
-                render_started_at = time.perf_counter()
-                buf = StringIO()
-                # 根据模式按需构建
-                research.build_basic_data(buf, symbol, raw_data)
-                if mode == "full":
-                    await research.build_trading_data(
-                        buf,
-                        symbol,
-                        raw_data,
-                        include_historical_fund_flow=True,
-                        historical_fund_flow_limit=fund_flow_limit,
-                        realtime_fund_flow=prefetch,
-                    )
-                else:
-                    await research.build_trading_data(
-                        buf,
-                        symbol,
-                        raw_data,
-                        realtime_fund_flow=prefetch,
-                    )
-
-                if mode in ["medium", "full"]:
-                    research.build_financial_data(buf, symbol, raw_data)
-                if mode == "full":
-                    research.build_technical_data(buf, symbol, raw_data)
-
-                output["reports"][symbol] = buf.getvalue()
-                fetch_failures = tuple(raw_data.get(FETCH_FAILURES_KEY, ()))
-                if (
-                    cache_key is not None
-                    and not fetch_failures
-                    and is_cacheable_report(output["reports"][symbol])
-                ):
-                    report_cache.put(cache_key, output["reports"][symbol])
-                elif fetch_failures:
-                    logger.info(
-                        "Report cache skipped request_id=%s tool=%s symbol=%s "
-                        "incomplete_sources=%s",
-                        request_id or "-",
-                        mode,
-                        symbol,
-                        ",".join(fetch_failures),
-                    )
-                logger.info(
-                    "Finished symbol request_id=%s tool=%s symbol=%s "
-                    "raw_data=%.3fs render=%.3fs total=%.3fs chars=%s",
-                    request_id or "-",
-                    mode,
-                    symbol,
-                    raw_elapsed,
-                    time.perf_counter() - render_started_at,
-                    time.perf_counter() - symbol_started_at,
-                    len(output["reports"][symbol]),
+                report, error = await asyncio.wait_for(
+                    _coalesce_render(
+                        cache_key,
+                        functools.partial(fill_item, symbol, cache_key, symbol_started_at),
+                    ),
+                    symbol_timeout,
                 )
-            except Exception as e:
-                err_msg = str(e)
-                output["errors"][symbol] = err_msg
-                output["reports"][symbol] = f"Error during processing: {err_msg}"
+            except asyncio.TimeoutError:
+                error = f"处理超时（超过 {symbol_timeout:g} 秒）"
+                report, status = f"Error: {error}", "timeout"
                 logger.warning(
-                    "Failed symbol request_id=%s tool=%s symbol=%s elapsed=%.3fs error=%s",
+                    "Symbol timed out request_id=%s tool=%s symbol=%s timeout=%.1fs",
                     request_id or "-",
                     mode,
                     symbol,
-                    time.perf_counter() - symbol_started_at,
-                    err_msg,
+                    symbol_timeout,
                 )
-            finally:
-                if prefetch is not None:
-                    prefetch.discard()
+            except DeadlineExceeded as e:
+                error = str(e)
+                report, status = f"Error: {error}", "shed"
+                shed_symbols.append(symbol)
+            else:
+                if error is not None:
+                    status = "error"
+            _collect(output, symbol, report, error)
+            await _notify(symbol, status)
+
+    shed_symbols: List[str] = []
 
     # 并发执行所有标的的任务
     try:
         with bind_log_context(request_id=request_id or "-", tool=mode):
             await asyncio.gather(*[process_item(s) for s in raw_symbols])
+        output["warnings"] = warnings + _stale_warnings()
         return BatchReportResponse(**output)
     finally:
         elapsed = time.time() - start_time
         _active_report_requests -= 1
-        response_chars = sum(len(report) for report in output["reports"].values())
+        rendered = _rendered_reports(output)
+        response_chars = sum(_report_chars(report) for report in rendered.values())
         logger.info(
             "Finished %s query request_id=%s symbols=%s%s cost=%.2fs "
-            "active=%s reports=%s errors=%s response_chars=%s",
+            "active=%s reports=%s errors=%s shed=%s response_chars=%s",
             mode,
             request_id or "-",
             symbols_label,
             date_label,
             elapsed,
             _active_report_requests,
-            len(output["reports"]),
-            len(output["errors"]),
+            len(rendered),
+            len(output["errors"]) - len(shed_symbols),
+            len(shed_symbols),
             response_chars,
         )
-        admission.release()
+        admission.release(host)
         logger.info(
-            "Batch query released request_id=%s tool=%s symbols=%s "
+            "Batch query released request_id=%s tool=%s symbols=%s client=%s "
             "queue=%.3fs service=%.3fs total=%.3fs active=%s waiting=%s limit=%s",
             request_id or "-",
             mode,
             symbols_label,
+            client_label,
             queue_seconds,
             time.perf_counter() - service_started_at,
             time.time() - start_time,
@@ -462,22 +1024,41 @@ async def fetch_technical_reports(
     include_derived: bool = True,
     date: Optional[str] = None,
     host: str = "",
+    layout: str = "rows",
 ) -> BatchTechnicalResponse:
-    """Fetch machine-readable technical indicator reports."""
+    """Fetch machine-readable technical indicator reports.
+
+    ``layout="columnar"`` fills ``TechnicalReport.columns`` instead of ``indicators``.
+    """
+    columnar = layout == "columnar"
     raw_symbols = [s.strip().upper() for s in symbol_str.split(',') if s.strip()]
     warnings = []
-    if len(raw_symbols) > 4:
-        skipped_symbols = raw_symbols[4:]
+    if len(raw_symbols) > MAX_BATCH_SYMBOLS:
+        skipped_symbols = raw_symbols[MAX_BATCH_SYMBOLS:]
         warnings.append(
-            f"批量查询最多支持 4 个标的；本次仅处理前 4 个，超出的 {len(skipped_symbols)} 个标的不会返回结果："
+            f"批量查询最多支持 {MAX_BATCH_SYMBOLS} 个标的；本次仅处理前 {MAX_BATCH_SYMBOLS} 个，超出的 {len(skipped_symbols)} 个标的不会返回结果："
             f"{','.join(skipped_symbols)}"
         )
-        raw_symbols = raw_symbols[:4]
+        raw_symbols = raw_symbols[:MAX_BATCH_SYMBOLS]
 
     symbols_label = ",".join(raw_symbols)
     start_time = time.time()
     date_label = f", date={date}" if date else ""
     logger.info("Starting tech query: %s%s", symbols_label, date_label)
+    if host != PREWARM_HOST:
+        scheduler = get_prewarm_scheduler()
+        for symbol in raw_symbols:
+            scheduler.record(
+                "tech",
+                symbol,
+                {
+                    "days": days,
+                    "fields": fields,
+                    "include_derived": include_derived,
+                    "date": date,
+                    "layout": layout,
+                },
+            )
 
     output = {
         "symbols_count": len(raw_symbols),
@@ -488,6 +1069,97 @@ async def fetch_technical_reports(
     }
     report_cache = get_report_cache()
 
+    def cache_hit(symbol: str, cache_key, cached, started_at: float):
+        report = TechnicalReport(**cached)
+        logger.info(
+            "Report cache hit tool=tech symbol=%s epoch=%s phase=%s "
+            "elapsed=%.3fs indicators=%s",
+            symbol,
+            cache_key.epoch,
+            cache_key.phase,
+            time.perf_counter() - started_at,
+            len(report.columns.dates) if report.columns else len(report.indicators),
+        )
+        return (report.symbol, report), None
+
+    async def render_item(symbol: str, cache_key):
+        raw_data = await research.load_raw_data(
+            symbol,
+            date,
+            host,
+            requirements=FetchRequirements.technical(),
+        )
+        if not raw_data:
+            return None, (
+                symbol,
+                f"未找到证券代码 {symbol} 的相关行情数据。",
+            )
+
+        report_symbol = str(raw_data.get("SYMBOL", symbol))
+        series = None
+        if "CLOSE" in raw_data and "DATE" in raw_data and len(raw_data["CLOSE"]):
+            # 在工作线程里逐标的计算，不占事件循环
+            close = raw_data["CLOSE"]
+            series = await asyncio.to_thread(
+                get_indicator_engine().compute,
+                report_symbol,
+                raw_data["DATE"],
+                close,
+                raw_data.get("HIGH", close),
+                raw_data.get("LOW", close),
+                research.compute_indicator_series,
+            )
+        build = (
+            research.get_technical_indicator_columns
+            if columnar
+            else research.get_technical_indicators
+        )
+        indicators = build(
+            raw_data,
+            days=days,
+            fields=fields,
+            include_derived=include_derived,
+            series=series,
+        )
+        if not indicators:
+            return None, (
+                report_symbol,
+                f"未找到证券代码 {report_symbol} 的技术指标数据。",
+            )
+
+        if columnar:
+            report = TechnicalReport(
+                symbol=report_symbol,
+                name=str(raw_data.get("NAME", "")),
+                quote_date=indicators["dates"][0],
+                columns=indicators,
+            )
+        else:
+            report = TechnicalReport(
+                symbol=report_symbol,
+                name=str(raw_data.get("NAME", "")),
+                quote_date=indicators[0]["date"],
+                indicators=indicators,
+            )
+        fetch_failures = tuple(raw_data.get(FETCH_FAILURES_KEY, ()))
+        if not fetch_failures:
+            report_cache.put(cache_key, report.model_dump(mode="json"))
+        else:
+            logger.info(
+                "Report cache skipped tool=tech symbol=%s incomplete_sources=%s",
+                symbol,
+                ",".join(fetch_failures),
+            )
+        return (report_symbol, report), None
+
+    async def fill_item(symbol: str, cache_key, started_at: float):
+        async with report_cache.get_or_lease(cache_key) as cached:
+            if cached is not None:
+                return cache_hit(symbol, cache_key, cached, started_at)
+            # 只有真正回源的渲染占用准入名额；合并等待方不占，避免互相等待
+            async with _admitted(host, "tech", symbol):
+                return await render_item(symbol, cache_key)
+
     async def process_item(symbol: str):
         symbol_started_at = time.perf_counter()
         try:
@@ -499,6 +1171,7 @@ async def fetch_technical_reports(
                     "fields": fields,
                     "include_derived": include_derived,
                     "date": date,
+                    "layout": layout,
                 },
                 query_date=date,
             )
@@ -506,59 +1179,11 @@ async def fetch_technical_reports(
             # 不能让整批 gather 失败。
             cached = report_cache.get(cache_key)
             if cached is not None:
-                report = TechnicalReport(**cached)
-                logger.info(
-                    "Report cache hit tool=tech symbol=%s epoch=%s phase=%s "
-                    "elapsed=%.3fs indicators=%s",
-                    symbol,
-                    cache_key.epoch,
-                    cache_key.phase,
-                    time.perf_counter() - symbol_started_at,
-                    len(report.indicators),
-                )
-                return (report.symbol, report), None
-
-            raw_data = await research.load_raw_data(
-                symbol,
-                date,
-                host,
-                requirements=FetchRequirements.technical(),
-            )
-            if not raw_data:
-                return None, (
-                    symbol,
-                    f"未找到证券代码 {symbol} 的相关行情数据。",
-                )
-
-            report_symbol = str(raw_data.get("SYMBOL", symbol))
-            indicators = research.get_technical_indicators(
-                raw_data,
-                days=days,
-                fields=fields,
-                include_derived=include_derived,
-            )
-            if not indicators:
-                return None, (
-                    report_symbol,
-                    f"未找到证券代码 {report_symbol} 的技术指标数据。",
-                )
-
-            report = TechnicalReport(
-                symbol=report_symbol,
-                name=str(raw_data.get("NAME", "")),
-                quote_date=indicators[0]["date"] if indicators else None,
-                indicators=indicators,
+                return cache_hit(symbol, cache_key, cached, symbol_started_at)
+            return await _coalesce_render(
+                cache_key,
+                functools.partial(fill_item, symbol, cache_key, symbol_started_at),
             )
-            fetch_failures = tuple(raw_data.get(FETCH_FAILURES_KEY, ()))
-            if not fetch_failures:
-                report_cache.put(cache_key, report.model_dump(mode="json"))
-            else:
-                logger.info(
-                    "Report cache skipped tool=tech symbol=%s incomplete_sources=%s",
-                    symbol,
-                    ",".join(fetch_failures),
-                )
-            return (report_symbol, report), None
         except Exception as e:
             return None, (symbol, str(e))
 
@@ -576,8 +1201,172 @@ async def fetch_technical_reports(
     return BatchTechnicalResponse(**output)
 
 
+async def fetch_watchlist(
+    symbol_str: str,
+    mode: str = "brief",
+    host: str = "",
+    date: Optional[str] = None,
+    fund_flow_limit: int = 15,
+    output_format: str = "markdown",
+    symbol_timeout: Optional[float] = None,
+    request_id: str = "",
+    progress: Optional[Callable[[int, int, str], Awaitable[None]]] = None,
+) -> WatchlistResponse:
+    """长列表报告：按 4 个一批交给 fetch_batch_reports，逐个标的上报进度。
+
+    同时在途的批次不超过 ``BATCH_QUERY_CONCURRENCY``：每个批次照常排准入、
+    走缓存与合并渲染，整批命中的批次不占准入。一次只放这么多批次进队列，
+    其他客户端的请求仍能插在中间，而不是排在几十个批次之后。
+    ``progress(done, total, message)`` 在每个标的完成时调用。
+    """
+    symbols = list(dict.fromkeys(
+        s.strip().upper() for s in symbol_str.split(",") if s.strip()
+    ))
+    warnings: List[str] = []
+    if len(symbols) > WATCHLIST_MAX_SYMBOLS:
+        skipped_symbols = symbols[WATCHLIST_MAX_SYMBOLS:]
+        warnings.append(
+            f"自选列表最多支持 {WATCHLIST_MAX_SYMBOLS} 个标的；超出的 {len(skipped_symbols)} 个标的不会返回结果："
+            f"{','.join(skipped_symbols)}"
+        )
+        symbols = symbols[:WATCHLIST_MAX_SYMBOLS]
+    if symbol_timeout is None:
+        symbol_timeout = WATCHLIST_SYMBOL_TIMEOUT_SECONDS
+    timeout = symbol_timeout if symbol_timeout > 0 else None
+
+    start_time = time.time()
+    structured = output_format == "json"
+    output = {
+        "symbols_count": len(symbols),
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "reports": {},
+        "errors": {},
+        "warnings": warnings,
+        "documents": {} if structured else None,
+    }
+    statuses: Dict[str, str] = {}
+
+    async def on_symbol(symbol: str, status: str) -> None:
+        statuses[symbol] = status
+        if progress is None:
+            return
+        try:
+            await progress(len(statuses), len(symbols), f"{symbol} {status}")
+        except Exception:
+            # 客户端已断开或不支持进度通知时，结果仍在最终响应里
+            logger.debug("Watchlist progress failed symbol=%s", symbol, exc_info=True)
+
+    chunks = iter([
+        symbols[i:i + MAX_BATCH_SYMBOLS] for i in range(0, len(symbols), MAX_BATCH_SYMBOLS)
+    ])
+    logger.info(
+        "Starting watchlist request_id=%s tool=%s symbols=%s batches=%s timeout=%s",
+        request_id or "-",
+        mode,
+        len(symbols),
+        -(-len(symbols) // MAX_BATCH_SYMBOLS),
+        timeout,
+    )
+
+    async def worker(index: int) -> None:
+        for chunk in chunks:
+            try:
+                response = await fetch_batch_reports(
+                    ",".join(chunk),
+                    mode,
+                    host,
+                    date,
+                    fund_flow_limit=fund_flow_limit,
+                    request_id=f"{request_id or 'watchlist'}-{index}",
+                    output_format=output_format,
+                    symbol_timeout=timeout,
+                    on_symbol=on_symbol,
+                )
+            except Exception as e:
+                status = "shed" if isinstance(e, DeadlineExceeded) else "error"
+                for symbol in chunk:
+                    if symbol not in statuses:
+                        _collect(output, symbol, f"Error during processing: {e}", str(e))
+                        await on_symbol(symbol, status)
+                continue
+            output["reports"].update(response.reports)
+            output["errors"].update(response.errors)
+            if structured:
+                output["documents"].update(response.documents or {})
+            warnings.extend(response.warnings)
+
+    try:
+        await asyncio.gather(*[
+            worker(i) for i in range(min(BATCH_QUERY_CONCURRENCY, len(symbols)))
+        ])
+    finally:
+        counts = Counter(statuses.values())
+        logger.info(
+            "Finished watchlist request_id=%s tool=%s symbols=%s cost=%.2fs statuses=%s",
+            request_id or "-",
+            mode,
+            len(symbols),
+            time.time() - start_time,
+            dict(counts),
+        )
+
+    # 结果按输入顺序排列，而不是完成顺序
+    for field in ("reports", "errors", "documents"):
+        if output[field] is not None:
+            output[field] = {s: output[field][s] for s in symbols if s in output[field]}
+    output["summary"] = WatchlistSummary(
+        requested=len(symbols),
+        succeeded=counts.get("ok", 0) + counts.get("cached", 0),
+        cached=counts.get("cached", 0),
+        failed=counts.get("error", 0),
+        timed_out=counts.get("timeout", 0),
+        shed=counts.get("shed", 0),
+        elapsed_seconds=round(time.time() - start_time, 3),
+    )
+    return WatchlistResponse(**output)
+
+
+async def _warm_report(mode: str, symbol: str, params: dict) -> BatchReportResponse:
+    return await fetch_batch_reports(
+        symbol,
+        mode,
+        PREWARM_HOST,
+        params.get("date"),
+        fund_flow_limit=params.get("fund_flow_limit", 15),
+        request_id=f"prewarm-{uuid.uuid4().hex[:8]}",
+        output_format=params.get("output", "markdown"),
+    )
+
+
+async def _warm_tech(symbol: str, params: dict) -> BatchTechnicalResponse:
+    return await fetch_technical_reports(symbol, host=PREWARM_HOST, **params)
+
+
+for _mode in ("brief", "medium", "full"):
+    get_prewarm_scheduler().register(_mode, functools.partial(_warm_report, _mode))
+get_prewarm_scheduler().register("tech", _warm_tech)
+get_feature_builder().register(research.record_screen_features)
+
+
+def _header_deadline(scope: Scope) -> Optional[float]:
+  """Seconds from the ``X-Request-Timeout`` header, None when absent or invalid."""
+  for name, value in scope.get("headers") or ():
+    if name.lower() == b"x-request-timeout":
+      try:
+        seconds = float(value.decode("latin-1"))
+      except ValueError:
+        return None
+      return seconds if seconds > 0 else None
+  return None
+
+
 class RequestLifecycleLogMiddleware:
-  """Log HTTP completion and disconnects around Streamable HTTP requests."""
+  """Log HTTP completion and disconnects around Streamable HTTP requests.
+
+  Each request also gets a ``RequestDeadline`` (``X-Request-Timeout`` when
+  sent); a disconnect before the response finished expires it, so work the
+  request still has queued is dropped at its next admission point.
+  """
 
   def __init__(self, app: ASGIApp):
     self.app = app
@@ -594,6 +1383,7 @@ class RequestLifecycleLogMiddleware:
     response_finished = False
     status_code = 0
     response_bytes = 0
+    deadline = RequestDeadline(_header_deadline(scope))
 
     async def receive_with_disconnect_log() -> Message:
       nonlocal disconnected
@@ -601,6 +1391,7 @@ class RequestLifecycleLogMiddleware:
       if message["type"] == "http.disconnect" and not disconnected:
         disconnected = True
         if not response_finished:
+          deadline.expire("client_disconnected")
           # GET 是 Streamable HTTP 的 SSE 通道：它的响应永远不会正常结束，
           # 客户端断开就是其正常终结方式。若一律告警，每个正常的客户端生命
           # 周期都会产生一条 WARNING，真正被放弃的 POST 请求反而被淹没。
@@ -632,8 +1423,12 @@ class RequestLifecycleLogMiddleware:
 
     outcome = "success"
     try:
-      with bind_log_context(http_trace_id=http_trace_id):
-        await self.app(scope, receive_with_disconnect_log, send_with_metrics)
+      token = deadline_var.set(deadline)
+      try:
+        with bind_log_context(http_trace_id=http_trace_id):
+          await self.app(scope, receive_with_disconnect_log, send_with_metrics)
+      finally:
+        deadline_var.reset(token)
       if disconnected and not response_finished:
         outcome = "client_disconnected"
     except BaseException:
@@ -657,12 +1452,28 @@ class RequestLifecycleLogMiddleware:
       )
 
 
+def start_background_schedulers() -> None:
+  """Start the loop-owned schedulers that must not wait for the first request."""
+  # 夜间重启的服务在开盘前未必有请求；等首个请求才启动就错过了预热
+  get_session_warmup().ensure_running()
+  get_breadth_sampler().ensure_running()
+
+
 class QtfMCP(FastMCP):
 
   def streamable_http_app(self) -> Starlette:
     super_app = super().streamable_http_app()
     super_app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
     super_app.add_middleware(RequestLifecycleLogMiddleware)
+    session_lifespan = super_app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+      start_background_schedulers()
+      async with session_lifespan(app):
+        yield
+
+    super_app.router.lifespan_context = lifespan
     return super_app
 
 # Create an MCP server
@@ -678,6 +1489,8 @@ async def brief(
   symbol: str,
   date: Optional[str] = None,
   fund_flow_limit: Optional[int] = None,
+  output: Literal["markdown", "json"] = "markdown",
+  deadline: Optional[float] = None,
   ctx: Context = None,
 ) -> BatchReportResponse:  # type: ignore
   """Get brief information and fund flow for input stock symbol(s) (Batch Supported).
@@ -689,18 +1502,24 @@ async def brief(
     symbol (str): Stock symbol or comma-separated list (up to 4), e.g., "SZ300308,SH000001"
     date (str, optional): Query cutoff date in YYYY-MM-DD format. Defaults to latest available trading day.
     fund_flow_limit (int, optional): Ignored; only the full tool uses this parameter.
+    output (str): "markdown" (default) returns Markdown text in `reports`; "json" returns the same
+      report as typed sections in `documents` (items with raw values, tables with raw cells).
+    deadline (float, optional): Seconds the caller will wait for this call; work still queued
+      past it is dropped. Defaults to the X-Request-Timeout header, else CN_STOCK_REQUEST_DEADLINE_SECONDS.
 
   Returns:
     A BatchReportResponse object containing multiple reports or errors.
   """
   who = ctx.request_context.request.client.host if ctx else ""  # type: ignore
-  return await fetch_batch_reports(
-    symbol,
-    "brief",
-    who,
-    date,
-    request_id=_new_trace_id(ctx),
-  )
+  with bind_deadline(deadline, default=REQUEST_DEADLINE_SECONDS):
+    return await fetch_batch_reports(
+      symbol,
+      "brief",
+      who,
+      date,
+      request_id=_new_trace_id(ctx),
+      output_format=output,
+    )
 
 
 @mcp_app.tool()
@@ -708,6 +1527,8 @@ async def medium(
   symbol: str,
   date: Optional[str] = None,
   fund_flow_limit: Optional[int] = None,
+  output: Literal["markdown", "json"] = "markdown",
+  deadline: Optional[float] = None,
   ctx: Context = None,
 ) -> BatchReportResponse:  # type: ignore
   """Get medium information for input stock symbol(s) (Batch Supported).
@@ -720,18 +1541,24 @@ async def medium(
     symbol (str): Stock symbol or comma-separated list (up to 4), e.g., "SZ300308,SH000001"
     date (str, optional): Query cutoff date in YYYY-MM-DD format. Defaults to latest available trading day.
     fund_flow_limit (int, optional): Ignored; only the full tool uses this parameter.
+    output (str): "markdown" (default) returns Markdown text in `reports`; "json" returns the same
+      report as typed sections in `documents` (items with raw values, tables with raw cells).
+    deadline (float, optional): Seconds the caller will wait for this call; work still queued
+      past it is dropped. Defaults to the X-Request-Timeout header, else CN_STOCK_REQUEST_DEADLINE_SECONDS.
 
   Returns:
     A BatchReportResponse object containing multiple reports or errors.
   """
   who = ctx.request_context.request.client.host if ctx else ""  # type: ignore
-  return await fetch_batch_reports(
-    symbol,
-    "medium",
-    who,
-    date,
-    request_id=_new_trace_id(ctx),
-  )
+  with bind_deadline(deadline, default=REQUEST_DEADLINE_SECONDS):
+    return await fetch_batch_reports(
+      symbol,
+      "medium",
+      who,
+      date,
+      request_id=_new_trace_id(ctx),
+      output_format=output,
+    )
 
 
 @mcp_app.tool()
@@ -739,6 +1566,8 @@ async def full(
   symbol: str,
   date: Optional[str] = None,
   fund_flow_limit: int = 15,
+  output: Literal["markdown", "json"] = "markdown",
+  deadline: Optional[float] = None,
   ctx: Context = None,
 ) -> BatchReportResponse:  # type: ignore
   """Get full information for input stock symbol(s) (Batch Supported).
@@ -752,19 +1581,75 @@ async def full(
     symbol (str): Stock symbol or comma-separated list (up to 4), e.g., "SZ300308,SH000001"
     date (str, optional): Query cutoff date in YYYY-MM-DD format. Defaults to latest available trading day.
     fund_flow_limit (int, optional): Number of historical fund-flow rows to show. Defaults to 15.
+    output (str): "markdown" (default) returns Markdown text in `reports`; "json" returns the same
+      report as typed sections in `documents` (items with raw values, tables with raw cells).
+    deadline (float, optional): Seconds the caller will wait for this call; work still queued
+      past it is dropped. Defaults to the X-Request-Timeout header, else CN_STOCK_REQUEST_DEADLINE_SECONDS.
 
   Returns:
     A BatchReportResponse object containing multiple reports or errors.
   """
   who = ctx.request_context.request.client.host if ctx else ""  # type: ignore
-  return await fetch_batch_reports(
-    symbol,
-    "full",
-    who,
-    date,
-    fund_flow_limit=fund_flow_limit,
-    request_id=_new_trace_id(ctx),
-  )
+  with bind_deadline(deadline, default=REQUEST_DEADLINE_SECONDS):
+    return await fetch_batch_reports(
+      symbol,
+      "full",
+      who,
+      date,
+      fund_flow_limit=fund_flow_limit,
+      request_id=_new_trace_id(ctx),
+      output_format=output,
+    )
+
+
+@mcp_app.tool()
+async def watchlist(
+  symbol: str,
+  mode: Literal["brief", "medium", "full"] = "brief",
+  date: Optional[str] = None,
+  fund_flow_limit: int = 15,
+  output: Literal["markdown", "json"] = "markdown",
+  symbol_timeout: Optional[float] = None,
+  deadline: Optional[float] = None,
+  ctx: Context = None,
+) -> WatchlistResponse:  # type: ignore
+  """Get brief/medium/full reports for a long watchlist in one call.
+  Symbols are processed in batches of 4 through the same admission and cache as the
+  report tools; each finished symbol is announced as an MCP progress notification.
+
+  Args:
+    symbol (str): Comma-separated stock symbols (up to CN_STOCK_WATCHLIST_MAX_SYMBOLS, default 300).
+    mode (str): Report content per symbol: "brief" (default), "medium" or "full".
+    date (str, optional): Query cutoff date in YYYY-MM-DD format. Defaults to latest available trading day.
+    fund_flow_limit (int, optional): Historical fund-flow rows in full mode. Defaults to 15.
+    output (str): "markdown" (default) or "json", as in the report tools.
+    symbol_timeout (float, optional): Per-symbol deadline in seconds, counted from batch admission.
+      Defaults to CN_STOCK_WATCHLIST_SYMBOL_TIMEOUT_SECONDS; 0 disables it.
+    deadline (float, optional): Seconds the caller will wait for the whole list; batches still
+      queued past it are dropped. Defaults to the X-Request-Timeout header, else no deadline.
+
+  Returns:
+    A WatchlistResponse: the batch report envelope plus a per-status summary.
+  """
+  who = ctx.request_context.request.client.host if ctx else ""  # type: ignore
+
+  async def progress(done: int, total: int, message: str) -> None:
+    if ctx is not None:
+      await ctx.report_progress(done, total, message)
+
+  # 长列表靠进度通知维持连接，不套用服务端默认截止时间
+  with bind_deadline(deadline):
+    return await fetch_watchlist(
+      symbol,
+      mode,
+      who,
+      date,
+      fund_flow_limit=fund_flow_limit,
+      output_format=output,
+      symbol_timeout=symbol_timeout,
+      request_id=_new_trace_id(ctx),
+      progress=progress,
+    )
 
 
 @mcp_app.tool()
@@ -774,6 +1659,8 @@ async def tech(
   fields: str = "all",
   include_derived: bool = True,
   date: Optional[str] = None,
+  layout: Literal["rows", "columnar"] = "rows",
+  deadline: Optional[float] = None,
   ctx: Context = None,  # type: ignore
 ) -> BatchTechnicalResponse:
   """Get machine-readable technical indicators for input stock symbol(s).
@@ -785,12 +1672,17 @@ async def tech(
     fields (str): Indicator groups to include: all, or comma-separated values from macd,kdj,rsi,bbands.
     include_derived (bool): Include macd.histogram = dif - dea when true.
     date (str, optional): Query cutoff date in YYYY-MM-DD format. Defaults to latest available trading day.
+    layout (str): "rows" (default) returns one object per day in `indicators`; "columnar" returns
+      `columns` with one `dates` array plus one array per value, cheaper for large `days`.
+    deadline (float, optional): Seconds the caller will wait for this call; work still queued
+      past it is dropped. Defaults to the X-Request-Timeout header, else CN_STOCK_REQUEST_DEADLINE_SECONDS.
 
   Returns:
     A BatchTechnicalResponse object containing JSON technical reports or errors.
   """
   who = ctx.request_context.request.client.host if ctx else ""  # type: ignore
-  return await fetch_technical_reports(symbol, days, fields, include_derived, date, who)
+  with bind_deadline(deadline, default=REQUEST_DEADLINE_SECONDS):
+    return await fetch_technical_reports(symbol, days, fields, include_derived, date, who, layout)
 
 
 @mcp_app.tool()
@@ -798,6 +1690,7 @@ async def kline_daily(
   symbol: str,
   date: str,
   adjust: Literal["qfq", "hfq", "none"] = "qfq",
+  deadline: Optional[float] = None,
   ctx: Context = None,  # type: ignore
 ) -> str:
   """获取指定日期的股票日K线数据
@@ -811,10 +1704,13 @@ async def kline_daily(
                 Query date in format "YYYY-MM-DD".
     adjust (str): 复权类型。"qfq"=前复权(默认), "hfq"=后复权, "none"=不复权。
                   Adjustment type: "qfq"=forward adjust(default), "hfq"=backward adjust, "none"=no adjust.
+    deadline (float, optional): 调用方愿意等待的秒数，过时仍在排队的取数会被丢弃。
+                  Defaults to the X-Request-Timeout header, else CN_STOCK_REQUEST_DEADLINE_SECONDS.
   
   Returns:
     该日期的K线数据，包含开盘价、收盘价、最高价、最低价、成交量、成交额等。
   """
+  who = ctx.request_context.request.client.host if ctx else ""  # type: ignore
   datasource = get_datasource()
   report_cache = get_report_cache()
   started_at = time.perf_counter()
@@ -824,61 +1720,69 @@ async def kline_daily(
     {"date": date, "adjust": adjust},
     query_date=date,
   )
-  cached = report_cache.get(cache_key)
-  if cached is not None:
-    logger.info(
-      "Report cache hit tool=kline_daily symbol=%s epoch=%s phase=%s "
-      "elapsed=%.3fs chars=%s",
-      symbol,
-      cache_key.epoch,
-      cache_key.phase,
-      time.perf_counter() - started_at,
-      len(cached),
-    )
-    return cached
 
-  result = await datasource.fetch_kline_simple(symbol, date, date, adjust)
+  async def fill():
+    # 共享缓存后端下，未命中的调用持有填充租约直到写入，其他 worker 等待后直接命中
+    async with report_cache.get_or_lease(cache_key) as cached:
+      if cached is not None:
+        logger.info(
+          "Report cache hit tool=kline_daily symbol=%s epoch=%s phase=%s "
+          "elapsed=%.3fs chars=%s",
+          symbol,
+          cache_key.epoch,
+          cache_key.phase,
+          time.perf_counter() - started_at,
+          len(cached),
+        )
+        return cached
+
+      async with _admitted(who, "kline_daily", symbol):
+        result = await datasource.fetch_kline_simple(symbol, date, date, adjust)
 
-  if result is None or not result.get("data"):
-    logger.info(
-      "Finished kline_daily symbol=%s date=%s adjust=%s cache=miss "
-      "elapsed=%.3fs outcome=empty",
-      symbol,
-      date,
-      adjust,
-      time.perf_counter() - started_at,
-    )
-    return f"未找到 {symbol} 在 {date} 的数据。可能是非交易日或股票代码有误。"
+      if result is None or not result.get("data"):
+        logger.info(
+          "Finished kline_daily symbol=%s date=%s adjust=%s cache=miss "
+          "elapsed=%.3fs outcome=empty",
+          symbol,
+          date,
+          adjust,
+          time.perf_counter() - started_at,
+        )
+        return f"未找到 {symbol} 在 {date} 的数据。可能是非交易日或股票代码有误。"
   
-  data = result["data"][0]
-  adjust_name = {"qfq": "前复权", "hfq": "后复权", "none": "不复权"}.get(adjust, adjust)
+      data = result["data"][0]
+      adjust_name = {"qfq": "前复权", "hfq": "后复权", "none": "不复权"}.get(adjust, adjust)
   
-  buf = StringIO()
-  print(f"# {symbol} {date} 日K线数据 ({adjust_name})", file=buf)
-  print("", file=buf)
-  print(f"- 开盘价: {data['开盘']:.2f}", file=buf)
-  print(f"- 收盘价: {data['收盘']:.2f}", file=buf)
-  print(f"- 最高价: {data['最高']:.2f}", file=buf)
-  print(f"- 最低价: {data['最低']:.2f}", file=buf)
-  print(f"- 成交量: {data['成交量']:,}", file=buf)
-  print(f"- 成交额: {data['成交额']:,.2f}", file=buf)
-  print(f"- 涨跌幅: {data['涨跌幅']:.2f}%", file=buf)
-  print(f"- 涨跌额: {data['涨跌额']:.2f}", file=buf)
-  print(f"- 振幅: {data['振幅']:.2f}%", file=buf)
-  print(f"- 换手率: {data['换手率']:.2f}%", file=buf)
-
-  report = buf.getvalue()
-  report_cache.put(cache_key, report)
-  logger.info(
-    "Finished kline_daily symbol=%s date=%s adjust=%s cache=miss "
-    "elapsed=%.3fs chars=%s",
-    symbol,
-    date,
-    adjust,
-    time.perf_counter() - started_at,
-    len(report),
-  )
-  return report
+      buf = StringIO()
+      print(f"# {symbol} {date} 日K线数据 ({adjust_name})", file=buf)
+      print("", file=buf)
+      print(f"- 开盘价: {data['开盘']:.2f}", file=buf)
+      print(f"- 收盘价: {data['收盘']:.2f}", file=buf)
+      print(f"- 最高价: {data['最高']:.2f}", file=buf)
+      print(f"- 最低价: {data['最低']:.2f}", file=buf)
+      print(f"- 成交量: {data['成交量']:,}", file=buf)
+      print(f"- 成交额: {data['成交额']:,.2f}", file=buf)
+      print(f"- 涨跌幅: {data['涨跌幅']:.2f}%", file=buf)
+      print(f"- 涨跌额: {data['涨跌额']:.2f}", file=buf)
+      print(f"- 振幅: {data['振幅']:.2f}%", file=buf)
+      print(f"- 换手率: {data['换手率']:.2f}%", file=buf)
+
+      report = buf.getvalue()
+      report_cache.put(cache_key, report)
+      logger.info(
+        "Finished kline_daily symbol=%s date=%s adjust=%s cache=miss "
+        "elapsed=%.3fs chars=%s",
+        symbol,
+        date,
+        adjust,
+        time.perf_counter() - started_at,
+        len(report),
+      )
+      return report
+
+  # 同一键的并发未命中只取数渲染一次，其余调用等待同一份结果
+  with bind_deadline(deadline, default=REQUEST_DEADLINE_SECONDS):
+    return await _coalesce_render(cache_key, fill)
 
 
 @mcp_app.tool()
@@ -887,6 +1791,7 @@ async def kline_range(
   start_date: str,
   end_date: str,
   adjust: Literal["qfq", "hfq", "none"] = "qfq",
+  deadline: Optional[float] = None,
   ctx: Context = None,  # type: ignore
 ) -> str:
   """获取指定日期区间的股票日K线数据
@@ -902,10 +1807,13 @@ async def kline_range(
                     End date in format "YYYY-MM-DD".
     adjust (str): 复权类型。"qfq"=前复权(默认), "hfq"=后复权, "none"=不复权。
                   Adjustment type: "qfq"=forward adjust(default), "hfq"=backward adjust, "none"=no adjust.
+    deadline (float, optional): 调用方愿意等待的秒数，过时仍在排队的取数会被丢弃。
+                  Defaults to the X-Request-Timeout header, else CN_STOCK_REQUEST_DEADLINE_SECONDS.
   
   Returns:
     日期区间内的K线数据表格，包含每日的开高低收、成交量、涨跌幅等。
   """
+  who = ctx.request_context.request.client.host if ctx else ""  # type: ignore
   datasource = get_datasource()
   report_cache = get_report_cache()
   started_at = time.perf_counter()
@@ -915,69 +1823,77 @@ async def kline_range(
     {"start_date": start_date, "end_date": end_date, "adjust": adjust},
     query_date=end_date,
   )
-  cached = report_cache.get(cache_key)
-  if cached is not None:
-    logger.info(
-      "Report cache hit tool=kline_range symbol=%s epoch=%s phase=%s "
-      "elapsed=%.3fs chars=%s",
-      symbol,
-      cache_key.epoch,
-      cache_key.phase,
-      time.perf_counter() - started_at,
-      len(cached),
-    )
-    return cached
 
-  result = await datasource.fetch_kline_simple(symbol, start_date, end_date, adjust)
+  async def fill():
+    # 共享缓存后端下，未命中的调用持有填充租约直到写入，其他 worker 等待后直接命中
+    async with report_cache.get_or_lease(cache_key) as cached:
+      if cached is not None:
+        logger.info(
+          "Report cache hit tool=kline_range symbol=%s epoch=%s phase=%s "
+          "elapsed=%.3fs chars=%s",
+          symbol,
+          cache_key.epoch,
+          cache_key.phase,
+          time.perf_counter() - started_at,
+          len(cached),
+        )
+        return cached
 
-  if result is None or not result.get("data"):
-    logger.info(
-      "Finished kline_range symbol=%s range=%s~%s adjust=%s cache=miss "
-      "elapsed=%.3fs outcome=empty",
-      symbol,
-      start_date,
-      end_date,
-      adjust,
-      time.perf_counter() - started_at,
-    )
-    return f"未找到 {symbol} 在 {start_date} 至 {end_date} 期间的数据。"
+      async with _admitted(who, "kline_range", symbol):
+        result = await datasource.fetch_kline_simple(symbol, start_date, end_date, adjust)
+
+      if result is None or not result.get("data"):
+        logger.info(
+          "Finished kline_range symbol=%s range=%s~%s adjust=%s cache=miss "
+          "elapsed=%.3fs outcome=empty",
+          symbol,
+          start_date,
+          end_date,
+          adjust,
+          time.perf_counter() - started_at,
+        )
+        return f"未找到 {symbol} 在 {start_date} 至 {end_date} 期间的数据。"
   
-  data_list = result["data"]
-  adjust_name = {"qfq": "前复权", "hfq": "后复权", "none": "不复权"}.get(adjust, adjust)
+      data_list = result["data"]
+      adjust_name = {"qfq": "前复权", "hfq": "后复权", "none": "不复权"}.get(adjust, adjust)
   
-  buf = StringIO()
-  print(f"# {symbol} K线数据 ({start_date} 至 {end_date}, {adjust_name})", file=buf)
-  print("", file=buf)
-  print(f"共 {len(data_list)} 个交易日", file=buf)
-  print("", file=buf)
+      buf = StringIO()
+      print(f"# {symbol} K线数据 ({start_date} 至 {end_date}, {adjust_name})", file=buf)
+      print("", file=buf)
+      print(f"共 {len(data_list)} 个交易日", file=buf)
+      print("", file=buf)
   
-  # 表格头
-  print("| 日期 | 开盘 | 收盘 | 最高 | 最低 | 成交量 | 涨跌幅 |", file=buf)
-  print("| --- | ---: | ---: | ---: | ---: | ---: | ---: |", file=buf)
+      # 表格头
+      print("| 日期 | 开盘 | 收盘 | 最高 | 最低 | 成交量 | 涨跌幅 |", file=buf)
+      print("| --- | ---: | ---: | ---: | ---: | ---: | ---: |", file=buf)
   
-  # 表格内容
-  for item in data_list:
-    print(
-      f"| {item['日期']} | {item['开盘']:.2f} | {item['收盘']:.2f} | "
-      f"{item['最高']:.2f} | {item['最低']:.2f} | {item['成交量']:,} | "
-      f"{item['涨跌幅']:.2f}% |",
-      file=buf
-    )
+      # 表格内容
+      for item in data_list:
+        print(
+          f"| {item['日期']} | {item['开盘']:.2f} | {item['收盘']:.2f} | "
+          f"{item['最高']:.2f} | {item['最低']:.2f} | {item['成交量']:,} | "
+          f"{item['涨跌幅']:.2f}% |",
+          file=buf
+        )
 
-  report = buf.getvalue()
-  report_cache.put(cache_key, report)
-  logger.info(
-    "Finished kline_range symbol=%s range=%s~%s adjust=%s cache=miss "
-    "elapsed=%.3fs rows=%s chars=%s",
-    symbol,
-    start_date,
-    end_date,
-    adjust,
-    time.perf_counter() - started_at,
-    len(data_list),
-    len(report),
-  )
-  return report
+      report = buf.getvalue()
+      report_cache.put(cache_key, report)
+      logger.info(
+        "Finished kline_range symbol=%s range=%s~%s adjust=%s cache=miss "
+        "elapsed=%.3fs rows=%s chars=%s",
+        symbol,
+        start_date,
+        end_date,
+        adjust,
+        time.perf_counter() - started_at,
+        len(data_list),
+        len(report),
+      )
+      return report
+
+  # 同一键的并发未命中只取数渲染一次，其余调用等待同一份结果
+  with bind_deadline(deadline, default=REQUEST_DEADLINE_SECONDS):
+    return await _coalesce_render(cache_key, fill)
 
 
 @mcp_app.tool()
@@ -1008,3 +1924,128 @@ async def market_breadth(ctx: Context = None) -> MarketBreadthResponse:  # type:
     ],
     warnings=list(data.warnings),
   )
+
+
+@mcp_app.tool()
+async def market_breadth_history(
+  date: str = "",
+  points: int = 60,
+  ctx: Context = None,
+) -> MarketBreadthHistoryResponse:  # type: ignore
+  """获取某个交易日盘中的全市场涨跌分布变化，不访问上游。
+
+  Get how whole-market breadth evolved through one trading day, from samples
+  the server recorded while the market was live. Makes no upstream calls.
+
+  Args:
+    date (str): Trading date "YYYY-MM-DD". Empty means today (the latest recorded day).
+    points (int): Maximum number of samples returned, evenly spaced and always
+      including the first and last. 0 returns every sample. Default 60.
+
+  Returns:
+    A MarketBreadthHistoryResponse with one array per count, aligned with times.
+  """
+  trade_date = date.strip() or None
+  if trade_date is not None:
+    try:
+      trade_date = datetime.date.fromisoformat(trade_date).isoformat()
+    except ValueError:
+      raise ValueError(f"date 应为 YYYY-MM-DD 格式: {date}") from None
+  series = get_breadth_sampler().history(trade_date)
+  if series is None:
+    return MarketBreadthHistoryResponse(
+      trade_date=trade_date or datetime.datetime.now(SHANGHAI_TZ).date().isoformat(),
+      samples=0,
+      times=[],
+      up_count=[],
+      down_count=[],
+      flat_count=[],
+      limit_up_count=[],
+      limit_down_count=[],
+      distribution={label: [] for label in MARKET_BREADTH_RANGES},
+      warnings=["该交易日没有涨跌分布采样"],
+    )
+  total = len(series)
+  series = series.downsample(max(0, points))
+  counts = series.counts.tolist()
+  columns = {field: [row[i] for row in counts] for i, field in enumerate(COUNT_FIELDS)}
+  for field in ("limit_up_count", "limit_down_count"):
+    columns[field] = [None if value < 0 else value for value in columns[field]]
+  return MarketBreadthHistoryResponse(
+    trade_date=series.trade_date,
+    samples=total,
+    times=[
+      datetime.datetime.fromtimestamp(value, SHANGHAI_TZ).strftime("%H:%M:%S")
+      for value in series.times.tolist()
+    ],
+    distribution={
+      label: [row[len(COUNT_FIELDS) + i] for row in counts]
+      for i, label in enumerate(MARKET_BREADTH_RANGES)
+    },
+    **columns,
+  )
+
+
+@mcp_app.tool()
+async def screen(
+  expression: str = "",
+  sort: str = "-amount",
+  limit: int = 50,
+  offset: int = 0,
+  deadline: Optional[float] = None,
+  ctx: Context = None,
+) -> ScreenResponse:  # type: ignore
+  """全 A 股条件选股：对全市场行情快照按表达式筛选、排序并分页。
+
+  Screen every A-share with one filter expression, then rank and paginate.
+
+  Args:
+    expression (str): Comparisons over fields joined by and/or/not, e.g.
+      "pe > 0 and pe < 15 and turnover20 > 5" or "close > ma60 and ret20 > 10".
+      Empty matches every stock.
+      Quote fields (all stocks): close, change_pct, change, open, high, low, prev_close,
+      turnover, volume_ratio, pe, volume, amount, mcap, fmcap.
+      K-line/finance fields (loaded for every stock in the background once per market
+      epoch; partial while features_building, see feature_coverage):
+      ma5, ma20, ma60, ret5, ret20, ret60, turnover5, turnover20, roe, pb.
+      Percentages are in percent (turnover20 > 5 means 5%); amount and mcap are in yuan.
+    sort (str): Ranking field, "-" prefix for descending. Default "-amount".
+    limit (int): Rows per page, 1-200. Default 50.
+    offset (int): Number of matches to skip. Default 0.
+    deadline (float, optional): Seconds the caller will wait for this call; work still queued
+      past it is dropped. Defaults to the X-Request-Timeout header, else CN_STOCK_REQUEST_DEADLINE_SECONDS.
+
+  Returns:
+    A ScreenResponse with the match count and one page of ranked rows.
+  """
+  started_at = time.perf_counter()
+  with bind_deadline(deadline, default=REQUEST_DEADLINE_SECONDS):
+    result = await screen_market(expression, sort, offset, limit)
+  logger.info(
+    "Finished screen expression=%r sort=%s matched=%s/%s coverage=%s building=%s elapsed=%.3fs",
+    expression,
+    sort,
+    result.matched,
+    result.total,
+    result.feature_coverage,
+    result.features_building,
+    time.perf_counter() - started_at,
+  )
+  return ScreenResponse(
+    expression=expression,
+    sort=sort,
+    fetched_at=result.fetched_at,
+    trade_date=result.trade_date,
+    total=result.total,
+    matched=result.matched,
+    offset=offset,
+    limit=limit,
+    feature_coverage=result.feature_coverage,
+    features_building=result.features_building,
+    fields=list(result.fields),
+    rows=[
+      ScreenRowResponse(symbol=row.symbol, name=row.name, values=row.values)
+      for row in result.rows
+    ],
+    warnings=list(result.warnings),
+  )
@@ -1,8 +1,14 @@
 """Lightweight request context shared by MCP, datasource, and browser logs."""
 
+import logging
+import math
+import time
+from collections import Counter
 from contextlib import contextmanager
-from contextvars import ContextVar
-from typing import Iterator
+from contextvars import Context, ContextVar, copy_context
+from typing import Iterator, Optional
+
+logger = logging.getLogger("qtf_mcp")
 
 
 request_id_var: ContextVar[str] = ContextVar("qtf_mcp_request_id", default="-")
@@ -39,3 +45,147 @@ def bind_log_context(
 def log_context() -> tuple[str, str, str]:
     """Return request_id, tool, and symbol for the current task."""
     return request_id_var.get(), tool_var.get(), symbol_var.get()
+
+
+class DeadlineExceeded(RuntimeError):
+    """Work dropped at an admission point because its request can no longer use it."""
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"请求已过截止时间，未执行（stage={stage} reason={reason}）")
+        self.stage = stage
+        self.reason = reason
+
+
+class RequestDeadline:
+    """End-to-end deadline of one request, on the monotonic clock.
+
+    A child narrows its parent: it expires at the earlier of the two, and
+    when the parent is expired early (``expire("client_disconnected")``).
+    """
+
+    def __init__(self, seconds: Optional[float] = None, *, parent: Optional["RequestDeadline"] = None):
+        self.expires_at = time.monotonic() + seconds if seconds and seconds > 0 else math.inf
+        self.parent = parent
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+        self.reason: Optional[str] = None
+
+    def expire(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+
+    def expired_reason(self) -> Optional[str]:
+        if self.reason is not None:
+            return self.reason
+        if self.parent is not None and self.parent.expired_reason() is not None:
+            return self.parent.expired_reason()
+        if time.monotonic() >= self.expires_at:
+            return "deadline"
+        return None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when unbounded."""
+        if math.isinf(self.expires_at):
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+class SharedDeadline:
+    """Deadline of work shared by several requests (a coalesced render).
+
+    It expires only once every joined request has; a request without a
+    deadline keeps the work alive for good.
+    """
+
+    def __init__(self, first: Optional[RequestDeadline]):
+        self.members: list[RequestDeadline] = []
+        self.unbounded = False
+        self.join(first)
+
+    def join(self, deadline: Optional[RequestDeadline]) -> None:
+        if deadline is None:
+            self.unbounded = True
+        elif deadline not in self.members:
+            self.members.append(deadline)
+
+    def expired_reason(self) -> Optional[str]:
+        if self.unbounded:
+            return None
+        reasons = [member.expired_reason() for member in self.members]
+        if all(reasons):
+            return reasons[0]
+        return None
+
+    def remaining(self) -> Optional[float]:
+        if self.unbounded:
+            return None
+        remaining = [member.remaining() for member in self.members]
+        if any(value is None for value in remaining):
+            return None
+        return max(remaining)
+
+
+deadline_var: ContextVar[Optional[RequestDeadline | SharedDeadline]] = ContextVar(
+    "qtf_mcp_deadline", default=None
+)
+# 按准入点统计的丢弃次数；与错误分开计数
+shed_counts: Counter = Counter()
+
+
+@contextmanager
+def bind_deadline(seconds: Optional[float] = None, *, default: float = 0) -> Iterator[None]:
+    """Bind a tool call's deadline under the request's (header) deadline.
+
+    ``seconds`` is the tool argument; ``default`` applies when neither it nor
+    a request header set one. Both only narrow a header deadline.
+    """
+    parent = deadline_var.get()
+    if seconds is not None and seconds <= 0:
+        seconds = None
+    if seconds is None and (parent is None or parent.remaining() is None):
+        seconds = default
+    if not isinstance(parent, RequestDeadline):
+        parent = None
+    token = deadline_var.set(RequestDeadline(seconds, parent=parent))
+    try:
+        yield
+    finally:
+        deadline_var.reset(token)
+
+
+def deadline_remaining() -> Optional[float]:
+    """Seconds left for the current request, or None when unbounded."""
+    deadline = deadline_var.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def shed(stage: str, reason: str = "deadline") -> DeadlineExceeded:
+    """Count and log one dropped unit of work; return the exception to raise."""
+    shed_counts[stage] += 1
+    logger.warning(
+        "Request shed request_id=%s tool=%s symbol=%s stage=%s reason=%s shed_total=%s",
+        request_id_var.get(),
+        tool_var.get(),
+        symbol_var.get(),
+        stage,
+        reason,
+        sum(shed_counts.values()),
+    )
+    return DeadlineExceeded(stage, reason)
+
+
+def check_deadline(stage: str) -> None:
+    """Raise DeadlineExceeded when the current request's deadline has passed."""
+    deadline = deadline_var.get()
+    if deadline is None:
+        return
+    reason = deadline.expired_reason()
+    if reason is not None:
+        raise shed(stage, reason)
+
+
+def detached_context() -> Context:
+    """Context for background work that must outlive the request (no deadline)."""
+    context = copy_context()
+    context.run(deadline_var.set, None)
+    return context
@@ -0,0 +1,238 @@
+"""Epoch-boundary pre-warm for the report cache.
+
+When the epoch flips into a full-reuse phase — ``postclose`` at ``SETTLE`` or
+``closed`` at ``EVENING_SETTLE`` — every cached report becomes unreachable and
+the first callers of each popular key all miss together. The scheduler keeps a
+decaying request count per ``(tool, symbol, params)`` and, right after each of
+those boundaries, re-renders the most requested keys in the background so the
+stampede lands on warm entries.
+
+Warming goes through the same entry points clients use (``fetch_batch_reports``,
+``fetch_technical_reports``): the keys, the cacheability checks and the admission
+queue are therefore exactly the ones a client request would see. Keys are warmed
+one at a time, so the warm-up never holds more than one admission slot.
+
+Inert when ``PREWARM_TOP_N`` is 0 or the report cache is disabled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from .cache import (
+    EVENING_SETTLE,
+    PHASE_CLOSED,
+    PHASE_POSTCLOSE,
+    SETTLE,
+    _as_shanghai,
+    get_report_cache,
+    market_phase,
+)
+from .config import PREWARM_MAX_TRACKED_KEYS, PREWARM_TOP_N
+from .observability import detached_context
+
+logger = logging.getLogger("qtf_mcp")
+
+# Upstream has settled by definition at these boundaries; the short delay only
+# keeps the warm-up clear of the first client requests racing the flip.
+BOUNDARY_DELAY_SECONDS = 5.0
+# Counts are multiplied by this after every warm-up, so a key's weight halves
+# per boundary and yesterday's favourites fade within a couple of days.
+DECAY = 0.5
+MIN_WEIGHT = 0.25
+
+PREWARM_HOST = "prewarm"
+_SCHEDULER_TASK_ATTR = "_cn_stock_prewarm_task"
+
+Warmer = Callable[[str, dict[str, Any]], Awaitable[Any]]
+DemandKey = tuple[str, str, str]
+
+
+def next_boundary(now: Optional[datetime.datetime] = None) -> datetime.datetime:
+    """Return the next weekday ``SETTLE`` or ``EVENING_SETTLE`` after ``now``."""
+    current = _as_shanghai(now)
+    day = current.date()
+    for offset in range(8):
+        candidate_day = day + datetime.timedelta(days=offset)
+        if candidate_day.weekday() >= 5:
+            continue
+        for clock in (SETTLE, EVENING_SETTLE):
+            candidate = datetime.datetime.combine(
+                candidate_day, clock, tzinfo=current.tzinfo
+            )
+            if candidate > current:
+                return candidate
+    raise AssertionError("no weekday within 8 days")
+
+
+def is_live_date(date: Any, now: Optional[datetime.datetime] = None) -> bool:
+    """Whether a ``date`` parameter follows the market: empty or today (Asia/Shanghai)."""
+    if not date:
+        return True
+    return str(date)[:10] == _as_shanghai(now).date().isoformat()
+
+
+class PrewarmScheduler:
+    """Track demand per cache key and re-render the hottest keys after a boundary."""
+
+    def __init__(
+        self,
+        *,
+        top_n: int = PREWARM_TOP_N,
+        max_tracked_keys: int = PREWARM_MAX_TRACKED_KEYS,
+    ):
+        self.top_n = top_n
+        self.max_tracked_keys = max_tracked_keys
+        self._weights: dict[DemandKey, float] = {}
+        self._params: dict[DemandKey, dict[str, Any]] = {}
+        self._warmers: dict[str, Warmer] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_n > 0 and get_report_cache().enabled
+
+    def register(self, tool: str, warmer: Warmer) -> None:
+        """Declare how to re-render one symbol of ``tool`` from recorded params."""
+        self._warmers[tool] = warmer
+
+    def record(self, tool: str, symbol: str, params: dict[str, Any]) -> None:
+        """Count one client request. Cheap and never raises."""
+        if not self.enabled or tool not in self._warmers:
+            return
+        # 指定历史日期的报告永不变化，边界处无需重新渲染
+        if not is_live_date(params.get("date")):
+            return
+        try:
+            key = (tool, symbol, json.dumps(params, sort_keys=True, default=str))
+            if key not in self._weights and len(self._weights) >= self.max_tracked_keys:
+                coldest = min(self._weights, key=self._weights.__getitem__)
+                self._weights.pop(coldest, None)
+                self._params.pop(coldest, None)
+            self._weights[key] = self._weights.get(key, 0.0) + 1.0
+            self._params[key] = dict(params)
+            self.ensure_running()
+        except Exception:
+            logger.debug("Prewarm record failed tool=%s symbol=%s", tool, symbol, exc_info=True)
+
+    def top_keys(self) -> list[DemandKey]:
+        ranked = sorted(self._weights.items(), key=lambda item: (-item[1], item[0]))
+        return [key for key, _ in ranked[: self.top_n]]
+
+    def _decay(self) -> None:
+        for key in list(self._weights):
+            weight = self._weights[key] * DECAY
+            if weight < MIN_WEIGHT:
+                self._weights.pop(key, None)
+                self._params.pop(key, None)
+            else:
+                self._weights[key] = weight
+
+    async def warm(self) -> dict[str, Any]:
+        """Re-render the current top-N keys once, sequentially. Returns the stats it logs."""
+        cache = get_report_cache()
+        _, epoch = market_phase()
+        keys = self.top_keys()
+        stores_before = cache.stores
+        started_at = time.perf_counter()
+        warmed = failed = 0
+        for key in keys:
+            tool, symbol, _ = key
+            warmer = self._warmers.get(tool)
+            if warmer is None:
+                continue
+            if not is_live_date(self._params[key].get("date")):
+                # 昨天记下的"今天"已成历史
+                self._weights.pop(key, None)
+                self._params.pop(key, None)
+                continue
+            try:
+                result = await warmer(symbol, self._params[key])
+                if getattr(result, "errors", None):
+                    failed += 1
+                else:
+                    warmed += 1
+            except Exception as error:
+                failed += 1
+                logger.warning(
+                    "Prewarm key failed tool=%s symbol=%s error=%s", tool, symbol, error
+                )
+        stats = {
+            "epoch": epoch,
+            "candidates": len(keys),
+            "warmed": warmed,
+            "failed": failed,
+            "rendered": cache.stores - stores_before,
+            "tracked": len(self._weights),
+            "cost": time.perf_counter() - started_at,
+        }
+        logger.info(
+            "Prewarm finished epoch=%s coverage=%s/%s failed=%s rendered=%s "
+            "tracked=%s cost=%.2fs",
+            stats["epoch"],
+            stats["warmed"],
+            stats["candidates"],
+            stats["failed"],
+            stats["rendered"],
+            stats["tracked"],
+            stats["cost"],
+        )
+        self._decay()
+        return stats
+
+    async def run(self) -> None:
+        """Sleep until each full-reuse boundary, then warm. Runs for the loop's lifetime."""
+        while True:
+            target = next_boundary()
+            delay = (target - _as_shanghai()).total_seconds() + BOUNDARY_DELAY_SECONDS
+            await asyncio.sleep(max(0.0, delay))
+            phase, _ = market_phase()
+            if phase not in (PHASE_POSTCLOSE, PHASE_CLOSED):
+                continue
+            if not self.enabled or not self._weights:
+                continue
+            try:
+                await self.warm()
+            except Exception:
+                logger.warning("Prewarm run failed", exc_info=True)
+
+    def ensure_running(self) -> None:
+        """Start the boundary loop on the running event loop, once."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = getattr(loop, _SCHEDULER_TASK_ATTR, None)
+        if task is not None and not task.done():
+            return
+        # 由某次客户端请求触发启动，但不能继承那次请求的截止时间
+        setattr(
+            loop,
+            _SCHEDULER_TASK_ATTR,
+            loop.create_task(self.run(), context=detached_context()),
+        )
+        logger.info(
+            "Prewarm scheduler started top_n=%s next_boundary=%s",
+            self.top_n,
+            next_boundary().strftime("%Y-%m-%d %H:%M"),
+        )
+
+
+_scheduler: Optional[PrewarmScheduler] = None
+
+
+def get_prewarm_scheduler() -> PrewarmScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = PrewarmScheduler()
+    return _scheduler
+
+
+def set_prewarm_scheduler(scheduler: Optional[PrewarmScheduler]) -> None:
+    """Replace the process-wide scheduler. Tests use this; production does not."""
+    global _scheduler
+    _scheduler = scheduler
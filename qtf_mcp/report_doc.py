@@ -0,0 +1,199 @@
+"""Structured report sections and the one Markdown renderer behind brief/medium/full.
+
+The ``build_*`` functions in ``research`` describe a report as typed sections:
+
+- ``Section``: a ``#`` / ``##`` heading with bullet ``Item`` s, an optional
+  ``Table`` and child sections (``# 交易数据`` holds ``## 价格`` … ``## 换手率``);
+- ``Item``: one bullet, its display text plus the raw numbers behind it;
+- ``Table``: column names and raw cell values, formatted per column only when
+  rendered to Markdown.
+
+``render_markdown`` is the only place that turns sections into text, and it
+reproduces the historical ``print`` layout byte for byte, including its quirks
+(the technical table's ``| 日期|`` cell, the fund-flow table's ``----`` rule).
+``to_json`` gives the same sections to programmatic clients and to the cache.
+
+The builders keep their ``fp`` argument. A ``ReportDocument`` collects the
+sections; any other text stream receives the rendered Markdown, so existing
+``StringIO`` callers see exactly what they saw before. Text written into a
+``ReportDocument`` directly (``print(..., file=doc)``) is kept as a raw Markdown
+block in place.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, TextIO, Union
+
+
+@dataclass
+class Item:
+    """One bullet: ``- {label}: {text}``, or ``- {text}`` without a label."""
+
+    text: str
+    label: Optional[str] = None
+    values: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class Table:
+    """Column names plus raw cells; ``formats`` turns a cell into Markdown text."""
+
+    columns: List[str]
+    rows: List[List[Any]]
+    formats: Optional[Sequence[Callable[[Any], str]]] = None
+    # 以下两项只影响 Markdown 排版，保持各表格历史上的写法
+    rule: str = "---"
+    key_separator: str = " | "
+
+
+@dataclass
+class Section:
+    title: str
+    level: int = 1
+    items: List[Item] = field(default_factory=list)
+    table: Optional[Table] = None
+    sections: List["Section"] = field(default_factory=list)
+    # 没有数据时的基本数据段历史上不输出结尾空行
+    terminated: bool = True
+
+    def add(self, text: str, label: Optional[str] = None, **values: Any) -> None:
+        self.items.append(Item(text, label, values or None))
+
+
+@dataclass
+class RawBlock:
+    """Markdown written straight into a document, kept verbatim."""
+
+    text: str
+
+
+Block = Union[Section, RawBlock]
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    return number if math.isfinite(number) else None
+
+
+def _item_line(item: Item) -> str:
+    return "- " + (f"{item.label}: {item.text}" if item.label else item.text)
+
+
+def render_items(items: Sequence[Item]) -> str:
+    """Bullet lines alone, for callers that write into an open section."""
+    return "".join(_item_line(item) + "\n" for item in items)
+
+
+def _table_lines(table: Table) -> List[str]:
+    formats = table.formats or ()
+    lines = [
+        "| " + " | ".join(table.columns) + " |",
+        f"| {table.rule} " * len(table.columns) + "|",
+    ]
+    for row in table.rows:
+        cells = [
+            formats[i](cell) if i < len(formats) and formats[i] is not None else str(cell)
+            for i, cell in enumerate(row)
+        ]
+        lines.append("| " + cells[0] + table.key_separator + " | ".join(cells[1:]) + " |")
+    return lines
+
+
+def _section_lines(section: Section, lines: List[str]) -> None:
+    lines.append("#" * section.level + " " + section.title)
+    # 一级标题与表格之前空一行；二级标题下的列表紧跟标题
+    if section.level == 1 or section.table is not None:
+        lines.append("")
+    lines.extend(_item_line(item) for item in section.items)
+    if section.table is not None:
+        lines.extend(_table_lines(section.table))
+    for child in section.sections:
+        _section_lines(child, lines)
+    if section.terminated and not section.sections:
+        lines.append("")
+
+
+def render_markdown(blocks: Sequence[Block]) -> str:
+    """The report text for ``blocks``, identical to the historical ``print`` output."""
+    parts: List[str] = []
+    for block in blocks:
+        if isinstance(block, RawBlock):
+            parts.append(block.text)
+            continue
+        lines: List[str] = []
+        _section_lines(block, lines)
+        parts.append("".join(line + "\n" for line in lines))
+    return "".join(parts)
+
+
+def _section_json(section: Section) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"title": section.title, "level": section.level}
+    if section.items:
+        out["items"] = [
+            {
+                "text": item.text,
+                "label": item.label,
+                "values": (
+                    {k: _json_value(v) for k, v in item.values.items()}
+                    if item.values
+                    else None
+                ),
+            }
+            for item in section.items
+        ]
+    if section.table is not None:
+        out["table"] = {
+            "columns": list(section.table.columns),
+            "rows": [[_json_value(cell) for cell in row] for row in section.table.rows],
+        }
+    if section.sections:
+        out["sections"] = [_section_json(child) for child in section.sections]
+    return out
+
+
+def to_json(blocks: Sequence[Block]) -> List[Dict[str, Any]]:
+    """JSON-ready sections; raw blocks become ``{"title": "", "level": 0, "markdown": text}``."""
+    return [
+        {"title": "", "level": 0, "markdown": block.text}
+        if isinstance(block, RawBlock)
+        else _section_json(block)
+        for block in blocks
+    ]
+
+
+class ReportDocument:
+    """Collects the sections of one report; also accepts ``print(..., file=doc)``."""
+
+    def __init__(self) -> None:
+        self.blocks: List[Block] = []
+
+    def extend(self, sections: Sequence[Section]) -> None:
+        self.blocks.extend(sections)
+
+    def write(self, text: str) -> int:
+        if self.blocks and isinstance(self.blocks[-1], RawBlock):
+            self.blocks[-1].text += text
+        else:
+            self.blocks.append(RawBlock(text))
+        return len(text)
+
+    def to_markdown(self) -> str:
+        return render_markdown(self.blocks)
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        return to_json(self.blocks)
+
+
+def emit(fp: Union[TextIO, ReportDocument], sections: Sequence[Section]) -> None:
+    """Hand ``sections`` to a document, or write their Markdown to a text stream."""
+    if isinstance(fp, ReportDocument):
+        fp.extend(sections)
+    elif sections:
+        fp.write(render_markdown(sections))
@@ -6,6 +6,8 @@
 
 import asyncio
 import datetime
+import functools
+import logging
 from dataclasses import dataclass
 from io import StringIO
 from typing import Dict, Optional, TextIO
@@ -13,12 +15,84 @@ from typing import Dict, Optional, TextIO
 import numpy as np
 import talib
 from numpy import ndarray
+from numpy.lib.stride_tricks import sliding_window_view
 
+from .cache import get_raw_data_cache
 from .datafeed import load_data_msd
 from .config import ALL_INDICES
-from .datasource.base import FetchRequirements
+from .datasource.base import FETCH_FAILURES_KEY, FetchRequirements
 from .datasource.realtime_ff import get_fund_flow
+from .indicators import get_indicator_engine
+from .observability import request_id_var
+from .report_doc import Item, Section, Table, emit, render_items
+from .screener import get_feature_store
 from .symbols import symbol_with_name
+from .window_stats import TradingWindows
+
+logger = logging.getLogger("qtf_mcp")
+
+
+# 块内展开为一次矩阵乘；64 根时最小权重 (2/3)^63 ≈ 8e-12，不会下溢
+_SMOOTH_BLOCK = 64
+
+
+@functools.lru_cache(maxsize=8)
+def _smoothing_weights(alpha: float, block: int) -> tuple[ndarray, ndarray]:
+    """块内递推的展开系数：``y[j] = W[j] @ x + carry[j] * y_prev``。"""
+    decay = 1.0 - alpha
+    powers = decay ** np.arange(block + 1, dtype=np.float64)
+    lag = np.arange(block)[:, None] - np.arange(block)[None, :]
+    weights = np.where(lag >= 0, alpha * powers[np.clip(lag, 0, None)], 0.0)
+    return weights, powers[1:]
+
+
+@functools.lru_cache(maxsize=8)
+def _augmented_weights(alpha: float, block: int) -> ndarray:
+    """``[x, y_prev] @ A`` 即块内输出：前 block 行为 ``W.T``，末行为衰减系数。"""
+    weights, carry = _smoothing_weights(alpha, block)
+    return np.vstack((weights.T, carry))
+
+
+def _smooth(values: ndarray, alpha: float) -> ndarray:
+    """``y[0] = x[0]``，``y[t] = (1-alpha)*y[t-1] + alpha*x[t]``，沿最后一维。
+
+    即 pandas ``ewm(alpha=alpha, adjust=False)``。递推按块展开成下三角矩阵乘，
+    避免逐根的 Python 循环；二维输入时每行独立平滑，批量计算多个标的。
+    含 inf/NaN 时矩阵乘会把 0 权重变成 NaN，改走逐根递推。
+    """
+    values = np.asarray(values, dtype=np.float64)
+    size = values.shape[-1]
+    smoothed = np.empty_like(values)
+    if size == 0:
+        return smoothed
+    decay = 1.0 - alpha
+    previous = np.array(values[..., 0])
+    smoothed[..., 0] = previous
+    if not np.isfinite(values).all():
+        for i in range(1, size):
+            previous = decay * previous + alpha * values[..., i]
+            smoothed[..., i] = previous
+        return smoothed
+
+    # 先用每块末行权重求出块末值（假设块前状态为 0），逐块标量递推出各块的起始状态，
+    # 再把起始状态作为第 65 列拼进块内，一次 GEMM 得到全部输出
+    weights, carry = _smoothing_weights(alpha, _SMOOTH_BLOCK)
+    lead = values.shape[:-1]
+    width = size - 1
+    blocks = -(-width // _SMOOTH_BLOCK)
+    augmented = np.zeros(lead + (blocks, _SMOOTH_BLOCK + 1), dtype=np.float64)
+    padded = np.zeros(lead + (blocks * _SMOOTH_BLOCK,), dtype=np.float64)
+    padded[..., :width] = values[..., 1:]
+    augmented[..., :_SMOOTH_BLOCK] = padded.reshape(lead + (blocks, _SMOOTH_BLOCK))
+    ends = augmented[..., :_SMOOTH_BLOCK] @ weights[-1]
+    block_decay = carry[-1]
+    for b in range(blocks):
+        augmented[..., b, _SMOOTH_BLOCK] = previous
+        previous = ends[..., b] + block_decay * previous
+    # 压成二维做一次 GEMM：堆叠形状的 matmul 会逐块调用，慢数倍
+    local = augmented.reshape(-1, _SMOOTH_BLOCK + 1) @ _augmented_weights(alpha, _SMOOTH_BLOCK)
+    smoothed[..., 1:] = local.reshape(lead + (-1,))[..., :width]
+    return smoothed
 
 
 def compute_kdj(close: ndarray, high: ndarray, low: ndarray, n: int = 9, m1: int = 3, m2: int = 3) -> tuple:
@@ -29,32 +103,31 @@ def compute_kdj(close: ndarray, high: ndarray, low: ndarray, n: int = 9, m1: int
     以确保与东方财富、富途等软件显示数值一致。
     K = (2/3)*prev_K + (1/3)*current_RSV
     D = (2/3)*prev_D + (1/3)*current_K
+    前 n-1 根 RSV 取 50，K、D 以首个 RSV 起算。
     """
-    import pandas as pd
-    
-    s_close = pd.Series(close)
-    s_high = pd.Series(high)
-    s_low = pd.Series(low)
-    
-    # 计算 RSV (Raw Stochastic Value)
-    low_min = s_low.rolling(window=n).min()
-    high_max = s_high.rolling(window=n).max()
-    
-    # 避免分母为0
-    diff = high_max - low_min
-    rsv = (s_close - low_min) / diff * 100
-    rsv = rsv.fillna(50)
-    
-    # 递归计算 K, D (采用 com=m-1 对应的 alpha=1/m)
-    # K[t] = (2/3) * K[t-1] + (1/3) * RSV[t]
-    k = rsv.ewm(com=m1-1, adjust=False).mean()
-    # D[t] = (2/3) * D[t-1] + (1/3) * K[t]
-    d = k.ewm(com=m2-1, adjust=False).mean()
-    
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+
+    # 计算 RSV (Raw Stochastic Value)；二维输入按行（每行一个标的）计算
+    low_min = np.full(close.shape, np.nan)
+    high_max = np.full(close.shape, np.nan)
+    if close.shape[-1] >= n:
+        low_min[..., n - 1:] = sliding_window_view(low, n, axis=-1).min(axis=-1)
+        high_max[..., n - 1:] = sliding_window_view(high, n, axis=-1).max(axis=-1)
+
+    # 分母为 0 时与 pandas 一致：0/0 记 50，x/0 保留 inf
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsv = (close - low_min) / (high_max - low_min) * 100
+    rsv[np.isnan(rsv)] = 50.0
+
+    k = _smooth(rsv, 1.0 / m1)
+    d = _smooth(k, 1.0 / m2)
+
     # J = 3*K - 2*D
     j = 3 * k - 2 * d
-    
-    return k.values, d.values, j.values
+
+    return k, d, j
 
 
 def compute_macd(close: ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple:
@@ -68,6 +141,25 @@ def compute_macd(close: ndarray, fast: int = 12, slow: int = 26, signal: int = 9
     return macd, signal_line
 
 
+def compute_indicator_series(close: ndarray, high: ndarray, low: ndarray) -> tuple:
+    """全量计算技术指标序列，顺序与 ``indicators.SERIES_NAMES`` 一致。
+
+    增量引擎以它为准：回退与校验模式都调用这里。
+    """
+    kdj_k, kdj_d, kdj_j = compute_kdj(close, high, low, 9, 3, 3)
+    macd_diff, macd_dea = compute_macd(close, 12, 26, 9)
+    rsi_6 = talib.RSI(close, timeperiod=6)
+    rsi_12 = talib.RSI(close, timeperiod=12)
+    rsi_24 = talib.RSI(close, timeperiod=24)
+    bb_upper, bb_middle, bb_lower = talib.BBANDS(close, matype=talib.MA_Type.T3)
+    return (
+        kdj_k, kdj_d, kdj_j,
+        macd_diff, macd_dea,
+        rsi_6, rsi_12, rsi_24,
+        bb_upper, bb_middle, bb_lower,
+    )
+
+
 TECHNICAL_FIELDS = ("kdj", "macd", "rsi", "bbands")
 
 
@@ -95,15 +187,13 @@ def _json_number(value) -> float | None:
     return val
 
 
-def get_technical_indicators(
-    data: Dict[str, ndarray],
-    days: int = 30,
-    fields: str = "all",
-    include_derived: bool = True,
-) -> list[dict]:
-    """Return machine-readable technical indicators for recent trading days."""
+def _technical_series(data: Dict[str, ndarray], series: Optional[tuple] = None):
+    """Inputs and indicator series shared by the row and column layouts.
+
+    ``series`` are indicators computed elsewhere (the ``tech`` worker thread) for these inputs.
+    """
     if "CLOSE" not in data or "DATE" not in data:
-        return []
+        return None
 
     close = data["CLOSE"]
     high = data.get("HIGH", close)
@@ -113,27 +203,51 @@ def get_technical_indicators(
     dates = data["DATE"]
 
     if len(close) == 0 or len(dates) == 0:
-        return []
+        return None
 
-    requested_fields = parse_technical_fields(fields)
-    days = max(1, int(days or 30))
+    if series is None:
+        series = get_indicator_engine().compute(
+            str(data.get("SYMBOL", "")), dates, close, high, low, compute_indicator_series
+        )
+    return dates, (open_, close, high, low, volume), series
 
-    kdj_k, kdj_d, kdj_j = compute_kdj(close, high, low, 9, 3, 3)
-    macd_diff, macd_dea = compute_macd(close, 12, 26, 9)
-    rsi_6 = talib.RSI(close, timeperiod=6)
-    rsi_12 = talib.RSI(close, timeperiod=12)
-    rsi_24 = talib.RSI(close, timeperiod=24)
-    bb_upper, bb_middle, bb_lower = talib.BBANDS(close, matype=talib.MA_Type.T3)
 
-    formatted_dates = [
-        datetime.datetime.fromtimestamp(d / 1e9).strftime("%Y-%m-%d") for d in dates
+def _format_tail_dates(dates: ndarray, start: int) -> list[str]:
+    """只格式化返回窗口内的日期，最近交易日在前。"""
+    return [
+        datetime.datetime.fromtimestamp(d / 1e9).strftime("%Y-%m-%d")
+        for d in dates[start:][::-1]
     ]
 
+
+def get_technical_indicators(
+    data: Dict[str, ndarray],
+    days: int = 30,
+    fields: str = "all",
+    include_derived: bool = True,
+    series: Optional[tuple] = None,
+) -> list[dict]:
+    """Return machine-readable technical indicators for recent trading days."""
+    prepared = _technical_series(data, series)
+    if prepared is None:
+        return []
+    dates, (open_, close, high, low, volume), series = prepared
+    (
+        kdj_k, kdj_d, kdj_j,
+        macd_diff, macd_dea,
+        rsi_6, rsi_12, rsi_24,
+        bb_upper, bb_middle, bb_lower,
+    ) = series
+
+    requested_fields = parse_technical_fields(fields)
+    days = max(1, int(days or 30))
+    start = max(0, len(dates) - days)
+    formatted_dates = _format_tail_dates(dates, start)
+
     indicators = []
-    start = max(0, len(formatted_dates) - days)
-    for i in range(len(formatted_dates) - 1, start - 1, -1):
+    for offset, i in enumerate(range(len(dates) - 1, start - 1, -1)):
         item: dict = {
-            "date": formatted_dates[i],
+            "date": formatted_dates[offset],
             "ohlc": {
                 "open": _json_number(open_[i]),
                 "close": _json_number(close[i]),
@@ -175,6 +289,85 @@ def get_technical_indicators(
     return indicators
 
 
+def _json_column(values: ndarray, start: int) -> list:
+    """Tail of ``values``, newest first, with NaN/inf mapped to None in one pass."""
+    tail = np.asarray(values[start:], dtype=np.float64)[::-1]
+    column = tail.tolist()
+    for i in np.flatnonzero(~np.isfinite(tail)).tolist():
+        column[i] = None
+    return column
+
+
+def get_technical_indicator_columns(
+    data: Dict[str, ndarray],
+    days: int = 30,
+    fields: str = "all",
+    include_derived: bool = True,
+    series: Optional[tuple] = None,
+) -> dict:
+    """Column layout of ``get_technical_indicators``: one date list plus one list per value.
+
+    Same values and order (newest first) as the row layout; each field is a list
+    aligned with ``dates``. Returns an empty dict when there is no data.
+    """
+    prepared = _technical_series(data, series)
+    if prepared is None:
+        return {}
+    dates, (open_, close, high, low, volume), series = prepared
+    (
+        kdj_k, kdj_d, kdj_j,
+        macd_diff, macd_dea,
+        rsi_6, rsi_12, rsi_24,
+        bb_upper, bb_middle, bb_lower,
+    ) = series
+
+    requested_fields = parse_technical_fields(fields)
+    days = max(1, int(days or 30))
+    start = max(0, len(dates) - days)
+
+    columns: dict = {
+        "dates": _format_tail_dates(dates, start),
+        "ohlc": {
+            "open": _json_column(open_, start),
+            "close": _json_column(close, start),
+            "high": _json_column(high, start),
+            "low": _json_column(low, start),
+            "volume": _json_column(volume, start),
+        },
+    }
+    if "kdj" in requested_fields:
+        columns["kdj"] = {
+            "k": _json_column(kdj_k, start),
+            "d": _json_column(kdj_d, start),
+            "j": _json_column(kdj_j, start),
+        }
+    if "macd" in requested_fields:
+        macd = {
+            "dif": _json_column(macd_diff, start),
+            "dea": _json_column(macd_dea, start),
+        }
+        if include_derived:
+            macd["histogram"] = _json_column(
+                np.asarray(macd_diff[start:], dtype=np.float64)
+                - np.asarray(macd_dea[start:], dtype=np.float64),
+                0,
+            )
+        columns["macd"] = macd
+    if "rsi" in requested_fields:
+        columns["rsi"] = {
+            "rsi6": _json_column(rsi_6, start),
+            "rsi12": _json_column(rsi_12, start),
+            "rsi24": _json_column(rsi_24, start),
+        }
+    if "bbands" in requested_fields:
+        columns["bbands"] = {
+            "upper": _json_column(bb_upper, start),
+            "middle": _json_column(bb_middle, start),
+            "lower": _json_column(bb_lower, start),
+        }
+    return columns
+
+
 async def load_raw_data(
     symbol: str,
     end_date=None,
@@ -189,19 +382,63 @@ async def load_raw_data(
         end_date = datetime.datetime.strptime(end_date, "%Y-%m-%d")
 
     start_date = end_date - datetime.timedelta(days=365 * 2)
+    start_text = start_date.strftime("%Y-%m-%d")
+    end_text = end_date.strftime("%Y-%m-%d")
+    requirements = requirements or FetchRequirements()
+
+    # 同一纪元内切换工具（brief -> tech -> full）复用已取到的数组，只重新渲染。
+    raw_cache = get_raw_data_cache()
+    window = f"{start_text}~{end_text}"
+    data = raw_cache.get(symbol, window, requirements)
+    if data is not None:
+        logger.info(
+            "Raw data cache hit request_id=%s symbol=%s window=%s",
+            request_id_var.get(),
+            symbol,
+            window,
+        )
+    else:
+        data = await load_data_msd(
+            symbol,
+            start_text,
+            end_text,
+            0,
+            who,
+            requirements=requirements,
+        )
+        if data and not data.get(FETCH_FAILURES_KEY):
+            raw_cache.put(symbol, window, requirements, data)
+            # screen 的均线、收益率等字段随最新窗口的取数顺带记录
+            if not is_historical_query and is_stock(symbol):
+                get_feature_store().record(symbol, data, today_volume_est_ratio(data))
+    if data and is_historical_query:
+        data["QUERY_DATE"] = end_date.strftime("%Y-%m-%d")  # type: ignore
+        data["IS_HISTORICAL_QUERY"] = True  # type: ignore
+    return data
+
 
+async def record_screen_features(symbol: str) -> bool:
+    """为 screen 的后台补齐加载一只个股的最新窗口并记录特征。
+
+    不经过原始数据缓存：全市场逐只取数会把客户端复用的条目挤出去。
+    部分数据源失败时仍记录已取到的字段，其余字段保留同日已有的值。
+    """
+    if not is_stock(symbol):
+        return False
+    end_date = datetime.datetime.now() + datetime.timedelta(days=1)
+    start_date = end_date - datetime.timedelta(days=365 * 2)
     data = await load_data_msd(
         symbol,
         start_date.strftime("%Y-%m-%d"),
         end_date.strftime("%Y-%m-%d"),
         0,
-        who,
-        requirements=requirements,
+        "screen",
+        requirements=FetchRequirements.screen(),
     )
-    if data and is_historical_query:
-        data["QUERY_DATE"] = end_date.strftime("%Y-%m-%d")  # type: ignore
-        data["IS_HISTORICAL_QUERY"] = True  # type: ignore
-    return data
+    if not data or not len(data.get("CLOSE", ())):
+        return False
+    get_feature_store().record(symbol, data, today_volume_est_ratio(data))
+    return True
 
 
 def is_stock(symbol: str) -> bool:
@@ -255,9 +492,8 @@ def yearly_fin_index(dates: ndarray) -> int:
 
 def build_basic_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> None:
     """构建基本数据部分"""
-    print("# 基本数据", file=fp)
-    print("", file=fp)
-    
+    section = Section("基本数据")
+
     # 优先使用纠偏后的规范代码
     symbol = data.get("SYMBOL", symbol)
     
@@ -271,9 +507,11 @@ def build_basic_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> None:
     sector = " ".join(filter_sector(sector_list)) if sector_list else ""
     
     if "DATE" not in data or len(data["DATE"]) == 0:
-        print(f"- 股票代码: {symbol}", file=fp)
-        print(f"- 股票名称: {name}", file=fp)
-        print("- 数据: 无", file=fp)
+        section.add(symbol, "股票代码")
+        section.add(name, "股票名称")
+        section.add("无", "数据")
+        section.terminated = False
+        emit(fp, [section])
         return
     
     data_date = datetime.datetime.fromtimestamp(data["DATE"][-1] / 1e9)
@@ -285,20 +523,20 @@ def build_basic_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> None:
         if "DATE" in fin and len(fin["DATE"]) > 0:
             last_year_index = yearly_fin_index(fin["DATE"])
 
-    print(f"- 股票代码: {symbol}", file=fp)
-    print(f"- 股票名称: {name}", file=fp)
-    print(f"- 数据日期: {data_date.strftime('%Y-%m-%d')}", file=fp)
+    section.add(symbol, "股票代码")
+    section.add(name, "股票名称")
+    section.add(data_date.strftime('%Y-%m-%d'), "数据日期")
     if sector:
-        print(f"- 行业概念: {sector}", file=fp)
+        section.add(sector, "行业概念")
     
     if is_stock(symbol):
         # 总市值、流通市值
         mcap = data.get("MCAP", np.array([]))
         fmcap = data.get("FMCAP", np.array([]))
         if len(mcap) > 0 and mcap[-1] > 0:
-            print(f"- 总市值: {mcap[-1]/1e8:.2f}亿", file=fp)
+            section.add(f"{mcap[-1]/1e8:.2f}亿", "总市值", value=mcap[-1])
         if len(fmcap) > 0 and fmcap[-1] > 0:
-            print(f"- 流通市值: {fmcap[-1]/1e8:.2f}亿", file=fp)
+            section.add(f"{fmcap[-1]/1e8:.2f}亿", "流通市值", value=fmcap[-1])
     
     if is_stock(symbol):
         # 总股本
@@ -323,12 +561,12 @@ def build_basic_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> None:
         if total_shares > 0 and current_price > 0:
             total_amount = total_shares * current_price
             pe_static = total_amount / net_profit if net_profit != 0 else float("inf")
-            print(f"- 市盈率(静): {pe_static:.2f}", file=fp)
+            section.add(f"{pe_static:.2f}", "市盈率(静)", value=pe_static)
             
             # 动态市盈率 (优先使用数据源直接提供的)
             pe_ttm_arr = data.get("PE_TTM", np.array([]))
             if len(pe_ttm_arr) > 0 and pe_ttm_arr[-1] > 0:
-                print(f"- 市盈率(动): {pe_ttm_arr[-1]:.2f}", file=fp)
+                section.add(f"{pe_ttm_arr[-1]:.2f}", "市盈率(动)", value=pe_ttm_arr[-1])
         
         # 市净率
         navps = data.get("NAVPS", np.array([]))
@@ -338,14 +576,14 @@ def build_basic_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> None:
             pb_arr = data.get("PB", np.array([]))
             if len(pb_arr) > 0 and pb_arr[-1] > 0:
                  pb = pb_arr[-1]
-            print(f"- 市净率: {pb:.2f}", file=fp)
+            section.add(f"{pb:.2f}", "市净率", value=pb)
         
         # 净资产收益率
         roe = data.get("ROE", np.array([]))
         if len(roe) > 0:
-            print(f"- 净资产收益率: {roe[-1]*100:.2f}%", file=fp)
-    
-    print("", file=fp)
+            section.add(f"{roe[-1]*100:.2f}%", "净资产收益率", value=roe[-1])
+
+    emit(fp, [section])
 
 
 def today_volume_est_ratio(data: Dict[str, ndarray], now: int = 0) -> float:
@@ -393,20 +631,27 @@ FUND_FLOW_FIELDS = [
 ]
 
 
-def build_fund_flow(field: tuple[str, str], data: Dict[str, ndarray]) -> str:
-    """构建资金流向信息"""
+def _fund_flow_values(field: tuple[str, str], data: Dict[str, ndarray]) -> Optional[tuple]:
+    """最新一日的 (净流入, 净占比)；缺字段时返回 None"""
     field_amount = field[1] + "_A"
     field_ratio = field[1] + "_R"
     value_amount = data.get(field_amount, None)
     value_ratio = data.get(field_ratio, None)
     if value_amount is None or value_ratio is None:
-        return ""
+        return None
     if len(value_amount) == 0 or len(value_ratio) == 0:
+        return None
+    return value_amount[-1], value_ratio[-1]
+
+
+def build_fund_flow(field: tuple[str, str], data: Dict[str, ndarray]) -> str:
+    """构建资金流向信息"""
+    values = _fund_flow_values(field, data)
+    if values is None:
         return ""
 
     kind = field[0]
-    raw_amount = value_amount[-1]
-    ratio = value_ratio[-1]
+    raw_amount, ratio = values
     
     # 自动转换单位：超过1亿显示亿，否则显示万
     if abs(raw_amount) >= 1e8:
@@ -419,6 +664,17 @@ def build_fund_flow(field: tuple[str, str], data: Dict[str, ndarray]) -> str:
     return f"{prefix}{kind}净流入: {amount_str}  {kind}净占比: {ratio:.2%}"
 
 
+def _fund_flow_items(data: Dict[str, ndarray]) -> list[Item]:
+    """数据源资金流向字段，每类一条"""
+    items = []
+    for field in FUND_FLOW_FIELDS:
+        val = build_fund_flow(field, data)
+        if val:
+            amount, ratio = _fund_flow_values(field, data)
+            items.append(Item(val, values={"kind": field[0], "amount": amount, "ratio": ratio}))
+    return items
+
+
 def has_today_fund_flow_from_api(data: Dict[str, ndarray], today: Optional[datetime.date] = None) -> bool:
     """Return whether AkShare fund-flow history has a latest row for today."""
     fund_flow = data.get("_DS_FUND_FLOW")
@@ -439,22 +695,25 @@ def has_today_fund_flow_from_api(data: Dict[str, ndarray], today: Optional[datet
     return latest_date == today
 
 
+def api_fund_flow_items_if_today(
+    data: Dict[str, ndarray],
+    today: Optional[datetime.date] = None,
+) -> list[Item]:
+    """Latest AkShare fund-flow items, or none unless they are dated today."""
+    if not has_today_fund_flow_from_api(data, today):
+        return []
+    return _fund_flow_items(data)
+
+
 def print_api_fund_flow_if_today(
     fp: TextIO,
     data: Dict[str, ndarray],
     today: Optional[datetime.date] = None,
 ) -> bool:
     """Print latest AkShare fund-flow fields if they are dated today."""
-    if not has_today_fund_flow_from_api(data, today):
-        return False
-
-    has_fund_flow = False
-    for field in FUND_FLOW_FIELDS:
-        val = build_fund_flow(field, data)
-        if val:
-            print(f"- {val}", file=fp)
-            has_fund_flow = True
-    return has_fund_flow
+    items = api_fund_flow_items_if_today(data, today)
+    fp.write(render_items(items))
+    return bool(items)
 
 
 def has_realtime_fund_flow_values(res: dict) -> bool:
@@ -462,7 +721,12 @@ def has_realtime_fund_flow_values(res: dict) -> bool:
     amount_keys = ["主力净流入", "超大单净流入", "大单净流入", "中单净流入", "小单净流入"]
     placeholders = {"", "-", "--", "0", "0.0", "0.00", "0万", "0.00万", "0亿", "0.00亿"}
     for key in amount_keys:
-        value = str(res.get(key, "")).strip()
+        value = res.get(key, "")
+        if isinstance(value, (int, float)):
+            if value:
+                return True
+            continue
+        value = str(value).strip()
         if value not in placeholders:
             return True
     return False
@@ -493,19 +757,36 @@ def format_fund_flow_price(value) -> str:
     return f"{val:.2f}"
 
 
-def build_historical_fund_flow_data(fp: TextIO, data: Dict[str, ndarray], limit: int = 15) -> None:
-    """构建历史资金流向表格"""
+_HISTORICAL_FUND_FLOW_COLUMNS = [
+    ("日期", None, None),
+    ("收盘价", "CLOSE", format_fund_flow_price),
+    ("涨跌幅", "PCT_CHG", format_fund_flow_percent),
+    ("主力净流入", "A_A", format_fund_flow_amount),
+    ("主力占比", "A_R", format_fund_flow_percent),
+    ("超大单净流入", "XL_A", format_fund_flow_amount),
+    ("超大单占比", "XL_R", format_fund_flow_percent),
+    ("大单净流入", "L_A", format_fund_flow_amount),
+    ("大单占比", "L_R", format_fund_flow_percent),
+    ("中单净流入", "M_A", format_fund_flow_amount),
+    ("中单占比", "M_R", format_fund_flow_percent),
+    ("小单净流入", "S_A", format_fund_flow_amount),
+    ("小单占比", "S_R", format_fund_flow_percent),
+]
+
+
+def historical_fund_flow_section(data: Dict[str, ndarray], limit: int = 15) -> Optional[Section]:
+    """历史资金流向表格；无数据时返回 None"""
     limit = int(limit or 0)
     if limit <= 0:
-        return
+        return None
 
     fund_flow = data.get("_DS_FUND_FLOW")
     if not fund_flow:
-        return
+        return None
 
     dates = fund_flow.get("DATE", np.array([], dtype=np.int64))
     if len(dates) == 0:
-        return
+        return None
 
     query_date = data.get("QUERY_DATE")
     indices = list(range(len(dates)))
@@ -519,19 +800,9 @@ def build_historical_fund_flow_data(fp: TextIO, data: Dict[str, ndarray], limit:
 
     indices = indices[-limit:][::-1]
     if not indices:
-        return
-
-    print("## 历史资金流向", file=fp)
-    print("", file=fp)
-    print(
-        "| 日期 | 收盘价 | 涨跌幅 | 主力净流入 | 主力占比 | 超大单净流入 | 超大单占比 | 大单净流入 | 大单占比 | 中单净流入 | 中单占比 | 小单净流入 | 小单占比 |",
-        file=fp,
-    )
-    print(
-        "| ---- | ---- | ---- | ---- | ---- | ---- | ---- | ---- | ---- | ---- | ---- | ---- | ---- |",
-        file=fp,
-    )
+        return None
 
+    rows = []
     for idx in indices:
         def value_for(key: str):
             values = fund_flow.get(key)
@@ -540,23 +811,22 @@ def build_historical_fund_flow_data(fp: TextIO, data: Dict[str, ndarray], limit:
             return values[idx]
 
         date_str = datetime.datetime.fromtimestamp(dates[idx] / 1e9).strftime("%Y-%m-%d")
-        row = [
-            date_str,
-            format_fund_flow_price(value_for("CLOSE")),
-            format_fund_flow_percent(value_for("PCT_CHG")),
-            format_fund_flow_amount(value_for("A_A")),
-            format_fund_flow_percent(value_for("A_R")),
-            format_fund_flow_amount(value_for("XL_A")),
-            format_fund_flow_percent(value_for("XL_R")),
-            format_fund_flow_amount(value_for("L_A")),
-            format_fund_flow_percent(value_for("L_R")),
-            format_fund_flow_amount(value_for("M_A")),
-            format_fund_flow_percent(value_for("M_R")),
-            format_fund_flow_amount(value_for("S_A")),
-            format_fund_flow_percent(value_for("S_R")),
-        ]
-        print(f"| {' | '.join(row)} |", file=fp)
-    print("", file=fp)
+        rows.append([date_str] + [value_for(key) for _, key, _ in _HISTORICAL_FUND_FLOW_COLUMNS[1:]])
+
+    table = Table(
+        [name for name, _, _ in _HISTORICAL_FUND_FLOW_COLUMNS],
+        rows,
+        [fmt for _, _, fmt in _HISTORICAL_FUND_FLOW_COLUMNS],
+        rule="----",
+    )
+    return Section("历史资金流向", level=2, table=table)
+
+
+def build_historical_fund_flow_data(fp: TextIO, data: Dict[str, ndarray], limit: int = 15) -> None:
+    """构建历史资金流向表格"""
+    section = historical_fund_flow_section(data, limit)
+    if section is not None:
+        emit(fp, [section])
 
 
 CORE_REALTIME_FUND_FLOW_INDICES = {"000001", "399001", "399006"}
@@ -642,89 +912,75 @@ async def build_trading_data(
     is_intra_day = today_ratio > 1.05  # 显著超过1说明是盘中
     
     close = data["CLOSE"]
-    # 原始成交量/成交额
-    volume_actual = data.get("VOLUME", np.zeros_like(close)).copy()
-    amount_actual = (data.get("AMOUNT", np.zeros_like(close)) / 1e8).copy()
-    
-    # 预估全天成交量/成交额
-    volume_est = volume_actual.copy()
-    amount_est = amount_actual.copy()
-    if len(volume_est) > 0:
-        volume_est[-1] = volume_actual[-1] * today_ratio
-        amount_est[-1] = amount_actual[-1] * today_ratio
-    
     high = data.get("HIGH", close)
     low = data.get("LOW", close)
     open_ = data.get("OPEN", close)
 
-    periods = list(filter(lambda n: n <= len(close), [5, 20, 60, 120, 240]))
+    # 各周期的均值/极值/合计一次算好；成交量/额的当日值已替换为全天预估
+    windows = TradingWindows(data, today_ratio)
+    periods = windows.periods
 
-    print("# 交易数据", file=fp)
-    print("", file=fp)
+    trading = Section("交易数据")
 
-    print("## 价格", file=fp)
-    print(
-        f"- 当日: {close[-1]:.3f} 开盘: {open_[-1]:.3f} "
-        f"最高: {high[-1]:.3f} 最低: {low[-1]:.3f}",
-        file=fp,
+    price = Section("价格", level=2)
+    price.add(
+        f"{close[-1]:.3f} 开盘: {open_[-1]:.3f} 最高: {high[-1]:.3f} 最低: {low[-1]:.3f}",
+        "当日",
+        close=close[-1], open=open_[-1], high=high[-1], low=low[-1],
     )
     for p in periods:
-        print(
-            f"- {p}日均价: {close[-p:].mean():.3f} 最高: {high[-p:].max():.3f} 最低: {low[-p:].min():.3f}",
-            file=fp,
+        mean_p, high_p, low_p = windows.close.mean(p), windows.high.max(p), windows.low.min(p)
+        price.add(
+            f"{mean_p:.3f} 最高: {high_p:.3f} 最低: {low_p:.3f}",
+            f"{p}日均价",
+            period=p, mean=mean_p, high=high_p, low=low_p,
         )
-    print("", file=fp)
+    trading.sections.append(price)
 
-    print("## 涨跌幅", file=fp)
+    change = Section("涨跌幅", level=2)
     if len(close) >= 2 and close[-2] != 0:
-        print(f"- 当日: {(close[-1] / close[-2] - 1):.2%}", file=fp)
+        value = close[-1] / close[-2] - 1
+        change.add(f"{value:.2%}", "当日", value=value)
     for p in periods:
         if close[-p] != 0:
-            print(f"- {p}日累计: {(close[-1] / close[-p] - 1) * 100:.2f}%", file=fp)
-    print("", file=fp)
+            value = close[-1] / close[-p] - 1
+            change.add(f"{value * 100:.2f}%", f"{p}日累计", period=p, value=value)
+    trading.sections.append(change)
 
-    print("## 振幅", file=fp)
+    amplitude = Section("振幅", level=2)
     prev_close = close[-2] if len(close) >= 2 else close[-1]
     if prev_close != 0:
-        print(f"- 当日: {(high[-1] - low[-1]) / prev_close:.2%}", file=fp)
+        value = (high[-1] - low[-1]) / prev_close
+        amplitude.add(f"{value:.2%}", "当日", value=value)
         
     for p in periods:
-        mean_p = close[-p:].mean()
+        mean_p = windows.close.mean(p)
         if mean_p != 0:
-            print(f"- {p}日振幅: {(high[-p:].max() - low[-p:].min()) / mean_p:.2%}", file=fp)
-    print("", file=fp)
+            value = (windows.high.max(p) - windows.low.min(p)) / mean_p
+            amplitude.add(f"{value:.2%}", f"{p}日振幅", period=p, value=value)
+    trading.sections.append(amplitude)
 
-    print("## 成交量(万手)", file=fp)
-    if is_intra_day:
-        print(f"- 当日(实时): {volume_actual[-1] / 1e4:.2f}", file=fp)
-    else:
-        print(f"- 当日: {volume_actual[-1] / 1e4:.2f}", file=fp)
-        
+    today_label = "当日(实时)" if is_intra_day else "当日"
+    volume = Section("成交量(万手)", level=2)
+    volume.add(f"{windows.volume_today / 1e4:.2f}", today_label, value=windows.volume_today)
     for p in periods:
-        # 均量使用预估值来填补当日，否则均值会偏低
-        vol_for_mean = volume_actual.copy()
-        vol_for_mean[-1] = volume_est[-1]
-        print(f"- {p}日均量(万手): {vol_for_mean[-p:].mean() / 1e4:.2f}", file=fp)
-    print("", file=fp)
-
-    print("## 成交额(亿)", file=fp)
-    if is_intra_day:
-        print(f"- 当日(实时): {amount_actual[-1]:.2f}", file=fp)
-    else:
-        print(f"- 当日: {amount_actual[-1]:.2f}", file=fp)
-        
+        value = windows.volume.mean(p)
+        volume.add(f"{value / 1e4:.2f}", f"{p}日均量(万手)", period=p, value=value)
+    trading.sections.append(volume)
+
+    amount = Section("成交额(亿)", level=2)
+    amount.add(f"{windows.amount_today:.2f}", today_label, value=windows.amount_today)
     for p in periods:
-        amt_for_mean = amount_actual.copy()
-        amt_for_mean[-1] = amount_est[-1]
-        print(f"- {p}日均额(亿): {amt_for_mean[-p:].mean():.2f}", file=fp)
-    print("", file=fp)
+        value = windows.amount.mean(p)
+        amount.add(f"{value:.2f}", f"{p}日均额(亿)", period=p, value=value)
+    trading.sections.append(amount)
 
     # 资金流向部分
-    print("## 资金流向", file=fp)
+    fund_flow = Section("资金流向", level=2)
+    trading.sections.append(fund_flow)
 
     if data.get("IS_HISTORICAL_QUERY", False):
-        print("- 指定日期查询暂不展示实时资金流向", file=fp)
-        print("", file=fp)
+        fund_flow.add("指定日期查询暂不展示实时资金流向")
     else:
     
         # 09:15 - 17:00 uses Playwright because the AkShare fund-flow feed lags.
@@ -734,9 +990,10 @@ async def build_trading_data(
             # 调用无头浏览器抓取实时数据
             import json
             target_code = get_realtime_fund_flow_target(symbol, data)
+            # 实时数据缺失时以当日的数据源资金流向兜底
+            api_items = api_fund_flow_items_if_today
             if target_code is None:
-                if not print_api_fund_flow_if_today(fp, data):
-                    print("- 暂无实时资金流向", file=fp)
+                fund_flow.items = api_items(data) or [Item("暂无实时资金流向")]
             else:
                 try:
                     if (
@@ -750,14 +1007,14 @@ async def build_trading_data(
                     res = results.get(target_code, {})
                     
                     if "error" in res:
-                         if not print_api_fund_flow_if_today(fp, data):
-                             print(f"- [实时抓取失败] {res['error']}", file=fp)
+                         fund_flow.items = api_items(data) or [Item(f"[实时抓取失败] {res['error']}")]
                     elif res:
-                         if not has_realtime_fund_flow_values(res) and print_api_fund_flow_if_today(fp, data):
-                             pass
+                         fallback = [] if has_realtime_fund_flow_values(res) else api_items(data)
+                         if fallback:
+                             fund_flow.items = fallback
                          else:
                              # [增加] 显式输出抓取到的标的名称，方便交叉验证
-                             print(f"- 标的名称: {res.get('标的名称', '')}", file=fp)
+                             fund_flow.add(res.get('标的名称', ''), "标的名称")
                              prefix = get_realtime_fund_flow_prefix(target_code, data)
                              # 按顺序对齐：主力, 超大单, 大单, 中单, 小单
                              field_configs = [
@@ -769,32 +1026,31 @@ async def build_trading_data(
                              ]
                              for name, amt_key, ratio_key in field_configs:
                                  if amt_key in res:
-                                     amount_str = res[amt_key]
+                                     amount = res[amt_key]
+                                     # 接口 JSON 给出的是元，DOM 兜底给出的是页面上的文本
+                                     amount_str = (
+                                         format_fund_flow_amount(amount)
+                                         if isinstance(amount, (int, float))
+                                         else amount
+                                     )
                                      ratio = res.get(ratio_key, 0.0) / 100.0  # 修正百分比倍数
-                                     print(f"- {prefix}{name}净流入: {amount_str}  {name}净占比: {ratio:.2%}", file=fp)
+                                     fund_flow.add(
+                                         f"{amount_str}  {name}净占比: {ratio:.2%}",
+                                         f"{prefix}{name}净流入",
+                                         kind=name, amount=amount, ratio=ratio,
+                                     )
                     else:
-                         if not print_api_fund_flow_if_today(fp, data):
-                             print("- 盘中实时数据暂时不可用", file=fp)
+                         fund_flow.items = api_items(data) or [Item("盘中实时数据暂时不可用")]
                 except Exception as e:
-                    if not print_api_fund_flow_if_today(fp, data):
-                        print(f"- [实时调用异常] {str(e)}", file=fp)
+                    fund_flow.items = api_items(data) or [Item(f"[实时调用异常] {str(e)}")]
         else:
             # 非交易时段展示详情数据
-            has_fund_flow = False
-            fields = [
-                ("主力", "A"), ("超大单", "XL"), ("大单", "L"), ("中单", "M"), ("小单", "S"),
-            ]
-            for field_name, field_id in fields:
-                val = build_fund_flow((field_name, field_id), data)
-                if val:
-                    print(f"- {val}", file=fp)
-                    has_fund_flow = True
-            if not has_fund_flow:
-                print("- 暂无资金流向数据", file=fp)
-        print("", file=fp)
+            fund_flow.items = _fund_flow_items(data) or [Item("暂无资金流向数据")]
 
     if include_historical_fund_flow:
-        build_historical_fund_flow_data(fp, data, limit=historical_fund_flow_limit)
+        history = historical_fund_flow_section(data, limit=historical_fund_flow_limit)
+        if history is not None:
+            trading.sections.append(history)
 
     # 换手率计算
     fcap = data.get("FCAP", np.array([]))
@@ -802,18 +1058,17 @@ async def build_trading_data(
         fcap = data.get("TCAP", np.array([]))
         
     if len(fcap) > 0 and fcap[-1] > 0:
-        print("## 换手率", file=fp)
-        if is_intra_day:
-            print(f"- 当日(实时): {volume_actual[-1] * 100 / fcap[-1]:.2%}", file=fp)
-        else:
-            print(f"- 当日: {volume_actual[-1] * 100 / fcap[-1]:.2%}", file=fp)
-            
+        turnover = Section("换手率", level=2)
+        value = windows.volume_today * 100 / fcap[-1]
+        turnover.add(f"{value:.2%}", today_label, value=value)
         for p in periods:
-            vol_for_mean = volume_actual.copy()
-            vol_for_mean[-1] = volume_est[-1]
-            print(f"- {p}日均换手: {vol_for_mean[-p:].mean() * 100 / fcap[-1]:.2%}", file=fp)
-            print(f"- {p}日总换手 (含今日): {vol_for_mean[-p:].sum() * 100 / fcap[-1]:.2%}", file=fp)
-        print("", file=fp)
+            mean_p = windows.volume.mean(p) * 100 / fcap[-1]
+            total_p = windows.volume.sum(p) * 100 / fcap[-1]
+            turnover.add(f"{mean_p:.2%}", f"{p}日均换手", period=p, value=mean_p)
+            turnover.add(f"{total_p:.2%}", f"{p}日总换手 (含今日)", period=p, value=total_p)
+        trading.sections.append(turnover)
+
+    emit(fp, [trading])
 
 
 def build_technical_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> None:
@@ -828,9 +1083,6 @@ def build_technical_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> N
     if len(close) < 30:
         return
 
-    print("# 技术指标(最近30日)", file=fp)
-    print("", file=fp)
-
     indicators = get_technical_indicators(data, days=30, include_derived=False)
     columns = [
         "日期",
@@ -846,35 +1098,32 @@ def build_technical_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> N
         "BBands Middle",
         "BBands Lower",
     ]
-    print("| " + " | ".join(columns) + " |", file=fp)
-    print("| --- " * len(columns) + "|", file=fp)
 
     def format_value(value: float | None) -> str:
         return "N/A" if value is None else f"{value:.2f}"
 
+    rows = []
     for item in indicators:
         kdj = item["kdj"]
         macd = item["macd"]
         rsi = item["rsi"]
         bbands = item["bbands"]
-        values = [
-            format_value(kdj["k"]),
-            format_value(kdj["d"]),
-            format_value(kdj["j"]),
-            format_value(macd["dif"]),
-            format_value(macd["dea"]),
-            format_value(rsi["rsi6"]),
-            format_value(rsi["rsi12"]),
-            format_value(rsi["rsi24"]),
-            format_value(bbands["upper"]),
-            format_value(bbands["middle"]),
-            format_value(bbands["lower"]),
-        ]
-        print(
-            "| " + item["date"] + "|" + " | ".join(values) + " |",
-            file=fp,
-        )
-    print("", file=fp)
+        rows.append([
+            item["date"],
+            kdj["k"],
+            kdj["d"],
+            kdj["j"],
+            macd["dif"],
+            macd["dea"],
+            rsi["rsi6"],
+            rsi["rsi12"],
+            rsi["rsi24"],
+            bbands["upper"],
+            bbands["middle"],
+            bbands["lower"],
+        ])
+    table = Table(columns, rows, [str] + [format_value] * (len(columns) - 1), key_separator="|")
+    emit(fp, [Section("技术指标(最近30日)", table=table)])
 
 
 def build_financial_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> None:
@@ -882,11 +1131,10 @@ def build_financial_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> N
     if not is_stock(symbol):
         return
     
+    section = Section("财务数据")
     if "_DS_FINANCE" not in data:
-        print("# 财务数据", file=fp)
-        print("", file=fp)
-        print("- 暂无财务数据", file=fp)
-        print("", file=fp)
+        section.add("暂无财务数据")
+        emit(fp, [section])
         return
     
     fin, _ = data["_DS_FINANCE"]
@@ -895,8 +1143,6 @@ def build_financial_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> N
     
     dates = fin["DATE"]
     max_years = 5
-    print("# 财务数据", file=fp)
-    print("", file=fp)
     years = 0
     fields = [
         # (名称, 字段ID, 除数, 是否显示)
@@ -930,16 +1176,14 @@ def build_financial_data(fp: TextIO, symbol: str, data: Dict[str, ndarray]) -> N
         years += 1
 
     if not rows:
-        print("- 暂无年度财务数据", file=fp)
-        print("", file=fp)
+        section.add("暂无年度财务数据")
+        emit(fp, [section])
         return
 
-    print("| 指标 | " + " ".join([f"{r[0]} |" for r in rows]), file=fp)
-    print("| --- " * (len(rows) + 1) + "|", file=fp)
-    for i in range(1, len(rows[0])):
-        print(
-            f"| {fields[i - 1][0]} | " + " ".join([f"{r[i]:.2f} |" for r in rows]),
-            file=fp,
-        )
-
-    print("", file=fp)
+    # 每行一个指标，每列一个年度
+    section.table = Table(
+        ["指标"] + [r[0] for r in rows],
+        [[fields[i - 1][0]] + [r[i] for r in rows] for i in range(1, len(rows[0]))],
+        [str] + [lambda value: f"{value:.2f}"] * len(rows),
+    )
+    emit(fp, [section])
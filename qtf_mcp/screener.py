@@ -0,0 +1,544 @@
+"""Market-wide screening for the ``screen`` tool.
+
+``screen`` evaluates one filter expression over every A-share at once. The
+table it reads has two column groups, aligned on the full-market snapshot:
+
+- quote fields from ``datasource.market_snapshot`` (price, change, turnover,
+  PE, amount, market cap …), present for every listed stock;
+- K-line and finance features (moving averages, returns, average turnover,
+  ROE, PB) from ``FeatureStore``. Fetching two years of bars for 5000 symbols
+  per call is not an option, so these are computed whenever the server loads a
+  stock's latest K-line window for any tool and kept for that trading day.
+  ``FeatureBuilder`` fills in the rest: the first ``screen`` of each market
+  epoch starts a background pass over the snapshot's symbols, a few at a time
+  through the shared data-fetch slots. Until it finishes, stocks it has not
+  reached have NaN here and the result reports the coverage.
+
+The joined table is built once per (snapshot, feature-store version) and
+reused by every call until either side changes, so a call costs one parse of
+the expression plus a handful of vectorized NumPy operations.
+
+Expressions are Python-syntax comparisons over field names, parsed with
+``ast`` and evaluated only through the whitelist below — never ``eval``::
+
+    pe > 0 and pe < 15 and turnover20 > 5
+    close > ma60 and (ret20 > 10 or volume_ratio >= 2)
+
+A comparison involving NaN is false, so a stock without a feature never
+matches a condition on that feature (``not`` inverts this, as in NumPy).
+"""
+
+from __future__ import annotations
+
+import ast
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy import ndarray
+
+from .cache import market_phase
+from .config import SCREEN_FEATURE_BUILD_CONCURRENCY, SCREEN_FEATURE_MAX_ENTRIES
+from .datasource.market_snapshot import SNAPSHOT_FIELDS, MarketSnapshot, get_market_snapshot
+from .observability import detached_context
+from .window_stats import TradingWindows
+
+logger = logging.getLogger("qtf_mcp")
+
+# 均线为价格；收益率、换手率、ROE 为百分数；换手率含盘中全日预估，与报告一致
+FEATURE_FIELDS = (
+    "ma5",
+    "ma20",
+    "ma60",
+    "ret5",
+    "ret20",
+    "ret60",
+    "turnover5",
+    "turnover20",
+    "roe",
+    "pb",
+)
+SCREEN_FIELDS = tuple(SNAPSHOT_FIELDS) + FEATURE_FIELDS
+DEFAULT_RESULT_FIELDS = ("close", "change_pct", "turnover", "amount")
+SCREEN_MAX_LIMIT = 200
+
+_BUILD_TASK_ATTR = "_cn_stock_screen_feature_build"
+
+# Loads one symbol's latest window and records its features; False when nothing
+# was recorded (not a stock the data sources cover, or no bars came back).
+FeatureLoader = Callable[[str], Awaitable[bool]]
+
+_COMPARE = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+_ARITHMETIC = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+}
+
+
+class ScreenExpressionError(ValueError):
+    pass
+
+
+def _trading_day(epoch: str) -> str:
+    # 每个纪元标记都以其所属交易日结尾，如 live-2026-10-19、closed-2026-10-16
+    return epoch[-10:]
+
+
+def extract_features(data: Dict[str, ndarray], today_ratio: float = 1.0) -> Optional[ndarray]:
+    """Screen features of one symbol's raw data, in ``FEATURE_FIELDS`` order."""
+    close = data.get("CLOSE")
+    if close is None or len(close) == 0:
+        return None
+    features = dict.fromkeys(FEATURE_FIELDS, np.nan)
+    windows = TradingWindows(data, today_ratio)
+    close = np.asarray(close, dtype=np.float64)
+    fcap = data.get("FCAP", np.array([]))
+    if len(fcap) == 0 or fcap[-1] == 0:
+        fcap = data.get("TCAP", np.array([]))
+    for p in (5, 20, 60):
+        if p in windows.periods:
+            features[f"ma{p}"] = windows.close.mean(p)
+        # 与报告的“N日累计”同一基准：含当日在内的第 N 根
+        if len(close) >= p and close[-p] > 0:
+            features[f"ret{p}"] = (close[-1] / close[-p] - 1) * 100
+    if len(fcap) > 0 and fcap[-1] > 0:
+        for p in (5, 20):
+            if p in windows.periods:
+                # 成交量单位为手
+                features[f"turnover{p}"] = windows.volume.mean(p) * 100 / fcap[-1] * 100
+    if "_DS_FINANCE" in data:
+        fin, _ = data["_DS_FINANCE"]
+        roe = fin.get("ROE", np.array([]))
+        if len(roe) > 0:
+            features["roe"] = roe[-1] * 100
+    pb = data.get("PB", np.array([]))
+    if len(pb) > 0:
+        features["pb"] = pb[-1]
+    return np.array([features[name] for name in FEATURE_FIELDS], dtype=np.float64)
+
+
+class FeatureStore:
+    """Per-symbol screen features, recorded as a side effect of loading K-lines.
+
+    Entries remember the market epoch they were computed in; ``screen`` only
+    joins entries from the snapshot's trading day, so a later load of the same
+    symbol replaces yesterday's row instead of mixing days. Within one trading
+    day a load only overwrites the fields it provides: a K-line load without
+    finance data keeps the ``roe`` an earlier load recorded.
+    """
+
+    def __init__(self, *, max_entries: int = SCREEN_FEATURE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # symbol -> (epoch, recorded_at, features)
+        self._entries: dict[str, tuple[str, float, ndarray]] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def record(self, symbol: str, data: Dict[str, ndarray], today_ratio: float = 1.0) -> None:
+        """Compute and store the features of ``data``. Never raises."""
+        try:
+            features = extract_features(data, today_ratio)
+            if features is None:
+                return
+            _, epoch = market_phase()
+            with self._lock:
+                while len(self._entries) >= self.max_entries and symbol not in self._entries:
+                    oldest = min(self._entries, key=lambda s: self._entries[s][1])
+                    self._entries.pop(oldest, None)
+                current = self._entries.get(symbol)
+                if current is not None and _trading_day(current[0]) == _trading_day(epoch):
+                    features = np.where(np.isnan(features), current[2], features)
+                self._entries[symbol] = (epoch, time.time(), features)
+                self.version += 1
+        except Exception:
+            logger.warning("Screen feature record failed symbol=%s", symbol, exc_info=True)
+
+    def rows(self, trading_day: str) -> tuple[int, dict[str, ndarray]]:
+        """``(version, {symbol: features})`` for entries of ``trading_day``."""
+        with self._lock:
+            return self.version, {
+                symbol: features
+                for symbol, (epoch, _, features) in self._entries.items()
+                if _trading_day(epoch) == trading_day
+            }
+
+    def symbols(self, epoch: str) -> set[str]:
+        """Symbols whose row was recorded in ``epoch``."""
+        with self._lock:
+            return {symbol for symbol, (recorded, _, _) in self._entries.items() if recorded == epoch}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.version += 1
+
+
+_feature_store: Optional[FeatureStore] = None
+_feature_store_lock = threading.Lock()
+
+
+def get_feature_store() -> FeatureStore:
+    global _feature_store
+    if _feature_store is None:
+        with _feature_store_lock:
+            if _feature_store is None:
+                _feature_store = FeatureStore()
+    return _feature_store
+
+
+class FeatureBuilder:
+    """Record features for every snapshot symbol once per market epoch, in the background."""
+
+    def __init__(self, *, concurrency: int = SCREEN_FEATURE_BUILD_CONCURRENCY):
+        self.concurrency = concurrency
+        self._loader: Optional[FeatureLoader] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.concurrency > 0 and self._loader is not None
+
+    def register(self, loader: FeatureLoader) -> None:
+        """Declare how to load and record one symbol."""
+        self._loader = loader
+
+    async def build(self, snapshot: MarketSnapshot) -> dict[str, Any]:
+        """Load every symbol without a row from this epoch. Returns the stats it logs."""
+        loader = self._loader
+        if loader is None:
+            raise RuntimeError("no feature loader registered")
+        started_at = time.perf_counter()
+        recorded = get_feature_store().symbols(snapshot.epoch)
+        pending = deque(str(symbol) for symbol in snapshot.symbols if str(symbol) not in recorded)
+        candidates = len(pending)
+        counts = {"loaded": 0, "missed": 0}
+
+        async def worker() -> None:
+            while pending:
+                symbol = pending.popleft()
+                try:
+                    ok = await loader(symbol)
+                except Exception as error:
+                    ok = False
+                    logger.debug("Screen feature load failed symbol=%s error=%s", symbol, error)
+                counts["loaded" if ok else "missed"] += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, candidates))))
+        stats = {
+            "epoch": snapshot.epoch,
+            "candidates": candidates,
+            **counts,
+            "cost": time.perf_counter() - started_at,
+        }
+        logger.info(
+            "Screen feature build finished epoch=%s loaded=%s/%s missed=%s cost=%.1fs",
+            stats["epoch"],
+            stats["loaded"],
+            stats["candidates"],
+            stats["missed"],
+            stats["cost"],
+        )
+        return stats
+
+    async def _run(self, snapshot: MarketSnapshot) -> None:
+        try:
+            await self.build(snapshot)
+        except Exception:
+            logger.warning("Screen feature build failed epoch=%s", snapshot.epoch, exc_info=True)
+
+    def ensure_build(self, snapshot: MarketSnapshot) -> bool:
+        """Start the build of ``snapshot``'s epoch once; True while it is running."""
+        if not self.enabled:
+            return False
+        loop = asyncio.get_running_loop()
+        current = getattr(loop, _BUILD_TASK_ATTR, None)
+        if current is not None:
+            epoch, task = current
+            if epoch == snapshot.epoch:
+                return not task.done()
+            # 上一纪元的补齐已过时
+            task.cancel()
+        # 由某次 screen 调用触发，但不能继承那次请求的截止时间
+        task = loop.create_task(self._run(snapshot), context=detached_context())
+        setattr(loop, _BUILD_TASK_ATTR, (snapshot.epoch, task))
+        logger.info(
+            "Screen feature build started epoch=%s symbols=%s concurrency=%s",
+            snapshot.epoch,
+            len(snapshot),
+            self.concurrency,
+        )
+        return True
+
+
+_feature_builder: Optional[FeatureBuilder] = None
+
+
+def get_feature_builder() -> FeatureBuilder:
+    global _feature_builder
+    if _feature_builder is None:
+        _feature_builder = FeatureBuilder()
+    return _feature_builder
+
+
+def set_feature_builder(builder: Optional[FeatureBuilder]) -> None:
+    """Replace the process-wide builder. Tests use this; production does not."""
+    global _feature_builder
+    _feature_builder = builder
+
+
+@dataclass(frozen=True)
+class ScreenTable:
+    snapshot: MarketSnapshot
+    columns: Dict[str, ndarray]
+    feature_coverage: int
+    version: int
+
+
+_table: Optional[ScreenTable] = None
+_table_lock = threading.Lock()
+
+
+def build_screen_table(snapshot: MarketSnapshot, store: Optional[FeatureStore] = None) -> ScreenTable:
+    """Join the snapshot with today's feature rows; reused until either side changes."""
+    global _table
+    store = store or get_feature_store()
+    version, rows = store.rows(_trading_day(snapshot.epoch))
+    with _table_lock:
+        table = _table
+        if table is not None and table.snapshot is snapshot and table.version == version:
+            return table
+
+    features = np.full((len(snapshot), len(FEATURE_FIELDS)), np.nan)
+    index = {symbol: i for i, symbol in enumerate(snapshot.symbols)}
+    covered = 0
+    for symbol, values in rows.items():
+        i = index.get(symbol)
+        if i is not None:
+            features[i] = values
+            covered += 1
+    columns = dict(snapshot.columns)
+    for j, name in enumerate(FEATURE_FIELDS):
+        columns[name] = features[:, j]
+    table = ScreenTable(snapshot, columns, covered, version)
+    with _table_lock:
+        _table = table
+    return table
+
+
+def _unknown_field(name: str) -> ScreenExpressionError:
+    return ScreenExpressionError(f"未知字段 {name}，可用字段: {', '.join(SCREEN_FIELDS)}")
+
+
+def _check_node(node: ast.AST, fields: List[str]) -> None:
+    if isinstance(node, ast.Name):
+        if node.id not in SCREEN_FIELDS:
+            raise _unknown_field(node.id)
+        if node.id not in fields:
+            fields.append(node.id)
+        return
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ScreenExpressionError(f"不支持的常量: {node.value!r}")
+        return
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, (ast.And, ast.Or)):
+        children = node.values
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub, ast.UAdd)):
+        children = [node.operand]
+    elif isinstance(node, ast.Compare) and all(type(op) in _COMPARE for op in node.ops):
+        children = [node.left, *node.comparators]
+    elif isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+        children = [node.left, node.right]
+    elif isinstance(node, ast.Tuple):
+        # 逗号分隔的条件按 and 处理
+        children = node.elts
+    else:
+        raise ScreenExpressionError(f"不支持的表达式: {ast.unparse(node)}")
+    for child in children:
+        _check_node(child, fields)
+
+
+@functools.lru_cache(maxsize=256)
+def parse_expression(text: str) -> Tuple[Optional[ast.expr], Tuple[str, ...]]:
+    """Validate ``text``; returns its syntax tree (None when empty) and the fields it reads."""
+    text = text.strip().replace("，", ",")
+    if not text:
+        return None, ()
+    try:
+        tree = ast.parse(text, mode="eval").body
+    except SyntaxError as exc:
+        raise ScreenExpressionError(f"无法解析筛选表达式: {exc.msg}") from None
+    fields: List[str] = []
+    _check_node(tree, fields)
+    return tree, tuple(fields)
+
+
+def _mask(value: Any, node: ast.AST, size: int) -> ndarray:
+    array = np.asarray(value)
+    if array.dtype != np.bool_:
+        raise ScreenExpressionError(f"条件必须是比较: {ast.unparse(node)}")
+    return np.broadcast_to(array, (size,))
+
+
+def _number(value: Any, node: ast.AST) -> Any:
+    if np.asarray(value).dtype == np.bool_:
+        raise ScreenExpressionError(f"条件不能参与算术运算: {ast.unparse(node)}")
+    return value
+
+
+def _evaluate(node: ast.AST, columns: Dict[str, ndarray], size: int) -> Any:
+    if isinstance(node, ast.Name):
+        return columns[node.id]
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    if isinstance(node, ast.BoolOp):
+        masks = [_mask(_evaluate(v, columns, size), v, size) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return functools.reduce(combine, masks)
+    if isinstance(node, ast.Tuple):
+        masks = [_mask(_evaluate(v, columns, size), v, size) for v in node.elts]
+        return functools.reduce(np.logical_and, masks)
+    if isinstance(node, ast.UnaryOp):
+        operand = _evaluate(node.operand, columns, size)
+        if isinstance(node.op, ast.Not):
+            return ~_mask(operand, node.operand, size)
+        operand = _number(operand, node.operand)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, columns, size)
+        result = None
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, columns, size)
+            step = _COMPARE[type(op)](left, right)
+            result = step if result is None else np.logical_and(result, step)
+            left = right
+        return result
+    left = _number(_evaluate(node.left, columns, size), node.left)
+    right = _number(_evaluate(node.right, columns, size), node.right)
+    return _ARITHMETIC[type(node.op)](left, right)
+
+
+def evaluate_expression(text: str, columns: Dict[str, ndarray], size: int) -> ndarray:
+    """Boolean mask of the rows matching ``text``; an empty expression matches all rows."""
+    tree, _ = parse_expression(text)
+    if tree is None:
+        return np.ones(size, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return _mask(_evaluate(tree, columns, size), tree, size)
+
+
+def parse_sort(sort: str) -> tuple[str, bool]:
+    """``"-amount"`` -> ``("amount", True)``: field and descending flag."""
+    text = (sort or "").strip()
+    descending = text.startswith("-")
+    name = text.lstrip("+-").strip()
+    if name not in SCREEN_FIELDS:
+        raise _unknown_field(name)
+    return name, descending
+
+
+@dataclass(frozen=True)
+class ScreenRow:
+    symbol: str
+    name: str
+    values: Dict[str, Optional[float]]
+
+
+@dataclass(frozen=True)
+class ScreenResult:
+    total: int
+    matched: int
+    fields: Tuple[str, ...]
+    rows: Tuple[ScreenRow, ...]
+    fetched_at: str
+    trade_date: Optional[str]
+    feature_coverage: int
+    features_building: bool = False
+    warnings: Tuple[str, ...] = ()
+
+
+def run_screen(
+    table: ScreenTable,
+    expression: str = "",
+    sort: str = "-amount",
+    offset: int = 0,
+    limit: int = 50,
+    building: bool = False,
+) -> ScreenResult:
+    """Filter, rank and page ``table``. Raises ``ScreenExpressionError`` on bad input.
+
+    ``building`` tells whether the background feature build of the epoch is still running.
+    """
+    if limit < 1 or limit > SCREEN_MAX_LIMIT:
+        raise ScreenExpressionError(f"limit 必须在 1 到 {SCREEN_MAX_LIMIT} 之间")
+    if offset < 0:
+        raise ScreenExpressionError("offset 不能为负数")
+    sort_field, descending = parse_sort(sort)
+    _, referenced = parse_expression(expression)
+    size = len(table.snapshot)
+
+    matched = np.flatnonzero(evaluate_expression(expression, table.columns, size))
+    keys = table.columns[sort_field][matched]
+    # NaN 总是排在最后；stable 保证同值按行情表顺序
+    order = np.argsort(-keys if descending else keys, kind="stable")
+    page = matched[order[offset:offset + limit]]
+
+    fields = tuple(dict.fromkeys((*DEFAULT_RESULT_FIELDS, *referenced, sort_field)))
+    rows = tuple(
+        ScreenRow(
+            symbol=str(table.snapshot.symbols[i]),
+            name=str(table.snapshot.names[i]),
+            values={
+                name: (float(table.columns[name][i]) if np.isfinite(table.columns[name][i]) else None)
+                for name in fields
+            },
+        )
+        for i in page
+    )
+    warnings = []
+    uses_features = any(name in FEATURE_FIELDS for name in (*referenced, sort_field))
+    if uses_features and table.feature_coverage < size:
+        source = "后台补齐进行中" if building else "当日已加载过 K 线的个股"
+        warnings.append(
+            f"K 线与财务字段仅覆盖 {table.feature_coverage}/{size} 只股票（{source}），"
+            "其余股票在这些字段上为空，不满足相关条件，结果并非全市场"
+        )
+    return ScreenResult(
+        total=size,
+        matched=len(matched),
+        fields=fields,
+        rows=rows,
+        fetched_at=table.snapshot.fetched_at,
+        trade_date=table.snapshot.trade_date,
+        feature_coverage=table.feature_coverage,
+        features_building=building,
+        warnings=tuple(warnings),
+    )
+
+
+async def screen_market(
+    expression: str = "",
+    sort: str = "-amount",
+    offset: int = 0,
+    limit: int = 50,
+) -> ScreenResult:
+    """Validate the request, then screen the current full-market snapshot."""
+    # 先校验参数，非法表达式不触发全市场行情请求
+    parse_expression(expression)
+    parse_sort(sort)
+    snapshot = await get_market_snapshot()
+    building = get_feature_builder().ensure_build(snapshot)
+    return run_screen(build_screen_table(snapshot), expression, sort, offset, limit, building)
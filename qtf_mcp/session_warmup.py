@@ -0,0 +1,152 @@
+"""Pre-open browser and auth warm-up, and the evening browser shutdown.
+
+The first intraday report after a quiet night would otherwise pay for the
+Playwright driver start, the Chromium launch and the fund-flow context, and the
+first ``market_breadth`` call for a Tonghuashun auth bootstrap. A few minutes
+before ``PRE_OPEN`` on weekdays the scheduler starts the fund-flow browser,
+fills the page pool, checks that a canary page renders (restarting the browser
+once if it does not), and confirms or refreshes the cached Tonghuashun auth.
+
+Live fund flow is only scraped until the ``BRANCH_FLIP`` at 17:00, so right
+after it the browser and driver are closed to free their memory overnight.
+Anything that still needs a browser later simply starts one again.
+
+Inert when ``SESSION_WARMUP_MINUTES`` is 0.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Optional
+
+from .cache import BRANCH_FLIP, PRE_OPEN, _as_shanghai
+from .config import SESSION_WARMUP_MINUTES
+from .datasource import realtime_ff
+from .datasource.market_breadth import warm_market_breadth_auth
+from .observability import detached_context
+
+logger = logging.getLogger("qtf_mcp")
+
+EVENT_WARMUP = "warmup"
+EVENT_SHUTDOWN = "shutdown"
+# 关浏览器前给在用的抓取留出的收尾时间
+SHUTDOWN_DRAIN_SECONDS = 30.0
+SHUTDOWN_DELAY_SECONDS = 5.0
+
+_SCHEDULER_TASK_ATTR = "_cn_stock_session_warmup_task"
+
+
+def next_session_event(
+    now: Optional[datetime.datetime] = None,
+    lead_minutes: float = SESSION_WARMUP_MINUTES,
+) -> tuple[str, datetime.datetime]:
+    """Return the next weekday warm-up or shutdown after ``now``."""
+    current = _as_shanghai(now)
+    day = current.date()
+    lead = datetime.timedelta(minutes=lead_minutes)
+    for offset in range(8):
+        candidate_day = day + datetime.timedelta(days=offset)
+        if candidate_day.weekday() >= 5:
+            continue
+        pre_open = datetime.datetime.combine(candidate_day, PRE_OPEN, tzinfo=current.tzinfo)
+        flip = datetime.datetime.combine(candidate_day, BRANCH_FLIP, tzinfo=current.tzinfo)
+        events = (
+            (EVENT_WARMUP, pre_open - lead),
+            (EVENT_SHUTDOWN, flip + datetime.timedelta(seconds=SHUTDOWN_DELAY_SECONDS)),
+        )
+        for kind, at in events:
+            if at > current:
+                return kind, at
+    raise AssertionError("no weekday within 8 days")
+
+
+class SessionWarmup:
+    """Warm the browser and auth before the session; close the browser after it."""
+
+    def __init__(self, *, lead_minutes: float = SESSION_WARMUP_MINUTES):
+        self.lead_minutes = lead_minutes
+
+    @property
+    def enabled(self) -> bool:
+        return self.lead_minutes > 0
+
+    async def warm_up(self) -> dict[str, Any]:
+        """Warm the fund-flow browser and the market-breadth auth once. Returns the stats it logs."""
+        started_at = time.perf_counter()
+        browser_ok = await realtime_ff.warm_browser()
+        auth_ok = await warm_market_breadth_auth()
+        stats = {
+            "browser": browser_ok,
+            "auth": auth_ok,
+            "idle_pages": realtime_ff.get_page_pool().idle,
+            "cost": time.perf_counter() - started_at,
+        }
+        logger.info(
+            "Session warm-up finished browser=%s auth=%s idle_pages=%s cost=%.2fs",
+            stats["browser"],
+            stats["auth"],
+            stats["idle_pages"],
+            stats["cost"],
+        )
+        return stats
+
+    async def shut_down(self) -> None:
+        started_at = time.perf_counter()
+        await realtime_ff.close_browser(SHUTDOWN_DRAIN_SECONDS)
+        logger.info("Session browser shutdown cost=%.2fs", time.perf_counter() - started_at)
+
+    async def run(self) -> None:
+        """Sleep until each warm-up or shutdown, then run it. Runs for the loop's lifetime."""
+        while True:
+            kind, target = next_session_event(lead_minutes=self.lead_minutes)
+            await asyncio.sleep(max(0.0, (target - _as_shanghai()).total_seconds()))
+            try:
+                if kind == EVENT_WARMUP:
+                    await self.warm_up()
+                else:
+                    await self.shut_down()
+            except Exception:
+                logger.warning("Session %s failed", kind, exc_info=True)
+
+    def ensure_running(self) -> None:
+        """Start the schedule on the running event loop, once."""
+        if not self.enabled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = getattr(loop, _SCHEDULER_TASK_ATTR, None)
+        if task is not None and not task.done():
+            return
+        # 在应用启动时启动，不继承任何请求的截止时间
+        setattr(
+            loop,
+            _SCHEDULER_TASK_ATTR,
+            loop.create_task(self.run(), context=detached_context()),
+        )
+        kind, target = next_session_event(lead_minutes=self.lead_minutes)
+        logger.info(
+            "Session warm-up scheduler started next=%s at=%s",
+            kind,
+            target.strftime("%Y-%m-%d %H:%M"),
+        )
+
+
+_scheduler: Optional[SessionWarmup] = None
+
+
+def get_session_warmup() -> SessionWarmup:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = SessionWarmup()
+    return _scheduler
+
+
+def set_session_warmup(scheduler: Optional[SessionWarmup]) -> None:
+    """Replace the process-wide scheduler. Tests use this; production does not."""
+    global _scheduler
+    _scheduler = scheduler
@@ -0,0 +1,79 @@
+"""Trailing-window statistics for the report sections.
+
+``build_trading_data`` reports the mean / high / low / sum of the last ``p``
+bars for ``p`` in 5, 20, 60, 120 and 240, across the price, amplitude, volume,
+amount and turnover sections. Every window ends at the latest bar, so the
+statistics are computed once per series and served to every section:
+
+- max / min come from one running-extremum pass from the newest bar backwards;
+- sums are NumPy's own ``x[-p:].sum()``, once per period. A single suffix-sum
+  pass would be cheaper, but prices carry two decimals, so a 20-day mean
+  printed to three decimals sits on a rounding tie about 1% of the time, and
+  any other summation order flips the printed digit there.
+
+The volume / amount copies with the intraday estimate on the latest bar are
+made once, not once per period and section.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable
+
+import numpy as np
+from numpy import ndarray
+
+TRAILING_PERIODS = (5, 20, 60, 120, 240)
+
+
+class TrailingWindows:
+    """Sum, mean, max and min of the trailing windows ``values[-p:]``."""
+
+    __slots__ = ("_sums", "_highs", "_lows")
+
+    def __init__(self, values: ndarray, periods: Iterable[int] = TRAILING_PERIODS):
+        values = np.asarray(values, dtype=np.float64)
+        newest_first = values[::-1]
+        self._sums = {p: values[-p:].sum() for p in periods if p <= len(values)}
+        self._highs = np.maximum.accumulate(newest_first) if len(values) else newest_first
+        self._lows = np.minimum.accumulate(newest_first) if len(values) else newest_first
+
+    def sum(self, period: int) -> float:
+        return self._sums[period]
+
+    def mean(self, period: int) -> float:
+        # 与 ndarray.mean 相同：和除以个数
+        return self._sums[period] / period
+
+    def max(self, period: int) -> float:
+        return self._highs[period - 1]
+
+    def min(self, period: int) -> float:
+        return self._lows[period - 1]
+
+
+class TradingWindows:
+    """Trailing windows of one symbol's K-line data, built once per report.
+
+    ``volume`` and ``amount`` (in 亿) carry the intraday full-day estimate on
+    the latest bar, which is what the period averages and turnover use; the
+    raw latest values stay available as ``volume_today`` / ``amount_today``.
+    """
+
+    def __init__(self, data: Dict[str, ndarray], today_ratio: float = 1.0):
+        close = data["CLOSE"]
+        volume = np.array(data.get("VOLUME", np.zeros_like(close)), dtype=np.float64)
+        amount = np.array(data.get("AMOUNT", np.zeros_like(close)), dtype=np.float64) / 1e8
+        self.volume_today = volume[-1] if len(volume) else 0.0
+        self.amount_today = amount[-1] if len(amount) else 0.0
+        # 均量使用预估值来填补当日，否则盘中均值会偏低
+        if len(volume):
+            volume[-1] = volume[-1] * today_ratio
+        if len(amount):
+            amount[-1] = amount[-1] * today_ratio
+
+        self.periods = [p for p in TRAILING_PERIODS if p <= len(close)]
+        self.close = TrailingWindows(close, self.periods)
+        self.high = TrailingWindows(data.get("HIGH", close), ())
+        self.low = TrailingWindows(data.get("LOW", close), ())
+        self.volume = TrailingWindows(volume, self.periods)
+        self.amount = TrailingWindows(amount, self.periods)
@@ -7,12 +7,16 @@ import datetime
 import numpy as np
 import pytest
 
+from qtf_mcp import breadth_history as breadth_history_module
 from qtf_mcp import cache as cache_module
+from qtf_mcp import indicators as indicators_module
+from qtf_mcp import screener as screener_module
+from qtf_mcp import session_warmup as session_warmup_module
 
 
 @pytest.fixture(autouse=True)
 def isolate_report_cache():
-    """默认关闭报告缓存，并隔离生产缓存目录。
+    """默认关闭报告缓存与原始数据缓存，并隔离生产缓存目录。
 
     缓存是一个可选层，断言"是否回源"的测试必须在关闭状态下运行；
     需要缓存的测试自行调用 set_report_cache 覆盖。
@@ -20,8 +24,42 @@ def isolate_report_cache():
     cache_module.set_report_cache(
         cache_module.ReportCache(enabled=False, disk_enabled=False)
     )
+    cache_module.set_raw_data_cache(cache_module.RawDataCache(enabled=False))
     yield
     cache_module.set_report_cache(None)
+    cache_module.set_raw_data_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def isolate_session_warmup():
+    """应用启动时会启动开盘前预热调度；测试中不启动浏览器。"""
+    session_warmup_module.set_session_warmup(session_warmup_module.SessionWarmup(lead_minutes=0))
+    yield
+    session_warmup_module.set_session_warmup(None)
+
+
+@pytest.fixture(autouse=True)
+def isolate_breadth_sampler():
+    """应用启动时会启动涨跌分布采样；测试中不采样也不写生产目录。"""
+    breadth_history_module.set_breadth_sampler(breadth_history_module.BreadthSampler(interval=0))
+    yield
+    breadth_history_module.set_breadth_sampler(None)
+
+
+@pytest.fixture(autouse=True)
+def isolate_feature_builder():
+    """screen 会在后台逐只补齐全市场特征；测试中不发起这类取数。"""
+    screener_module.set_feature_builder(screener_module.FeatureBuilder(concurrency=0))
+    yield
+    screener_module.set_feature_builder(None)
+
+
+@pytest.fixture(autouse=True)
+def isolate_indicator_engine():
+    """增量指标状态按标的跨调用保留，测试之间不能互相继承。"""
+    indicators_module.set_indicator_engine(None)
+    yield
+    indicators_module.set_indicator_engine(None)
 
 
 @pytest.fixture(scope="session")
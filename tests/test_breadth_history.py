@@ -0,0 +1,129 @@
+"""
+盘中涨跌分布历史测试
+
+覆盖：环形缓冲写满后覆盖最旧样本、均匀降采样保留首尾、
+过期与过密样本的跳过、收盘后落盘并从磁盘读回，以及 market_breadth_history 工具的列式输出。
+"""
+
+import datetime
+import importlib
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from qtf_mcp import breadth_history
+from qtf_mcp.breadth_history import BreadthRing, BreadthSampler, load_series
+from qtf_mcp.datasource.market_breadth import MARKET_BREADTH_RANGES, MarketBreadthBucket, MarketBreadthData
+
+app_module = importlib.import_module("qtf_mcp.mcp_app")
+
+SHANGHAI = ZoneInfo("Asia/Shanghai")
+
+
+def at(hour, minute, day=16):
+    # 2026-10-16 是周五
+    return datetime.datetime(2026, 10, day, hour, minute, tzinfo=SHANGHAI)
+
+
+def make_data(up, limit_up=None, trade_date="2026-10-16") -> MarketBreadthData:
+    return MarketBreadthData(
+        source="test",
+        fetched_at="2026-10-16 10:00:00",
+        trade_date=trade_date,
+        up_count=up,
+        down_count=100,
+        flat_count=10,
+        limit_up_count=limit_up,
+        limit_down_count=3,
+        distribution=tuple(
+            MarketBreadthBucket(label=label, count=index)
+            for index, label in enumerate(MARKET_BREADTH_RANGES)
+        ),
+    )
+
+
+def test_ring_overwrites_oldest_and_starts_over_on_a_new_day():
+    ring = BreadthRing(capacity=3)
+    for index in range(5):
+        ring.append("2026-10-16", float(index), make_data(up=index))
+
+    series = ring.series()
+    assert series.times.tolist() == [2.0, 3.0, 4.0]
+    assert series.counts[:, 0].tolist() == [2, 3, 4]
+    assert series.counts[0, 3] == -1 and series.counts[0, 4] == 3
+    assert series.counts[0, 5:].tolist() == list(range(10))
+
+    ring.append("2026-10-19", 9.0, make_data(up=9))
+    assert len(ring) == 1 and ring.series().trade_date == "2026-10-19"
+
+
+def test_downsample_keeps_first_and_last_samples():
+    ring = BreadthRing(capacity=300)
+    for index in range(240):
+        ring.append("2026-10-16", float(index), make_data(up=index))
+
+    sampled = ring.series().downsample(5)
+
+    assert sampled.times.tolist() == [0.0, 60.0, 120.0, 179.0, 239.0]
+    assert len(ring.series().downsample(0)) == 240
+
+
+@pytest.mark.asyncio
+async def test_sampler_skips_stale_and_dense_samples_then_persists_after_close(monkeypatch, tmp_path):
+    results = iter(
+        [
+            make_data(up=1, trade_date="2026-10-15"),
+            make_data(up=2),
+            make_data(up=4, limit_up=7),
+        ]
+    )
+
+    async def fake_get_market_breadth():
+        return next(results)
+
+    monkeypatch.setattr(breadth_history, "get_market_breadth", fake_get_market_breadth)
+    sampler = BreadthSampler(interval=60, capacity=16, directory=str(tmp_path))
+
+    assert not await sampler.sample(at(9, 15))
+    assert await sampler.sample(at(9, 16))
+    assert not await sampler.sample(at(9, 16) + datetime.timedelta(seconds=10))
+    await sampler.tick(at(15, 4))
+    await sampler.tick(at(15, 5))
+    await sampler.tick(at(15, 6))
+
+    saved = load_series("2026-10-16", str(tmp_path))
+    assert saved.counts[:, 0].tolist() == [2, 4]
+    assert saved.counts[:, 3].tolist() == [-1, 7]
+    assert [path.name for path in tmp_path.iterdir()] == ["2026-10-16.npz"]
+
+    # 重启后内存为空，同一天从磁盘读回
+    restarted = BreadthSampler(interval=60, directory=str(tmp_path))
+    assert restarted.history("2026-10-16").times.tolist() == saved.times.tolist()
+    assert restarted.history("2026-10-15") is None
+
+
+@pytest.mark.asyncio
+async def test_history_tool_returns_columns_without_upstream_calls(monkeypatch, tmp_path):
+    async def forbidden_get_market_breadth():
+        raise AssertionError("history must not fetch")
+
+    sampler = BreadthSampler(interval=60, directory=str(tmp_path))
+    sampler.ring.append("2026-10-16", at(9, 30).timestamp(), make_data(up=5))
+    sampler.ring.append("2026-10-16", at(9, 31).timestamp(), make_data(up=6, limit_up=2))
+    sampler.ring.append("2026-10-16", at(9, 32).timestamp(), make_data(up=7, limit_up=3))
+    monkeypatch.setattr(breadth_history, "_sampler", sampler)
+    monkeypatch.setattr(breadth_history, "get_market_breadth", forbidden_get_market_breadth)
+
+    response = await app_module.market_breadth_history(date="2026-10-16", points=2)
+
+    assert response.samples == 3
+    assert response.times == ["09:30:00", "09:32:00"]
+    assert response.up_count == [5, 7]
+    assert response.limit_up_count == [None, 3]
+    assert response.distribution["8% ~ 涨停"] == [9, 9]
+
+    missing = await app_module.market_breadth_history(date="2026-10-15")
+    assert missing.samples == 0 and missing.warnings
+
+    with pytest.raises(ValueError):
+        await app_module.market_breadth_history(date="16/10/2026")
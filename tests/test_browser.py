@@ -0,0 +1,200 @@
+"""
+共享浏览器管理测试
+
+覆盖：启动与建 context 被取消时的清理、同一驱动服务多个用途、
+按页面数回收浏览器（等在用租约结束）、断线重建，以及常驻内存采样。
+"""
+
+import asyncio
+
+import pytest
+
+from qtf_mcp.datasource import browser as browser_module
+from qtf_mcp.datasource import realtime_ff
+from qtf_mcp.datasource.browser import BrowserManager, BrowserPurpose
+
+
+class FakeContext:
+    def __init__(self):
+        self.handlers = []
+
+    def on(self, event, handler):
+        self.handlers.append(handler)
+
+    async def new_page(self):
+        page = object()
+        for handler in self.handlers:
+            handler(page)
+        return page
+
+
+class FakeBrowser:
+    def __init__(self, hang_on_context=None):
+        self.hang_on_context = hang_on_context
+        self.closed = False
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected and not self.closed
+
+    async def new_context(self, **kwargs):
+        if self.hang_on_context is not None:
+            self.hang_on_context.set()
+            await asyncio.Event().wait()
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeChromium:
+    def __init__(self, hang_on_launch=None, browser_factory=FakeBrowser):
+        self.hang_on_launch = hang_on_launch
+        self.browser_factory = browser_factory
+        self.launched = []
+        self.browsers = []
+
+    async def launch(self, **kwargs):
+        self.launched.append(kwargs)
+        if self.hang_on_launch is not None:
+            self.hang_on_launch.set()
+            await asyncio.Event().wait()
+        browser = self.browser_factory()
+        self.browsers.append(browser)
+        return browser
+
+
+class FakePlaywright:
+    def __init__(self, chromium):
+        self.chromium = chromium
+        self.starts = 0
+        self.stopped = False
+
+    async def start(self):
+        self.starts += 1
+        return self
+
+    async def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def fake_driver(monkeypatch):
+    playwright = FakePlaywright(FakeChromium())
+    monkeypatch.setattr(browser_module, "async_playwright", lambda: playwright)
+    return playwright
+
+
+HEADFUL = BrowserPurpose("headful", headless=False, channel="chrome", keep_open=False)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_browser_launch_stops_partial_playwright(monkeypatch):
+    launch_started = asyncio.Event()
+    playwright = FakePlaywright(FakeChromium(hang_on_launch=launch_started))
+    monkeypatch.setattr(browser_module, "async_playwright", lambda: playwright)
+    manager = BrowserManager()
+
+    async def lease():
+        async with manager.lease(realtime_ff.FUND_FLOW_BROWSER):
+            pass
+
+    startup = asyncio.create_task(lease())
+    await launch_started.wait()
+    startup.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await startup
+
+    assert playwright.stopped
+    assert manager._playwright is None
+    assert manager.stats()["browsers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_context_creation_closes_partial_browser(monkeypatch):
+    context_started = asyncio.Event()
+    playwright = FakePlaywright(
+        FakeChromium(browser_factory=lambda: FakeBrowser(hang_on_context=context_started))
+    )
+    monkeypatch.setattr(browser_module, "async_playwright", lambda: playwright)
+    manager = BrowserManager()
+
+    async def lease():
+        async with manager.lease(realtime_ff.FUND_FLOW_BROWSER):
+            pass
+
+    startup = asyncio.create_task(lease())
+    await context_started.wait()
+    startup.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await startup
+
+    assert playwright.chromium.browsers[0].closed
+    assert playwright.stopped
+    assert manager._playwright is None
+
+
+@pytest.mark.asyncio
+async def test_purposes_share_one_driver_and_headful_browser_closes_after_use(fake_driver):
+    """资金流与同花顺共用一个驱动；有界面的浏览器用完即关，无头浏览器与 context 常驻复用。"""
+    manager = BrowserManager(max_rss_mb=0)
+
+    async with manager.lease(realtime_ff.FUND_FLOW_BROWSER) as first:
+        pass
+    async with manager.lease(HEADFUL) as headful:
+        assert headful is not first
+    async with manager.lease(realtime_ff.FUND_FLOW_BROWSER) as again:
+        assert again is first
+
+    chromium = fake_driver.chromium
+    assert fake_driver.starts == 1
+    assert [call["headless"] for call in chromium.launched] == [True, False]
+    assert chromium.launched[1]["channel"] == "chrome"
+    assert chromium.launched[0]["args"].count("--disable-gpu") == 1
+    assert not chromium.browsers[0].closed and chromium.browsers[1].closed
+    assert manager.stats()["browsers"] == 1 and manager.launches == 2
+
+    await manager.close()
+    assert chromium.browsers[0].closed and fake_driver.stopped
+
+
+@pytest.mark.asyncio
+async def test_browser_recycles_after_page_budget_once_leases_drain(fake_driver):
+    """开满页面数的浏览器等在用的租约结束后再换新；断线的浏览器直接重建。"""
+    manager = BrowserManager(max_rss_mb=0, max_pages=2)
+    purpose = realtime_ff.FUND_FLOW_BROWSER
+
+    async with manager.lease(purpose) as context:
+        held = manager.lease(purpose)
+        assert await held.__aenter__() is context
+        await context.new_page()
+        await context.new_page()
+
+    # 仍有租约在用：新的租约排队，旧浏览器不关
+    queued = manager.lease(purpose)
+    waiting = asyncio.create_task(queued.__aenter__())
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+    assert not fake_driver.chromium.browsers[0].closed
+
+    await held.__aexit__(None, None, None)
+    fresh = await asyncio.wait_for(waiting, timeout=1)
+    assert fresh is not context
+    assert fake_driver.chromium.browsers[0].closed
+    assert manager.recycles == 1 and manager.stats()["in_use"] == 1
+
+    fake_driver.chromium.browsers[1].connected = False
+    await queued.__aexit__(None, None, None)
+    async with manager.lease(purpose) as relaunched:
+        assert relaunched is not fresh
+    assert manager.launches == 3 and fake_driver.starts == 1
+
+
+def test_descendant_rss_reads_proc():
+    rss = browser_module.descendant_rss_mb()
+    assert rss is None or rss >= 0.0
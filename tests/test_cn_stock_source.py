@@ -12,7 +12,7 @@ import pytest
 from qtf_mcp.datasource import cn_stock_source as source_module
 from qtf_mcp.datasource.cn_stock_source import CNStockDataSource
 from qtf_mcp.datasource.base import DataSource, FetchRequirements, StockData
-from qtf_mcp import datafeed
+from qtf_mcp import datafeed, observability
 
 
 def _sample_kline_frame():
@@ -106,6 +106,37 @@ def test_executor_limiter_can_be_reused_across_event_loops(monkeypatch):
     asyncio.run(run_wave())
 
 
+@pytest.mark.asyncio
+async def test_expired_request_is_shed_before_taking_a_data_fetch_slot(monkeypatch):
+    """排队等取数名额时过了截止时间的请求被丢弃，不会提交到线程池，也不占名额。"""
+    monkeypatch.setattr(source_module, "DATA_FETCH_MAX_IN_FLIGHT", 1)
+    release = threading.Event()
+    calls = []
+
+    def blocking_call():
+        release.wait()
+
+    def queued_call():
+        calls.append(1)
+
+    holder = asyncio.create_task(source_module._run_in_executor(blocking_call))
+    await asyncio.sleep(0.01)
+    shed_before = sum(observability.shed_counts.values())
+    try:
+        with observability.bind_deadline(0.05):
+            with pytest.raises(observability.DeadlineExceeded):
+                await source_module._run_in_executor(queued_call)
+    finally:
+        release.set()
+        await holder
+
+    assert calls == []
+    assert sum(observability.shed_counts.values()) == shed_before + 1
+    # 名额已归还：下一次调用立即执行
+    await asyncio.wait_for(source_module._run_in_executor(queued_call), timeout=1)
+    assert calls == [1]
+
+
 @pytest.mark.asyncio
 async def test_technical_requirements_skip_unused_sources(monkeypatch):
     datasource = CNStockDataSource()
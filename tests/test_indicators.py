@@ -0,0 +1,196 @@
+"""增量技术指标引擎测试
+
+以 research.compute_indicator_series（TA-Lib / NumPy 全量计算）为准：
+长序列的重建直接取一次全量结果并由它播种状态；短序列逐根回放时 RSI 必须逐位相同，
+KDJ 的分块平滑、MACD 与 BBANDS 的 FMA 只允许末位差异；播种后的步进各指标都只允许末位差异。
+"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from qtf_mcp import indicators as indicators_module
+from qtf_mcp.indicators import SEED_MIN_BARS, SERIES_NAMES, VERIFY_TOLERANCE, IndicatorEngine
+from qtf_mcp.research import compute_indicator_series, get_technical_indicators
+
+EXACT = {"rsi6", "rsi12", "rsi24"}
+
+
+def make_bars(n: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    close = 10 + np.cumsum(rng.standard_normal(n) * 0.1)
+    high = close + np.abs(rng.standard_normal(n) * 0.1)
+    low = close - np.abs(rng.standard_normal(n) * 0.1)
+    dates = np.arange(n, dtype=np.int64) * 86_400_000_000_000 + 1_700_000_000_000_000_000
+    return dates, close, high, low
+
+
+def assert_matches_reference(series, close, high, low):
+    expected = compute_indicator_series(close, high, low)
+    for name, got, want in zip(SERIES_NAMES, series, expected):
+        assert got.shape == want.shape, name
+        assert np.array_equal(np.isnan(got), np.isnan(want)), name
+        if name in EXACT:
+            assert np.array_equal(got, want, equal_nan=True), name
+        else:
+            np.testing.assert_allclose(got, want, rtol=1e-12, atol=1e-12, err_msg=name)
+
+
+def assert_close_to_reference(series, close, high, low):
+    for name, got, want in zip(SERIES_NAMES, series, compute_indicator_series(close, high, low)):
+        assert got.shape == want.shape, name
+        assert np.array_equal(np.isnan(got), np.isnan(want)), name
+        np.testing.assert_allclose(got, want, rtol=1e-11, atol=1e-11, err_msg=name)
+
+
+@pytest.mark.parametrize("bars", [1, 8, 9, 25, 26, 33, 34, 113, 114, 115, 116, 117, 480])
+def test_rebuild_matches_reference_across_warmup_boundaries(bars):
+    dates, close, high, low = make_bars(bars)
+    engine = IndicatorEngine(enabled=True, verify=False)
+    series = engine.compute("SH600000", dates, close, high, low, compute_indicator_series)
+    assert_matches_reference(series, close, high, low)
+    assert engine.rebuilds == 1
+
+
+def test_flat_prices_follow_reference_edge_cases():
+    """横盘时 RSV 为 0/0、RSI 分母为 0、方差为 0，都要与参考实现一致。"""
+    n = 150
+    dates = np.arange(n, dtype=np.int64)
+    close = np.full(n, 10.0)
+    engine = IndicatorEngine(enabled=True, verify=False)
+    series = engine.compute("SH600000", dates, close, close, close, compute_indicator_series)
+    assert_matches_reference(series, close, close, close)
+
+
+def test_revised_and_appended_bars_step_incrementally():
+    dates, close, high, low = make_bars(301)
+    engine = IndicatorEngine(enabled=True, verify=False)
+    engine.compute("SH600000", dates[:300], close[:300], high[:300], low[:300],
+                   compute_indicator_series)
+
+    # 盘中修订最后一根 K 线
+    revised = close[:300].copy()
+    revised[-1] += 0.37
+    series = engine.compute("SH600000", dates[:300], revised, high[:300], low[:300],
+                            compute_indicator_series)
+    assert_close_to_reference(series, revised, high[:300], low[:300])
+
+    # 次日新增一根
+    series = engine.compute("SH600000", dates, close, high, low, compute_indicator_series)
+    assert_close_to_reference(series, close, high, low)
+    assert (engine.rebuilds, engine.updates) == (1, 2)
+
+
+def test_seeded_rebuild_costs_one_reference_pass():
+    """长序列重建只做一次全量计算，返回的就是它的结果。"""
+    dates, close, high, low = make_bars(480)
+    calls = []
+
+    def counted(close, high, low):
+        calls.append(len(close))
+        return compute_indicator_series(close, high, low)
+
+    engine = IndicatorEngine(enabled=True, verify=True)
+    series = engine.compute("SH600000", dates, close, high, low, counted)
+    assert calls == [480]
+    for got, want in zip(series, compute_indicator_series(close, high, low)):
+        assert np.array_equal(got, want, equal_nan=True)
+
+    # 原样重复请求不重新步进，与首次结果逐位相同（tech 输出不做舍入）
+    repeat = engine.compute("SH600000", dates, close, high, low, counted)
+    assert engine.updates == 1
+    for got, want in zip(repeat, series):
+        assert np.array_equal(got, want, equal_nan=True)
+
+
+@pytest.mark.parametrize("start", [SEED_MIN_BARS + 1, 300])
+def test_seeded_state_steps_many_bars_close_to_reference(start):
+    """从播种状态连续步进一百多根，误差不随步数累积。"""
+    dates, close, high, low = make_bars(start + 150, seed=11)
+    engine = IndicatorEngine(enabled=True, verify=False)
+    for end in range(start, len(close) + 1):
+        series = engine.compute("SH600000", dates[:end], close[:end], high[:end], low[:end],
+                                compute_indicator_series)
+    assert (engine.rebuilds, engine.updates) == (1, 150)
+    assert_close_to_reference(series, close, high, low)
+
+
+def test_rewritten_history_forces_rebuild():
+    """前复权会改写整段历史，必须整体重建而不是接着旧状态递推。"""
+    dates, close, high, low = make_bars(200)
+    engine = IndicatorEngine(enabled=True, verify=False)
+    engine.compute("SH600000", dates, close, high, low, compute_indicator_series)
+
+    adjusted = close * 0.9
+    series = engine.compute("SH600000", dates, adjusted, high * 0.9, low * 0.9,
+                            compute_indicator_series)
+    assert engine.rebuilds == 2
+    assert_matches_reference(series, adjusted, high * 0.9, low * 0.9)
+
+
+def test_non_finite_input_uses_reference():
+    dates, close, high, low = make_bars(100)
+    close = close.copy()
+    close[40] = np.nan
+    engine = IndicatorEngine(enabled=True, verify=False)
+    series = engine.compute("SH600000", dates, close, high, low, compute_indicator_series)
+    for got, want in zip(series, compute_indicator_series(close, high, low)):
+        assert np.array_equal(got, want, equal_nan=True)
+    assert engine.fallbacks == 1
+    assert engine.rebuilds == 0
+
+
+def test_verify_mode_returns_reference_and_logs_mismatch(caplog):
+    dates, close, high, low = make_bars(120)
+
+    def drifted(close, high, low):
+        series = list(compute_indicator_series(close, high, low))
+        series[0] = series[0] + VERIFY_TOLERANCE * 1e4
+        return tuple(series)
+
+    engine = IndicatorEngine(enabled=True, verify=True)
+    engine.compute("SH600000", dates[:119], close[:119], high[:119], low[:119],
+                   compute_indicator_series)
+    with caplog.at_level(logging.WARNING, logger="qtf_mcp"):
+        series = engine.compute("SH600000", dates, close, high, low, drifted)
+    assert np.array_equal(series[0], drifted(close, high, low)[0])
+    assert engine.mismatches == 1
+    assert any("series=kdj_k" in r.getMessage() for r in caplog.records)
+
+    # 逐根回放的短序列重建同样校验
+    short = IndicatorEngine(enabled=True, verify=True)
+    short.compute("SH600000", dates[:60], close[:60], high[:60], low[:60], drifted)
+    assert short.mismatches == 1
+
+    clean = IndicatorEngine(enabled=True, verify=True)
+    clean.compute("SH600000", dates, close, high, low, compute_indicator_series)
+    assert clean.mismatches == 0
+
+
+def test_state_is_bounded_and_keyed_by_window_start():
+    engine = IndicatorEngine(enabled=True, verify=False, max_entries=2)
+    dates, close, high, low = make_bars(60)
+    for offset in range(3):
+        engine.compute("SH600000", dates[offset:], close[offset:], high[offset:], low[offset:],
+                       compute_indicator_series)
+    assert len(engine._states) == 2
+    assert engine.rebuilds == 3
+
+
+def test_technical_indicators_unchanged_by_engine(monkeypatch, sample_stock_data_dict):
+    data = dict(sample_stock_data_dict, SYMBOL="SH600000")
+    monkeypatch.setattr(indicators_module, "_engine", IndicatorEngine(enabled=False))
+    baseline = get_technical_indicators(data, days=30)
+
+    engine = IndicatorEngine(enabled=True, verify=False)
+    monkeypatch.setattr(indicators_module, "_engine", engine)
+    first = get_technical_indicators(data, days=30)
+    second = get_technical_indicators(data, days=30)
+
+    assert first == second
+    assert engine.updates == 1
+    for got, want in zip(first, baseline):
+        assert got["date"] == want["date"]
+        assert got["kdj"] == pytest.approx(want["kdj"], rel=1e-12)
+        assert got["rsi"] == want["rsi"]
@@ -1,8 +1,11 @@
 import asyncio
 import importlib
+import json
 import stat
+import time
 from types import SimpleNamespace
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -16,14 +19,18 @@ from qtf_mcp.datasource.market_breadth import (
     TonghuashunCooldownError,
     TonghuashunPlaywrightProvider,
     _build_tonghuashun_auth,
+    EfinanceMarketBreadthProvider,
     _tonghuashun_browser_args,
     build_market_breadth_distribution,
+    compute_market_breadth,
     get_market_breadth,
     parse_tonghuashun_market_breadth,
 )
+from qtf_mcp.datasource.market_snapshot import MarketSnapshot
 
 app_module = importlib.import_module("qtf_mcp.mcp_app")
 market_module = importlib.import_module("qtf_mcp.datasource.market_breadth")
+browser_module = importlib.import_module("qtf_mcp.datasource.browser")
 
 
 TONGHUASHUN_PAYLOAD = {
@@ -120,6 +127,9 @@ def test_parse_tonghuashun_market_breadth_uses_explicit_source_date():
 @pytest.mark.asyncio
 async def test_bootstrap_auth_closes_browser(monkeypatch):
     class FakePage:
+        def __init__(self):
+            self.closed = False
+
         async def goto(self, *args, **kwargs):
             return SimpleNamespace(status=200)
 
@@ -130,9 +140,17 @@ async def test_bootstrap_auth_closes_browser(monkeypatch):
         async def wait_for_timeout(self, milliseconds):
             raise AssertionError("v Cookie should be available immediately")
 
+        async def close(self):
+            self.closed = True
+
+    page = FakePage()
+
     class FakeContext:
+        def on(self, event, handler):
+            pass
+
         async def new_page(self):
-            return FakePage()
+            return page
 
         async def cookies(self, page_url):
             return [
@@ -144,39 +162,55 @@ async def test_bootstrap_auth_closes_browser(monkeypatch):
         def __init__(self):
             self.closed = False
 
+        def is_connected(self):
+            return not self.closed
+
         async def new_context(self, **kwargs):
             return FakeContext()
 
         async def close(self):
             self.closed = True
 
-    class FakePlaywrightManager:
-        async def __aenter__(self):
-            return object()
+    browser = FakeBrowser()
+    launches = []
+
+    class FakeChromium:
+        async def launch(self, **kwargs):
+            launches.append(kwargs)
+            return browser
 
-        async def __aexit__(self, exc_type, exc, traceback):
-            return False
+    class FakePlaywright:
+        chromium = FakeChromium()
 
-    browser = FakeBrowser()
-    provider = TonghuashunPlaywrightProvider()
+        async def start(self):
+            return self
 
-    async def fake_launch(playwright):
-        return browser
+        async def stop(self):
+            pass
 
-    monkeypatch.setattr(market_module, "async_playwright", FakePlaywrightManager)
-    monkeypatch.setattr(provider, "_launch_browser", fake_launch)
+    monkeypatch.setattr(browser_module, "async_playwright", FakePlaywright)
+    manager = browser_module.BrowserManager(max_rss_mb=0)
+    monkeypatch.setattr(browser_module, "_manager", manager)
+    provider = TonghuashunPlaywrightProvider()
 
     result = await provider._bootstrap_auth()
 
     assert result.v_cookie == "auth-token"
-    assert browser.closed is True
+    # 共享的浏览器管理器按有界面的 Chrome 启动，取完 Cookie 即关闭
+    assert launches[0]["headless"] is False and launches[0]["channel"] == "chrome"
+    assert browser.closed is True and page.closed is True
+    assert manager.stats()["browsers"] == 0
     provider.close()
 
 
+def fresh(token: str, age: float = 0.0) -> TonghuashunAuth:
+    return TonghuashunAuth(token, f"Chrome {token}", obtained_at=time.time() - age)
+
+
 @pytest.mark.asyncio
 async def test_provider_reuses_cached_auth_for_http_requests(monkeypatch):
     provider = TonghuashunPlaywrightProvider()
-    provider._auth = TonghuashunAuth("cached-token", "Chrome test agent")
+    provider._auth = fresh("cached-token")
     request_auth = []
 
     async def unexpected_bootstrap():
@@ -193,6 +227,7 @@ async def test_provider_reuses_cached_auth_for_http_requests(monkeypatch):
     await provider.fetch()
 
     assert request_auth == [provider._auth, provider._auth]
+    assert provider._refresh_task is None
     provider.close()
 
 
@@ -200,9 +235,7 @@ async def test_provider_reuses_cached_auth_for_http_requests(monkeypatch):
 async def test_provider_reuses_persisted_auth_after_restart(monkeypatch, tmp_path):
     cache_path = tmp_path / "tonghuashun-auth.json"
     original_provider = TonghuashunPlaywrightProvider(auth_cache_path=cache_path)
-    original_provider._save_cached_auth_sync(
-        TonghuashunAuth("persisted-token", "Chrome persisted agent"),
-    )
+    original_provider._save_cached_auth_sync(fresh("persisted-token", age=60))
     original_provider.close()
 
     restarted_provider = TonghuashunPlaywrightProvider(auth_cache_path=cache_path)
@@ -220,28 +253,67 @@ async def test_provider_reuses_persisted_auth_after_restart(monkeypatch, tmp_pat
     result = await restarted_provider.fetch()
 
     assert result.source == "tonghuashun_web"
-    assert restarted_provider._auth == TonghuashunAuth(
-        "persisted-token",
-        "Chrome persisted agent",
-    )
+    assert restarted_provider._auth == fresh("persisted-token")
+    # 取得时间随凭证落盘，重启后仍按原来的年龄估计有效期
+    assert 50 < time.time() - restarted_provider._auth.obtained_at < 120
+    assert restarted_provider._refresh_task is None
     restarted_provider.close()
 
 
 @pytest.mark.asyncio
-async def test_provider_refreshes_auth_once_after_403(monkeypatch, tmp_path):
+async def test_provider_refreshes_in_background_before_expiry(monkeypatch, tmp_path):
+    """快过期的凭证照常服务请求，新凭证在后台取得；旧凭证留作备用。"""
+    provider = TonghuashunPlaywrightProvider(
+        auth_cache_path=tmp_path / "tonghuashun-auth.json",
+        auth_ttl_seconds=3600,
+        refresh_ahead_seconds=600,
+    )
+    aging = fresh("aging-token", age=3100)
+    provider._auth = aging
+    release_bootstrap = asyncio.Event()
+    request_auth = []
+
+    async def slow_bootstrap():
+        await release_bootstrap.wait()
+        return fresh("new-token")
+
+    def fake_request(auth):
+        request_auth.append(auth)
+        return TONGHUASHUN_PAYLOAD
+
+    monkeypatch.setattr(provider, "_bootstrap_auth", slow_bootstrap)
+    monkeypatch.setattr(provider, "_request_payload_sync", fake_request)
+
+    await provider.fetch()
+    assert request_auth == [aging]
+    assert provider._refresh_task is not None and not provider._refresh_task.done()
+
+    release_bootstrap.set()
+    assert await provider._refresh_task is True
+    await provider.fetch()
+
+    assert request_auth == [aging, fresh("new-token")]
+    assert provider._standby == aging
+    assert provider._load_cached_auth_sync() == fresh("new-token")
+    provider.close()
+
+
+@pytest.mark.asyncio
+async def test_rejected_auth_falls_back_to_standby_without_browser(monkeypatch, tmp_path):
+    """被拒的凭证立即换用备用凭证重试，同时在后台刷新；请求路径不启动浏览器。"""
     cache_path = tmp_path / "tonghuashun-auth.json"
     provider = TonghuashunPlaywrightProvider(auth_cache_path=cache_path)
-    stale_auth = TonghuashunAuth("stale-token", "Chrome stale agent")
-    fresh_auth = TonghuashunAuth("fresh-token", "Chrome fresh agent")
+    stale_auth = fresh("stale-token", age=900)
+    standby_auth = fresh("standby-token", age=1200)
     provider._auth = stale_auth
+    provider._standby = standby_auth
     provider._save_cached_auth_sync(stale_auth)
-    bootstrap_count = 0
+    release_bootstrap = asyncio.Event()
     request_auth = []
 
-    async def fake_bootstrap():
-        nonlocal bootstrap_count
-        bootstrap_count += 1
-        return fresh_auth
+    async def slow_bootstrap():
+        await release_bootstrap.wait()
+        return fresh("fresh-token")
 
     def fake_request(auth):
         request_auth.append(auth)
@@ -249,58 +321,169 @@ async def test_provider_refreshes_auth_once_after_403(monkeypatch, tmp_path):
             raise TonghuashunAuthError("HTTP 403")
         return TONGHUASHUN_PAYLOAD
 
-    monkeypatch.setattr(provider, "_bootstrap_auth", fake_bootstrap)
+    monkeypatch.setattr(provider, "_bootstrap_auth", slow_bootstrap)
     monkeypatch.setattr(provider, "_request_payload_sync", fake_request)
 
     result = await provider.fetch()
 
     assert result.up_count == 1768
-    assert bootstrap_count == 1
-    assert request_auth == [stale_auth, fresh_auth]
-    assert provider._load_cached_auth_sync() == fresh_auth
+    assert request_auth == [stale_auth, standby_auth]
+    assert provider._auth == standby_auth and provider._standby is None
+    # 被拒时的年龄收紧了有效期估计，备用凭证已到刷新窗口
+    assert 850 < provider._expires_at(standby_auth) - standby_auth.obtained_at < 1000
+
+    release_bootstrap.set()
+    await provider._refresh_task
+    assert provider._auth == fresh("fresh-token")
+    assert provider._load_cached_auth_sync() == fresh("fresh-token")
     provider.close()
 
 
 @pytest.mark.asyncio
-async def test_provider_ignores_rejected_cache_when_deletion_fails(monkeypatch, tmp_path):
-    cache_path = tmp_path / "tonghuashun-auth.json"
-    provider = TonghuashunPlaywrightProvider(auth_cache_path=cache_path)
-    stale_auth = TonghuashunAuth("stale-token", "Chrome stale agent")
-    fresh_auth = TonghuashunAuth("fresh-token", "Chrome fresh agent")
+async def test_early_rejection_does_not_make_every_request_refresh(monkeypatch, tmp_path):
+    """凭证 5 秒时被拒一次后，新凭证的有效期估计有下限，之后 10 次请求至多再开一次浏览器。"""
+    provider = TonghuashunPlaywrightProvider(
+        auth_cache_path=tmp_path / "tonghuashun-auth.json",
+        auth_ttl_seconds=3600,
+        refresh_ahead_seconds=600,
+    )
+    stale_auth = fresh("stale-token", age=5)
     provider._auth = stale_auth
-    provider._save_cached_auth_sync(stale_auth)
     bootstrap_count = 0
-    request_auth = []
 
     async def fake_bootstrap():
         nonlocal bootstrap_count
         bootstrap_count += 1
-        return fresh_auth
+        return fresh(f"token-{bootstrap_count}")
 
     def fake_request(auth):
-        request_auth.append(auth)
         if auth == stale_auth:
             raise TonghuashunAuthError("HTTP 403")
         return TONGHUASHUN_PAYLOAD
 
-    def failed_delete(auth):
-        raise OSError("cache is read-only")
-
     monkeypatch.setattr(provider, "_bootstrap_auth", fake_bootstrap)
     monkeypatch.setattr(provider, "_request_payload_sync", fake_request)
-    monkeypatch.setattr(provider, "_delete_cached_auth_if_stale_sync", failed_delete)
 
+    with pytest.raises(TonghuashunAuthError, match="未就绪"):
+        await provider.fetch()
+    for _ in range(10):
+        if provider._refresh_task is not None:
+            await provider._refresh_task
+        await provider.fetch()
+
+    assert bootstrap_count == 1
+    assert provider._lifetime() == 900
+    # 成功刷新同样限频
+    assert await provider.refresh() is False
+    assert bootstrap_count == 1
+    provider.close()
+
+
+def test_rejection_ages_expire_after_one_ttl(tmp_path):
+    provider = TonghuashunPlaywrightProvider(
+        auth_cache_path=tmp_path / "tonghuashun-auth.json",
+        auth_ttl_seconds=3600,
+        refresh_ahead_seconds=600,
+    )
+    provider._rejections.append((time.time() - 3601, 1200.0))
+    provider._rejections.append((time.time() - 60, 1800.0))
+
+    assert provider._lifetime() == 1800
+    assert len(provider._rejections) == 1
+    provider._rejections.clear()
+    assert provider._lifetime() == 3600
+    provider.close()
+
+
+class _FakeHTTPResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return json.loads(self._body)
+
+
+class _FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, **kwargs):
+        return self.response
+
+    def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_html_challenge_page_rejects_auth_and_refreshes(monkeypatch, tmp_path):
+    """过期 Cookie 得到 200 的 HTML 验证页：记为被拒并后台刷新，而不是让数据源冷却。"""
+    provider = TonghuashunPlaywrightProvider(
+        cooldown_seconds=300,
+        auth_cache_path=tmp_path / "tonghuashun-auth.json",
+    )
+    expired = fresh("expired-token", age=1200)
+    provider._auth = expired
+    provider._session = _FakeSession(_FakeHTTPResponse(200, "<html>验证</html>"))
+    bootstrap_count = 0
+
+    async def fake_bootstrap():
+        nonlocal bootstrap_count
+        bootstrap_count += 1
+        return fresh("fresh-token")
+
+    monkeypatch.setattr(provider, "_bootstrap_auth", fake_bootstrap)
+
+    with pytest.raises(TonghuashunAuthError, match="未就绪"):
+        await provider.fetch()
+    assert provider._rejected_auth == expired and len(provider._rejections) == 1
+    assert provider._cooldown_until == 0.0
+    assert await provider._refresh_task is True
+
+    provider._session = _FakeSession(_FakeHTTPResponse(200, json.dumps(TONGHUASHUN_PAYLOAD)))
     result = await provider.fetch()
 
     assert result.up_count == 1768
+    assert bootstrap_count == 1 and provider._auth == fresh("fresh-token")
+    provider.close()
+
+
+@pytest.mark.asyncio
+async def test_rejected_auth_without_standby_fails_fast_and_ignores_rejected_cache(
+    monkeypatch, tmp_path
+):
+    cache_path = tmp_path / "tonghuashun-auth.json"
+    provider = TonghuashunPlaywrightProvider(auth_cache_path=cache_path)
+    stale_auth = fresh("stale-token")
+    provider._auth = stale_auth
+    provider._save_cached_auth_sync(stale_auth)
+    bootstrap_count = 0
+
+    async def failed_bootstrap():
+        nonlocal bootstrap_count
+        bootstrap_count += 1
+        raise RuntimeError("browser unavailable")
+
+    def fake_request(auth):
+        raise TonghuashunAuthError("HTTP 403")
+
+    monkeypatch.setattr(provider, "_bootstrap_auth", failed_bootstrap)
+    monkeypatch.setattr(provider, "_request_payload_sync", fake_request)
+
+    with pytest.raises(TonghuashunAuthError, match="未就绪"):
+        await provider.fetch()
+    await provider._refresh_task
+
     assert bootstrap_count == 1
-    assert request_auth == [stale_auth, fresh_auth]
-    assert provider._load_cached_auth_sync() == fresh_auth
+    # 刷新失败时也删掉被拒的凭证，之后不会再从磁盘读回它
+    assert not cache_path.exists()
+    with pytest.raises(TonghuashunAuthError, match="browser unavailable"):
+        await provider.fetch()
     provider.close()
 
 
 @pytest.mark.asyncio
-async def test_concurrent_provider_requests_bootstrap_once(monkeypatch, tmp_path):
+async def test_concurrent_requests_without_auth_share_one_background_refresh(monkeypatch, tmp_path):
     provider = TonghuashunPlaywrightProvider(
         auth_cache_path=tmp_path / "tonghuashun-auth.json",
     )
@@ -310,7 +493,7 @@ async def test_concurrent_provider_requests_bootstrap_once(monkeypatch, tmp_path
         nonlocal bootstrap_count
         bootstrap_count += 1
         await asyncio.sleep(0.01)
-        return TonghuashunAuth("shared-token", "Chrome test agent")
+        return fresh("shared-token")
 
     monkeypatch.setattr(provider, "_bootstrap_auth", fake_bootstrap)
     monkeypatch.setattr(
@@ -319,6 +502,13 @@ async def test_concurrent_provider_requests_bootstrap_once(monkeypatch, tmp_path
         lambda auth: TONGHUASHUN_PAYLOAD,
     )
 
+    results = await asyncio.gather(
+        *(provider.fetch() for _ in range(3)),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, TonghuashunAuthError) for result in results)
+
+    await provider._refresh_task
     results = await asyncio.gather(*(provider.fetch() for _ in range(3)))
 
     assert bootstrap_count == 1
@@ -339,27 +529,21 @@ async def test_provider_instances_share_persisted_auth(monkeypatch, tmp_path):
         nonlocal bootstrap_count
         bootstrap_count += 1
         await asyncio.sleep(0.01)
-        return TonghuashunAuth("shared-token", "Chrome test agent")
+        return fresh("shared-token")
 
     for provider in providers:
         monkeypatch.setattr(provider, "_bootstrap_auth", fake_bootstrap)
-        monkeypatch.setattr(
-            provider,
-            "_request_payload_sync",
-            lambda auth: TONGHUASHUN_PAYLOAD,
-        )
 
-    results = await asyncio.gather(*(provider.fetch() for provider in providers))
+    assert await asyncio.gather(*(provider.refresh() for provider in providers)) == [True, True]
 
     assert bootstrap_count == 1
-    assert [result.up_count for result in results] == [1768, 1768]
-    assert providers[0]._auth == providers[1]._auth
+    assert providers[0]._auth == providers[1]._auth == fresh("shared-token")
     for provider in providers:
         provider.close()
 
 
 @pytest.mark.asyncio
-async def test_provider_cools_down_after_failure(monkeypatch, tmp_path):
+async def test_failed_refresh_cools_down(monkeypatch, tmp_path):
     provider = TonghuashunPlaywrightProvider(
         cooldown_seconds=300,
         auth_cache_path=tmp_path / "tonghuashun-auth.json",
@@ -375,31 +559,51 @@ async def test_provider_cools_down_after_failure(monkeypatch, tmp_path):
     monkeypatch.setattr(market_module.time, "monotonic", lambda: clock[0])
     monkeypatch.setattr(provider, "_bootstrap_auth", failed_bootstrap)
 
-    with pytest.raises(RuntimeError, match="browser unavailable"):
+    assert await provider.refresh() is False
+    with pytest.raises(TonghuashunAuthError, match="browser unavailable"):
         await provider.fetch()
-    with pytest.raises(TonghuashunCooldownError, match="冷却中"):
-        await provider.fetch()
-    assert bootstrap_count == 1
+    assert provider._refresh_task.done() and bootstrap_count == 1
 
     clock[0] += 301
-    with pytest.raises(RuntimeError, match="browser unavailable"):
+    with pytest.raises(TonghuashunAuthError):
         await provider.fetch()
+    await provider._refresh_task
     assert bootstrap_count == 2
     provider.close()
 
 
 @pytest.mark.asyncio
-async def test_provider_replaces_corrupt_auth_cache(monkeypatch, tmp_path):
+async def test_provider_cools_down_after_upstream_failure(monkeypatch):
+    provider = TonghuashunPlaywrightProvider(cooldown_seconds=300)
+    provider._auth = fresh("cached-token")
+    requests_made = 0
+
+    def failed_request(auth):
+        nonlocal requests_made
+        requests_made += 1
+        raise RuntimeError("HTTP 502")
+
+    monkeypatch.setattr(provider, "_request_payload_sync", failed_request)
+
+    with pytest.raises(RuntimeError, match="HTTP 502"):
+        await provider.fetch()
+    with pytest.raises(TonghuashunCooldownError, match="冷却中"):
+        await provider.fetch()
+    assert requests_made == 1
+    provider.close()
+
+
+@pytest.mark.asyncio
+async def test_warm_refreshes_over_corrupt_auth_cache(monkeypatch, tmp_path):
     cache_path = tmp_path / "tonghuashun-auth.json"
     cache_path.write_text("not-json", encoding="utf-8")
     provider = TonghuashunPlaywrightProvider(auth_cache_path=cache_path)
     bootstrap_count = 0
-    fresh_auth = TonghuashunAuth("fresh-token", "Chrome fresh agent")
 
     async def fake_bootstrap():
         nonlocal bootstrap_count
         bootstrap_count += 1
-        return fresh_auth
+        return fresh("fresh-token")
 
     monkeypatch.setattr(provider, "_bootstrap_auth", fake_bootstrap)
     monkeypatch.setattr(
@@ -408,10 +612,9 @@ async def test_provider_replaces_corrupt_auth_cache(monkeypatch, tmp_path):
         lambda auth: TONGHUASHUN_PAYLOAD,
     )
 
-    await provider.fetch()
-
+    assert await provider.warm() is True
     assert bootstrap_count == 1
-    assert provider._load_cached_auth_sync() == fresh_auth
+    assert provider._load_cached_auth_sync() == fresh("fresh-token")
     provider.close()
 
 
@@ -425,6 +628,80 @@ def test_build_market_breadth_distribution_boundary_rules():
     assert [bucket.count for bucket in result] == [1, 1, 1, 1, 2, 2, 2, 2, 2, 1]
 
 
+def make_snapshot(rows) -> MarketSnapshot:
+    symbols, names, prev_close, close = zip(*rows)
+    prev_close = np.array(prev_close, dtype=np.float64)
+    close = np.array(close, dtype=np.float64)
+    return MarketSnapshot(
+        symbols=np.array(symbols, dtype=object),
+        names=np.array(names, dtype=object),
+        columns={
+            "close": close,
+            "prev_close": prev_close,
+            "change_pct": np.round((close / prev_close - 1) * 100, 2),
+        },
+        fetched_at="2026-07-30 15:01:00",
+        epoch="closed:2026-07-30",
+        trade_date="2026-07-30",
+    )
+
+
+def test_compute_market_breadth_applies_board_limit_rules():
+    """涨跌停按板块幅度与昨收四舍五入到分判定；N、C 开头的新股不计入涨跌停。"""
+    snapshot = make_snapshot(
+        [
+            ("SH600000", "浦发银行", 10.05, 11.06),  # 10.05 * 1.1 = 11.055 -> 11.06
+            ("SH600001", "主板上涨", 10.00, 10.99),
+            ("SZ300750", "宁德时代", 100.0, 80.0),  # 创业板 20% 跌停
+            ("SH688001", "华兴源创", 50.0, 55.0),  # 科创板 +10% 不是涨停
+            ("BJ830799", "艾融软件", 10.0, 13.0),  # 北交所 30% 涨停
+            ("SZ000001", "*ST平安", 3.33, 3.16),  # 主板 ST 自 2025-07-07 起按 10%，-5% 不是跌停
+            ("SH600004", "ST上涨", 10.0, 10.5),  # +5% 不是涨停
+            ("SH600005", "*ST下跌", 3.33, 3.00),  # 3.33 * 0.9 = 2.997 -> 3.00 跌停
+            ("SZ301001", "ST创业", 10.0, 10.5),  # 创业板 ST 仍按 20%
+            ("SH600002", "N新股", 10.0, 14.4),
+            ("SZ301002", "C次新", 10.0, 8.0),
+            ("SZ000002", "停牌股", 10.0, float("nan")),
+            ("SH600003", "平盘", 10.0, 10.0),
+        ]
+    )
+
+    result = compute_market_breadth(snapshot)
+
+    assert result.limit_up_count == 2
+    assert result.limit_down_count == 2
+    assert (result.up_count, result.down_count, result.flat_count) == (7, 4, 1)
+    assert [bucket.count for bucket in result.distribution] == [3, 0, 1, 0, 0, 1, 0, 2, 0, 5]
+    assert result.trade_date == "2026-07-30"
+    assert result.warnings == ()
+
+
+def test_compute_market_breadth_warns_without_previous_close():
+    snapshot = make_snapshot([("SH600000", "浦发银行", float("nan"), 11.0)])
+    snapshot.columns["change_pct"][:] = 1.0
+
+    result = compute_market_breadth(snapshot)
+
+    assert result.up_count == 1
+    assert result.limit_up_count is None and result.limit_down_count is None
+    assert result.warnings
+
+
+@pytest.mark.asyncio
+async def test_efinance_provider_reads_shared_snapshot(monkeypatch):
+    snapshot = make_snapshot([("SH600000", "浦发银行", 10.0, 11.0)])
+
+    async def fake_snapshot():
+        return snapshot
+
+    monkeypatch.setattr(market_module, "get_market_snapshot", fake_snapshot)
+
+    result = await EfinanceMarketBreadthProvider().fetch()
+
+    assert result.source == "efinance"
+    assert result.limit_up_count == 1
+
+
 @pytest.mark.asyncio
 async def test_get_market_breadth_falls_back_to_next_provider():
     class FailedProvider:
@@ -0,0 +1,147 @@
+"""纪元边界预热测试
+
+覆盖：边界时刻推算、需求计数与衰减、以及预热是否按记录的参数重新渲染。
+"""
+
+import datetime
+import sys
+
+import pytest
+
+import qtf_mcp.mcp_app  # noqa: F401  确保子模块已加载
+from qtf_mcp import cache as cache_module
+from qtf_mcp import prewarm
+from qtf_mcp.cache import EVENING_SETTLE, SETTLE, ReportCache
+from qtf_mcp.prewarm import PrewarmScheduler, next_boundary
+
+mcp_app = sys.modules["qtf_mcp.mcp_app"]
+
+MONDAY = datetime.date(2026, 8, 17)
+FRIDAY = datetime.date(2026, 8, 21)
+
+
+def at(day: datetime.date, hour: int, minute: int = 0) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time(hour, minute))
+
+
+@pytest.fixture
+def enabled_cache(tmp_path):
+    cache = ReportCache(
+        enabled=True, live_ttl_seconds=600.0, disk_enabled=False, directory=str(tmp_path)
+    )
+    cache_module.set_report_cache(cache)
+    return cache
+
+
+@pytest.fixture
+def scheduler(enabled_cache, monkeypatch):
+    instance = PrewarmScheduler(top_n=2)
+    # 边界循环会睡到下一个收盘点，测试里直接调用 warm()
+    monkeypatch.setattr(instance, "ensure_running", lambda: None)
+    return instance
+
+
+@pytest.mark.parametrize(
+    "moment,expected",
+    [
+        (at(MONDAY, 10, 0), datetime.datetime.combine(MONDAY, SETTLE)),
+        (at(MONDAY, 16, 0), datetime.datetime.combine(MONDAY, EVENING_SETTLE)),
+        (at(MONDAY, 18, 0), datetime.datetime.combine(MONDAY + datetime.timedelta(days=1), SETTLE)),
+        (at(FRIDAY, 18, 0), datetime.datetime.combine(FRIDAY + datetime.timedelta(days=3), SETTLE)),
+    ],
+)
+def test_next_boundary_targets_full_reuse_epochs(moment, expected):
+    assert next_boundary(moment).replace(tzinfo=None) == expected
+
+
+def test_recording_is_inert_when_disabled(enabled_cache):
+    idle = PrewarmScheduler(top_n=0)
+    idle.register("brief", lambda symbol, params: None)
+    idle.record("brief", "SH600000", {})
+    assert idle.top_keys() == []
+
+
+@pytest.mark.asyncio
+async def test_top_keys_rank_by_demand_and_decay(scheduler):
+    calls = []
+
+    async def warmer(symbol, params):
+        calls.append((symbol, params))
+
+    scheduler.register("brief", warmer)
+    for _ in range(3):
+        scheduler.record("brief", "SH600519", {"date": None})
+    scheduler.record("brief", "SZ000001", {"date": None})
+    scheduler.record("brief", "SZ000001", {"date": None})
+    scheduler.record("brief", "SH600000", {"date": None})
+
+    assert [key[1] for key in scheduler.top_keys()] == ["SH600519", "SZ000001"]
+
+    stats = await scheduler.warm()
+    assert stats["candidates"] == 2
+    assert stats["warmed"] == 2
+    assert calls == [("SH600519", {"date": None}), ("SZ000001", {"date": None})]
+    # 每个边界权重减半；只出现过一次的键在低于 MIN_WEIGHT 后被淘汰
+    cold = ("brief", "SH600000", '{"date": null}')
+    assert scheduler._weights[cold] == 0.5
+    await scheduler.warm()
+    await scheduler.warm()
+    assert cold not in scheduler._weights
+
+
+@pytest.mark.asyncio
+async def test_historical_dates_are_not_tracked(scheduler):
+    """指定历史日期的请求输出不会变，不记录；昨天记下的当日键在预热时淘汰。"""
+    warmed = []
+
+    async def warmer(symbol, params):
+        warmed.append(params)
+
+    scheduler.register("tech", warmer)
+    scheduler.record("tech", "SH600000", {"date": "2026-08-10"})
+    assert scheduler.top_keys() == []
+
+    assert prewarm.is_live_date("", at(MONDAY, 10))
+    assert prewarm.is_live_date("2026-08-17", at(MONDAY, 10))
+    assert not prewarm.is_live_date("2026-08-17", at(MONDAY + datetime.timedelta(days=1), 10))
+
+    today = cache_module._as_shanghai().date().isoformat()
+    scheduler.record("tech", "SH600000", {"date": today})
+    (key,) = scheduler.top_keys()
+    scheduler._params[key]["date"] = "2026-08-10"  # 跨日后
+    await scheduler.warm()
+    assert warmed == [] and scheduler.top_keys() == []
+
+
+@pytest.mark.asyncio
+async def test_warm_failures_are_counted_not_raised(scheduler):
+    async def broken(symbol, params):
+        raise RuntimeError("upstream down")
+
+    scheduler.register("tech", broken)
+    scheduler.record("tech", "SH600000", {"days": 30})
+    stats = await scheduler.warm()
+    assert stats["failed"] == 1
+    assert stats["warmed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_client_requests_are_recorded_with_cache_key_params(scheduler, monkeypatch):
+    """记录的参数必须能原样重放成同一个缓存键；预热自身的调用不计入需求。"""
+    monkeypatch.setattr(prewarm, "_scheduler", scheduler)
+    replayed = []
+
+    async def fake_fetch(symbol_str, mode, host, date=None, fund_flow_limit=15,
+                         request_id="", allow_stale=True, output_format="markdown"):
+        replayed.append((symbol_str, mode, host, date, fund_flow_limit))
+        return mcp_app.BatchReportResponse(
+            symbols_count=1, timestamp="", reports={symbol_str: "x"}, errors={}
+        )
+
+    today = cache_module._as_shanghai().date().isoformat()
+    scheduler.register("full", lambda symbol, params: mcp_app._warm_report("full", symbol, params))
+    scheduler.record("full", "SH600519", {"date": today, "fund_flow_limit": 20})
+    monkeypatch.setattr(mcp_app, "fetch_batch_reports", fake_fetch)
+
+    await scheduler.warm()
+    assert replayed == [("SH600519", "full", prewarm.PREWARM_HOST, today, 20)]
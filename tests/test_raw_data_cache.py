@@ -0,0 +1,156 @@
+"""原始数据缓存测试
+
+覆盖：取数需求的包含关系、纪元与盘中 TTL 约束，以及 load_raw_data 在
+工具切换时是否真的复用已取到的数组。
+"""
+
+import datetime
+import time
+
+import numpy as np
+import pytest
+
+from qtf_mcp import cache as cache_module
+from qtf_mcp import research
+from qtf_mcp.cache import RawDataCache
+from qtf_mcp.datasource.base import FETCH_FAILURES_KEY, FetchRequirements
+
+MONDAY = datetime.date(2026, 8, 17)
+WINDOW = "2024-08-17~2026-08-18"
+
+
+def at(day: datetime.date, hour: int, minute: int = 0) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time(hour, minute))
+
+
+def raw(close_last: float = 10.0) -> dict:
+    return {"CLOSE": np.array([9.0, close_last]), "NAME": "测试"}
+
+
+def test_full_requirements_cover_technical():
+    assert FetchRequirements().covers(FetchRequirements.technical())
+    assert not FetchRequirements.technical().covers(FetchRequirements())
+    assert FetchRequirements.technical().covers(FetchRequirements.technical())
+
+
+def test_full_fetch_satisfies_later_technical_request():
+    c = RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=8)
+    now = at(MONDAY, 20, 0)
+    c.put("SH600000", WINDOW, FetchRequirements(), raw(), now=now)
+
+    hit = c.get("SH600000", WINDOW, FetchRequirements.technical(), now=now)
+    assert hit is not None
+    assert hit["CLOSE"][-1] == 10.0
+
+
+def test_technical_fetch_does_not_satisfy_full_request():
+    c = RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=8)
+    now = at(MONDAY, 20, 0)
+    c.put("SH600000", WINDOW, FetchRequirements.technical(), raw(), now=now)
+
+    assert c.get("SH600000", WINDOW, FetchRequirements(), now=now) is None
+
+
+def test_narrower_put_does_not_replace_broader_entry():
+    c = RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=8)
+    now = at(MONDAY, 20, 0)
+    c.put("SH600000", WINDOW, FetchRequirements(), raw(10.0), now=now)
+    c.put("SH600000", WINDOW, FetchRequirements.technical(), raw(11.0), now=now)
+
+    hit = c.get("SH600000", WINDOW, FetchRequirements(), now=now)
+    assert hit is not None and hit["CLOSE"][-1] == 10.0
+
+
+def test_entries_do_not_cross_epochs():
+    c = RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=8)
+    c.put("SH600000", WINDOW, FetchRequirements(), raw(), now=at(MONDAY, 16, 0))
+    assert c.get("SH600000", WINDOW, FetchRequirements(), now=at(MONDAY, 18, 0)) is None
+
+
+def test_live_entries_expire_with_report_ttl(monkeypatch):
+    c = RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=8)
+    now = at(MONDAY, 10, 0)
+    c.put("SH600000", WINDOW, FetchRequirements(), raw(), now=now)
+    assert c.get("SH600000", WINDOW, FetchRequirements(), now=now) is not None
+
+    real_time = time.time
+    monkeypatch.setattr(cache_module.time, "time", lambda: real_time() + 31)
+    assert c.get("SH600000", WINDOW, FetchRequirements(), now=now) is None
+
+
+def test_hit_returns_independent_dict():
+    """调用方会往结果里写 QUERY_DATE 等键，不能污染缓存条目。"""
+    c = RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=8)
+    now = at(MONDAY, 20, 0)
+    c.put("SH600000", WINDOW, FetchRequirements(), raw(), now=now)
+
+    first = c.get("SH600000", WINDOW, FetchRequirements(), now=now)
+    first["QUERY_DATE"] = "2026-08-10"
+    second = c.get("SH600000", WINDOW, FetchRequirements(), now=now)
+    assert "QUERY_DATE" not in second
+
+
+def test_size_bound_evicts_oldest():
+    c = RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=2)
+    now = at(MONDAY, 20, 0)
+    for symbol in ("SH600000", "SH600001", "SH600002"):
+        c.put(symbol, WINDOW, FetchRequirements(), raw(), now=now)
+    assert c.get("SH600000", WINDOW, FetchRequirements(), now=now) is None
+    assert c.get("SH600002", WINDOW, FetchRequirements(), now=now) is not None
+
+
+@pytest.fixture
+def counting_fetch(monkeypatch):
+    calls = []
+
+    async def fake_load_data_msd(symbol, start, end, n=0, who="", requirements=None):
+        calls.append((symbol, requirements))
+        return raw()
+
+    monkeypatch.setattr(research, "load_data_msd", fake_load_data_msd)
+    cache_module.set_raw_data_cache(
+        RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=8)
+    )
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_tool_switch_reuses_fetch(counting_fetch):
+    """brief 之后的 tech 不再回源。"""
+    await research.load_raw_data("SH600000", requirements=FetchRequirements())
+    data = await research.load_raw_data(
+        "SH600000", requirements=FetchRequirements.technical()
+    )
+
+    assert len(counting_fetch) == 1
+    assert data["CLOSE"][-1] == 10.0
+
+
+@pytest.mark.asyncio
+async def test_historical_flags_do_not_leak_into_live_window(counting_fetch):
+    first = await research.load_raw_data("SH600000", end_date="2026-08-10")
+    second = await research.load_raw_data("SH600000", end_date="2026-08-10")
+
+    assert len(counting_fetch) == 1
+    assert first["QUERY_DATE"] == second["QUERY_DATE"] == "2026-08-10"
+    assert second["IS_HISTORICAL_QUERY"] is True
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_is_not_cached(monkeypatch):
+    calls = []
+
+    async def fake_load_data_msd(symbol, start, end, n=0, who="", requirements=None):
+        calls.append(symbol)
+        data = raw()
+        data[FETCH_FAILURES_KEY] = ["finance"]
+        return data
+
+    monkeypatch.setattr(research, "load_data_msd", fake_load_data_msd)
+    cache_module.set_raw_data_cache(
+        RawDataCache(enabled=True, live_ttl_seconds=30, max_entries=8)
+    )
+
+    await research.load_raw_data("SH600000")
+    await research.load_raw_data("SH600000")
+    assert len(calls) == 2
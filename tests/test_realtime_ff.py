@@ -5,18 +5,29 @@ Realtime fund-flow page routing tests.
 import asyncio
 import datetime
 import importlib
+import json
 from io import StringIO
 
 import numpy as np
 import pytest
 
-from qtf_mcp import research
+from qtf_mcp import observability, research
 from qtf_mcp.datasource import realtime_ff
 from qtf_mcp.datasource.realtime_ff import get_fund_flow_display_name, get_fund_flow_url
 
 app_module = importlib.import_module("qtf_mcp.mcp_app")
 
 
+@pytest.fixture(autouse=True)
+def page_only_fund_flow(monkeypatch):
+    """默认只走页面抓取且不复用结果；列表接口与结果缓存的测试自行打开。"""
+    monkeypatch.setattr(realtime_ff, "REALTIME_FF_BATCH_SIZE", 0)
+    monkeypatch.setattr(realtime_ff, "REALTIME_FF_RESULT_TTL_SECONDS", 0.0)
+    realtime_ff.clear_result_cache()
+    yield
+    realtime_ff.clear_result_cache()
+
+
 def test_core_indices_use_specific_index_pages():
     assert get_fund_flow_url("000001") == "https://data.eastmoney.com/zjlx/zs000001.html"
     assert get_fund_flow_url("SH000001") == "https://data.eastmoney.com/zjlx/zs000001.html"
@@ -43,97 +54,6 @@ def test_core_indices_use_stable_display_names():
     assert get_fund_flow_display_name("300308", "中际旭创") == "中际旭创"
 
 
-@pytest.mark.asyncio
-async def test_cancelled_browser_launch_stops_partial_playwright(monkeypatch):
-    launch_started = asyncio.Event()
-
-    class FakeChromium:
-        async def launch(self, **kwargs):
-            launch_started.set()
-            await asyncio.Event().wait()
-
-    class FakePlaywright:
-        def __init__(self):
-            self.chromium = FakeChromium()
-            self.stopped = False
-
-        async def start(self):
-            return self
-
-        async def stop(self):
-            self.stopped = True
-
-    fake_playwright = FakePlaywright()
-    monkeypatch.setattr(realtime_ff, "async_playwright", lambda: fake_playwright)
-    monkeypatch.setattr(realtime_ff, "_playwright", None)
-    monkeypatch.setattr(realtime_ff, "_browser", None)
-    monkeypatch.setattr(realtime_ff, "_context", None)
-
-    startup = asyncio.create_task(realtime_ff.get_context())
-    await launch_started.wait()
-    startup.cancel()
-
-    with pytest.raises(asyncio.CancelledError):
-        await startup
-
-    assert fake_playwright.stopped
-    assert realtime_ff._playwright is None
-    assert realtime_ff._browser is None
-    assert realtime_ff._context is None
-
-
-@pytest.mark.asyncio
-async def test_cancelled_context_creation_closes_partial_browser(monkeypatch):
-    context_started = asyncio.Event()
-
-    class FakeBrowser:
-        def __init__(self):
-            self.closed = False
-
-        async def new_context(self, **kwargs):
-            context_started.set()
-            await asyncio.Event().wait()
-
-        async def close(self):
-            self.closed = True
-
-    fake_browser = FakeBrowser()
-
-    class FakeChromium:
-        async def launch(self, **kwargs):
-            return fake_browser
-
-    class FakePlaywright:
-        def __init__(self):
-            self.chromium = FakeChromium()
-            self.stopped = False
-
-        async def start(self):
-            return self
-
-        async def stop(self):
-            self.stopped = True
-
-    fake_playwright = FakePlaywright()
-    monkeypatch.setattr(realtime_ff, "async_playwright", lambda: fake_playwright)
-    monkeypatch.setattr(realtime_ff, "_playwright", None)
-    monkeypatch.setattr(realtime_ff, "_browser", None)
-    monkeypatch.setattr(realtime_ff, "_context", None)
-
-    startup = asyncio.create_task(realtime_ff.get_context())
-    await context_started.wait()
-    startup.cancel()
-
-    with pytest.raises(asyncio.CancelledError):
-        await startup
-
-    assert fake_browser.closed
-    assert fake_playwright.stopped
-    assert realtime_ff._playwright is None
-    assert realtime_ff._browser is None
-    assert realtime_ff._context is None
-
-
 @pytest.mark.asyncio
 async def test_realtime_fund_flow_singleflight_only_while_inflight(monkeypatch):
     calls = 0
@@ -160,6 +80,77 @@ async def test_realtime_fund_flow_singleflight_only_while_inflight(monkeypatch):
     assert first_result == second_result == fresh_result
 
 
+@pytest.mark.asyncio
+async def test_realtime_result_is_reused_within_ttl_across_tools(monkeypatch):
+    """TTL 内同一标的（个股或指数）的后续请求复用上次成功结果；失败不缓存，过期后重新抓取。"""
+    monkeypatch.setattr(realtime_ff, "REALTIME_FF_RESULT_TTL_SECONDS", 0.05)
+    realtime_ff._inflight.clear()
+    calls = []
+
+    async def fake_fetch(symbol):
+        calls.append(symbol)
+        if symbol == "600519":
+            return {"error": "Timeout 10000ms exceeded", "url": ""}
+        return {"标的名称": symbol, "主力净流入": "1亿"}
+
+    monkeypatch.setattr(realtime_ff, "_fetch_single_with_context", fake_fetch)
+
+    with observability.bind_log_context(request_id="r1", tool="brief"):
+        await realtime_ff.get_fund_flow(["300408", "000001", "600519"])
+    with observability.bind_log_context(request_id="r2", tool="full"):
+        second = json.loads(await realtime_ff.get_fund_flow(["300408", "000001", "600519"]))
+
+    assert sorted(calls) == ["000001", "300408", "600519", "600519"]
+    assert second["000001"] == {"标的名称": "000001", "主力净流入": "1亿"}
+
+    await asyncio.sleep(0.06)
+    await realtime_ff.fetch_single_shared("300408")
+    assert calls.count("300408") == 2
+
+
+@pytest.mark.asyncio
+async def test_subscribed_targets_are_served_from_background_samples(monkeypatch):
+    """请求过的标的由后台轮询刷新，之后的报告直接读内存样本；空闲标的被淘汰。"""
+    subscriptions = realtime_ff.FundFlowSubscriptions(
+        interval=60, idle_seconds=600, concurrency=1, max_targets=2
+    )
+    monkeypatch.setattr(realtime_ff, "_subscriptions", subscriptions)
+    realtime_ff._inflight.clear()
+    calls = []
+
+    async def fake_fetch(symbol):
+        calls.append(symbol)
+        return {"标的名称": symbol, "主力净流入": f"{len(calls)}亿"}
+
+    monkeypatch.setattr(realtime_ff, "_fetch_single_with_context", fake_fetch)
+    loop = asyncio.get_running_loop()
+    try:
+        await realtime_ff.get_fund_flow(["300408", "dpzjlx"])
+        assert calls == ["300408", "dpzjlx"]
+        assert getattr(loop, realtime_ff._POLLER_TASK_ATTR).done() is False
+
+        stats = await subscriptions.refresh()
+        assert stats["refreshed"] == 2 and len(calls) == 4
+
+        served = json.loads(await realtime_ff.get_fund_flow(["dpzjlx", "300408"]))
+        assert len(calls) == 4
+        assert served["300408"]["主力净流入"] in ("3亿", "4亿")
+        assert subscriptions.latest("dpzjlx")[1] < 1.0
+
+        # 超过上限时淘汰最久未请求的标的
+        await realtime_ff.get_fund_flow(["000001"])
+        assert subscriptions.targets() == ["300408", "000001"]
+        assert subscriptions.latest("dpzjlx") is None
+
+        subscriptions.idle_seconds = 0
+        stats = await subscriptions.refresh()
+        assert stats["targets"] == 0 and subscriptions.targets() == []
+        assert subscriptions.latest("300408") is None
+    finally:
+        getattr(loop, realtime_ff._POLLER_TASK_ATTR).cancel()
+        await asyncio.sleep(0)
+
+
 @pytest.mark.asyncio
 async def test_realtime_fetch_survives_disconnected_leader_for_retry(monkeypatch):
     calls = 0
@@ -489,3 +480,308 @@ async def test_discard_consumes_failed_prefetch_exception(monkeypatch):
     prefetch.discard()
 
     assert isinstance(prefetch.task.exception(), RuntimeError)
+
+
+def test_push2_response_parsing_handles_jsonp_scaling_and_code():
+    """JSONP 与纯 JSON 都能解析；非 fltt=2 的占比按 100 倍还原；代码不符时不采用。"""
+    url = "https://push2.eastmoney.com/api/qt/stock/get?secid=0.300408&fields=f62,f184"
+    jsonp = (
+        'jQuery123({"rc":0,"data":{"f57":"300408","f58":"三环集团","f62":123456789.0,'
+        '"f184":543,"f66":-2e7,"f69":-88,"f72":"-","f75":0,"f78":1e6,"f81":12,"f84":-5e5,"f87":-6}});'
+    )
+
+    values = realtime_ff.parse_fund_flow_response(jsonp, url, "300408")
+    assert values["name"] == "三环集团"
+    assert values["f62"] == 123456789.0 and values["f184"] == pytest.approx(5.43)
+    assert values["f72"] == 0.0
+    assert realtime_ff.parse_fund_flow_response(jsonp, url, "600519") is None
+
+    ulist = '{"data":{"diff":[{"f12":"300408","f14":"三环集团","f62":1.5e8,"f184":2.5}]}}'
+    values = realtime_ff.parse_fund_flow_response(
+        ulist, "https://push2.eastmoney.com/api/qt/ulist.np/get?fltt=2", "300408"
+    )
+    assert values["f62"] == 1.5e8 and values["f184"] == 2.5
+    assert realtime_ff.parse_fund_flow_response('{"data":{"klines":[]}}', url, "300408") is None
+    assert realtime_ff.is_fund_flow_api_url(url)
+    assert not realtime_ff.is_fund_flow_api_url("https://push2.eastmoney.com/api/qt/stock/fflow/kline/get")
+
+
+def test_push2_response_without_matching_identity_is_rejected():
+    """条目代码或请求 secid 必须与目标一致；单条目列表也不例外；无代码目标一律不采用。"""
+    bare = '{"data":{"f62":1.5e8,"f184":2.5}}'
+    url = "https://push2.eastmoney.com/api/qt/stock/get?fltt=2&secid=0.300408"
+    assert realtime_ff.parse_fund_flow_response(bare, url, "300408")["f62"] == 1.5e8
+    assert realtime_ff.parse_fund_flow_response(bare, url, "600519") is None
+    assert realtime_ff.parse_fund_flow_response(
+        bare, "https://push2.eastmoney.com/api/qt/stock/get?fltt=2", "300408"
+    ) is None
+
+    ulist = '{"data":{"diff":[{"f12":"300408","f14":"三环集团","f62":1.5e8,"f184":2.5}]}}'
+    list_url = "https://push2.eastmoney.com/api/qt/ulist.np/get?fltt=2"
+    assert realtime_ff.parse_fund_flow_response(ulist, list_url, "600519") is None
+    assert realtime_ff.parse_fund_flow_response(ulist, list_url, "") is None
+    assert realtime_ff.parse_fund_flow_response(_api_response()._text, url, "") is None
+
+
+class _FakeResponse:
+    def __init__(self, url, text):
+        self.url = url
+        self._text = text
+
+    async def text(self):
+        return self._text
+
+
+class _FakePage:
+    def __init__(self, responses=(), dom=None):
+        self.responses = list(responses)
+        self.dom = dom
+        self.handlers = []
+        self.routes = 0
+        self.visited = []
+        self.evaluated = False
+        self.closed = False
+
+    async def route(self, pattern, handler):
+        self.routes += 1
+
+    def on(self, event, handler):
+        self.handlers.append(handler)
+
+    async def goto(self, url, **kwargs):
+        self.visited.append(url)
+        for response in self.responses:
+            for handler in self.handlers:
+                await handler(response)
+
+    async def wait_for_selector(self, selector, timeout=None):
+        if self.dom is None:
+            await asyncio.Event().wait()
+
+    async def wait_for_function(self, script, timeout=None):
+        pass
+
+    async def evaluate(self, script):
+        self.evaluated = True
+        return self.dom
+
+    async def close(self):
+        self.closed = True
+
+
+class _FakeContext:
+    def __init__(self, *pages):
+        self.pages = list(pages)
+
+    async def new_page(self):
+        return self.pages.pop(0) if self.pages else _FakePage()
+
+
+@pytest.fixture
+def page_pool(monkeypatch):
+    pool = realtime_ff.PagePool(2, max_uses=2)
+    monkeypatch.setattr(realtime_ff, "_page_pool", pool)
+    return pool
+
+
+def _api_response(code="300408"):
+    return _FakeResponse(
+        f"https://push2.eastmoney.com/api/qt/stock/get?fltt=2&secid=0.{code}",
+        f'{{"data":{{"f57":"{code}","f58":"三环集团","f62":150000000,"f184":2.5,'
+        '"f66":1,"f69":1,"f72":1,"f75":1,"f78":1,"f81":1,"f84":1,"f87":1}}',
+    )
+
+
+@pytest.mark.asyncio
+async def test_fetch_single_uses_intercepted_json_without_scraping(page_pool):
+    """页面自己的 push2 响应一到就直接取数，金额以数值返回，不再解析 DOM。"""
+    page = _FakePage([
+        _FakeResponse("https://push2.eastmoney.com/api/qt/stock/fflow/kline/get?secid=0.300408", "{}"),
+        _api_response(),
+    ])
+
+    result = await realtime_ff.fetch_single("300408", _FakeContext(page))
+
+    assert result["标的名称"] == "三环集团"
+    assert result["主力净流入"] == 150000000
+    assert result["主力净比(%)"] == 2.5
+    assert not page.evaluated
+
+
+@pytest.mark.asyncio
+async def test_fetch_single_falls_back_to_dom_without_json(page_pool):
+    """没有可用的接口响应时退回 DOM 解析，结果形状不变。"""
+    dom = {"name": "三环集团", "f62": "1.50亿", "f184": "2.50%"}
+    dom.update({f: "0" for f in ("f66", "f69", "f72", "f75", "f78", "f81", "f84", "f87")})
+    page = _FakePage([], dom=dom)
+
+    result = await realtime_ff.fetch_single("300408", _FakeContext(page))
+
+    assert page.evaluated
+    assert result["主力净流入"] == "1.50亿"
+    assert result["主力净比(%)"] == 2.5
+
+
+@pytest.mark.asyncio
+async def test_fetch_single_ignores_previous_symbols_json(page_pool):
+    """复用页面收到上一个标的迟到的响应时不采用，退回 DOM。"""
+    dom = {"name": "三环集团", "f62": "1.50亿", "f184": "2.50%"}
+    dom.update({f: "0" for f in ("f66", "f69", "f72", "f75", "f78", "f81", "f84", "f87")})
+    page = _FakePage([_api_response("600519")], dom=dom)
+
+    result = await realtime_ff.fetch_single("300408", _FakeContext(page))
+
+    assert page.evaluated
+    assert result["主力净流入"] == "1.50亿"
+
+
+@pytest.mark.asyncio
+async def test_market_page_always_reads_dom(page_pool):
+    """dpzjlx 没有单一代码可核对：个股 push2 响应不能被当成沪深两市。"""
+    dom = {"name": "沪深两市", "f62": "-120.5亿", "f184": "-1.20%"}
+    dom.update({f: "0" for f in ("f66", "f69", "f72", "f75", "f78", "f81", "f84", "f87")})
+    page = _FakePage([_api_response()], dom=dom)
+
+    result = await realtime_ff.fetch_single("dpzjlx", _FakeContext(page))
+
+    assert page.evaluated
+    assert result["标的名称"] == "沪深两市"
+    assert result["主力净流入"] == "-120.5亿"
+
+
+@pytest.mark.asyncio
+async def test_page_pool_reuses_pages_and_recycles_after_max_uses(page_pool):
+    """页面只建一次、路由只装一次，原地跳转切换标的；用满次数后关闭换新。"""
+    first, second = _FakePage([_api_response()]), _FakePage([_api_response()])
+    context = _FakeContext(first, second)
+
+    for _ in range(3):
+        result = await realtime_ff.fetch_single("300408", context)
+        assert result["主力净流入"] == 150000000
+
+    assert first.routes == len(realtime_ff.BLOCKED_PATTERNS)
+    assert len(first.visited) == 2 and first.closed
+    assert len(second.visited) == 1 and not second.closed
+    assert page_pool.created == 2 and page_pool.recycled == 1
+
+
+@pytest.mark.asyncio
+async def test_page_pool_replaces_failed_page_and_bounds_concurrency(page_pool):
+    """抓取失败的页面不再复用；同时在用的页面不超过池大小。"""
+    failing = _FakePage()
+
+    async def broken_goto(url, **kwargs):
+        raise RuntimeError("net::ERR_CONNECTION_RESET")
+
+    failing.goto = broken_goto
+    context = _FakeContext(failing, _FakePage([_api_response()]))
+
+    result = await realtime_ff.fetch_single("300408", context)
+    assert "ERR_CONNECTION_RESET" in result["error"]
+    assert failing.closed
+    assert (await realtime_ff.fetch_single("300408", context))["主力净流入"] == 150000000
+
+    # 预热只补足空闲页面，并停在给定页面上
+    assert await page_pool.warm(context, "https://data.eastmoney.com/zjlx/dpzjlx.html") == 1
+    assert page_pool.created == 3
+
+    held = [await page_pool.acquire(context), await page_pool.acquire(context)]
+    third = asyncio.create_task(page_pool.acquire(context))
+    await asyncio.sleep(0.01)
+    assert not third.done() and page_pool.in_use == 2
+    await page_pool.release(held.pop())
+    held.append(await asyncio.wait_for(third, timeout=1))
+    for pooled in held:
+        await page_pool.release(pooled)
+    assert page_pool.in_use == 0
+
+
+def test_list_secids_and_response_parsing():
+    """个股按市场映射 secid，指数与大盘页不走列表接口；列表响应按代码展开。"""
+    assert realtime_ff.fund_flow_secid("600519") == "1.600519"
+    assert realtime_ff.fund_flow_secid("300408") == "0.300408"
+    assert realtime_ff.fund_flow_secid("830799") == "0.830799"
+    assert realtime_ff.fund_flow_secid("920088") == "0.920088"
+    assert realtime_ff.fund_flow_secid("430047") == "0.430047"
+    assert realtime_ff.fund_flow_secid("900901") == "1.900901"
+    assert realtime_ff.fund_flow_secid("000001") is None
+    assert realtime_ff.fund_flow_secid("dpzjlx") is None
+
+    body = (
+        '{"data":{"total":2,"diff":[{"f12":"600519","f14":"贵州茅台","f62":-3e8,"f184":-4.2},'
+        '{"f12":"300408","f14":"三环集团","f62":1.5e8,"f184":2.5,"f66":"-"}]}}'
+    )
+    values = realtime_ff.parse_fund_flow_list(body, realtime_ff.FUND_FLOW_LIST_URL + "?fltt=2")
+    assert set(values) == {"600519", "300408"}
+    assert values["600519"]["name"] == "贵州茅台" and values["600519"]["f184"] == -4.2
+    assert values["300408"]["f66"] == 0.0
+    assert realtime_ff.parse_fund_flow_list('{"data":null}', realtime_ff.FUND_FLOW_LIST_URL) == {}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_stock_lookups_share_paginated_list_calls(monkeypatch):
+    """同时到达的个股合并为按页切分的列表调用；列表缺失的代码与指数退回页面抓取。"""
+    monkeypatch.setattr(realtime_ff, "REALTIME_FF_BATCH_SIZE", 2)
+    realtime_ff._inflight.clear()
+    list_calls, page_calls = [], []
+
+    def fake_list(secids):
+        list_calls.append(list(secids))
+        return {
+            secid.split(".")[1]: {"name": "股票" + secid, "f62": 1e8, "f184": 1.5}
+            | {f: 0.0 for f in ("f66", "f69", "f72", "f75", "f78", "f81", "f84", "f87")}
+            for secid in secids
+            if secid != "0.000333"
+        }
+
+    async def fake_page(symbol):
+        page_calls.append(symbol)
+        return {"标的名称": symbol, "主力净流入": "1亿"}
+
+    monkeypatch.setattr(realtime_ff, "_fetch_fund_flow_list_sync", fake_list)
+    monkeypatch.setattr(realtime_ff, "_fetch_single_with_context", fake_page)
+
+    report, other = await asyncio.gather(
+        realtime_ff.get_fund_flow(["dpzjlx", "300408", "600519", "000333"]),
+        realtime_ff.get_fund_flow(["002594"]),
+    )
+
+    assert sorted(list_calls) == [["0.000333", "0.002594"], ["0.300408", "1.600519"]]
+    assert sorted(page_calls) == ["000333", "dpzjlx"]
+    results = json.loads(report)
+    assert results["300408"]["标的名称"] == "股票0.300408"
+    assert results["300408"]["主力净流入"] == 1e8 and results["300408"]["主力净比(%)"] == 1.5
+    assert results["000333"] == {"标的名称": "000333", "主力净流入": "1亿"}
+    assert json.loads(other)["002594"]["主力净流入"] == 1e8
+
+    def failing_list(secids):
+        raise RuntimeError("push2 unavailable")
+
+    monkeypatch.setattr(realtime_ff, "_fetch_fund_flow_list_sync", failing_list)
+    results = json.loads(await realtime_ff.get_fund_flow(["300408"]))
+    assert results["300408"] == {"标的名称": "300408", "主力净流入": "1亿"}
+    batcher = realtime_ff.get_fund_flow_batcher()
+    assert batcher.batches == 2 and batcher.calls == 3
+    assert batcher.hits == 3 and batcher.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_numeric_realtime_amounts_render_like_page_text(monkeypatch):
+    """接口返回的数值金额与页面文本渲染出完全相同的报告。"""
+    payloads = [
+        '{"300408": {"标的名称": "三环集团", "主力净流入": 150000000.0, "主力净比(%)": 2.5}}',
+        '{"300408": {"标的名称": "三环集团", "主力净流入": "1.50亿", "主力净比(%)": 2.5}}',
+    ]
+
+    async def fake_get_fund_flow(symbols, **kwargs):
+        return payloads.pop(0)
+
+    monkeypatch.setattr(research, "get_fund_flow", fake_get_fund_flow)
+    monkeypatch.setattr(research, "is_realtime_fund_flow_window", lambda now=None: True)
+
+    numeric, text = StringIO(), StringIO()
+    await research.build_trading_data(numeric, "SZ300408", _live_window_raw_data())
+    await research.build_trading_data(text, "SZ300408", _live_window_raw_data())
+
+    assert "1.50亿  主力净占比: 2.50%" in numeric.getvalue()
+    assert numeric.getvalue() == text.getvalue()
@@ -23,6 +23,7 @@ from qtf_mcp.cache import (
     PHASE_POSTCLOSE,
     ReportCache,
     build_key,
+    in_trading_session,
     is_cacheable_report,
     market_phase,
 )
@@ -73,6 +74,25 @@ def test_market_phase_boundaries(moment, expected_phase):
     assert phase == expected_phase
 
 
+@pytest.mark.parametrize(
+    "moment,expected",
+    [
+        (at(MONDAY, 9, 14), False),
+        (at(MONDAY, 9, 15), True),
+        (at(MONDAY, 11, 34), True),    # 午间定格缓冲
+        (at(MONDAY, 11, 35), False),
+        (at(MONDAY, 12, 0), False),    # 午休
+        (at(MONDAY, 13, 0), True),
+        (at(MONDAY, 15, 4), True),
+        (at(MONDAY, 15, 5), False),
+        (at(MONDAY, 16, 0), False),    # 收盘后到 17:00 不再轮询
+        (at(SATURDAY, 10, 0), False),
+    ],
+)
+def test_trading_session_skips_lunch_post_close_and_weekends(moment, expected):
+    assert in_trading_session(moment) is expected
+
+
 def test_closed_epoch_spans_overnight():
     """周一 18:00 与周二 08:00 属于同一纪元，两者渲染同一个资金流分支。"""
     _, evening = market_phase(at(MONDAY, 18, 0))
@@ -361,6 +381,35 @@ def test_live_ttl_expires(tmp_path, monkeypatch):
     assert c.get(key) is None
 
 
+def test_stale_entry_served_only_inside_swr_window(tmp_path, monkeypatch):
+    c = make_cache(tmp_path, live_ttl_seconds=30.0, stale_seconds=60.0)
+    key = build_key("brief", "SH600000", {}, now=at(MONDAY, 10, 0))
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    c.put(key, "盘中报告")
+    now[0] += 45
+    assert c.get(key) is None, "过了 TTL 的条目对普通读取仍是未命中"
+    assert c.get_stale(key) == ("盘中报告", 45.0)
+    now[0] += 50  # 累计 95s > TTL + SWR
+    assert c.get_stale(key) is None
+
+
+def test_swr_is_off_by_default_and_live_only(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    strict = make_cache(tmp_path, live_ttl_seconds=30.0)
+    live_key = build_key("brief", "SH600000", {}, now=at(MONDAY, 10, 0))
+    strict.put(live_key, "盘中报告")
+    now[0] += 45
+    assert strict.get_stale(live_key) is None
+
+    swr = make_cache(tmp_path, live_ttl_seconds=30.0, stale_seconds=60.0)
+    closed_key = build_key("brief", "SH600000", {}, now=at(MONDAY, 18, 0))
+    swr.put(closed_key, "收盘报告")
+    assert swr.get_stale(closed_key) is None, "非盘中阶段本就完全复用，不走 SWR"
+
+
 def test_live_ttl_zero_disables_intraday_reuse(tmp_path):
     c = make_cache(tmp_path, live_ttl_seconds=0.0)
     live_key = build_key("brief", "SH600000", {}, now=at(MONDAY, 10, 0))
@@ -550,3 +599,99 @@ def test_disk_payload_is_readable_json(tmp_path):
     payload = json.loads(path.read_text(encoding="utf-8"))
     assert payload["value"] == "报告正文"
     assert payload["epoch"] == key.epoch
+
+
+# --- 共享后端（多进程） --------------------------------------------------
+
+
+def make_shared(tmp_path, **kwargs) -> ReportCache:
+    params = {
+        "disk_enabled": True,
+        "backend": "sqlite",
+        "directory": str(tmp_path / "shared"),
+    }
+    params.update(kwargs)
+    return make_cache(tmp_path, **params)
+
+
+def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    """两个 worker 指向同一目录：一个写入，另一个的内存层为空也能命中。"""
+    key = build_key("brief", "SH600000", {}, now=at(MONDAY, 18, 0))
+    worker_a = make_shared(tmp_path)
+    worker_b = make_shared(tmp_path)
+
+    worker_a.put(key, "报告正文")
+    assert worker_b.get(key) == "报告正文"
+    assert (tmp_path / "shared" / cache_module.SQLITE_FILENAME).exists()
+
+
+def test_sqlite_backend_keeps_fingerprint_invariant(tmp_path, monkeypatch):
+    key = build_key("brief", "SH600000", {}, now=at(MONDAY, 18, 0))
+    make_shared(tmp_path).put(key, "上线前的渲染结果")
+
+    monkeypatch.setattr(cache_module, "RENDER_FINGERPRINT", "newbuild1234")
+    assert make_shared(tmp_path).get(key) is None
+
+
+def test_sqlite_sweep_prunes_expired_rows(tmp_path):
+    worker = make_shared(tmp_path)
+    key = build_key("brief", "SH600000", {}, now=at(MONDAY, 18, 0))
+    worker.put(key, "报告正文")
+    expired = time.time() - cache_module.DISK_RETENTION_SECONDS - 60
+    worker._sqlite().execute("UPDATE entries SET created_at = ?", (expired,))
+
+    worker._last_sweep_at = 0.0
+    worker._sweep_disk()
+    assert worker._sqlite_read(key) is None
+
+
+@pytest.mark.asyncio
+async def test_fill_lease_makes_second_worker_wait_for_first_render(tmp_path):
+    """同一纪元同一键只渲染一次：后到的 worker 等租约，然后直接命中。"""
+    import asyncio
+
+    key = build_key("brief", "SH600000", {}, now=at(MONDAY, 18, 0))
+    worker_a = make_shared(tmp_path)
+    worker_b = make_shared(tmp_path)
+    renders = []
+
+    async def serve(worker, name):
+        async with worker.get_or_lease(key) as cached:
+            if cached is not None:
+                return cached
+            renders.append(name)
+            await asyncio.sleep(0.2)
+            worker.put(key, f"{name} 渲染")
+            return f"{name} 渲染"
+
+    first = asyncio.create_task(serve(worker_a, "a"))
+    await asyncio.sleep(0.05)
+    second = await serve(worker_b, "b")
+
+    assert await first == "a 渲染"
+    assert second == "a 渲染"
+    assert renders == ["a"]
+    assert worker_b.lease_waits == 1
+
+
+@pytest.mark.asyncio
+async def test_fill_lease_wait_is_bounded(tmp_path):
+    """持有者卡死时，其他 worker 超时后自行渲染，而不是无限等待。"""
+    key = build_key("brief", "SH600000", {}, now=at(MONDAY, 18, 0))
+    holder = make_shared(tmp_path)
+    waiter = make_shared(tmp_path, lease_timeout_seconds=0.1)
+
+    async with holder.fill_lease(key) as held:
+        assert held is True
+        async with waiter.fill_lease(key) as leased:
+            assert leased is False
+    assert waiter.lease_timeouts == 1
+
+
+@pytest.mark.asyncio
+async def test_file_backend_takes_no_lease(tmp_path):
+    c = make_cache(tmp_path, disk_enabled=True)
+    key = build_key("brief", "SH600000", {}, now=at(MONDAY, 18, 0))
+    async with c.fill_lease(key) as leased:
+        assert leased is False
+    assert not (tmp_path / "cache").exists()
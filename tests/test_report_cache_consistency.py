@@ -16,7 +16,7 @@ import pytest
 
 import qtf_mcp.mcp_app  # noqa: F401  确保子模块已加载
 from qtf_mcp import cache as cache_module
-from qtf_mcp import research
+from qtf_mcp import observability, research
 from qtf_mcp.cache import ReportCache
 from qtf_mcp.datasource.base import FETCH_FAILURES_KEY, StockData
 
@@ -492,3 +492,244 @@ async def test_every_cached_tool_logs_its_hit():
         if miss_marker not in source:
             missing.append(f"{name}: 缺未命中日志")
     assert missing == [], f"日志缺失: {missing}"
+
+
+# --- 盘中 SWR ----------------------------------------------------------
+
+
+@pytest.fixture
+def live_clock(monkeypatch):
+    """把缓存键固定在盘中时刻，并接管缓存的墙钟，使 SWR 测试与真实时间无关。"""
+    real_build_key = cache_module.build_key
+    moment = datetime.datetime(2026, 8, 17, 10, 0)
+    monkeypatch.setattr(
+        mcp_app, "build_key", lambda *args, **kwargs: real_build_key(*args, now=moment, **kwargs)
+    )
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    return now
+
+
+async def drain_refreshes():
+    loop = asyncio.get_running_loop()
+    refreshes = getattr(loop, mcp_app._REPORT_REFRESH_ATTR, {})
+    if refreshes:
+        await asyncio.gather(*list(refreshes.values()))
+
+
+@pytest.mark.asyncio
+async def test_swr_serves_stale_report_and_refreshes_once(tmp_path, live_clock, deterministic_render):
+    install_cache(tmp_path, live_ttl_seconds=30.0, stale_seconds=60.0)
+    fresh = await mcp_app.fetch_batch_reports("SH600000", "brief", "test")
+    assert deterministic_render["count"] == 1
+
+    live_clock[0] += 45
+    first, second = await asyncio.gather(
+        mcp_app.fetch_batch_reports("SH600000", "brief", "test"),
+        mcp_app.fetch_batch_reports("SH600000", "brief", "test"),
+    )
+    assert first.reports["SH600000"] == fresh.reports["SH600000"]
+    assert any("45 秒前" in w for w in first.warnings)
+    assert any("45 秒前" in w for w in second.warnings)
+
+    await drain_refreshes()
+    assert deterministic_render["count"] == 2, "两次过期命中只应触发一次后台刷新"
+
+    refreshed = await mcp_app.fetch_batch_reports("SH600000", "brief", "test")
+    assert refreshed.warnings == []
+    assert deterministic_render["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_swr_window_is_bounded(tmp_path, live_clock, deterministic_render):
+    install_cache(tmp_path, live_ttl_seconds=30.0, stale_seconds=60.0)
+    await mcp_app.fetch_batch_reports("SH600000", "brief", "test")
+
+    live_clock[0] += 120  # 超过 TTL + SWR
+    result = await mcp_app.fetch_batch_reports("SH600000", "brief", "test")
+    assert deterministic_render["count"] == 2, "超出陈旧窗口必须同步回源"
+    assert result.warnings == []
+
+
+@pytest.mark.asyncio
+async def test_swr_disabled_keeps_strict_ttl(tmp_path, live_clock, deterministic_render):
+    install_cache(tmp_path, live_ttl_seconds=30.0)
+    await mcp_app.fetch_batch_reports("SH600000", "brief", "test")
+
+    live_clock[0] += 45
+    result = await mcp_app.fetch_batch_reports("SH600000", "brief", "test")
+    assert deterministic_render["count"] == 2
+    assert result.warnings == []
+
+
+@pytest.fixture
+def gated_render(monkeypatch, deterministic_render):
+    """让取数停在闸门上，便于构造"领头者仍在渲染时跟随者到达"的时序。"""
+    gate = asyncio.Event()
+    inner = research.load_raw_data
+
+    async def gated_load_raw_data(*args, **kwargs):
+        await gate.wait()
+        return await inner(*args, **kwargs)
+
+    monkeypatch.setattr(research, "load_raw_data", gated_load_raw_data)
+    return gate
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["brief", "full"])
+async def test_concurrent_misses_render_once(mode, tmp_path, caplog, gated_render, deterministic_render):
+    install_cache(tmp_path)
+    caplog.set_level(logging.INFO, logger="qtf_mcp")
+    calls = [
+        asyncio.create_task(mcp_app.fetch_batch_reports("SH600000", mode, "a")),
+        asyncio.create_task(mcp_app.fetch_batch_reports("SH600000", mode, "b")),
+    ]
+    await asyncio.sleep(0.01)
+    gated_render.set()
+    first, second = await asyncio.gather(*calls)
+
+    assert deterministic_render["count"] == 1
+    assert first.reports == second.reports
+    assert first.errors == second.errors == {}
+    assert sum("Report render coalesced" in r.getMessage() for r in caplog.records) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_fail_followers(tmp_path, gated_render, deterministic_render):
+    """领头请求断开只停止它自己的等待，渲染照常完成并写入缓存。"""
+    cache = install_cache(tmp_path)
+    leader = asyncio.create_task(mcp_app.fetch_batch_reports("SH600000", "brief", "a"))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(mcp_app.fetch_batch_reports("SH600000", "brief", "b"))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    gated_render.set()
+
+    result = await follower
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert result.errors == {}
+    assert deterministic_render["count"] == 1
+    assert cache.stores == 1
+
+
+async def _fetch_with_deadline(symbol: str, client: str, deadline):
+    with observability.bind_deadline(deadline):
+        return await mcp_app.fetch_batch_reports(symbol, "brief", client)
+
+
+@pytest.fixture
+def deadline_gated_render(monkeypatch, deterministic_render):
+    """闸门之后先检查截止时间，模拟渲染任务在取数名额处的检查。"""
+    gate = asyncio.Event()
+    inner = research.load_raw_data
+
+    async def gated_load_raw_data(*args, **kwargs):
+        await gate.wait()
+        observability.check_deadline("data_fetch")
+        return await inner(*args, **kwargs)
+
+    monkeypatch.setattr(research, "load_raw_data", gated_load_raw_data)
+    return gate
+
+
+@pytest.mark.asyncio
+async def test_shared_render_outlives_expired_leader(tmp_path, deadline_gated_render, deterministic_render):
+    """领头请求过了截止时间，但跟随者还在等：合并渲染照常完成，两边都拿到报告。"""
+    install_cache(tmp_path)
+    leader = asyncio.create_task(_fetch_with_deadline("SH600000", "a", 0.02))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(_fetch_with_deadline("SH600000", "b", None))
+    await asyncio.sleep(0.03)
+    deadline_gated_render.set()
+
+    first, second = await asyncio.gather(leader, follower)
+    assert first.errors == second.errors == {}
+    assert deterministic_render["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_render_is_shed_once_every_waiter_expired(tmp_path, deadline_gated_render, deterministic_render):
+    """所有等待者都过了截止时间时，渲染在下一个准入点被丢弃，标的记为 shed。"""
+    install_cache(tmp_path)
+    statuses = []
+
+    async def on_symbol(symbol, status):
+        statuses.append(status)
+
+    async def call():
+        with observability.bind_deadline(0.02):
+            return await mcp_app.fetch_batch_reports("SH600000", "brief", "a", on_symbol=on_symbol)
+
+    shed_before = observability.shed_counts["data_fetch"]
+    request = asyncio.create_task(call())
+    await asyncio.sleep(0.03)
+    deadline_gated_render.set()
+    result = await request
+
+    assert statuses == ["shed"]
+    assert "截止时间" in result.errors["SH600000"]
+    assert deterministic_render["count"] == 0
+    assert observability.shed_counts["data_fetch"] == shed_before + 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tech_misses_render_once(tmp_path, gated_render, deterministic_render):
+    install_cache(tmp_path)
+    calls = [
+        asyncio.create_task(mcp_app.fetch_technical_reports("SH600000", days=30)),
+        asyncio.create_task(mcp_app.fetch_technical_reports("SH600000", days=30)),
+        asyncio.create_task(mcp_app.fetch_technical_reports("SH600000", days=10)),
+    ]
+    await asyncio.sleep(0.01)
+    gated_render.set()
+    same_a, same_b, other = await asyncio.gather(*calls)
+
+    assert deterministic_render["count"] == 2, "不同参数是不同的键，不得合并"
+    assert same_a.reports["SH600000"].model_dump() == same_b.reports["SH600000"].model_dump()
+    assert len(other.reports["SH600000"].indicators) != len(same_a.reports["SH600000"].indicators)
+
+
+@pytest.mark.asyncio
+async def test_disabled_cache_does_not_coalesce(tmp_path, gated_render, deterministic_render):
+    install_cache(tmp_path, enabled=False)
+    calls = [
+        asyncio.create_task(mcp_app.fetch_batch_reports("SH600000", "brief", "a")),
+        asyncio.create_task(mcp_app.fetch_batch_reports("SH600000", "brief", "b")),
+    ]
+    await asyncio.sleep(0.01)
+    gated_render.set()
+    await asyncio.gather(*calls)
+    assert deterministic_render["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_kline_misses_fetch_once(tmp_path, monkeypatch):
+    install_cache(tmp_path)
+    gate = asyncio.Event()
+    calls = {"count": 0}
+    row = {
+        "日期": "2026-08-14", "开盘": 10.0, "收盘": 10.5, "最高": 10.8, "最低": 9.9,
+        "成交量": 1000, "成交额": 1.0e6, "涨跌幅": 1.2, "涨跌额": 0.12,
+        "振幅": 2.0, "换手率": 0.5,
+    }
+
+    class FakeSource:
+        async def fetch_kline_simple(self, symbol, start, end, adjust):
+            calls["count"] += 1
+            await gate.wait()
+            return {"data": [row]}
+
+    monkeypatch.setattr(mcp_app, "get_datasource", lambda: FakeSource())
+    daily = getattr(mcp_app.kline_daily, "fn", mcp_app.kline_daily)
+    tasks = [
+        asyncio.create_task(daily("SH600000", "2026-08-14")),
+        asyncio.create_task(daily("SH600000", "2026-08-14")),
+    ]
+    await asyncio.sleep(0.01)
+    gate.set()
+    first, second = await asyncio.gather(*tasks)
+    assert first == second
+    assert calls["count"] == 1
+    cache_module.set_report_cache(None)
@@ -0,0 +1,89 @@
+"""结构化报表测试
+
+Markdown 由章节结构渲染而来，必须与直接写入文本流的结果逐字节一致；
+JSON 形态必须是严格 JSON（NaN 变为 null）。
+"""
+
+import json
+from io import StringIO
+
+import numpy as np
+import pytest
+
+from qtf_mcp import research
+from qtf_mcp.report_doc import Item, ReportDocument, Section, Table, render_markdown
+
+
+async def _render(fp, data):
+    research.build_basic_data(fp, "SZ000001", data)
+    await research.build_trading_data(fp, "SZ000001", data)
+    research.build_financial_data(fp, "SZ000001", data)
+    research.build_technical_data(fp, "SZ000001", data)
+
+
+@pytest.mark.asyncio
+async def test_document_renders_same_markdown_as_text_stream(sample_stock_data_dict):
+    """同一份数据写入 StringIO 与写入 ReportDocument 得到相同的 Markdown。"""
+    data = dict(sample_stock_data_dict)
+    data["IS_HISTORICAL_QUERY"] = True
+    stream = StringIO()
+    document = ReportDocument()
+
+    await _render(stream, data)
+    await _render(document, data)
+
+    assert document.to_markdown() == stream.getvalue()
+    titles = [section["title"] for section in document.to_json()]
+    assert titles == ["基本数据", "交易数据", "财务数据", "技术指标(最近30日)"]
+
+
+@pytest.mark.asyncio
+async def test_json_sections_carry_raw_values(sample_stock_data_dict):
+    """列表项带原始数值，表格单元格是原始值，NaN 序列化为 null。"""
+    data = dict(sample_stock_data_dict)
+    data["IS_HISTORICAL_QUERY"] = True
+    document = ReportDocument()
+
+    await _render(document, data)
+
+    sections = document.to_json()
+    json.dumps(sections, allow_nan=False)
+    trading = sections[1]
+    price = trading["sections"][0]
+    assert price["title"] == "价格"
+    assert price["items"][0]["label"] == "当日"
+    assert price["items"][0]["values"]["close"] == pytest.approx(data["CLOSE"][-1])
+    technical = sections[3]["table"]
+    assert technical["columns"][0] == "日期"
+    assert len(technical["rows"]) == 30
+    # 30 根 K 线不足 MACD 预热期，缺值为 null
+    assert technical["rows"][0][4] is None
+
+
+def test_renderer_keeps_historical_table_layouts():
+    """技术指标表首列后不留空格、资金流表用 ---- 分隔，与原输出一致。"""
+    technical = Section(
+        "技术指标(最近30日)",
+        table=Table(["日期", "K"], [["2026-01-02", 1.0]], [str, "{:.2f}".format], key_separator="|"),
+    )
+    history = Section(
+        "历史资金流向", level=2, table=Table(["日期", "收盘价"], [["2026-01-02", np.nan]], rule="----")
+    )
+
+    assert render_markdown([technical]) == (
+        "# 技术指标(最近30日)\n\n| 日期 | K |\n| --- | --- |\n| 2026-01-02|1.00 |\n\n"
+    )
+    assert render_markdown([history]) == (
+        "## 历史资金流向\n\n| 日期 | 收盘价 |\n| ---- | ---- |\n| 2026-01-02 | nan |\n\n"
+    )
+
+
+def test_raw_writes_are_kept_in_place():
+    """直接 print 进文档的文本按原位置保留。"""
+    document = ReportDocument()
+    section = Section("基本数据", items=[Item("SZ000001", "股票代码")])
+    document.extend([section])
+    print("# trading", file=document)
+
+    assert document.to_markdown() == "# 基本数据\n\n- 股票代码: SZ000001\n\n# trading\n"
+    assert document.to_json()[1] == {"title": "", "level": 0, "markdown": "# trading\n"}
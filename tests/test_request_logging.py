@@ -5,6 +5,7 @@ import logging
 import pytest
 
 from qtf_mcp.mcp_app import RequestLifecycleLogMiddleware
+from qtf_mcp.observability import deadline_var
 
 
 def _scope(method: str = "POST"):
@@ -146,3 +147,36 @@ async def test_request_lifecycle_does_not_count_failed_response_send(caplog):
     assert "response_started=True" in caplog.text
     assert "response_bytes=0" in caplog.text
     assert "response_finished=False" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_request_deadline_follows_header_and_disconnect():
+    """X-Request-Timeout 设定请求截止时间；客户端断开后截止时间立即失效。"""
+    scope = _scope()
+    scope["headers"] = [(b"x-request-timeout", b"30")]
+    messages = iter(
+        [
+            {"type": "http.request", "body": b"", "more_body": False},
+            {"type": "http.disconnect"},
+        ]
+    )
+    seen = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        raise AssertionError(f"unexpected response: {message}")
+
+    async def app(scope, receive, send):
+        deadline = deadline_var.get()
+        await receive()
+        seen.append((deadline.remaining(), deadline.expired_reason()))
+        await receive()
+        seen.append((deadline.remaining(), deadline.expired_reason()))
+
+    await RequestLifecycleLogMiddleware(app)(scope, receive, send)
+
+    assert 29 < seen[0][0] <= 30 and seen[0][1] is None
+    assert seen[1][1] == "client_disconnected"
+    assert deadline_var.get() is None
@@ -391,6 +391,44 @@ class TestComputeKDJ:
         assert len(d) == 20
         assert len(j) == 20
 
+    @staticmethod
+    def china_kdj(close, high, low, n=9, m1=3, m2=3):
+        """tests_research/compare_kdj.py 的逐根递推写法：K、D 以 50 起算。"""
+        k_values, d_values = [], []
+        curr_k = curr_d = 50.0
+        for i in range(len(close)):
+            if i < n - 1:
+                rsv = 50.0
+            else:
+                lowest = low[i - n + 1:i + 1].min()
+                highest = high[i - n + 1:i + 1].max()
+                rsv = 50.0 if highest == lowest else (close[i] - lowest) / (highest - lowest) * 100
+            curr_k = (m1 - 1) / m1 * curr_k + rsv / m1
+            curr_d = (m2 - 1) / m2 * curr_d + curr_k / m2
+            k_values.append(curr_k)
+            d_values.append(curr_d)
+        k, d = np.array(k_values), np.array(d_values)
+        return k, d, 3 * k - 2 * d
+
+    @pytest.mark.parametrize("size", [1, 8, 9, 64, 65, 200, 5000])
+    def test_matches_recursive_convention(self, size):
+        """分块矩阵乘平滑与逐根递推一致，跨越块边界也不漂移。"""
+        rng = np.random.default_rng(size)
+        close = 10 + np.cumsum(rng.standard_normal(size) * 0.1)
+        high = close + np.abs(rng.standard_normal(size) * 0.1)
+        low = close - np.abs(rng.standard_normal(size) * 0.1)
+
+        for got, want in zip(compute_kdj(close, high, low), self.china_kdj(close, high, low)):
+            np.testing.assert_allclose(got, want, rtol=0, atol=1e-9)
+
+    def test_zero_range_window(self):
+        """9 日无波动时 RSV 为 0/0，按 50 处理。"""
+        close = np.full(30, 10.0)
+        k, d, j = compute_kdj(close, close, close)
+        np.testing.assert_allclose(k, 50.0)
+        np.testing.assert_allclose(d, 50.0)
+        np.testing.assert_allclose(j, 50.0)
+
 
 class TestComputeMACD:
     """测试 compute_macd 函数"""
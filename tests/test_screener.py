@@ -0,0 +1,335 @@
+"""全市场选股测试
+
+覆盖：efinance 行情表到列式快照的转换、表达式白名单与 NaN 语义、
+排序分页、K 线特征的记录与按交易日拼接，以及 screen 工具的端到端调用。
+"""
+
+import asyncio
+import importlib
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from qtf_mcp import research
+from qtf_mcp import screener
+from qtf_mcp.datasource import market_snapshot
+from qtf_mcp.datasource.market_snapshot import snapshot_from_quotes
+from qtf_mcp.screener import (
+    FEATURE_FIELDS,
+    FeatureBuilder,
+    FeatureStore,
+    ScreenExpressionError,
+    build_screen_table,
+    evaluate_expression,
+    extract_features,
+    run_screen,
+)
+
+app_module = importlib.import_module("qtf_mcp.mcp_app")
+EPOCH = "closed-2026-10-16"
+
+
+def quotes_frame(rows: int = 4) -> pd.DataFrame:
+    codes = ["600000", "000001", "300750", "830799"][:rows]
+    return pd.DataFrame(
+        {
+            "股票代码": codes,
+            "股票名称": ["浦发银行", "平安银行", "宁德时代", "艾融软件"][:rows],
+            "涨跌幅": [1.5, -2.0, 3.2, "-"][:rows],
+            "最新价": [10.0, 12.0, 200.0, 30.0][:rows],
+            "换手率": [0.5, 6.0, 8.0, 12.0][:rows],
+            "动态市盈率": [5.0, 8.0, 30.0, -10.0][:rows],
+            "成交额": [1e9, 2e9, 5e9, 1e8][:rows],
+            "最新交易日": ["20261016"] * rows,
+        }
+    )
+
+
+def test_snapshot_from_quotes_builds_numeric_columns():
+    """代码补齐市场前缀，"-" 转为 NaN，缺失列整列为 NaN。"""
+    snapshot = snapshot_from_quotes(quotes_frame(), epoch=EPOCH)
+
+    assert list(snapshot.symbols) == ["SH600000", "SZ000001", "SZ300750", "BJ830799"]
+    assert snapshot.names[2] == "宁德时代"
+    assert snapshot.trade_date == "2026-10-16"
+    assert np.isnan(snapshot.columns["change_pct"][3])
+    assert np.isnan(snapshot.columns["mcap"]).all()
+    assert snapshot.columns["pe"].dtype == np.float64
+
+
+def test_expression_supports_boolean_logic_and_arithmetic():
+    """and/or/not、链式比较、四则运算与逗号分隔条件都按向量化求值。"""
+    columns = {
+        "pe": np.array([5.0, 8.0, 30.0, -10.0]),
+        "turnover": np.array([0.5, 6.0, 8.0, 12.0]),
+        "close": np.array([10.0, 12.0, 200.0, 30.0]),
+        "ma20": np.array([9.0, np.nan, 210.0, 20.0]),
+    }
+
+    assert evaluate_expression("pe > 0 and pe < 15", columns, 4).tolist() == [True, True, False, False]
+    assert evaluate_expression("0 < pe < 15, turnover > 5", columns, 4).tolist() == [False, True, False, False]
+    assert evaluate_expression("pe < 0 or turnover >= 8", columns, 4).tolist() == [False, False, True, True]
+    assert evaluate_expression("close > ma20 * 1.05", columns, 4).tolist() == [True, False, False, True]
+    # NaN 比较为假，not 取反后为真
+    assert evaluate_expression("not close > ma20", columns, 4).tolist() == [False, True, True, False]
+    assert evaluate_expression("", columns, 4).all()
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "__import__('os').system('true')",
+        "pe.real > 1",
+        "unknown_field > 1",
+        "pe",
+        "pe > 'x'",
+        "pe >",
+        "-(pe > 5)",
+        "(pe > 1) - (pe > 2) > 0",
+        "+(pe > 5) and pe > 0",
+    ],
+)
+def test_expression_rejects_anything_outside_whitelist(expression):
+    """函数调用、属性访问、未知字段、非布尔结果、条件参与算术与语法错误都被拒绝。"""
+    columns = {"pe": np.array([1.0])}
+    with pytest.raises(ScreenExpressionError):
+        evaluate_expression(expression, columns, 1)
+
+
+def test_run_screen_ranks_and_paginates_with_nan_last():
+    """降序排序时 NaN 排在最后，offset/limit 只截取当前页。"""
+    snapshot = snapshot_from_quotes(quotes_frame(), epoch=EPOCH)
+    table = build_screen_table(snapshot, FeatureStore())
+
+    result = run_screen(table, "turnover > 1", "-change_pct", offset=0, limit=2)
+    assert result.matched == 3
+    assert [row.symbol for row in result.rows] == ["SZ300750", "SZ000001"]
+    assert result.fields == ("close", "change_pct", "turnover", "amount")
+
+    page = run_screen(table, "turnover > 1", "-change_pct", offset=2, limit=2)
+    assert [row.symbol for row in page.rows] == ["BJ830799"]
+    assert page.rows[0].values["change_pct"] is None
+
+    with pytest.raises(ScreenExpressionError):
+        run_screen(table, "", "-nope")
+    with pytest.raises(ScreenExpressionError):
+        run_screen(table, "", "-amount", limit=0)
+
+
+def test_features_join_only_for_the_snapshot_trading_day(sample_stock_data_dict, monkeypatch):
+    """K 线特征只与同一交易日的快照拼接，未覆盖的股票在特征条件上不匹配。"""
+    data = dict(sample_stock_data_dict)
+    data["FCAP"] = np.array([1e8] * len(data["CLOSE"]))
+    features = extract_features(data)
+    close = data["CLOSE"]
+    assert features[FEATURE_FIELDS.index("ma20")] == pytest.approx(close[-20:].mean())
+    assert features[FEATURE_FIELDS.index("ret5")] == pytest.approx((close[-1] / close[-5] - 1) * 100)
+    assert features[FEATURE_FIELDS.index("turnover5")] == pytest.approx(
+        data["VOLUME"][-5:].mean() * 100 / 1e8 * 100
+    )
+    assert np.isnan(features[FEATURE_FIELDS.index("ma60")])
+
+    store = FeatureStore()
+    monkeypatch.setattr(screener, "market_phase", lambda: ("closed", EPOCH))
+    store.record("SZ000001", data)
+    monkeypatch.setattr(screener, "market_phase", lambda: ("closed", "closed-2026-10-15"))
+    store.record("SH600000", data)
+
+    snapshot = snapshot_from_quotes(quotes_frame(), epoch=EPOCH)
+    table = build_screen_table(snapshot, store)
+    assert table.feature_coverage == 1
+
+    result = run_screen(table, "ma20 > 0", "-amount")
+    assert [row.symbol for row in result.rows] == ["SZ000001"]
+    assert result.rows[0].values["ma20"] == pytest.approx(close[-20:].mean())
+    assert "1/4" in result.warnings[0]
+
+
+def test_record_keeps_fields_a_later_load_does_not_provide(sample_stock_data_dict, monkeypatch):
+    """同一交易日内不带财务数据的加载不清掉已记录的 ROE；跨日则整行替换。"""
+    data = dict(sample_stock_data_dict)
+    with_finance = dict(data, _DS_FINANCE=({"ROE": np.array([0.12])}, None))
+    store = FeatureStore()
+    monkeypatch.setattr(screener, "market_phase", lambda: ("closed", EPOCH))
+    store.record("SZ000001", with_finance)
+    store.record("SZ000001", data)
+
+    _, rows = store.rows("2026-10-16")
+    assert rows["SZ000001"][FEATURE_FIELDS.index("roe")] == pytest.approx(12.0)
+    assert rows["SZ000001"][FEATURE_FIELDS.index("ma20")] == pytest.approx(data["CLOSE"][-20:].mean())
+
+    monkeypatch.setattr(screener, "market_phase", lambda: ("live", "live-2026-10-19"))
+    store.record("SZ000001", data)
+    _, rows = store.rows("2026-10-19")
+    assert np.isnan(rows["SZ000001"][FEATURE_FIELDS.index("roe")])
+
+
+@pytest.mark.asyncio
+async def test_load_raw_data_records_features_for_latest_window(sample_stock_data_dict, monkeypatch):
+    """最新窗口的个股取数顺带记录特征；历史日期查询与指数不记录。"""
+    store = FeatureStore()
+    monkeypatch.setattr(screener, "_feature_store", store)
+    monkeypatch.setattr(screener, "market_phase", lambda: ("closed", EPOCH))
+
+    async def fake_load_data_msd(symbol, start, end, n=0, who="", requirements=None):
+        return dict(sample_stock_data_dict)
+
+    monkeypatch.setattr(research, "load_data_msd", fake_load_data_msd)
+
+    await research.load_raw_data("SZ000001")
+    await research.load_raw_data("SH600000", "2024-01-30")
+    await research.load_raw_data("SH000001")
+
+    _, rows = store.rows("2026-10-16")
+    assert list(rows) == ["SZ000001"]
+
+
+@pytest.mark.asyncio
+async def test_screen_tool_over_full_market_snapshot(monkeypatch):
+    """5000 只股票的快照只取数一次，之后的筛选在内存中向量化完成。"""
+    n = 5000
+    rng = np.random.default_rng(7)
+    frame = pd.DataFrame(
+        {
+            "股票代码": [f"{600000 + i:06d}" for i in range(n)],
+            "股票名称": [f"股票{i}" for i in range(n)],
+            "涨跌幅": rng.uniform(-10, 10, n),
+            "最新价": rng.uniform(2, 200, n),
+            "换手率": rng.uniform(0, 20, n),
+            "动态市盈率": rng.uniform(-50, 100, n),
+            "成交额": rng.uniform(1e6, 1e10, n),
+            "最新交易日": ["20261016"] * n,
+        }
+    )
+    calls = []
+
+    def fake_fetch():
+        calls.append(1)
+        return frame
+
+    monkeypatch.setattr(market_snapshot, "_fetch_quotes_sync", fake_fetch)
+    monkeypatch.setattr(market_snapshot, "market_phase", lambda: ("closed", EPOCH))
+    monkeypatch.setattr(screener, "_feature_store", FeatureStore())
+    market_snapshot.clear_market_snapshot()
+    try:
+        first = await app_module.screen("pe > 0 and pe < 15 and turnover > 5", limit=10)
+        started_at = time.perf_counter()
+        second = await app_module.screen("pe > 0 and pe < 15 and turnover > 5", "-turnover", 10, 10)
+        elapsed = time.perf_counter() - started_at
+    finally:
+        market_snapshot.clear_market_snapshot()
+
+    expected = int(((frame["动态市盈率"] > 0) & (frame["动态市盈率"] < 15) & (frame["换手率"] > 5)).sum())
+    assert calls == [1]
+    assert first.total == n and first.matched == expected and len(first.rows) == 10
+    assert first.fields == ["close", "change_pct", "turnover", "amount", "pe"]
+    turnovers = [row.values["turnover"] for row in second.rows]
+    assert turnovers == sorted(turnovers, reverse=True)
+    assert second.offset == 10
+    assert first.trade_date == "2026-10-16"
+    assert elapsed < 1.0
+
+
+@pytest.mark.asyncio
+async def test_feature_builder_loads_missing_symbols_with_bounded_concurrency(
+    sample_stock_data_dict, monkeypatch
+):
+    """后台补齐只取本纪元尚无记录的股票，同时进行的取数不超过并发上限。"""
+    store = FeatureStore()
+    monkeypatch.setattr(screener, "_feature_store", store)
+    monkeypatch.setattr(screener, "market_phase", lambda: ("closed", EPOCH))
+    store.record("SH600000", dict(sample_stock_data_dict))
+    active = {"now": 0, "peak": 0}
+    loaded = []
+
+    async def loader(symbol):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        loaded.append(symbol)
+        if symbol == "BJ830799":
+            return False
+        store.record(symbol, dict(sample_stock_data_dict))
+        return True
+
+    builder = FeatureBuilder(concurrency=2)
+    builder.register(loader)
+    snapshot = snapshot_from_quotes(quotes_frame(), epoch=EPOCH)
+    stats = await builder.build(snapshot)
+
+    assert sorted(loaded) == ["BJ830799", "SZ000001", "SZ300750"]
+    assert active["peak"] == 2
+    assert (stats["candidates"], stats["loaded"], stats["missed"]) == (3, 2, 1)
+    assert build_screen_table(snapshot, store).feature_coverage == 3
+
+
+@pytest.mark.asyncio
+async def test_screen_reports_coverage_until_the_epoch_build_finishes(
+    sample_stock_data_dict, monkeypatch
+):
+    """纪元内首次 screen 启动后台补齐，完成前响应标明进行中并给出覆盖数，之后不再重复启动。"""
+    store = FeatureStore()
+    monkeypatch.setattr(screener, "_feature_store", store)
+    monkeypatch.setattr(screener, "market_phase", lambda: ("closed", EPOCH))
+    monkeypatch.setattr(market_snapshot, "_fetch_quotes_sync", quotes_frame)
+    monkeypatch.setattr(market_snapshot, "market_phase", lambda: ("closed", EPOCH))
+    release = asyncio.Event()
+    calls = []
+
+    async def loader(symbol):
+        calls.append(symbol)
+        await release.wait()
+        store.record(symbol, dict(sample_stock_data_dict))
+        return True
+
+    builder = FeatureBuilder(concurrency=4)
+    builder.register(loader)
+    screener.set_feature_builder(builder)
+    market_snapshot.clear_market_snapshot()
+    try:
+        first = await app_module.screen("ma20 > 0")
+        assert first.features_building is True
+        assert first.feature_coverage == 0 and first.matched == 0
+        assert "0/4" in first.warnings[0] and "后台补齐" in first.warnings[0]
+
+        release.set()
+        _, task = getattr(asyncio.get_running_loop(), screener._BUILD_TASK_ATTR)
+        await task
+        second = await app_module.screen("ma20 > 0")
+    finally:
+        market_snapshot.clear_market_snapshot()
+
+    assert len(calls) == 4
+    assert second.features_building is False
+    assert second.feature_coverage == second.matched == 4
+    assert second.warnings == []
+
+
+@pytest.mark.asyncio
+async def test_record_screen_features_bypasses_raw_data_cache(sample_stock_data_dict, monkeypatch):
+    """补齐取数直接记录特征，不写原始数据缓存；非个股不取数。"""
+    from qtf_mcp import cache as cache_module
+
+    store = FeatureStore()
+    monkeypatch.setattr(screener, "_feature_store", store)
+    monkeypatch.setattr(screener, "market_phase", lambda: ("closed", EPOCH))
+    raw_cache = cache_module.RawDataCache(enabled=True)
+    cache_module.set_raw_data_cache(raw_cache)
+    requested = []
+
+    async def fake_load_data_msd(symbol, start, end, n=0, who="", requirements=None):
+        requested.append((symbol, requirements))
+        return dict(sample_stock_data_dict)
+
+    monkeypatch.setattr(research, "load_data_msd", fake_load_data_msd)
+
+    assert await research.record_screen_features("SZ000001") is True
+    assert await research.record_screen_features("BJ830799") is False
+
+    assert [symbol for symbol, _ in requested] == ["SZ000001"]
+    assert requested[0][1].finance and not requested[0][1].fund_flow
+    assert list(store.rows("2026-10-16")[1]) == ["SZ000001"]
+    assert len(raw_cache._entries) == 0
@@ -0,0 +1,126 @@
+"""
+开盘前预热与收盘后关浏览器测试
+
+覆盖：预热与关闭时刻的计算（跳过周末）、预热流程的统计、
+哨兵页面失败时重启浏览器重试一次，以及同花顺认证的预热不抛异常。
+"""
+
+import datetime
+import importlib
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from qtf_mcp import session_warmup
+from qtf_mcp.datasource import market_breadth, realtime_ff
+from qtf_mcp.session_warmup import EVENT_SHUTDOWN, EVENT_WARMUP, SessionWarmup, next_session_event
+
+SHANGHAI = ZoneInfo("Asia/Shanghai")
+
+
+def at(day, hour, minute):
+    return datetime.datetime(2026, 10, day, hour, minute, tzinfo=SHANGHAI)
+
+
+def test_next_session_event_warms_before_pre_open_and_skips_weekends():
+    # 2026-10-16 是周五
+    assert next_session_event(at(16, 8, 0), lead_minutes=5) == (EVENT_WARMUP, at(16, 9, 10))
+    kind, target = next_session_event(at(16, 9, 12), lead_minutes=5)
+    assert kind == EVENT_SHUTDOWN and target == at(16, 17, 0) + datetime.timedelta(seconds=5)
+    assert next_session_event(at(16, 17, 1), lead_minutes=5) == (EVENT_WARMUP, at(19, 9, 10))
+    assert next_session_event(at(17, 12, 0), lead_minutes=5) == (EVENT_WARMUP, at(19, 9, 10))
+
+
+@pytest.mark.asyncio
+async def test_warm_up_runs_browser_and_auth_and_shutdown_drains(monkeypatch):
+    calls = []
+
+    async def fake_warm_browser():
+        calls.append("browser")
+        return True
+
+    async def fake_warm_auth():
+        calls.append("auth")
+        return False
+
+    async def fake_close(drain_seconds=0):
+        calls.append(("close", drain_seconds))
+
+    monkeypatch.setattr(realtime_ff, "warm_browser", fake_warm_browser)
+    monkeypatch.setattr(realtime_ff, "close_browser", fake_close)
+    monkeypatch.setattr(session_warmup, "warm_market_breadth_auth", fake_warm_auth)
+
+    scheduler = SessionWarmup(lead_minutes=5)
+    stats = await scheduler.warm_up()
+    await scheduler.shut_down()
+
+    assert stats["browser"] is True and stats["auth"] is False
+    assert calls == ["browser", "auth", ("close", session_warmup.SHUTDOWN_DRAIN_SECONDS)]
+    assert not SessionWarmup(lead_minutes=0).enabled
+
+
+@pytest.mark.asyncio
+async def test_failed_canary_restarts_browser_once(monkeypatch):
+    """哨兵页面渲染失败时关闭浏览器重来一次，两次都失败则报告失败。"""
+    canary = [False, True]
+    events = []
+
+    async def fake_warm_pages(url=realtime_ff.CANARY_URL):
+        events.append("warm")
+        return 2
+
+    async def fake_check(url=realtime_ff.CANARY_URL):
+        events.append("check")
+        return canary.pop(0)
+
+    async def fake_close(drain_seconds=0):
+        events.append("close")
+
+    monkeypatch.setattr(realtime_ff, "warm_pages", fake_warm_pages)
+    monkeypatch.setattr(realtime_ff, "check_browser", fake_check)
+    monkeypatch.setattr(realtime_ff, "close_browser", fake_close)
+
+    assert await realtime_ff.warm_browser() is True
+    assert events == ["warm", "check", "close", "warm", "check"]
+
+    canary[:] = [False, False]
+    events.clear()
+    assert await realtime_ff.warm_browser() is False
+    assert events.count("close") == 1
+
+
+@pytest.mark.asyncio
+async def test_auth_warm_up_reports_failure_without_raising(monkeypatch, tmp_path):
+    provider = market_breadth.TonghuashunPlaywrightProvider(auth_cache_path=tmp_path / "auth.json")
+
+    async def failing_bootstrap():
+        raise RuntimeError("browser unavailable")
+
+    async def failing_fetch():
+        raise market_breadth.TonghuashunCooldownError("cooling down")
+
+    monkeypatch.setattr(provider, "_bootstrap_auth", failing_bootstrap)
+    monkeypatch.setattr(provider, "fetch", failing_fetch)
+    monkeypatch.setattr(market_breadth, "DEFAULT_MARKET_BREADTH_PROVIDERS", (provider,))
+
+    assert await market_breadth.warm_market_breadth_auth() is False
+    provider.close()
+
+
+@pytest.mark.asyncio
+async def test_schedulers_start_with_the_app_not_the_first_request(monkeypatch):
+    """夜间重启后没有请求也要在开盘前预热：调度在应用 lifespan 里启动。"""
+    from qtf_mcp import breadth_history
+
+    app_module = importlib.import_module("qtf_mcp.mcp_app")
+    started = []
+    monkeypatch.setattr(
+        session_warmup.get_session_warmup(), "ensure_running", lambda: started.append("warmup")
+    )
+    monkeypatch.setattr(
+        breadth_history.get_breadth_sampler(), "ensure_running", lambda: started.append("breadth")
+    )
+    app = app_module.QtfMCP("lifespan-test", stateless_http=True).streamable_http_app()
+
+    async with app.router.lifespan_context(app):
+        assert started == ["warmup", "breadth"]
@@ -10,6 +10,7 @@ import json
 import numpy as np
 import pytest
 
+from qtf_mcp import observability
 from qtf_mcp.datasource.base import FetchRequirements
 
 app_module = importlib.import_module("qtf_mcp.mcp_app")
@@ -61,6 +62,33 @@ async def test_tech_single_symbol_returns_json(monkeypatch):
     assert isinstance(report.indicators[0].kdj.k, float)
 
 
+@pytest.mark.asyncio
+async def test_tech_computes_each_symbol_through_engine_off_loop(monkeypatch):
+    """指标逐标的经引擎在工作线程里计算，不在事件循环线程上跑。"""
+    import threading
+
+    from qtf_mcp import indicators as indicators_module
+
+    async def fake_load_raw_data(symbol, end_date=None, who="", requirements=None):
+        return _make_raw_data(symbol)
+
+    calls = []
+
+    class RecordingEngine(indicators_module.IndicatorEngine):
+        def compute(self, symbol, dates, close, high, low, reference):
+            calls.append((symbol, threading.get_ident()))
+            return super().compute(symbol, dates, close, high, low, reference)
+
+    monkeypatch.setattr(app_module.research, "load_raw_data", fake_load_raw_data)
+    indicators_module.set_indicator_engine(RecordingEngine(enabled=False))
+
+    response = await app_module.fetch_technical_reports("SZ002463,SH600519", days=2)
+
+    assert response.errors == {}
+    assert sorted(symbol for symbol, _ in calls) == ["SH600519", "SZ002463"]
+    assert all(ident != threading.get_ident() for _, ident in calls)
+
+
 @pytest.mark.asyncio
 async def test_tech_batch_symbols_return_json(monkeypatch):
     async def fake_load_raw_data(symbol, end_date=None, who="", requirements=None):
@@ -231,6 +259,33 @@ async def test_markdown_batch_limit_adds_warning(monkeypatch):
     assert "SZ000005" in response.warnings[0]
 
 
+@pytest.mark.asyncio
+async def test_markdown_report_json_output(monkeypatch):
+    """output_format=json 时报表以章节结构放进 documents，Markdown 形态不受影响。"""
+
+    async def fake_load_raw_data(symbol, end_date=None, who="", requirements=None):
+        return _make_raw_data(symbol)
+
+    monkeypatch.setattr(app_module.research, "load_raw_data", fake_load_raw_data)
+    monkeypatch.setattr(app_module.research, "is_realtime_fund_flow_window", lambda now=None: False)
+
+    markdown = await app_module.fetch_batch_reports("SZ002463", "brief", "")
+    structured = await app_module.fetch_batch_reports(
+        "SZ002463", "brief", "", output_format="json"
+    )
+
+    assert markdown.documents is None
+    assert markdown.reports["SZ002463"].startswith("# 基本数据\n\n")
+    assert structured.reports == {}
+    assert structured.errors == {}
+    sections = structured.documents["SZ002463"]
+    assert [section.title for section in sections] == ["基本数据", "交易数据"]
+    trading = sections[1]
+    assert [child.title for child in trading.sections][:2] == ["价格", "涨跌幅"]
+    assert trading.sections[0].items[0].values["close"] == pytest.approx(20.0)
+    json.loads(_dump_json(structured))
+
+
 @pytest.mark.asyncio
 async def test_full_enables_historical_fund_flow(monkeypatch):
     seen = {}
@@ -386,3 +441,280 @@ async def test_cancelled_report_releases_batch_permit(monkeypatch):
     assert admission.active == 0
     await asyncio.wait_for(admission.acquire(), timeout=0.1)
     admission.release()
+
+
+async def _grant_order(admission, queued):
+    """按 queued 的 (client, label) 依次排队，逐个释放并记录获得名额的顺序。"""
+    order = []
+    holders = ["a"]
+
+    async def wait(client, label):
+        await admission.acquire(client)
+        holders.append(client)
+        order.append(label)
+
+    tasks = []
+    for client, label in queued:
+        tasks.append(asyncio.create_task(wait(client, label)))
+        await asyncio.sleep(0)
+    for _ in range(len(queued) + 1):
+        admission.release(holders.pop(0))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_batch_admission_round_robins_between_clients():
+    """一个客户端排了很多批次时，后到的客户端在下一个名额就能轮到。"""
+    admission = app_module.BatchQueryAdmission(1)
+    await admission.acquire("a")
+
+    order = await _grant_order(admission, [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")])
+
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert admission.active == 0 and admission.waiting == 0
+    assert admission.stats() == {}
+
+
+@pytest.mark.asyncio
+async def test_batch_admission_weights_consecutive_grants():
+    """权重为 2 的客户端每轮连续拿到两个名额。"""
+    admission = app_module.BatchQueryAdmission(1, weights={"a": 2})
+    await admission.acquire("a")
+
+    order = await _grant_order(admission, [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")])
+
+    assert order == ["a1", "a2", "b1", "a3"]
+
+
+@pytest.mark.asyncio
+async def test_batch_admission_client_cap_leaves_slots_for_others():
+    """单客户端上限生效时，即使有空闲名额也不能再占，其他客户端直接进入。"""
+    admission = app_module.BatchQueryAdmission(2, client_limit=1)
+    await admission.acquire("a")
+    queued = asyncio.create_task(admission.acquire("a"))
+    await asyncio.sleep(0)
+
+    assert not queued.done()
+    assert admission.stats()["a"] == {"active": 1, "waiting": 1}
+    await asyncio.wait_for(admission.acquire("b"), timeout=0.1)
+
+    admission.release("a")
+    await asyncio.wait_for(queued, timeout=0.1)
+    admission.release("a")
+    admission.release("b")
+    assert admission.stats() == {}
+
+
+@pytest.mark.asyncio
+async def test_tech_and_kline_misses_queue_on_client_admission(monkeypatch):
+    """tech 与 K 线工具回源时按客户端排单标的准入。"""
+    admission = app_module.BatchQueryAdmission(1)
+    fetched = []
+
+    async def fake_load_raw_data(symbol, end_date=None, who="", requirements=None):
+        fetched.append(symbol)
+        return _make_raw_data(symbol)
+
+    class FakeDatasource:
+        async def fetch_kline_simple(self, symbol, start, end, adjust):
+            fetched.append(f"{symbol}@{start}")
+            return None
+
+    monkeypatch.setattr(app_module, "_get_symbol_query_admission", lambda: admission)
+    monkeypatch.setattr(app_module.research, "load_raw_data", fake_load_raw_data)
+    monkeypatch.setattr(app_module, "get_datasource", lambda: FakeDatasource())
+    await admission.acquire("busy")
+
+    tech = asyncio.create_task(app_module.fetch_technical_reports("SZ002463", days=2, host="10.0.0.2"))
+    kline = asyncio.create_task(app_module.kline_daily("SZ002463", "2026-01-05"))
+    await asyncio.sleep(0.05)
+    assert fetched == []
+    assert admission.stats()["10.0.0.2"]["waiting"] == 1
+    assert admission.stats()[""]["waiting"] == 1
+
+    admission.release("busy")
+    response = await asyncio.wait_for(tech, timeout=1)
+    await asyncio.wait_for(kline, timeout=1)
+    assert response.errors == {}
+    assert sorted(fetched) == ["SZ002463", "SZ002463@2026-01-05"]
+    assert admission.active == 0
+
+
+@pytest.mark.asyncio
+async def test_kline_miss_does_not_wait_behind_report_batches(monkeypatch):
+    """报告批次占满批量准入时，单标的 K 线回源仍走自己的名额。"""
+    batches = app_module.BatchQueryAdmission(1)
+
+    class FakeDatasource:
+        async def fetch_kline_simple(self, symbol, start, end, adjust):
+            return None
+
+    monkeypatch.setattr(app_module, "_get_batch_query_admission", lambda: batches)
+    monkeypatch.setattr(app_module, "get_datasource", lambda: FakeDatasource())
+    await batches.acquire("busy")
+
+    await asyncio.wait_for(app_module.kline_daily("SZ002463", "2026-01-05"), timeout=1)
+    assert batches.waiting == 0
+    assert app_module._get_symbol_query_admission().active == 0
+    batches.release("busy")
+
+
+@pytest.mark.asyncio
+async def test_expired_batch_is_shed_in_admission_queue(monkeypatch):
+    """排队等准入时过了截止时间的批次直接丢弃：不回源，也不占用名额。"""
+    admission = app_module.BatchQueryAdmission(1)
+    fetched = []
+
+    async def fake_load_raw_data(symbol, end_date=None, who="", requirements=None):
+        fetched.append(symbol)
+        return _make_raw_data(symbol)
+
+    monkeypatch.setattr(app_module, "_get_batch_query_admission", lambda: admission)
+    monkeypatch.setattr(app_module, "_get_symbol_query_admission", lambda: admission)
+    monkeypatch.setattr(app_module.research, "load_raw_data", fake_load_raw_data)
+    await admission.acquire("busy")
+    shed_before = observability.shed_counts["admission"]
+
+    with pytest.raises(observability.DeadlineExceeded):
+        await app_module.brief("SZ000001", deadline=0.05)
+    # tech 按标的汇总错误，丢弃的标的出现在 errors 里
+    response = await app_module.tech("SZ000001", days=2, deadline=0.05)
+    assert "截止时间" in response.errors["SZ000001"]
+
+    assert fetched == []
+    assert observability.shed_counts["admission"] == shed_before + 2
+    assert admission.stats() == {"busy": {"active": 1, "waiting": 0}}
+    admission.release("busy")
+
+
+@pytest.mark.asyncio
+async def test_tech_columnar_layout_matches_rows(monkeypatch):
+    async def fake_load_raw_data(symbol, end_date=None, who="", requirements=None):
+        return _make_raw_data("SZ002463", n=35)
+
+    monkeypatch.setattr(app_module.research, "load_raw_data", fake_load_raw_data)
+
+    rows = await app_module.fetch_technical_reports("SZ002463", days=35)
+    columnar = await app_module.fetch_technical_reports("SZ002463", days=35, layout="columnar")
+
+    row_report = rows.reports["SZ002463"]
+    report = columnar.reports["SZ002463"]
+    assert row_report.columns is None
+    assert report.indicators == []
+    assert report.quote_date == row_report.quote_date
+    columns = report.columns
+    assert columns.dates == [item.date for item in row_report.indicators]
+    for group in ("ohlc", "kdj", "macd", "rsi", "bbands"):
+        for name, values in getattr(columns, group).items():
+            expected = [getattr(getattr(item, group), name) for item in row_report.indicators]
+            assert values == pytest.approx(expected, nan_ok=False), (group, name)
+    # 最早几天 MACD 尚未起算，缺失值为 null
+    assert columns.macd["dif"][-1] is None
+    assert columns.macd["histogram"][-1] is None
+
+
+@pytest.mark.asyncio
+async def test_tech_columnar_respects_fields_and_days(monkeypatch):
+    async def fake_load_raw_data(symbol, end_date=None, who="", requirements=None):
+        return _make_raw_data("SZ002463")
+
+    monkeypatch.setattr(app_module.research, "load_raw_data", fake_load_raw_data)
+
+    response = await app_module.fetch_technical_reports(
+        "SZ002463", days=3, fields="macd", include_derived=False, layout="columnar"
+    )
+    payload = json.loads(_dump_json(response))
+    columns = payload["reports"]["SZ002463"]["columns"]
+
+    assert len(columns["dates"]) == 3
+    assert set(columns["macd"]) == {"dif", "dea"}
+    assert columns["kdj"] is None and columns["rsi"] is None and columns["bbands"] is None
+    assert all(len(values) == 3 for values in columns["ohlc"].values())
+
+@pytest.fixture
+def watchlist_sources(monkeypatch):
+    """桩掉取数与交易数据段，记录同时在途的取数数量。"""
+    state = {"active": 0, "peak": 0, "slow": set()}
+
+    async def fake_load_raw_data(symbol, end_date=None, who="", requirements=None):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        try:
+            await asyncio.sleep(1.0 if symbol in state["slow"] else 0.01)
+        finally:
+            state["active"] -= 1
+        return _make_raw_data(symbol)
+
+    async def fake_build_trading_data(fp, symbol, data, **kwargs):
+        print("# trading", file=fp)
+
+    monkeypatch.setattr(app_module.research, "load_raw_data", fake_load_raw_data)
+    monkeypatch.setattr(app_module.research, "build_trading_data", fake_build_trading_data)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_watchlist_reports_every_symbol_in_input_order(watchlist_sources):
+    """超过 4 个标的全部返回，按输入顺序排列，每个标的上报一次进度。"""
+    symbols = [f"SZ{code:06d}" for code in range(1, 11)]
+    progress = []
+
+    async def on_progress(done, total, message):
+        progress.append((done, total, message))
+
+    response = await app_module.fetch_watchlist(",".join(symbols), progress=on_progress)
+
+    assert response.symbols_count == 10
+    assert list(response.reports) == symbols
+    assert response.errors == {}
+    assert response.summary.succeeded == 10
+    assert response.summary.timed_out == 0
+    assert [done for done, _, _ in progress] == list(range(1, 11))
+    assert all(total == 10 for _, total, _ in progress)
+    # 同时在途的批次不超过准入上限
+    assert watchlist_sources["peak"] <= app_module.BATCH_QUERY_CONCURRENCY * app_module.MAX_BATCH_SYMBOLS
+
+
+@pytest.mark.asyncio
+async def test_watchlist_symbol_deadline_only_fails_slow_symbol(watchlist_sources):
+    """单个标的超时只记为该标的的错误，同批其余标的照常返回。"""
+    watchlist_sources["slow"].add("SZ000002")
+
+    response = await app_module.fetch_watchlist(
+        "SZ000001,SZ000002,SZ000003", symbol_timeout=0.2
+    )
+
+    assert set(response.errors) == {"SZ000002"}
+    assert "超时" in response.errors["SZ000002"]
+    assert response.reports["SZ000001"].startswith("# 基本数据")
+    assert response.summary.succeeded == 2
+    assert response.summary.timed_out == 1
+    assert response.summary.failed == 0
+
+
+@pytest.mark.asyncio
+async def test_watchlist_dedupes_and_caps_symbols(watchlist_sources, monkeypatch):
+    """重复代码只处理一次，超过上限的代码写入 warnings。"""
+    monkeypatch.setattr(app_module, "WATCHLIST_MAX_SYMBOLS", 2)
+
+    response = await app_module.fetch_watchlist("sz000001,SZ000001,SZ000002,SZ000003")
+
+    assert list(response.reports) == ["SZ000001", "SZ000002"]
+    assert len(response.warnings) == 1
+    assert "SZ000003" in response.warnings[0]
+
+
+@pytest.mark.asyncio
+async def test_watchlist_progress_failure_does_not_fail_report(watchlist_sources):
+    """进度通知失败（客户端断开）不影响最终结果。"""
+
+    async def broken_progress(done, total, message):
+        raise RuntimeError("stream closed")
+
+    response = await app_module.fetch_watchlist(
+        "SZ000001,SZ000002", progress=broken_progress
+    )
+
+    assert response.summary.succeeded == 2
@@ -0,0 +1,51 @@
+"""
+尾部窗口统计测试：与逐周期切片计算逐位一致
+"""
+
+import numpy as np
+import pytest
+
+from qtf_mcp.window_stats import TRAILING_PERIODS, TradingWindows, TrailingWindows
+
+
+def two_decimal_prices(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return np.round(10 + np.abs(np.cumsum(rng.standard_normal(n) * 0.2)), 2)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_trailing_windows_match_slices_bit_for_bit(seed):
+    """两位小数价格的均值常落在三位小数的进位点上，求和顺序必须与 ndarray.mean 相同。"""
+    values = two_decimal_prices(300, seed)
+    windows = TrailingWindows(values)
+    for p in TRAILING_PERIODS:
+        assert windows.sum(p) == values[-p:].sum()
+        assert windows.mean(p) == values[-p:].mean()
+        assert windows.max(p) == values[-p:].max()
+        assert windows.min(p) == values[-p:].min()
+
+
+def test_nan_propagates_like_numpy():
+    values = two_decimal_prices(30)
+    values[-10] = np.nan
+    windows = TrailingWindows(values, (5, 20))
+    assert windows.mean(5) == values[-5:].mean()
+    assert np.isnan(windows.mean(20))
+    assert np.isnan(windows.max(20))
+    assert np.isnan(windows.min(20))
+
+
+def test_trading_windows_apply_intraday_estimate_once():
+    close = two_decimal_prices(25)
+    volume = np.full(25, 1000.0)
+    amount = np.full(25, 2e8)
+    windows = TradingWindows({"CLOSE": close, "VOLUME": volume, "AMOUNT": amount}, 2.0)
+
+    assert windows.periods == [5, 20]
+    assert windows.volume_today == 1000.0
+    assert windows.amount_today == 2.0
+    assert windows.volume.sum(5) == 6000.0
+    assert windows.amount.mean(5) == pytest.approx(2.4)
+    # 输入数组不被改写
+    assert volume[-1] == 1000.0
+    assert windows.high.max(20) == close[-20:].max()
@@ -0,0 +1,65 @@
+"""增量指标引擎基准：冷启动重建、热步进与全量向量计算。
+
+    PYTHONPATH=. python tests_research/bench_indicators.py
+
+冷启动（新标的、新交易日或被 LRU 淘汰）做一次全量计算并由它播种状态；热步进只算最后一根。
+输出各自单次耗时（取多轮最小值）以及热步进需要命中多少次才能抵消一次冷启动。
+"""
+
+import itertools
+import timeit
+
+import numpy as np
+
+from qtf_mcp.indicators import IndicatorEngine
+from qtf_mcp.research import compute_indicator_series
+
+
+def make_bars(size, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 + np.cumsum(rng.standard_normal(size) * 0.1)
+    high = close + np.abs(rng.standard_normal(size) * 0.1)
+    low = close - np.abs(rng.standard_normal(size) * 0.1)
+    dates = np.arange(size, dtype=np.int64) * 86_400_000_000_000
+    return dates, close, high, low
+
+
+def best_of(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    print(
+        f"{'bars':>6} {'full(ms)':>9} {'cold(ms)':>9} {'warm(ms)':>9} {'break-even':>11}"
+    )
+    for size in (120, 480, 1000):
+        dates, close, high, low = make_bars(size)
+
+        def cold():
+            IndicatorEngine(enabled=True).compute(
+                "SH600000", dates, close, high, low, compute_indicator_series
+            )
+
+        warm_engine = IndicatorEngine(enabled=True)
+        warm_engine.compute("SH600000", dates, close, high, low, compute_indicator_series)
+        # 交替两版最后一根，每次都真正步进，而不是命中原样重复
+        revisions = itertools.cycle((close, np.append(close[:-1], close[-1] + 0.01)))
+
+        def warm():
+            warm_engine.compute(
+                "SH600000", dates, next(revisions), high, low, compute_indicator_series
+            )
+
+        full = best_of(lambda: compute_indicator_series(close, high, low), 200)
+        cold_cost = best_of(cold, 20)
+        warm_cost = best_of(warm, 200)
+        saving = full - warm_cost
+        break_even = f"{(cold_cost - full) / saving:.0f}" if saving > 0 else "never"
+        print(
+            f"{size:>6} {full * 1e3:>9.3f} {cold_cost * 1e3:>9.3f} "
+            f"{warm_cost * 1e3:>9.3f} {break_even:>11}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""KDJ 内核基准：NumPy 分块平滑 vs 旧的 pandas rolling/ewm 写法。
+
+    PYTHONPATH=. python tests_research/bench_kdj.py
+
+输出每种长度下两种实现的单次耗时（取多轮最小值）与最大绝对差。
+"""
+
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from qtf_mcp.research import compute_kdj
+
+
+def pandas_kdj(close, high, low, n=9, m1=3, m2=3):
+    """compute_kdj 改写前的实现，保留作对照。"""
+    s_close = pd.Series(close)
+    s_high = pd.Series(high)
+    s_low = pd.Series(low)
+    low_min = s_low.rolling(window=n).min()
+    high_max = s_high.rolling(window=n).max()
+    rsv = ((s_close - low_min) / (high_max - low_min) * 100).fillna(50)
+    k = rsv.ewm(com=m1 - 1, adjust=False).mean()
+    d = k.ewm(com=m2 - 1, adjust=False).mean()
+    j = 3 * k - 2 * d
+    return k.values, d.values, j.values
+
+
+def make_bars(size, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 10 + np.cumsum(rng.standard_normal(size) * 0.1)
+    high = close + np.abs(rng.standard_normal(size) * 0.1)
+    low = close - np.abs(rng.standard_normal(size) * 0.1)
+    return close, high, low
+
+
+def best_of(func, args, number=200, repeat=5):
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=repeat)) / number
+
+
+def main():
+    print(f"{'bars':>6} {'pandas(ms)':>11} {'numpy(ms)':>10} {'speedup':>8} {'max|diff|':>10}")
+    for size in (480, 5000):
+        bars = make_bars(size)
+        legacy = best_of(pandas_kdj, bars)
+        kernel = best_of(compute_kdj, bars)
+        diff = max(
+            float(np.max(np.abs(a - b)))
+            for a, b in zip(compute_kdj(*bars), pandas_kdj(*bars))
+        )
+        print(
+            f"{size:>6} {legacy * 1e3:>11.3f} {kernel * 1e3:>10.3f} "
+            f"{legacy / kernel:>7.1f}x {diff:>10.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()